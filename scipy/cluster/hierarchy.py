@@ -172,8 +172,10 @@ from __future__ import division, print_function, absolute_import
 import warnings
 
 import numpy as np
+import scipy.sparse
 from . import _hierarchy_wrap
 import scipy.spatial.distance as distance
+from scipy.spatial import cKDTree
 
 from scipy.lib.six import string_types
 from scipy.lib.six.moves import xrange
@@ -183,6 +185,8 @@ _cpy_non_euclid_methods = {'single': 0, 'complete': 1, 'average': 2,
 _cpy_euclid_methods = {'centroid': 3, 'median': 4, 'ward': 5}
 _cpy_linkage_methods = set(_cpy_non_euclid_methods.keys()).union(
     set(_cpy_euclid_methods.keys()))
+# Metrics for which single linkage uses a kd-tree, and their Minkowski p
+_tree_metrics = {'euclidean': 2., 'cityblock': 1., 'chebyshev': np.inf}
 
 __all__ = ['ClusterNode', 'average', 'centroid', 'complete', 'cophenet',
            'correspond', 'dendrogram', 'fcluster', 'fclusterdata',
@@ -465,7 +469,7 @@ def ward(y):
     return linkage(y, method='ward', metric='euclidean')
 
 
-def linkage(y, method='single', metric='euclidean'):
+def linkage(y, method='single', metric='euclidean', connectivity=None):
     """
     Performs hierarchical/agglomerative clustering on the condensed
     distance matrix y.
@@ -593,20 +597,51 @@ def linkage(y, method='single', metric='euclidean'):
     implementation may chose a different minimum than the MATLAB
     version.
 
+    The clustering is not computed by updating the full distance matrix
+    as described above for every merge, which takes :math:`O(n^3)` time.
+    The 'single' method uses the minimum spanning tree of the
+    observations, whose edges in order of length give the single
+    linkage merges. The 'complete', 'average', 'weighted' and 'ward'
+    methods use the nearest-neighbor chain algorithm, which gives the
+    same merges for these methods. Both take :math:`O(n^2)` time. Only
+    the 'centroid' and 'median' methods use the generic algorithm.
+
+    Single linkage of observation vectors with the 'euclidean',
+    'cityblock' or 'chebyshev' metric does not compute the distance
+    matrix at all: the minimum spanning tree is found with a
+    `scipy.spatial.cKDTree`, in :math:`O(n)` memory.
+
+    If a `connectivity` graph is given, only clusters joined by an edge
+    of the graph are merged, and only the distances along the edges are
+    computed, so that the time taken grows with the number of edges
+    rather than with :math:`n^2`. The distance between two clusters is
+    then taken over the edges between them: their smallest distance for
+    'single', their largest for 'complete' and their mean for 'average';
+    'weighted' averages the distances of the two merged clusters if both
+    are adjacent to a third. The 'centroid', 'median' and 'ward' methods
+    are computed from the centroids of the clusters as described above.
+
     Parameters
     ----------
-    y : ndarray
+    y : ndarray or CondensedDistanceMatrix
         A condensed or redundant distance matrix. A condensed distance matrix
         is a flat array containing the upper triangular of the distance matrix.
-        This is the form that ``pdist`` returns. Alternatively, a collection of
-        :math:`m` observation vectors in n dimensions may be passed as an
-        :math:`m` by :math:`n` array.
+        This is the form that ``pdist`` returns; it may also be wrapped in a
+        `scipy.spatial.distance.CondensedDistanceMatrix`. Alternatively, a
+        collection of :math:`m` observation vectors in n dimensions may be
+        passed as an :math:`m` by :math:`n` array.
     method : str, optional
         The linkage algorithm to use. See the ``Linkage Methods`` section below
         for full descriptions.
     metric : str, optional
         The distance metric to use. See the ``distance.pdist`` function for a
         list of valid distance metrics.
+    connectivity : sparse matrix, optional
+        An :math:`m` by :math:`m` adjacency matrix of the observation
+        vectors, such as a grid or mesh graph; its nonzero entries are the
+        pairs of observations that are adjacent, in either direction. The
+        graph must be connected, and the metric must be 'euclidean'.
+        Default is None, for no connectivity constraint.
 
     Returns
     -------
@@ -617,8 +652,17 @@ def linkage(y, method='single', metric='euclidean'):
     if not isinstance(method, str):
         raise TypeError("Argument 'method' must be a string.")
 
+    if isinstance(y, distance.CondensedDistanceMatrix):
+        y = y.y
     y = _convert_to_double(np.asarray(y, order='c'))
 
+    if len(y.shape) == 2 and y.shape[0] == 0:
+        raise ValueError('The number of observations cannot be determined on '
+                         'an empty observation matrix.')
+
+    if connectivity is not None:
+        return _linkage_connectivity(y, method, metric, connectivity)
+
     s = y.shape
     if len(s) == 1:
         distance.is_valid_y(y, throw=True, name='y')
@@ -630,28 +674,96 @@ def linkage(y, method='single', metric='euclidean'):
         # Since the C code does not support striding using strides.
         [y] = _copy_arrays_if_base_present([y])
 
-        Z = np.zeros((d - 1, 4))
-        _hierarchy_wrap.linkage_wrap(y, Z, int(d),
-                                   int(_cpy_non_euclid_methods[method]))
+        Z = _linkage_reducible(y, int(d), method)
     elif len(s) == 2:
         X = y
         n = s[0]
         m = s[1]
         if method not in _cpy_linkage_methods:
             raise ValueError('Invalid method: %s' % method)
-        if method in _cpy_non_euclid_methods:
+        if method == 'single' and metric in _tree_metrics:
+            Z = _linkage_single_tree(X, metric)
+        elif method in _cpy_non_euclid_methods:
             dm = distance.pdist(X, metric)
-            Z = np.zeros((n - 1, 4))
-            _hierarchy_wrap.linkage_wrap(dm, Z, n,
-                                       int(_cpy_non_euclid_methods[method]))
+            Z = _linkage_reducible(dm, n, method)
         elif method in _cpy_euclid_methods:
             if metric != 'euclidean':
                 raise ValueError(('Method %s requires the distance metric to '
                                  'be euclidean') % s)
             dm = distance.pdist(X, metric)
-            Z = np.zeros((n - 1, 4))
-            _hierarchy_wrap.linkage_euclid_wrap(dm, Z, X, m, n,
-                                              int(_cpy_euclid_methods[method]))
+            if method == 'ward':
+                Z = _linkage_reducible(dm, n, method)
+            else:
+                Z = np.zeros((n - 1, 4))
+                _hierarchy_wrap.linkage_euclid_wrap(dm, Z, X, m, n,
+                                            int(_cpy_euclid_methods[method]))
+    return Z
+
+
+def _linkage_reducible(dm, n, method):
+    # Linkage matrix of a method satisfying the reducibility property from
+    # the condensed distance matrix dm, in O(n^2) time: by the minimum
+    # spanning tree for single linkage, by the nearest-neighbor chain for
+    # the other methods.
+    Z = np.zeros((n - 1, 4))
+    if n < 2:
+        return Z
+    if method == 'single':
+        _hierarchy_wrap.linkage_mst_wrap(dm, Z, n)
+    else:
+        if method in _cpy_non_euclid_methods:
+            code = _cpy_non_euclid_methods[method]
+        else:
+            code = _cpy_euclid_methods[method]
+        _hierarchy_wrap.linkage_nn_chain_wrap(dm, Z, n, int(code))
+    return Z
+
+
+def _linkage_single_tree(X, metric):
+    # Single linkage of the observation vectors X from the minimum
+    # spanning tree found by a kd-tree, without a distance matrix.
+    n = X.shape[0]
+    Z = np.zeros((n - 1, 4))
+    if n < 2:
+        return Z
+    i, j, d = cKDTree(X).minimum_spanning_tree(p=_tree_metrics[metric])
+    _hierarchy_wrap.linkage_from_mst_wrap(i.astype('i'), j.astype('i'),
+                                          d, Z, n)
+    return Z
+
+
+def _linkage_connectivity(X, method, metric, connectivity):
+    # Linkage matrix of the observation vectors X in which only clusters
+    # adjacent in the connectivity graph are merged.
+    if len(X.shape) != 2:
+        raise ValueError('A connectivity graph requires the observation '
+                         'vectors.')
+    if method not in _cpy_linkage_methods:
+        raise ValueError('Invalid method: %s' % method)
+    if metric != 'euclidean':
+        raise ValueError('A connectivity graph requires the distance metric '
+                         'to be euclidean')
+    n, m = X.shape
+    connectivity = scipy.sparse.csr_matrix(connectivity)
+    if connectivity.shape != (n, n):
+        raise ValueError('The connectivity matrix must be %d by %d.' % (n, n))
+    # Only the nonzero pattern is used, made symmetric.
+    connectivity = scipy.sparse.csr_matrix(
+        (np.ones(connectivity.nnz), connectivity.indices,
+         connectivity.indptr), shape=(n, n))
+    connectivity = (connectivity + connectivity.T).tocsr()
+    [X] = _copy_arrays_if_base_present([X])
+
+    if n < 2:
+        return np.zeros((0, 4))
+    Z = np.zeros((n - 1, 4))
+    if method in _cpy_non_euclid_methods:
+        code = _cpy_non_euclid_methods[method]
+    else:
+        code = _cpy_euclid_methods[method]
+    _hierarchy_wrap.linkage_connectivity_wrap(
+        X, connectivity.indptr.astype('i'), connectivity.indices.astype('i'),
+        Z, int(m), int(n), int(code))
     return Z
 
 
@@ -790,35 +902,17 @@ class ClusterNode:
 
         """
 
-        # Do a preorder traversal, caching the result. To avoid having to do
-        # recursion, we'll store the previous index we've visited in a vector.
-        n = self.count
-
-        curNode = [None] * (2 * n)
-        lvisited = np.zeros((2 * n,), dtype=bool)
-        rvisited = np.zeros((2 * n,), dtype=bool)
-        curNode[0] = self
-        k = 0
+        # Do a preorder traversal. To avoid recursion, the nodes still to
+        # be visited are kept on a stack, the right child below the left.
+        stack = [self]
         preorder = []
-        while k >= 0:
-            nd = curNode[k]
-            ndid = nd.id
+        while stack:
+            nd = stack.pop()
             if nd.is_leaf():
                 preorder.append(func(nd))
-                k = k - 1
             else:
-                if not lvisited[ndid]:
-                    curNode[k + 1] = nd.left
-                    lvisited[ndid] = True
-                    k = k + 1
-                elif not rvisited[ndid]:
-                    curNode[k + 1] = nd.right
-                    rvisited[ndid] = True
-                    k = k + 1
-                # If we've visited the left and right of this non-leaf
-                # node already, go up in the tree.
-                else:
-                    k = k - 1
+                stack.append(nd.right)
+                stack.append(nd.left)
 
         return preorder
 
@@ -826,6 +920,83 @@ _cnode_bare = ClusterNode(0)
 _cnode_type = type(ClusterNode)
 
 
+class _LinkageTree(object):
+    """
+    The tree of a linkage matrix, kept as arrays.
+
+    ``children[i]`` holds the ids of the two clusters merged into cluster
+    ``n + i``; their distance and count are read from ``Z[i]``.
+
+    """
+
+    def __init__(self, Z):
+        self.Z = Z
+        self.n = Z.shape[0] + 1
+        self.children = Z[:, :2].astype(np.intp)
+
+    def node(self, id):
+        return _ClusterNodeView(self, id)
+
+
+class _ClusterNodeView(ClusterNode):
+    """
+    A ClusterNode backed by a `_LinkageTree`.
+
+    The children are made when they are first asked for, so only the
+    part of the tree that is walked is ever built.
+
+    """
+
+    def __init__(self, tree, id):
+        self._tree = tree
+        self.id = id
+        if id < tree.n:
+            self.dist = 0
+            self.count = 1
+        else:
+            self.dist = tree.Z[id - tree.n, 2]
+            self.count = int(tree.Z[id - tree.n, 3])
+
+    def __getattr__(self, name):
+        if name not in ('left', 'right'):
+            raise AttributeError(name)
+        tree = self._tree
+        if self.id < tree.n:
+            self.left = self.right = None
+        else:
+            fi, fj = tree.children[self.id - tree.n]
+            self.left = tree.node(int(fi))
+            self.right = tree.node(int(fj))
+        return self.__dict__[name]
+
+    def pre_order(self, func=(lambda x: x.id)):
+        # The stack holds the nodes already built and the ids of those
+        # that are not, which are walked in the arrays without building
+        # any inner node.
+        tree = self._tree
+        n, children = tree.n, tree.children
+        stack = [self]
+        preorder = []
+        while stack:
+            nd = stack.pop()
+            if isinstance(nd, ClusterNode):
+                if 'left' not in nd.__dict__:
+                    stack.append(nd.id)
+                elif nd.is_leaf():
+                    preorder.append(func(nd))
+                else:
+                    stack.append(nd.right)
+                    stack.append(nd.left)
+            elif nd < n:
+                preorder.append(func(tree.node(nd)))
+            else:
+                fi, fj = children[nd - n]
+                stack.append(int(fj))
+                stack.append(int(fi))
+
+        return preorder
+
+
 def to_tree(Z, rd=False):
     """
     Converts a hierarchical clustering encoded in the matrix ``Z`` (by
@@ -839,6 +1010,12 @@ def to_tree(Z, rd=False):
     the ClusterNode object is a leaf node, its count must be 1, and its
     distance is meaningless but set to 0.
 
+    The tree is kept as arrays derived from ``Z``, and a node's children
+    are only made when they are first accessed, so the root of a
+    hierarchy of millions of observations costs little more than ``Z``
+    itself.  ``pre_order`` on these nodes walks the arrays without
+    building the inner nodes.
+
     Note: This function is provided for the convenience of the library
     user. ClusterNodes are not used as input to any of the functions in this
     library.
@@ -856,7 +1033,8 @@ def to_tree(Z, rd=False):
         mapping cluster ids to ClusterNode references. If a cluster id is
         less than n, then it corresponds to a singleton cluster
         (leaf node). See ``linkage`` for more information on the
-        assignment of cluster ids to clusters.
+        assignment of cluster ids to clusters.  ``d`` holds every node,
+        so all ``2n-1`` of them are built up front.
 
     Returns
     -------
@@ -873,37 +1051,29 @@ def to_tree(Z, rd=False):
     # 1.
     n = Z.shape[0] + 1
 
-    # Create a list full of None's to store the node objects
-    d = [None] * (n * 2 - 1)
+    tree = _LinkageTree(Z)
+    children = tree.children
 
-    # Create the nodes corresponding to the n original objects.
-    for i in xrange(0, n):
-        d[i] = ClusterNode(i)
-
-    nd = None
-
-    for i in xrange(0, n - 1):
-        fi = int(Z[i, 0])
-        fj = int(Z[i, 1])
-        if fi > i + n:
-            raise ValueError(('Corrupt matrix Z. Index to derivative cluster '
-                              'is used before it is formed. See row %d, '
-                              'column 0') % fi)
-        if fj > i + n:
-            raise ValueError(('Corrupt matrix Z. Index to derivative cluster '
-                              'is used before it is formed. See row %d, '
-                              'column 1') % fj)
-        nd = ClusterNode(i + n, d[fi], d[fj], Z[i, 2])
-        #          ^ id   ^ left ^ right ^ dist
-        if Z[i, 3] != nd.count:
-            raise ValueError(('Corrupt matrix Z. The count Z[%d,3] is '
-                              'incorrect.') % i)
-        d[n + i] = nd
+    # Each count must be the sum of the counts of the two clusters merged.
+    # Since those are checked the same way, all counts are then right.
+    counts = np.concatenate((np.ones(n), Z[:, 3]))
+    bad = np.nonzero(Z[:, 3] != counts[children].sum(axis=1))[0]
+    if len(bad):
+        raise ValueError(('Corrupt matrix Z. The count Z[%d,3] is '
+                          'incorrect.') % bad[0])
 
     if rd:
-        return (nd, d)
+        # Build every node and link it to its children in d.
+        d = [tree.node(i) for i in xrange(0, 2 * n - 1)]
+        for i in xrange(0, n):
+            d[i].left = d[i].right = None
+        for i in xrange(0, n - 1):
+            fi, fj = children[i]
+            d[n + i].left = d[fi]
+            d[n + i].right = d[fj]
+        return (d[-1], d)
     else:
-        return nd
+        return tree.node(2 * n - 2)
 
 
 def _convert_to_bool(X):
@@ -1355,31 +1525,21 @@ def is_valid_linkage(Z, warning=False, throw=False, name=None):
 
 def _check_hierarchy_uses_cluster_before_formed(Z):
     n = Z.shape[0] + 1
-    for i in xrange(0, n - 1):
-        if Z[i, 0] >= n + i or Z[i, 1] >= n + i:
-            return True
-    return False
+    formed = n + np.arange(n - 1)
+    return bool(np.any((Z[:, 0] >= formed) | (Z[:, 1] >= formed)))
 
 
 def _check_hierarchy_uses_cluster_more_than_once(Z):
-    n = Z.shape[0] + 1
-    chosen = set([])
-    for i in xrange(0, n - 1):
-        if (Z[i, 0] in chosen) or (Z[i, 1] in chosen) or Z[i, 0] == Z[i, 1]:
-            return True
-        chosen.add(Z[i, 0])
-        chosen.add(Z[i, 1])
-    return False
+    if np.any(Z[:, 0] == Z[:, 1]):
+        return True
+    chosen = Z[:, :2].ravel()
+    return len(np.unique(chosen)) != len(chosen)
 
 
 def _check_hierarchy_not_all_clusters_used(Z):
     n = Z.shape[0] + 1
-    chosen = set([])
-    for i in xrange(0, n - 1):
-        chosen.add(int(Z[i, 0]))
-        chosen.add(int(Z[i, 1]))
-    must_chosen = set(range(0, 2 * n - 2))
-    return len(must_chosen.difference(chosen)) > 0
+    chosen = np.unique(Z[:, :2].astype(int))
+    return len(np.setdiff1d(np.arange(2 * n - 2), chosen)) > 0
 
 
 def num_obs_linkage(Z):
@@ -1598,6 +1758,12 @@ def fclusterdata(X, t, criterion='inconsistent',
     -----
     This function is similar to the MATLAB function clusterdata.
 
+    With the single linkage method and the 'euclidean', 'cityblock'
+    or 'chebyshev' metric, no distance matrix is formed, as described
+    in `linkage`, so that large data sets can be clustered; for
+    instance ``criterion='distance'`` then gives the connected
+    components of the graph joining the observations closer than `t`.
+
     """
     X = np.asarray(X, order='c', dtype=np.double)
 
@@ -1605,8 +1771,11 @@ def fclusterdata(X, t, criterion='inconsistent',
         raise TypeError('The observation matrix X must be an n by m numpy '
                         'array.')
 
-    Y = distance.pdist(X, metric=metric)
-    Z = linkage(Y, method=method)
+    if method == 'single' and metric in _tree_metrics:
+        Z = linkage(X, method=method, metric=metric)
+    else:
+        Y = distance.pdist(X, metric=metric)
+        Z = linkage(Y, method=method)
     if R is None:
         R = inconsistent(Z, d=depth)
     else:
@@ -2121,7 +2290,7 @@ def dendrogram(Z, p=30, truncate_mode=None, color_threshold=None,
     if color_threshold is None or \
        (isinstance(color_threshold, string_types) and
                            color_threshold == 'default'):
-        color_threshold = max(Z[:, 2]) * 0.7
+        color_threshold = Z[:, 2].max() * 0.7
     R = {'icoord': icoord_list, 'dcoord': dcoord_list, 'ivl': ivl,
          'leaves': lvs, 'color_list': color_list}
     if show_contracted:
@@ -2148,7 +2317,7 @@ def dendrogram(Z, p=30, truncate_mode=None, color_threshold=None,
         contraction_marks=contraction_marks,
         link_color_func=link_color_func)
     if not no_plot:
-        mh = max(Z[:, 2])
+        mh = Z[:, 2].max()
         _plot_dendrogram(icoord_list, dcoord_list, ivl, p, n, mh, orientation,
                          no_labels, color_list, leaf_font_size=leaf_font_size,
                          leaf_rotation=leaf_rotation,
@@ -2207,67 +2376,22 @@ def _append_contraction_marks(Z, iv, i, n, contraction_marks):
 
 
 def _append_contraction_marks_sub(Z, iv, i, n, contraction_marks):
-    if i >= n:
-        contraction_marks.append((iv, Z[i - n, 2]))
-        _append_contraction_marks_sub(Z, iv, Z[i - n, 0], n, contraction_marks)
-        _append_contraction_marks_sub(Z, iv, Z[i - n, 1], n, contraction_marks)
-
-
-def _dendrogram_calculate_info(Z, p, truncate_mode,
-                               color_threshold=np.inf, get_leaves=True,
-                               orientation='top', labels=None,
-                               count_sort=False, distance_sort=False,
-                               show_leaf_counts=False, i=-1, iv=0.0,
-                               ivl=[], n=0, icoord_list=[], dcoord_list=[],
-                               lvs=None, mhr=False,
-                               current_color=[], color_list=[],
-                               currently_below_threshold=[],
-                               leaf_label_func=None, level=0,
-                               contraction_marks=None,
-                               link_color_func=None):
-    """
-    Calculates the endpoints of the links as well as the labels for the
-    the dendrogram rooted at the node with index i. iv is the independent
-    variable value to plot the left-most leaf node below the root node i
-    (if orientation='top', this would be the left-most x value where the
-    plotting of this root node i and its descendents should begin).
-
-    ivl is a list to store the labels of the leaf nodes. The leaf_label_func
-    is called whenever ivl != None, labels == None, and
-    leaf_label_func != None. When ivl != None and labels != None, the
-    labels list is used only for labeling the the leaf nodes. When
-    ivl == None, no labels are generated for leaf nodes.
-
-    When get_leaves==True, a list of leaves is built as they are visited
-    in the dendrogram.
-
-    Returns a tuple with l being the independent variable coordinate that
-    corresponds to the midpoint of cluster to the left of cluster i if
-    i is non-singleton, otherwise the independent coordinate of the leaf
-    node if i is a leaf node.
-
-    Returns
-    -------
-    A tuple (left, w, h, md), where:
-
-      * left is the independent variable coordinate of the center of the
-        the U of the subtree
-
-      * w is the amount of space used for the subtree (in independent
-        variable units)
-
-      * h is the height of the subtree in dependent variable units
-
-      * md is the max(Z[*,2]) for all nodes * below and including
-        the target node.
-
-    """
-    if n == 0:
-        raise ValueError("Invalid singleton cluster count n.")
-
-    if i == -1:
-        raise ValueError("Invalid root cluster index i.")
-
+    # Marks the non-singleton clusters below and including i in pre-order.
+    stack = [int(i)]
+    while stack:
+        i = stack.pop()
+        if i >= n:
+            contraction_marks.append((iv, Z[i - n, 2]))
+            stack.append(int(Z[i - n, 1]))
+            stack.append(int(Z[i - n, 0]))
+
+
+def _dendrogram_leaf_info(Z, p, n, truncate_mode, i, iv, level, lvs, ivl,
+                          leaf_label_func, labels, show_leaf_counts,
+                          contraction_marks):
+    # If node i is drawn as a leaf of the dendrogram, records it and
+    # returns the tuple returned by _dendrogram_calculate_info for it.
+    # Otherwise returns None.
     if truncate_mode == 'lastp':
         # If the node is a leaf node but corresponds to a non-single cluster,
         # it's label is either the empty string or the number of original
@@ -2310,9 +2434,13 @@ def _dendrogram_calculate_info(Z, p, truncate_mode,
         _append_singleton_leaf_node(Z, p, n, level, lvs, ivl,
                                     leaf_label_func, i, labels)
         return (iv + 5.0, 10.0, 0.0, 0.0)
+    return None
+
+
+def _dendrogram_child_order(Z, n, i, count_sort, distance_sort):
+    # Returns the children (ua, ub) of the non-singleton cluster i in the
+    # order in which they are drawn.
 
-    # !!! Otherwise, we don't have a leaf node, so work on plotting a
-    # non-leaf node.
     # Actual indices of a and b
     aa = int(Z[i - n, 0])
     ab = int(Z[i - n, 1])
@@ -2374,74 +2502,127 @@ def _dendrogram_calculate_info(Z, p, truncate_mode,
     else:
         ua = aa
         ub = ab
+    return ua, ub
 
-    # Updated iv variable and the amount of space used.
-    (uiva, uwa, uah, uamd) = \
-        _dendrogram_calculate_info(
-            Z=Z, p=p,
-            truncate_mode=truncate_mode,
-            color_threshold=color_threshold,
-            get_leaves=get_leaves,
-            orientation=orientation,
-            labels=labels,
-            count_sort=count_sort,
-            distance_sort=distance_sort,
-            show_leaf_counts=show_leaf_counts,
-            i=ua, iv=iv, ivl=ivl, n=n,
-            icoord_list=icoord_list,
-            dcoord_list=dcoord_list, lvs=lvs,
-            current_color=current_color,
-            color_list=color_list,
-            currently_below_threshold=currently_below_threshold,
-            leaf_label_func=leaf_label_func,
-            level=level + 1, contraction_marks=contraction_marks,
-            link_color_func=link_color_func)
-
-    h = Z[i - n, 2]
-    if h >= color_threshold or color_threshold <= 0:
-        c = 'b'
-
-        if currently_below_threshold[0]:
-            current_color[0] = (current_color[0] + 1) % len(_link_line_colors)
-        currently_below_threshold[0] = False
-    else:
-        currently_below_threshold[0] = True
-        c = _link_line_colors[current_color[0]]
-
-    (uivb, uwb, ubh, ubmd) = \
-        _dendrogram_calculate_info(
-            Z=Z, p=p,
-            truncate_mode=truncate_mode,
-            color_threshold=color_threshold,
-            get_leaves=get_leaves,
-            orientation=orientation,
-            labels=labels,
-            count_sort=count_sort,
-            distance_sort=distance_sort,
-            show_leaf_counts=show_leaf_counts,
-            i=ub, iv=iv + uwa, ivl=ivl, n=n,
-            icoord_list=icoord_list,
-            dcoord_list=dcoord_list, lvs=lvs,
-            current_color=current_color,
-            color_list=color_list,
-            currently_below_threshold=currently_below_threshold,
-            leaf_label_func=leaf_label_func,
-            level=level + 1, contraction_marks=contraction_marks,
-            link_color_func=link_color_func)
-
-    max_dist = max(uamd, ubmd, h)
-
-    icoord_list.append([uiva, uiva, uivb, uivb])
-    dcoord_list.append([uah, h, h, ubh])
-    if link_color_func is not None:
-        v = link_color_func(int(i))
-        if not isinstance(v, string_types):
-            raise TypeError("link_color_func must return a matplotlib "
-                            "color string!")
-        color_list.append(v)
-    else:
-        color_list.append(c)
-    return (((uiva + uivb) / 2), uwa + uwb, h, max_dist)
+
+def _dendrogram_calculate_info(Z, p, truncate_mode,
+                               color_threshold=np.inf, get_leaves=True,
+                               orientation='top', labels=None,
+                               count_sort=False, distance_sort=False,
+                               show_leaf_counts=False, i=-1, iv=0.0,
+                               ivl=[], n=0, icoord_list=[], dcoord_list=[],
+                               lvs=None, mhr=False,
+                               current_color=[], color_list=[],
+                               currently_below_threshold=[],
+                               leaf_label_func=None, level=0,
+                               contraction_marks=None,
+                               link_color_func=None):
+    """
+    Calculates the endpoints of the links as well as the labels for the
+    the dendrogram rooted at the node with index i. iv is the independent
+    variable value to plot the left-most leaf node below the root node i
+    (if orientation='top', this would be the left-most x value where the
+    plotting of this root node i and its descendents should begin).
+
+    ivl is a list to store the labels of the leaf nodes. The leaf_label_func
+    is called whenever ivl != None, labels == None, and
+    leaf_label_func != None. When ivl != None and labels != None, the
+    labels list is used only for labeling the the leaf nodes. When
+    ivl == None, no labels are generated for leaf nodes.
+
+    When get_leaves==True, a list of leaves is built as they are visited
+    in the dendrogram.
+
+    Returns a tuple with l being the independent variable coordinate that
+    corresponds to the midpoint of cluster to the left of cluster i if
+    i is non-singleton, otherwise the independent coordinate of the leaf
+    node if i is a leaf node.
+
+    Returns
+    -------
+    A tuple (left, w, h, md), where:
+
+      * left is the independent variable coordinate of the center of the
+        the U of the subtree
+
+      * w is the amount of space used for the subtree (in independent
+        variable units)
+
+      * h is the height of the subtree in dependent variable units
+
+      * md is the max(Z[*,2]) for all nodes * below and including
+        the target node.
+
+    """
+    if n == 0:
+        raise ValueError("Invalid singleton cluster count n.")
+
+    if i == -1:
+        raise ValueError("Invalid root cluster index i.")
+
+    # The tree is walked with an explicit stack instead of recursion, so
+    # that deep hierarchies do not exceed the recursion limit.  A frame
+    # holds [i, iv, level, ua, ub, result of ua, link color]; ua is None
+    # until the frame is first visited, and the result of ua is None
+    # until the subtree of ua has been laid out.  result is the tuple
+    # returned for the subtree laid out last.
+    stack = [[i, iv, level, None, None, None, None]]
+    result = None
+    while stack:
+        frame = stack[-1]
+        i, iv, level, ua, ub, ares, c = frame
+        if ua is None:
+            result = _dendrogram_leaf_info(
+                Z, p, n, truncate_mode, i, iv, level, lvs, ivl,
+                leaf_label_func, labels, show_leaf_counts,
+                contraction_marks)
+            if result is not None:
+                stack.pop()
+                continue
+            ua, ub = _dendrogram_child_order(Z, n, i, count_sort,
+                                             distance_sort)
+            frame[3] = ua
+            frame[4] = ub
+            stack.append([ua, iv, level + 1, None, None, None, None])
+            continue
+
+        h = Z[i - n, 2]
+        if ares is None:
+            # Updated iv variable and the amount of space used.
+            frame[5] = result
+            uwa = result[1]
+            if h >= color_threshold or color_threshold <= 0:
+                c = 'b'
+                if currently_below_threshold[0]:
+                    current_color[0] = ((current_color[0] + 1) %
+                                        len(_link_line_colors))
+                currently_below_threshold[0] = False
+            else:
+                currently_below_threshold[0] = True
+                c = _link_line_colors[current_color[0]]
+            frame[6] = c
+            stack.append([ub, iv + uwa, level + 1, None, None, None, None])
+            continue
+
+        stack.pop()
+        (uiva, uwa, uah, uamd) = ares
+        (uivb, uwb, ubh, ubmd) = result
+
+        max_dist = max(uamd, ubmd, h)
+
+        icoord_list.append([uiva, uiva, uivb, uivb])
+        dcoord_list.append([uah, h, h, ubh])
+        if link_color_func is not None:
+            v = link_color_func(int(i))
+            if not isinstance(v, string_types):
+                raise TypeError("link_color_func must return a matplotlib "
+                                "color string!")
+            color_list.append(v)
+        else:
+            color_list.append(c)
+        result = (((uiva + uivb) / 2), uwa + uwb, h, max_dist)
+
+    return result
 
 
 def is_isomorphic(T1, T2):
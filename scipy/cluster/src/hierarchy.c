@@ -634,6 +634,626 @@ finished:
   return result;
 }
 
+/** Index of the distance between observations i and j, i < j, in a
+    condensed distance matrix of n observations. */
+#define CPY_CONDENSED_INDEX(_n, _i, _j) \
+  ((npy_intp)(_n) * (_i) - (npy_intp)(_i) * ((_i) + 1) / 2 + (_j) - (_i) - 1)
+
+/** A merge found by linkage_nn_chain or linkage_mst.  Both find the
+    merges out of distance order, as pairs of observations that each
+    belong to one of the two clusters merged. */
+typedef struct cmerge {
+  double d;
+  int a;
+  int b;
+  int k;
+} cmerge;
+
+static int cmerge_compare(const void *p, const void *q) {
+  const cmerge *x = (const cmerge*)p, *y = (const cmerge*)q;
+  /** Ties keep the order in which the merges were found. */
+  if (x->d < y->d) return -1;
+  if (x->d > y->d) return 1;
+  return (x->k > y->k) - (x->k < y->k);
+}
+
+static int uf_find(int *parent, int x) {
+  int root = x, next;
+  while (parent[root] != root) {
+    root = parent[root];
+  }
+  while (parent[x] != root) {
+    next = parent[x];
+    parent[x] = root;
+    x = next;
+  }
+  return root;
+}
+
+/**
+ * Sorts the n-1 merges by distance and writes them to the linkage
+ * matrix Z, numbering the clusters as linkage() does: the cluster formed
+ * by the k'th merge has the id n+k, and the smaller id of the two
+ * clusters merged comes first.
+ *
+ * Return values:
+ * 0:  success
+ * -1: out of memory--malloc() failed.
+ */
+static int merges_to_linkage(cmerge *merges, double *Z, int n) {
+  int *parent = NULL, *size = NULL;
+  int k, a, b, nid;
+  double *Zrow;
+
+  parent = (int*)malloc(sizeof(int) * (2 * n - 1));
+  size = (int*)malloc(sizeof(int) * (2 * n - 1));
+  if (!parent || !size) {
+    free(parent);
+    free(size);
+    return -1;
+  }
+  for (k = 0; k < 2 * n - 1; k++) {
+    parent[k] = k;
+    size[k] = 1;
+  }
+  qsort(merges, n - 1, sizeof(cmerge), cmerge_compare);
+  for (k = 0, nid = n; k < n - 1; k++, nid++) {
+    a = uf_find(parent, merges[k].a);
+    b = uf_find(parent, merges[k].b);
+    parent[a] = nid;
+    parent[b] = nid;
+    size[nid] = size[a] + size[b];
+    Zrow = Z + (k * CPY_LIS);
+    Zrow[CPY_LIN_LEFT] = CPY_MIN(a, b);
+    Zrow[CPY_LIN_RIGHT] = CPY_MAX(a, b);
+    Zrow[CPY_LIN_DIST] = merges[k].d;
+    Zrow[CPY_LIN_CNT] = size[nid];
+  }
+  free(parent);
+  free(size);
+  return 0;
+}
+
+/**
+ * Single linkage of n observations from their condensed distance
+ * matrix dm, by Prim's algorithm for the minimum spanning tree.  The
+ * single linkage dendrogram consists of the tree edges in order of
+ * length.  This takes O(n^2) time and O(n) memory besides dm, which is
+ * not modified.
+ *
+ * Return values:
+ * 0:  success
+ * -1: out of memory--malloc() failed.
+ */
+int linkage_mst(const double *dm, double *Z, int n) {
+  int i, k, x, y;
+  double d, best;
+  double *dist = NULL;
+  int *nearest = NULL;
+  char *intree = NULL;
+  cmerge *merges = NULL;
+  int result = -1;
+
+  dist = (double*)malloc(sizeof(double) * n);
+  if (!dist) goto finished;
+  nearest = (int*)malloc(sizeof(int) * n);
+  if (!nearest) goto finished;
+  intree = (char*)calloc(n, sizeof(char));
+  if (!intree) goto finished;
+  merges = (cmerge*)malloc(sizeof(cmerge) * (n - 1));
+  if (!merges) goto finished;
+
+  for (i = 0; i < n; i++) {
+    dist[i] = HUGE_VAL;
+    nearest[i] = 0;
+  }
+  /** dist[i] is the distance of observation i to the tree, which is
+      reached at observation nearest[i]. */
+  x = 0;
+  for (k = 0; k < n - 1; k++) {
+    intree[x] = 1;
+    best = HUGE_VAL;
+    y = -1;
+    for (i = 0; i < n; i++) {
+      if (intree[i]) {
+        continue;
+      }
+      d = (i < x) ? dm[CPY_CONDENSED_INDEX(n, i, x)]
+                  : dm[CPY_CONDENSED_INDEX(n, x, i)];
+      if (d < dist[i]) {
+        dist[i] = d;
+        nearest[i] = x;
+      }
+      if (y == -1 || dist[i] < best) {
+        best = dist[i];
+        y = i;
+      }
+    }
+    merges[k].d = best;
+    merges[k].a = nearest[y];
+    merges[k].b = y;
+    merges[k].k = k;
+    x = y;
+  }
+  result = merges_to_linkage(merges, Z, n);
+
+finished:
+  free(dist);
+  free(nearest);
+  free(intree);
+  free(merges);
+  return result;
+}
+
+/**
+ * Single linkage of n observations from the n-1 edges of a minimum
+ * spanning tree of the observations, which joins observations a[k] and
+ * b[k] at distance d[k].  The edges may be given in any order.
+ *
+ * Return values:
+ * 0:  success
+ * -1: out of memory--malloc() failed.
+ */
+int linkage_from_mst(const int *a, const int *b, const double *d,
+                     double *Z, int n) {
+  int k, result;
+  cmerge *merges;
+
+  merges = (cmerge*)malloc(sizeof(cmerge) * (n - 1));
+  if (!merges) {
+    return -1;
+  }
+  for (k = 0; k < n - 1; k++) {
+    merges[k].d = d[k];
+    merges[k].a = a[k];
+    merges[k].b = b[k];
+    merges[k].k = k;
+  }
+  result = merges_to_linkage(merges, Z, n);
+  free(merges);
+  return result;
+}
+
+/**
+ * The distance between cluster x and the union of clusters r and s, by
+ * the Lance-Williams update of the method.  The formulas are those of
+ * the dist_* functions used by linkage().
+ */
+static NPY_INLINE double lance_williams(int method, double drx, double dsx,
+                                        double drs, double rn, double sn,
+                                        double xn) {
+  double t;
+  switch (method) {
+  case CPY_LINKAGE_COMPLETE:
+    return CPY_MAX(drx, dsx);
+  case CPY_LINKAGE_AVERAGE:
+    return ((double)1.0 / (xn * (rn + sn))) * ((drx * (rn * xn)) +
+                                               (dsx * (sn * xn)));
+  case CPY_LINKAGE_WEIGHTED:
+    return (drx + dsx) / 2;
+  case CPY_LINKAGE_WARD:
+    t = rn + sn + xn;
+    return sqrt(((rn + xn) / t) * (drx * drx) +
+                ((sn + xn) / t) * (dsx * dsx) +
+                (-xn / t) * (drs * drs));
+  case CPY_LINKAGE_SINGLE:
+  default:
+    return CPY_MIN(drx, dsx);
+  }
+}
+
+/**
+ * Hierarchical clustering of n observations from their condensed
+ * distance matrix dm by the nearest-neighbor chain algorithm.  It
+ * follows a chain of nearest neighbors until two clusters are each
+ * other's nearest neighbors, and merges them.  This gives the same
+ * dendrogram as linkage() for the methods satisfying the reducibility
+ * property: single, complete, average, weighted and ward, but not
+ * centroid and median.  It takes O(n^2) time and a copy of dm.
+ *
+ * Return values:
+ * 0:  success
+ * -1: out of memory--malloc() failed.
+ */
+int linkage_nn_chain(const double *dm, double *Z, int n, int method) {
+  int i, k, x, y, len;
+  double d, best;
+  double *D = NULL;
+  int *chain = NULL, *size = NULL;
+  char *active = NULL;
+  cmerge *merges = NULL;
+  npy_intp ix, iy;
+  int result = -1;
+
+  D = (double*)malloc(sizeof(double) * NCHOOSE2((npy_intp)n));
+  if (!D) goto finished;
+  chain = (int*)malloc(sizeof(int) * n);
+  if (!chain) goto finished;
+  size = (int*)malloc(sizeof(int) * n);
+  if (!size) goto finished;
+  active = (char*)malloc(sizeof(char) * n);
+  if (!active) goto finished;
+  merges = (cmerge*)malloc(sizeof(cmerge) * (n - 1));
+  if (!merges) goto finished;
+  memcpy(D, dm, sizeof(double) * NCHOOSE2((npy_intp)n));
+
+  for (i = 0; i < n; i++) {
+    size[i] = 1;
+    active[i] = 1;
+  }
+
+  /** Each cluster is kept in the row of one of its observations;
+      the rows of the other observations are inactive. */
+  len = 0;
+  for (k = 0; k < n - 1; k++) {
+    if (len == 0) {
+      for (i = 0; !active[i]; i++);
+      chain[len++] = i;
+    }
+
+    /** Grow the chain until its last two clusters are each other's
+        nearest neighbors.  Ties are resolved in favor of the previous
+        cluster of the chain, which guarantees termination. */
+    for (;;) {
+      x = chain[len - 1];
+      if (len > 1) {
+        y = chain[len - 2];
+        best = (x < y) ? D[CPY_CONDENSED_INDEX(n, x, y)]
+                       : D[CPY_CONDENSED_INDEX(n, y, x)];
+      }
+      else {
+        y = -1;
+        best = HUGE_VAL;
+      }
+      for (i = 0; i < n; i++) {
+        if (!active[i] || i == x) {
+          continue;
+        }
+        d = (i < x) ? D[CPY_CONDENSED_INDEX(n, i, x)]
+                    : D[CPY_CONDENSED_INDEX(n, x, i)];
+        if (d < best || y == -1) {
+          best = d;
+          y = i;
+        }
+      }
+      if (len > 1 && y == chain[len - 2]) {
+        break;
+      }
+      chain[len++] = y;
+    }
+
+    len -= 2;
+    if (x > y) {
+      i = x; x = y; y = i;
+    }
+    merges[k].d = best;
+    merges[k].a = x;
+    merges[k].b = y;
+    merges[k].k = k;
+
+    /** The merged cluster takes the row of y. */
+    for (i = 0; i < n; i++) {
+      if (!active[i] || i == x || i == y) {
+        continue;
+      }
+      ix = (i < x) ? CPY_CONDENSED_INDEX(n, i, x)
+                   : CPY_CONDENSED_INDEX(n, x, i);
+      iy = (i < y) ? CPY_CONDENSED_INDEX(n, i, y)
+                   : CPY_CONDENSED_INDEX(n, y, i);
+      D[iy] = lance_williams(method, D[ix], D[iy], best,
+                             (double)size[x], (double)size[y],
+                             (double)size[i]);
+    }
+    size[y] += size[x];
+    active[x] = 0;
+  }
+  result = merges_to_linkage(merges, Z, n);
+
+finished:
+  free(D);
+  free(chain);
+  free(size);
+  free(active);
+  free(merges);
+  return result;
+}
+
+/** A cluster adjacent to another in the connectivity graph, with the
+    sum of the distances of the graph edges between the two clusters
+    and their number (for average linkage), or the linkage distance
+    (for the other methods). */
+typedef struct cneighbor {
+  int id;
+  int cnt;
+  double d;
+} cneighbor;
+
+typedef struct cneighbors {
+  cneighbor *items;
+  int len;
+  int space;
+} cneighbors;
+
+/** A candidate merge of adjacent clusters a and b at distance d. */
+typedef struct cpair {
+  double d;
+  int a;
+  int b;
+} cpair;
+
+typedef struct cpair_heap {
+  cpair *items;
+  npy_intp len;
+  npy_intp space;
+} cpair_heap;
+
+static int neighbors_append(cneighbors *nb, int id, int cnt, double d) {
+  cneighbor *tmp;
+  int space;
+  if (nb->len == nb->space) {
+    space = 2 * nb->space + 4;
+    tmp = (cneighbor*)realloc(nb->items, sizeof(cneighbor) * space);
+    if (!tmp) {
+      return -1;
+    }
+    nb->items = tmp;
+    nb->space = space;
+  }
+  nb->items[nb->len].id = id;
+  nb->items[nb->len].cnt = cnt;
+  nb->items[nb->len].d = d;
+  nb->len++;
+  return 0;
+}
+
+static int pair_heap_push(cpair_heap *heap, double d, int a, int b) {
+  cpair *tmp, t;
+  npy_intp i, space;
+  if (heap->len == heap->space) {
+    space = 2 * heap->space + 16;
+    tmp = (cpair*)realloc(heap->items, sizeof(cpair) * space);
+    if (!tmp) {
+      return -1;
+    }
+    heap->items = tmp;
+    heap->space = space;
+  }
+  i = heap->len++;
+  heap->items[i].d = d;
+  heap->items[i].a = a;
+  heap->items[i].b = b;
+  while (i > 0 && heap->items[(i - 1) / 2].d > heap->items[i].d) {
+    t = heap->items[i];
+    heap->items[i] = heap->items[(i - 1) / 2];
+    heap->items[(i - 1) / 2] = t;
+    i = (i - 1) / 2;
+  }
+  return 0;
+}
+
+static cpair pair_heap_pop(cpair_heap *heap) {
+  cpair top = heap->items[0], t;
+  npy_intp i = 0, j;
+  heap->items[0] = heap->items[--heap->len];
+  for (;;) {
+    j = 2 * i + 1;
+    if (j >= heap->len) {
+      break;
+    }
+    if (j + 1 < heap->len && heap->items[j + 1].d < heap->items[j].d) {
+      j++;
+    }
+    if (heap->items[i].d <= heap->items[j].d) {
+      break;
+    }
+    t = heap->items[i];
+    heap->items[i] = heap->items[j];
+    heap->items[j] = t;
+    i = j;
+  }
+  return top;
+}
+
+/** Removes the entries of clusters a and b from a neighbor list. */
+static void neighbors_remove(cneighbors *nb, int a, int b) {
+  int i = 0;
+  while (i < nb->len) {
+    if (nb->items[i].id == a || nb->items[i].id == b) {
+      nb->items[i] = nb->items[--nb->len];
+    }
+    else {
+      i++;
+    }
+  }
+}
+
+/** The distance between adjacent clusters u and x from their centroids,
+    for the methods which are defined by centroids. */
+static double centroid_linkage(int method, const double *cu,
+                               const double *cx, double un, double xn,
+                               int m) {
+  double d = euclidean_distance(cu, cx, m);
+  if (method == CPY_LINKAGE_WARD) {
+    d *= sqrt(2 * un * xn / (un + xn));
+  }
+  return d;
+}
+
+/**
+ * Hierarchical clustering of the n observations X of dimension m in
+ * which only clusters joined by an edge of the connectivity graph may
+ * merge.  The graph is given by its symmetric adjacency matrix in CSR
+ * format (indptr, indices), and the distance between adjacent
+ * observations is Euclidean.  The candidate merges are kept in a heap,
+ * so that the time taken grows with the number of edges instead of
+ * n^2.
+ *
+ * Single and complete linkage take the smallest and largest distance
+ * of the graph edges between two clusters, and average linkage their
+ * mean; weighted linkage averages the distances of the two merged
+ * clusters that are adjacent to a third.  Centroid, median and ward
+ * linkage are computed from the cluster centroids as linkage() does.
+ *
+ * Return values:
+ * 0:  success
+ * -1: out of memory--malloc() failed.
+ * -2: the connectivity graph is not connected.
+ */
+int linkage_connectivity(const double *X, const int *indptr,
+                         const int *indices, double *Z, int n, int m,
+                         int method) {
+  int i, j, k, u, a, b, x, nid = 2 * n - 1;
+  double d, un;
+  int *size = NULL, *pos = NULL;
+  char *active = NULL;
+  double *centroids = NULL, *cu = NULL;
+  cneighbors *nbrs = NULL, *nu;
+  cneighbor *it;
+  cpair_heap heap = {NULL, 0, 0};
+  cpair top;
+  double *Zrow;
+  int centroid_method = (method == CPY_LINKAGE_CENTROID ||
+                         method == CPY_LINKAGE_MEDIAN ||
+                         method == CPY_LINKAGE_WARD);
+  int result = -1;
+
+  size = (int*)malloc(sizeof(int) * nid);
+  if (!size) goto finished;
+  pos = (int*)malloc(sizeof(int) * nid);
+  if (!pos) goto finished;
+  active = (char*)calloc(nid, sizeof(char));
+  if (!active) goto finished;
+  nbrs = (cneighbors*)calloc(nid, sizeof(cneighbors));
+  if (!nbrs) goto finished;
+  if (centroid_method) {
+    centroids = (double*)malloc(sizeof(double) * nid * m);
+    if (!centroids) goto finished;
+    memcpy(centroids, X, sizeof(double) * n * m);
+  }
+
+  for (i = 0; i < nid; i++) {
+    pos[i] = -1;
+  }
+  for (i = 0; i < n; i++) {
+    size[i] = 1;
+    active[i] = 1;
+    for (k = indptr[i]; k < indptr[i + 1]; k++) {
+      j = indices[k];
+      if (j == i) {
+        continue;
+      }
+      d = euclidean_distance(X + i * m, X + j * m, m);
+      if (neighbors_append(nbrs + i, j, 1, d) < 0) goto finished;
+      if (i < j && pair_heap_push(&heap, d, i, j) < 0) goto finished;
+    }
+  }
+
+  for (k = 0, u = n; k < n - 1; k++, u++) {
+    /** The distance between two clusters does not change while both
+        remain, so a candidate is valid if neither has merged since. */
+    do {
+      if (heap.len == 0) {
+        result = -2;
+        goto finished;
+      }
+      top = pair_heap_pop(&heap);
+    } while (!active[top.a] || !active[top.b]);
+    a = top.a;
+    b = top.b;
+    active[a] = 0;
+    active[b] = 0;
+    active[u] = 1;
+    size[u] = size[a] + size[b];
+    un = (double)size[u];
+
+    Zrow = Z + (k * CPY_LIS);
+    Zrow[CPY_LIN_LEFT] = CPY_MIN(a, b);
+    Zrow[CPY_LIN_RIGHT] = CPY_MAX(a, b);
+    Zrow[CPY_LIN_DIST] = top.d;
+    Zrow[CPY_LIN_CNT] = size[u];
+
+    if (centroid_method) {
+      cu = centroids + (npy_intp)u * m;
+      for (i = 0; i < m; i++) {
+        if (method == CPY_LINKAGE_MEDIAN) {
+          cu[i] = (centroids[(npy_intp)a * m + i] +
+                   centroids[(npy_intp)b * m + i]) / 2;
+        }
+        else {
+          cu[i] = (centroids[(npy_intp)a * m + i] * size[a] +
+                   centroids[(npy_intp)b * m + i] * size[b]) / un;
+        }
+      }
+    }
+
+    /** Join the neighbor lists of a and b into that of u.  pos[x] is
+        the entry of neighbor x in the list of u. */
+    nu = nbrs + u;
+    for (i = 0; i < nbrs[a].len + nbrs[b].len; i++) {
+      it = (i < nbrs[a].len) ? nbrs[a].items + i
+                             : nbrs[b].items + (i - nbrs[a].len);
+      x = it->id;
+      if (x == a || x == b) {
+        continue;
+      }
+      if (pos[x] == -1) {
+        pos[x] = nu->len;
+        if (neighbors_append(nu, x, it->cnt, it->d) < 0) goto finished;
+        continue;
+      }
+      switch (method) {
+      case CPY_LINKAGE_SINGLE:
+        nu->items[pos[x]].d = CPY_MIN(nu->items[pos[x]].d, it->d);
+        break;
+      case CPY_LINKAGE_COMPLETE:
+        nu->items[pos[x]].d = CPY_MAX(nu->items[pos[x]].d, it->d);
+        break;
+      case CPY_LINKAGE_AVERAGE:
+        nu->items[pos[x]].d += it->d;
+        nu->items[pos[x]].cnt += it->cnt;
+        break;
+      case CPY_LINKAGE_WEIGHTED:
+        nu->items[pos[x]].d = (nu->items[pos[x]].d + it->d) / 2;
+        break;
+      }
+    }
+    for (i = 0; i < nu->len; i++) {
+      it = nu->items + i;
+      x = it->id;
+      pos[x] = -1;
+      if (centroid_method) {
+        it->d = centroid_linkage(method, cu,
+                                 centroids + (npy_intp)x * m, un,
+                                 (double)size[x], m);
+      }
+      /** Average linkage keeps the sum of the edge distances in the
+          lists, and their mean in the heap. */
+      d = (method == CPY_LINKAGE_AVERAGE) ? it->d / it->cnt : it->d;
+      neighbors_remove(nbrs + x, a, b);
+      if (neighbors_append(nbrs + x, u, it->cnt, it->d) < 0) goto finished;
+      if (pair_heap_push(&heap, d, u, x) < 0) goto finished;
+    }
+    free(nbrs[a].items);
+    free(nbrs[b].items);
+    nbrs[a].items = nbrs[b].items = NULL;
+  }
+  result = 0;
+
+finished:
+  if (nbrs) {
+    for (i = 0; i < nid; i++) {
+      free(nbrs[i].items);
+    }
+  }
+  free(nbrs);
+  free(size);
+  free(pos);
+  free(active);
+  free(centroids);
+  free(heap.items);
+  return result;
+}
+
 /** Trying to reimplement so that output is consistent with MATLAB's in
     cases where there are is than one correct choice to make at each
     iteration of the algorithm. This implementation is not active.
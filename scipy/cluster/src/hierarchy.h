@@ -103,6 +103,13 @@ void dist_weighted(cinfo *info, int mini, int minj, int np, int n);
 int leaders(const double *Z, const int *T, int *L, int *M, int kk, int n);
 
 int linkage(double *dm, double *Z, double *X, int m, int n, int ml, int kc, distfunc dfunc, int method);
+int linkage_mst(const double *dm, double *Z, int n);
+int linkage_from_mst(const int *a, const int *b, const double *d,
+                     double *Z, int n);
+int linkage_nn_chain(const double *dm, double *Z, int n, int method);
+int linkage_connectivity(const double *X, const int *indptr,
+                         const int *indices, double *Z, int n, int m,
+                         int method);
 void linkage_alt(double *dm, double *Z, double *X, int m, int n, int ml, int kc, distfunc dfunc, int method);
 
 void cophenetic_distances(const double *Z, double *d, int n);
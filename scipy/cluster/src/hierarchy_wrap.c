@@ -79,6 +79,103 @@ extern PyObject *linkage_wrap(PyObject *self, PyObject *args) {
   return Py_BuildValue("d", 0.0);
 }
 
+extern PyObject *linkage_mst_wrap(PyObject *self, PyObject *args) {
+  int n, result;
+  PyArrayObject *dm, *Z;
+  if (!PyArg_ParseTuple(args, "O!O!i",
+			&PyArray_Type, &dm,
+			&PyArray_Type, &Z,
+			&n)) {
+    return NULL;
+  }
+  NPY_BEGIN_ALLOW_THREADS;
+  result = linkage_mst((const double*)dm->data, (double*)Z->data, n);
+  NPY_END_ALLOW_THREADS;
+  if (result == -1) {
+    PyErr_SetString(PyExc_MemoryError,
+                    "out of memory while computing linkage");
+    return NULL;
+  }
+  return Py_BuildValue("d", 0.0);
+}
+
+extern PyObject *linkage_from_mst_wrap(PyObject *self, PyObject *args) {
+  int n, result;
+  PyArrayObject *a, *b, *d, *Z;
+  if (!PyArg_ParseTuple(args, "O!O!O!O!i",
+			&PyArray_Type, &a,
+			&PyArray_Type, &b,
+			&PyArray_Type, &d,
+			&PyArray_Type, &Z,
+			&n)) {
+    return NULL;
+  }
+  NPY_BEGIN_ALLOW_THREADS;
+  result = linkage_from_mst((const int*)a->data, (const int*)b->data,
+                            (const double*)d->data, (double*)Z->data, n);
+  NPY_END_ALLOW_THREADS;
+  if (result == -1) {
+    PyErr_SetString(PyExc_MemoryError,
+                    "out of memory while computing linkage");
+    return NULL;
+  }
+  return Py_BuildValue("d", 0.0);
+}
+
+extern PyObject *linkage_nn_chain_wrap(PyObject *self, PyObject *args) {
+  int method, n, result;
+  PyArrayObject *dm, *Z;
+  if (!PyArg_ParseTuple(args, "O!O!ii",
+			&PyArray_Type, &dm,
+			&PyArray_Type, &Z,
+			&n,
+			&method)) {
+    return NULL;
+  }
+  NPY_BEGIN_ALLOW_THREADS;
+  result = linkage_nn_chain((const double*)dm->data, (double*)Z->data,
+                            n, method);
+  NPY_END_ALLOW_THREADS;
+  if (result == -1) {
+    PyErr_SetString(PyExc_MemoryError,
+                    "out of memory while computing linkage");
+    return NULL;
+  }
+  return Py_BuildValue("d", 0.0);
+}
+
+extern PyObject *linkage_connectivity_wrap(PyObject *self, PyObject *args) {
+  int method, m, n, result;
+  PyArrayObject *X, *indptr, *indices, *Z;
+  if (!PyArg_ParseTuple(args, "O!O!O!O!iii",
+			&PyArray_Type, &X,
+			&PyArray_Type, &indptr,
+			&PyArray_Type, &indices,
+			&PyArray_Type, &Z,
+			&m,
+			&n,
+			&method)) {
+    return NULL;
+  }
+  NPY_BEGIN_ALLOW_THREADS;
+  result = linkage_connectivity((const double*)X->data,
+                                (const int*)indptr->data,
+                                (const int*)indices->data,
+                                (double*)Z->data, n, m, method);
+  NPY_END_ALLOW_THREADS;
+  if (result == -1) {
+    PyErr_SetString(PyExc_MemoryError,
+                    "out of memory while computing linkage");
+    return NULL;
+  }
+  if (result == -2) {
+    PyErr_SetString(PyExc_ValueError,
+                    "the connectivity graph is not connected");
+    return NULL;
+  }
+  return Py_BuildValue("d", 0.0);
+}
+
 extern PyObject *linkage_euclid_wrap(PyObject *self, PyObject *args) {
   int method, m, n, ml;
   PyArrayObject *dm, *Z, *X;
@@ -376,7 +473,11 @@ static PyMethodDef _hierarchyWrapMethods[] = {
    get_max_Rfield_for_each_cluster_wrap, METH_VARARGS},
   {"inconsistent_wrap", inconsistent_wrap, METH_VARARGS},
   {"leaders_wrap", leaders_wrap, METH_VARARGS},
+  {"linkage_connectivity_wrap", linkage_connectivity_wrap, METH_VARARGS},
   {"linkage_euclid_wrap", linkage_euclid_wrap, METH_VARARGS},
+  {"linkage_from_mst_wrap", linkage_from_mst_wrap, METH_VARARGS},
+  {"linkage_mst_wrap", linkage_mst_wrap, METH_VARARGS},
+  {"linkage_nn_chain_wrap", linkage_nn_chain_wrap, METH_VARARGS},
   {"linkage_wrap", linkage_wrap, METH_VARARGS},
   {"prelist_wrap", prelist_wrap, METH_VARARGS},
   {NULL, NULL}     /* Sentinel - marks the end of this structure */
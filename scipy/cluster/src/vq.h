@@ -11,4 +11,10 @@ int double_tvq(double* obs, double* code_book, int Nobs, int Ncodes,
 int float_tvq(float* obs, float* code_book, int Nobs, int Ncodes, 
         int Nfeatures, npy_intp* codes, float* lowest_dist);
 
+int double_kmeans(const double *obs, double *code_book, int Nobs,
+        int Ncodes, int Nfeatures, int niter, npy_intp *codes, int *nempty);
+
+int float_kmeans(const float *obs, float *code_book, int Nobs,
+        int Ncodes, int Nfeatures, int niter, npy_intp *codes, int *nempty);
+
 #endif
@@ -7,6 +7,7 @@
  * with recent swig
  */
 #include <stddef.h>
+#include <stdlib.h>
 #include <math.h>
 
 #include "vq.h"
@@ -50,20 +51,30 @@ static int [+ (get "type_name") +]_vq_obs(const [+ (get "data_type") +] *obs,
 	int i,j,k=0;
 	[+ (get "data_type") +] dist, diff;
 
-	*lowest_dist = ([+ (get "data_type") +]) rbig;
-	for(i = 0; i < Ncodes; i++) {
+	/* Compare squared distances, and stop summing one as soon as it
+	 * exceeds the smallest so far: the code cannot be the nearest.
+	 * Start from the first code, so that a code is chosen however
+	 * far the observation is. */
+	*code = 0;
+	*lowest_dist = 0;
+	for(j=0; j < Nfeatures; j++) {
+		diff = code_book[j] - obs[j];
+		*lowest_dist += diff*diff;
+	}
+	for(i = 1; i < Ncodes; i++) {
 		dist = 0;
-		for(j=0; j < Nfeatures; j++) {
+		k = i*Nfeatures;
+		for(j=0; j < Nfeatures && dist < *lowest_dist; j++) {
 			diff = code_book[k] - obs[j];
 			dist += diff*diff;
 			k++;
 		}
-		dist = ([+ (get "data_type") +])sqrt(dist);
 		if (dist < *lowest_dist) {
 			*code = i;
 			*lowest_dist = dist;
 		}
 	}
+	*lowest_dist = ([+ (get "data_type") +])sqrt(*lowest_dist);
 
     return 0;
 }
@@ -77,10 +88,181 @@ int [+ (get "type_name") +]_tvq(
     int i;
 	for( i = 0; i < Nobs; i++) {		
 		[+ (get "type_name") +]_vq_obs(
-                    &(obs[i*Nfeatures]),
+                    obs + (npy_intp)i*Nfeatures,
                     code_book,Ncodes, Nfeatures,
                     &(codes[i]), &(lowest_dist[i]));
 	}
     return 0;
 }
+
+static double [+ (get "type_name") +]_code_dist(const [+ (get "data_type") +] *x, const [+ (get "data_type") +] *y, int Nfeatures)
+{
+    int j;
+    double dist = 0, diff;
+
+    for (j = 0; j < Nfeatures; j++) {
+        diff = (double)x[j] - y[j];
+        dist += diff*diff;
+    }
+    return sqrt(dist);
+}
+
+/*
+ * k-means with Hamerly's bounds.  Every iteration assigns each
+ * observation to its nearest code and moves each code to the mean of its
+ * observations, as Lloyd's algorithm does, but an upper bound on the
+ * distance of an observation to its code and a lower bound on its
+ * distance to every other code are kept, and moved along with the codes
+ * by the triangle inequality.  The distances to all codes are only
+ * computed for the observations whose bounds do not show that their
+ * code stays the nearest.
+ *
+ * codes receives the assignment of the last iteration, and code_book the
+ * codes moved by it.  A code without observations keeps its place, and
+ * nempty counts how often this happens.  The iterations stop early once
+ * no observation changes its code.
+ *
+ * Returns 0 on success, -1 if out of memory.
+ */
+int [+ (get "type_name") +]_kmeans(const [+ (get "data_type") +] *obs, [+ (get "data_type") +] *code_book,
+    int Nobs, int Ncodes, int Nfeatures, int niter,
+    npy_intp *codes, int *nempty)
+{
+    double *upper, *lower, *half, *moved, *sums;
+    npy_intp *counts;
+    npy_intp i;
+    int j, l, it, best, changed, maxj;
+    double d, d1, d2, m, maxmove, maxmove2;
+    const [+ (get "data_type") +] *x;
+    [+ (get "data_type") +] *c, v;
+    int result = -1;
+
+    upper = (double*)malloc(sizeof(double) * Nobs);
+    lower = (double*)malloc(sizeof(double) * Nobs);
+    half = (double*)malloc(sizeof(double) * Ncodes);
+    moved = (double*)malloc(sizeof(double) * Ncodes);
+    sums = (double*)malloc(sizeof(double) * Ncodes * Nfeatures);
+    counts = (npy_intp*)malloc(sizeof(npy_intp) * Ncodes);
+    if (!upper || !lower || !half || !moved || !sums || !counts) {
+        goto clean;
+    }
+
+    *nempty = 0;
+    for (it = 0; it < niter; it++) {
+        /* Half the distance from each code to the nearest other code:
+         * an observation closer than that to its code is closest to it. */
+        for (j = 0; j < Ncodes; j++) {
+            half[j] = rbig;
+        }
+        for (j = 0; j < Ncodes; j++) {
+            for (l = j + 1; l < Ncodes; l++) {
+                d = 0.5 * [+ (get "type_name") +]_code_dist(code_book + j*Nfeatures,
+                                          code_book + l*Nfeatures, Nfeatures);
+                if (d < half[j]) {
+                    half[j] = d;
+                }
+                if (d < half[l]) {
+                    half[l] = d;
+                }
+            }
+        }
+
+        changed = (it == 0);
+        for (i = 0; i < Nobs; i++) {
+            x = obs + i*Nfeatures;
+            if (it > 0) {
+                m = (half[codes[i]] > lower[i]) ? half[codes[i]] : lower[i];
+                if (upper[i] <= m) {
+                    continue;
+                }
+                upper[i] = [+ (get "type_name") +]_code_dist(x, code_book + codes[i]*Nfeatures,
+                                           Nfeatures);
+                if (upper[i] <= m) {
+                    continue;
+                }
+            }
+            d1 = d2 = rbig;
+            best = 0;
+            for (j = 0; j < Ncodes; j++) {
+                d = [+ (get "type_name") +]_code_dist(x, code_book + j*Nfeatures, Nfeatures);
+                if (d < d1) {
+                    d2 = d1;
+                    d1 = d;
+                    best = j;
+                }
+                else if (d < d2) {
+                    d2 = d;
+                }
+            }
+            if (it > 0 && best != codes[i]) {
+                changed = 1;
+            }
+            codes[i] = best;
+            upper[i] = d1;
+            lower[i] = d2;
+        }
+        if (!changed) {
+            /* The codes are already the means of this assignment. */
+            break;
+        }
+
+        /* Move the codes to the means of their observations. */
+        for (j = 0; j < Ncodes; j++) {
+            counts[j] = 0;
+        }
+        for (j = 0; j < Ncodes * Nfeatures; j++) {
+            sums[j] = 0;
+        }
+        for (i = 0; i < Nobs; i++) {
+            x = obs + i*Nfeatures;
+            counts[codes[i]]++;
+            for (l = 0; l < Nfeatures; l++) {
+                sums[codes[i]*Nfeatures + l] += x[l];
+            }
+        }
+        maxmove = maxmove2 = 0;
+        maxj = -1;
+        for (j = 0; j < Ncodes; j++) {
+            moved[j] = 0;
+            if (counts[j] == 0) {
+                (*nempty)++;
+                continue;
+            }
+            c = code_book + j*Nfeatures;
+            d = 0;
+            for (l = 0; l < Nfeatures; l++) {
+                v = ([+ (get "data_type") +])(sums[j*Nfeatures + l] / counts[j]);
+                d += ((double)v - c[l]) * ((double)v - c[l]);
+                c[l] = v;
+            }
+            moved[j] = sqrt(d);
+            if (moved[j] > maxmove) {
+                maxmove2 = maxmove;
+                maxmove = moved[j];
+                maxj = j;
+            }
+            else if (moved[j] > maxmove2) {
+                maxmove2 = moved[j];
+            }
+        }
+
+        /* The distance to the code can grow by at most its move, and the
+         * distance to any other code shrink by at most the largest move
+         * of the others. */
+        for (i = 0; i < Nobs; i++) {
+            upper[i] += moved[codes[i]];
+            lower[i] -= (codes[i] == maxj) ? maxmove2 : maxmove;
+        }
+    }
+    result = 0;
+
+clean:
+    free(upper);
+    free(lower);
+    free(half);
+    free(moved);
+    free(sums);
+    free(counts);
+    return result;
+}
 [+ ENDFOR data_type +]
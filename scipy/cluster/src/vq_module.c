@@ -9,9 +9,32 @@
 #include "vq.h"
 
 PyObject* compute_vq(PyObject*, PyObject*);
+PyObject* compute_kmeans(PyObject*, PyObject*);
+
+static char vq_doc[] =
+"vq(obs, code) -> (index, dist)\n"
+"\n"
+"Assign each observation in obs to its nearest code in code.  obs and\n"
+"code are arrays of the same type, float or double, and rank, 1 or 2.\n"
+"index[i] is the index of the code nearest to obs[i] and dist[i] its\n"
+"Euclidean distance to it.";
+
+static char kmeans_doc[] =
+"kmeans(obs, code, niter) -> (index, nempty)\n"
+"\n"
+"Run at most niter iterations of k-means on obs, starting from the\n"
+"centroids in code, which are moved in place.  obs and code are arrays\n"
+"of the same type, float or double, and rank, 1 or 2; code must be C\n"
+"contiguous and writeable.  The iterations stop early once no\n"
+"observation changes its centroid.\n"
+"\n"
+"index[i] is the centroid of obs[i] in the last iteration.  A centroid\n"
+"left without observations by an iteration keeps its place, and nempty\n"
+"is the number of times this happened over all iterations.";
 
 static PyMethodDef vqmethods [] = {
-    {"vq", compute_vq, METH_VARARGS, "TODO docstring"},
+    {"vq", compute_vq, METH_VARARGS, vq_doc},
+    {"kmeans", compute_kmeans, METH_VARARGS, kmeans_doc},
     {NULL, NULL, 0, NULL}
 };
 
@@ -115,6 +138,10 @@ PyObject* compute_vq(PyObject* self, PyObject* args)
                      "rank different than 1 or 2 are not supported");
             goto clean_code_a;
     }
+    if (nc < 1) {
+        PyErr_Format(PyExc_ValueError, "code should not be empty");
+        goto clean_code_a;
+    }
 
     switch (PyArray_TYPE(obs)) {
         case NPY_FLOAT:
@@ -126,8 +153,10 @@ PyObject* compute_vq(PyObject* self, PyObject* args)
             if (index_a == NULL) {
                 goto clean_dist_a;
             }
+            Py_BEGIN_ALLOW_THREADS
             float_tvq((float*)obs_a->data, (float*)code_a->data, n, nc, d,
                     (npy_intp*)index_a->data, (float*)dist_a->data);
+            Py_END_ALLOW_THREADS
             break;
         case NPY_DOUBLE:
             dist_a = (PyArrayObject*)PyArray_EMPTY(1, &n, typenum1, 0);
@@ -138,8 +167,10 @@ PyObject* compute_vq(PyObject* self, PyObject* args)
             if (index_a == NULL) {
                 goto clean_dist_a;
             }
+            Py_BEGIN_ALLOW_THREADS
             double_tvq((double*)obs_a->data, (double*)code_a->data, n, nc, d,
                     (npy_intp*)index_a->data, (double*)dist_a->data);
+            Py_END_ALLOW_THREADS
             break;
         default:
             PyErr_Format(PyExc_ValueError,
@@ -176,3 +207,111 @@ clean_obs_a:
     Py_DECREF(obs_a);
     return NULL;
 }
+
+/*
+ * kmeans(obs, code, niter) runs niter iterations of k-means on obs,
+ * starting from code, which is moved in place.  obs and code must have
+ * the same type, float or double, and code must be contiguous.  Returns
+ * the labels of the last iteration and the number of times a code was
+ * left without observations.
+ */
+PyObject* compute_kmeans(PyObject* self, PyObject* args)
+{
+    PyObject *obs, *code;
+    PyArrayObject *obs_a, *code_a, *index_a;
+    int niter, nempty = 0, status = 0;
+    npy_intp n, d, nc;
+
+    if (!PyArg_ParseTuple(args, "OOi", &obs, &code, &niter)) {
+        return NULL;
+    }
+    if (!(PyArray_Check(obs) && PyArray_Check(code))) {
+        PyErr_Format(PyExc_ValueError,
+                     "observation and code should be numpy arrays");
+        return NULL;
+    }
+    if (PyArray_TYPE(obs) != PyArray_TYPE(code)) {
+        PyErr_Format(PyExc_ValueError,
+                     "observation and code should have same type");
+        return NULL;
+    }
+    if (!PyArray_ISCARRAY(code)) {
+        PyErr_Format(PyExc_ValueError,
+                     "code should be a C contiguous, writeable array");
+        return NULL;
+    }
+    if (PyArray_NDIM(obs) != PyArray_NDIM(code)) {
+        PyErr_Format(PyExc_ValueError,
+                     "observation and code should have same shape");
+        return NULL;
+    }
+    switch (PyArray_NDIM(obs)) {
+        case 1:
+            d = 1;
+            break;
+        case 2:
+            d = PyArray_DIM(obs, 1);
+            if (d != PyArray_DIM(code, 1)) {
+                PyErr_Format(PyExc_ValueError,
+                         "obs and code should have same number of "
+                         " features (columns)");
+                return NULL;
+            }
+            break;
+        default:
+            PyErr_Format(PyExc_ValueError,
+                     "rank different than 1 or 2 are not supported");
+            return NULL;
+    }
+    n = PyArray_DIM(obs, 0);
+    nc = PyArray_DIM(code, 0);
+    if (nc < 1) {
+        PyErr_Format(PyExc_ValueError, "code should not be empty");
+        return NULL;
+    }
+
+    obs_a = (PyArrayObject*)PyArray_FROM_OF(obs,
+                NPY_CONTIGUOUS | NPY_NOTSWAPPED | NPY_ALIGNED);
+    if (obs_a == NULL) {
+        return NULL;
+    }
+    code_a = (PyArrayObject*)code;
+    index_a = (PyArrayObject*)PyArray_ZEROS(1, &n, NPY_INTP, 0);
+    if (index_a == NULL) {
+        goto clean_obs_a;
+    }
+
+    switch (PyArray_TYPE(obs)) {
+        case NPY_FLOAT:
+            Py_BEGIN_ALLOW_THREADS
+            status = float_kmeans((float*)PyArray_DATA(obs_a),
+                    (float*)PyArray_DATA(code_a), n, nc, d, niter,
+                    (npy_intp*)PyArray_DATA(index_a), &nempty);
+            Py_END_ALLOW_THREADS
+            break;
+        case NPY_DOUBLE:
+            Py_BEGIN_ALLOW_THREADS
+            status = double_kmeans((double*)PyArray_DATA(obs_a),
+                    (double*)PyArray_DATA(code_a), n, nc, d, niter,
+                    (npy_intp*)PyArray_DATA(index_a), &nempty);
+            Py_END_ALLOW_THREADS
+            break;
+        default:
+            PyErr_Format(PyExc_ValueError,
+                     "type other than float or double not supported");
+            goto clean_index_a;
+    }
+    if (status < 0) {
+        PyErr_NoMemory();
+        goto clean_index_a;
+    }
+
+    Py_DECREF(obs_a);
+    return Py_BuildValue("Ni", (PyObject*)index_a, nempty);
+
+clean_index_a:
+    Py_DECREF(index_a);
+clean_obs_a:
+    Py_DECREF(obs_a);
+    return NULL;
+}
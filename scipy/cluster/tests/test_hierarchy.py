@@ -37,6 +37,7 @@ from __future__ import division, print_function, absolute_import
 import os.path
 
 import numpy as np
+import scipy.sparse
 from numpy.testing import TestCase, run_module_suite
 
 from scipy.lib.six.moves import xrange
@@ -46,7 +47,11 @@ from scipy.cluster.hierarchy import linkage, from_mlab_linkage, to_mlab_linkage,
         is_isomorphic, single, complete, weighted, centroid, leaders, \
         correspond, is_monotonic, maxdists, maxinconsts, maxRstat, \
         is_valid_linkage, is_valid_im, to_tree, leaves_list, dendrogram
-from scipy.spatial.distance import squareform, pdist
+from scipy.spatial.distance import (squareform, pdist,
+        CondensedDistanceMatrix)
+from scipy.cluster import _hierarchy_wrap
+from scipy.cluster.hierarchy import (_cpy_euclid_methods,
+        _cpy_non_euclid_methods)
 
 _tdist = np.array([[0, 662, 877, 255, 412, 996],
                    [662, 0, 295, 468, 268, 400],
@@ -124,6 +129,13 @@ class TestLinkage(TestCase):
         expectedZ = from_mlab_linkage(Zmlab)
         self.assertTrue(within_tol(Z, expectedZ, eps))
 
+    def test_linkage_condensed_distance_matrix(self):
+        "Tests linkage(D) with a CondensedDistanceMatrix D."
+        D = CondensedDistanceMatrix(_ytdist)
+        for method in ['single', 'complete', 'average', 'weighted']:
+            np.testing.assert_array_equal(linkage(D, method),
+                                          linkage(_ytdist, method))
+
     def test_linkage_complete_tdist(self):
         "Tests linkage(Y, 'complete') on the tdist data set."
         Z = linkage(_ytdist, 'complete')
@@ -185,6 +197,91 @@ class TestLinkage(TestCase):
         expectedZ = from_mlab_linkage(Zmlab)
         self.assertTrue(within_tol(Z, expectedZ, eps))
 
+    def test_linkage_matches_generic_algorithm(self):
+        "Tests the O(n^2) algorithms against the generic algorithm."
+        np.random.seed(1234)
+        X = np.random.rand(60, 3)
+        y = pdist(X)
+        methods = dict(_cpy_non_euclid_methods,
+                       ward=_cpy_euclid_methods['ward'])
+        for method, code in methods.items():
+            Z = linkage(X, method)
+            expectedZ = np.zeros((59, 4))
+            if method == 'ward':
+                _hierarchy_wrap.linkage_euclid_wrap(y.copy(), expectedZ, X,
+                                                    3, 60, code)
+            else:
+                _hierarchy_wrap.linkage_wrap(y.copy(), expectedZ, 60, code)
+            np.testing.assert_array_equal(Z[:, [0, 1, 3]],
+                                          expectedZ[:, [0, 1, 3]])
+            np.testing.assert_allclose(Z[:, 2], expectedZ[:, 2],
+                                       rtol=1e-12)
+
+    def test_linkage_single_tree(self):
+        "Tests single linkage of observation vectors by a kd-tree."
+        np.random.seed(1234)
+        X = np.random.rand(100, 3)
+        for metric in ['euclidean', 'cityblock', 'chebyshev']:
+            Z = linkage(X, 'single', metric)
+            expectedZ = linkage(pdist(X, metric), 'single')
+            np.testing.assert_array_equal(Z, expectedZ)
+
+    def test_linkage_connectivity_complete_graph(self):
+        "Tests linkage with a connectivity graph joining all observations."
+        np.random.seed(1234)
+        X = np.random.rand(30, 3)
+        connectivity = scipy.sparse.csr_matrix(np.triu(np.ones((30, 30))))
+        for method in ['single', 'complete', 'average', 'weighted',
+                       'centroid', 'median', 'ward']:
+            Z = linkage(X, method, connectivity=connectivity)
+            expectedZ = linkage(X, method)
+            np.testing.assert_array_equal(Z[:, [0, 1, 3]],
+                                          expectedZ[:, [0, 1, 3]])
+            np.testing.assert_allclose(Z[:, 2], expectedZ[:, 2],
+                                       rtol=1e-12)
+
+    def test_linkage_connectivity_grid(self):
+        "Tests that only clusters adjacent on a grid are merged."
+        np.random.seed(1234)
+        X = np.random.rand(6 * 5, 2)
+        pos = np.array(list(np.ndindex(6, 5)))
+        adjacent = np.abs(pos[:, None, :] - pos[None, :, :]).sum(2) == 1
+        connectivity = scipy.sparse.csr_matrix(adjacent)
+        for method in ['single', 'complete', 'average', 'ward']:
+            Z = linkage(X, method, connectivity=connectivity)
+            self.assertTrue(is_valid_linkage(Z))
+            members = [[i] for i in range(30)]
+            for a, b in Z[:, :2].astype(int):
+                self.assertTrue(adjacent[np.ix_(members[a],
+                                                members[b])].any())
+                members.append(members[a] + members[b])
+
+    def test_linkage_connectivity_errors(self):
+        "Tests linkage with invalid connectivity graphs."
+        X = np.random.rand(4, 2)
+        disconnected = scipy.sparse.csr_matrix(([1., 1.], ([0, 2], [1, 3])),
+                                               shape=(4, 4))
+        self.assertRaises(ValueError, linkage, X, connectivity=disconnected)
+        self.assertRaises(ValueError, linkage, X,
+                          connectivity=scipy.sparse.eye(3, 3))
+        self.assertRaises(ValueError, linkage, X, metric='cityblock',
+                          connectivity=scipy.sparse.eye(4, 4))
+        self.assertRaises(ValueError, linkage, pdist(X),
+                          connectivity=scipy.sparse.eye(4, 4))
+        self.assertRaises(ValueError, linkage, np.zeros((0, 2)),
+                          connectivity=scipy.sparse.eye(1, 1))
+        Z = linkage(np.zeros((1, 2)), connectivity=scipy.sparse.eye(1, 1))
+        self.assertEqual(Z.shape, (0, 4))
+
+    def test_linkage_small(self):
+        "Tests linkage with one and two observations."
+        for method in ['single', 'complete', 'average', 'weighted', 'ward']:
+            self.assertEqual(linkage(np.zeros((1, 2)), method).shape, (0, 4))
+            self.assertRaises(ValueError, linkage, np.zeros((0, 2)), method)
+            np.testing.assert_array_equal(
+                linkage(np.array([[0., 0.], [3., 4.]]), method),
+                [[0, 1, 5, 2]])
+
 
 class TestInconsistent(TestCase):
     def test_single_inconsistent_tdist_1(self):
@@ -398,6 +495,15 @@ class TestFcluster(TestCase):
         T = fclusterdata(X, criterion='maxclust', t=4)
         self.assertTrue(is_isomorphic(T, expectedT))
 
+    def test_fclusterdata_distance_single(self):
+        "Tests fclusterdata(X, criterion='distance') with single linkage."
+        np.random.seed(1234)
+        X = np.random.rand(200, 2)
+        for t in [0.02, 0.05, 0.1]:
+            T = fclusterdata(X, t, criterion='distance')
+            expectedT = fcluster(linkage(pdist(X)), t, criterion='distance')
+            self.assertTrue(is_isomorphic(T, expectedT))
+
     def test_fcluster_maxclusts_2(self):
         "Tests fcluster(Z, criterion='maxclust', t=2) on a random 3-cluster data set."
         expectedT = np.int_(eo['fclusterdata-maxclusts-2'])
@@ -733,6 +839,47 @@ class TestLeavesList(TestCase):
         node = to_tree(Z)
         self.assertTrue((node.pre_order() == leaves_list(Z)).all())
 
+    def test_pre_order_subtree(self):
+        "Tests ClusterNode.pre_order on subtrees of a hierarchy."
+        Z = linkage(eo['iris'], 'average')
+        root, nodes = to_tree(Z, rd=True)
+        order = list(leaves_list(Z))
+        for nd in nodes[150:]:
+            # the leaves of a subtree are contiguous in the leaf order
+            leaves = nd.pre_order()
+            self.assertEqual(len(leaves), nd.get_count())
+            k = order.index(leaves[0])
+            self.assertEqual(leaves, order[k:k + len(leaves)])
+
+    def test_to_tree_lazy_nodes(self):
+        "Tests that to_tree builds the nodes of a hierarchy on demand."
+        Z = linkage(eo['iris'], 'average')
+        root = to_tree(Z)
+        self.assertEqual(root.pre_order(), list(leaves_list(Z)))
+        # walking the tree built no inner node
+        self.assertFalse('left' in root.__dict__)
+        root2, nodes = to_tree(Z, rd=True)
+        stack = [(root, root2)]
+        while stack:
+            a, b = stack.pop()
+            self.assertEqual((a.id, a.count, a.dist), (b.id, b.count, b.dist))
+            self.assertEqual(a.is_leaf(), b.is_leaf())
+            self.assertTrue(a.get_left() is a.left)
+            self.assertTrue(nodes[b.id] is b)
+            if not a.is_leaf():
+                stack.append((a.get_left(), b.get_left()))
+                stack.append((a.get_right(), b.get_right()))
+        # the subtree under the built nodes is the same
+        self.assertEqual(root.pre_order(), list(leaves_list(Z)))
+        self.assertEqual(root.right.pre_order(lambda x: x.count),
+                         [1] * root.right.count)
+
+    def test_to_tree_bad_count(self):
+        "Tests to_tree on a linkage with a wrong count."
+        Z = linkage(eo['iris'], 'average')
+        Z[100, 3] += 1
+        self.assertRaises(ValueError, to_tree, Z)
+
     def test_leaves_list_iris_complete(self):
         "Tests leaves_list(Z) on the Iris data set using complete linkage."
         X = eo['iris']
@@ -1366,6 +1513,25 @@ class TestDendrogram(TestCase):
         leaves = R["leaves"]
         self.assertEqual(leaves, [2, 5, 1, 0, 3, 4])
 
+    def test_dendrogram_deep_hierarchy(self):
+        "Tests dendrogram on a hierarchy deeper than the recursion limit."
+        n = 5000
+        # every merge adds one observation to the previous cluster
+        Z = np.zeros((n - 1, 4))
+        Z[:, 0] = np.arange(n - 1) + n - 1
+        Z[0, 0] = 0
+        Z[:, 1] = np.arange(1, n)
+        Z[:, 2] = np.arange(1, n)
+        Z[:, 3] = np.arange(2, n + 1)
+        self.assertTrue(is_valid_linkage(Z))
+        R = dendrogram(Z, no_plot=True)
+        np.testing.assert_array_equal(R["leaves"], leaves_list(Z))
+        self.assertEqual(len(R["icoord"]), n - 1)
+        R = dendrogram(Z, p=10, truncate_mode='lastp', no_plot=True,
+                       show_contracted=True)
+        self.assertEqual(len(R["leaves"]), 10)
+        self.assertEqual(to_tree(Z).pre_order(), list(range(n)))
+
 
 def calculate_maximum_distances(Z):
     "Used for testing correctness of maxdists. Very slow."
@@ -9,10 +9,11 @@ import warnings
 
 import numpy as np
 from numpy.testing import assert_array_equal, assert_array_almost_equal, \
-        TestCase, run_module_suite, assert_raises
+        TestCase, run_module_suite, assert_raises, assert_
 from numpy.testing.utils import WarningManager
 
-from scipy.cluster.vq import kmeans, kmeans2, py_vq, py_vq2, vq, ClusterError
+from scipy.cluster.vq import kmeans, kmeans2, py_vq, py_vq2, vq, ClusterError, \
+        MiniBatchKMeans, _py_vq_blocks
 try:
     from scipy.cluster import _vq
     TESTC = True
@@ -81,6 +82,44 @@ class TestVq(TestCase):
         else:
             print("== not testing C imp of vq (rank 1) ==")
 
+    def test_vq_n_jobs(self):
+        """Testing vq in several threads against one thread."""
+        np.random.seed(1234)
+        obs = np.random.randn(1001, 4)
+        code_book = np.random.randn(17, 4)
+        for dt in [np.float32, np.float64]:
+            label, dist = vq(obs.astype(dt), code_book.astype(dt))
+            for n_jobs in [2, 3, -1]:
+                tlabel, tdist = vq(obs.astype(dt), code_book.astype(dt),
+                                   n_jobs=n_jobs)
+                assert_array_equal(tlabel, label)
+                assert_array_equal(tdist, dist)
+                if TESTC:
+                    assert_(tdist.dtype == dt)
+        assert_raises(ValueError, vq, obs, code_book, n_jobs=0)
+
+    def test_vq_far_codes(self):
+        """Testing vq on observations very far from every code."""
+        obs = np.array([[1e60, 0.], [-1e60, 1.], [0., 0.]])
+        code_book = np.array([[0., 0.], [1., 1.]])
+        label, dist = vq(obs, code_book)
+        assert_array_equal(label, [0, 0, 0])
+        assert_array_equal(dist, [1e60, 1e60, 0])
+        if TESTC:
+            assert_raises(ValueError, _vq.vq, obs, code_book[:0])
+
+    def test_py_vq_blocks(self):
+        """Testing the blocked distances of py_vq and py_vq2."""
+        np.random.seed(1234)
+        obs = np.random.randn(500, 3)
+        code_book = np.random.randn(40, 3)
+        dist = np.sqrt(np.sum((obs[:, np.newaxis, :] -
+                               code_book[np.newaxis, :, :]) ** 2, -1))
+        for label, mdist in [py_vq(obs, code_book), py_vq2(obs, code_book),
+                             _py_vq_blocks(obs, code_book, block_size=100)]:
+            assert_array_equal(label, np.argmin(dist, 1))
+            assert_array_almost_equal(mdist, np.min(dist, 1))
+
     def test__vq_sametype(self):
         if TESTC:
             a = np.array([1, 2])
@@ -182,6 +221,39 @@ class TestKMean(TestCase):
         finally:
             warn_ctx.__exit__()
 
+        kmeans2(data, 3, minit='++')
+        kmeans2(data[:, 0], 3, minit='++')  # special case (1-D)
+
+    def test_kmeans2_kpp(self):
+        """Testing that k-means++ seeds one centroid per separated cluster."""
+        np.random.seed(1234)
+        centers = np.array([[0., 0], [10, 0], [0, 10], [10, 10]])
+        data = np.concatenate([c + 0.1 * np.random.randn(50, 2)
+                               for c in centers])
+        for i in range(5):
+            code, label = kmeans2(data, 4, iter=1, minit='++')
+            assert_array_equal(np.bincount(label, minlength=4), [50] * 4)
+            assert_array_almost_equal(code[label[::50]], centers, decimal=1)
+
+    def test__kmeans(self):
+        """Testing the compiled k-means against plain Lloyd iterations."""
+        if TESTC:
+            data = np.fromfile(DATAFILE1, sep=", ")
+            data = data.reshape((200, 2))
+            for obs in [data, data[:, 0], data.astype(np.float32)]:
+                initc = obs[:4].copy()
+                code = initc.copy()
+                label = _vq.kmeans(obs, code, 10)[0]
+
+                tcode = initc.copy()
+                for i in range(10):
+                    tlabel = vq(obs, tcode)[0]
+                    for j in range(4):
+                        if np.any(tlabel == j):
+                            tcode[j] = np.mean(obs[tlabel == j], axis=0)
+                assert_array_equal(label, tlabel)
+                assert_array_almost_equal(code, tcode, decimal=5)
+
     def test_kmeans2_empty(self):
         """Ticket #505."""
         assert_raises(ValueError, kmeans2, [], 2)
@@ -193,5 +265,67 @@ class TestKMean(TestCase):
         assert_raises(ValueError, kmeans2, X, np.array([]))
 
 
+class TestMiniBatchKMeans(TestCase):
+    def test_one_chunk(self):
+        """Testing that one chunk moves the centroids to the means."""
+        initc = np.concatenate(([[X[0]], [X[1]], [X[2]]]))
+        km = MiniBatchKMeans(initc).partial_fit(X)
+        assert_array_almost_equal(km.code_book, CODET1)
+        assert_array_equal(km.counts, np.bincount(LABEL1))
+        assert_array_equal(km.predict(X), vq(X, CODET1)[0])
+
+    def test_chunks(self):
+        """Testing that the centroids are running means over the chunks."""
+        initc = np.concatenate(([[X[0]], [X[1]], [X[2]]]))
+        km = MiniBatchKMeans(initc)
+        km.partial_fit(X[:6])
+        km.partial_fit(X[6:])
+        tcode = initc.copy()
+        label1 = vq(X[:6], tcode)[0]
+        for j in range(3):
+            tcode[j] = np.mean(X[:6][label1 == j], axis=0)
+        label2 = vq(X[6:], tcode)[0]
+        label = np.concatenate((label1, label2))
+        for j in range(3):
+            tcode[j] = np.mean(X[label == j], axis=0)
+        assert_array_almost_equal(km.code_book, tcode)
+        assert_array_equal(km.counts, np.bincount(label, minlength=3))
+
+    def test_stream(self):
+        """Testing that a stream of separated clusters is recovered."""
+        np.random.seed(1234)
+        centers = np.array([[0., 0], [10, 0], [0, 10]])
+        km = MiniBatchKMeans(3)
+        for i in range(10):
+            chunk = centers[np.random.randint(0, 3, 100)]
+            km.partial_fit(chunk + 0.1 * np.random.randn(100, 2))
+        assert_array_equal(km.counts.sum(), 1000)
+        label = km.predict(centers)
+        assert_array_equal(np.sort(label), [0, 1, 2])
+        assert_array_almost_equal(km.code_book[label], centers, decimal=1)
+
+    def test_single_centroid(self):
+        """Testing code books of one centroid."""
+        # one centroid of 1-D data, not k=5
+        km = MiniBatchKMeans(np.array([5.])).partial_fit(X[:, 0])
+        assert_array_almost_equal(km.code_book, [X[:, 0].mean()])
+        # one centroid of 2-D data, not k=2
+        for initc in [X[0], X[:1]]:
+            km = MiniBatchKMeans(initc).partial_fit(X)
+            assert_(km.k == 1)
+            assert_array_almost_equal(km.code_book, [X.mean(axis=0)])
+            assert_array_equal(km.counts, [len(X)])
+            assert_array_equal(km.predict(X[:3]), [0, 0, 0])
+
+    def test_errors(self):
+        assert_raises(ValueError, MiniBatchKMeans, 0)
+        assert_raises(ValueError, MiniBatchKMeans, np.zeros((0, 2)))
+        assert_raises(ValueError, MiniBatchKMeans(X[:2]).partial_fit,
+                      X[:, 0])
+        assert_raises(ValueError, MiniBatchKMeans, 2, minit='uniform')
+        assert_raises(ValueError, MiniBatchKMeans(3).partial_fit, X[:2])
+        assert_raises(ValueError, MiniBatchKMeans(3).predict, X)
+
+
 if __name__ == "__main__":
     run_module_suite()
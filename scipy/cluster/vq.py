@@ -15,6 +15,7 @@ centroids in a code book.
    kmeans -- Performs k-means on a set of observation vectors forming k clusters
    kmeans2 -- A different implementation of k-means with more methods
            -- for initializing centroids
+   MiniBatchKMeans -- Incremental k-means on a stream of observations
 
 Background information
 ======================
@@ -70,7 +71,7 @@ from __future__ import division, print_function, absolute_import
 
 __docformat__ = 'restructuredtext'
 
-__all__ = ['whiten', 'vq', 'kmeans', 'kmeans2']
+__all__ = ['whiten', 'vq', 'kmeans', 'kmeans2', 'MiniBatchKMeans']
 
 # TODO:
 #   - implements high level method for running several times k-means with
@@ -86,6 +87,8 @@ from numpy import shape, zeros, sqrt, argmin, minimum, array, \
      std, mean
 import numpy as np
 
+from scipy.lib._threads import run_threads, cpu_count
+
 
 class ClusterError(Exception):
     pass
@@ -134,7 +137,7 @@ def whiten(obs):
     return obs / std_dev
 
 
-def vq(obs, code_book):
+def vq(obs, code_book, n_jobs=1):
     """
     Assign codes from a code book to observations.
 
@@ -165,6 +168,11 @@ def vq(obs, code_book):
          ...             [  1.,   2.,   3.,   4.],  #c1
          ...             [  1.,   2.,   3.,   4.]]) #c2
 
+    n_jobs : int, optional
+        Number of threads assigning codes to the observations, each for a
+        block of rows, when `obs` and `code_book` are float32 or float64
+        arrays.  If -1 is given, all CPU cores are used.  Default: 1.
+
     Returns
     -------
     code : ndarray
@@ -191,15 +199,17 @@ def vq(obs, code_book):
     (array([1, 1, 0],'i'), array([ 0.43588989,  0.73484692,  0.83066239]))
 
     """
+    if n_jobs == -1:
+        n_jobs = cpu_count()
+    elif n_jobs < 1:
+        raise ValueError("n_jobs must be a positive integer or -1")
     try:
         from . import _vq
         ct = common_type(obs, code_book)
-        c_obs = obs.astype(ct)
-        c_code_book = code_book.astype(ct)
-        if ct is single:
-            results = _vq.vq(c_obs, c_code_book)
-        elif ct is double:
-            results = _vq.vq(c_obs, c_code_book)
+        c_obs = np.asarray(obs, dtype=ct)
+        c_code_book = np.asarray(code_book, dtype=ct)
+        if ct is single or ct is double:
+            results = _vq_threads(_vq.vq, c_obs, c_code_book, n_jobs)
         else:
             results = py_vq(obs, code_book)
     except ImportError:
@@ -207,6 +217,27 @@ def vq(obs, code_book):
     return results
 
 
+def _vq_threads(func, obs, code_book, n_jobs):
+    """Call func(obs, code_book), the compiled vq, in n_jobs threads, each
+    for a block of rows of obs, which it computes without the GIL."""
+    n = obs.shape[0]
+    if n_jobs == 1 or n < 2:
+        return func(obs, code_book)
+    # slices of the rows of a contiguous array are contiguous, and so are
+    # not copied again by func
+    obs = np.ascontiguousarray(obs)
+    code = np.empty(n, dtype=np.intp)
+    dist = np.empty(n, dtype=obs.dtype)
+
+    def worker(start, stop):
+        code[start:stop], dist[start:stop] = func(obs[start:stop], code_book)
+
+    size = -(-n // n_jobs)
+    run_threads(worker, [(start, min(start + size, n))
+                          for start in range(0, n, size)])
+    return code, dist
+
+
 def py_vq(obs, code_book):
     """ Python version of vq algorithm.
 
@@ -259,12 +290,27 @@ def py_vq(obs, code_book):
                          "number of features (eg columns)""" %
                          (code_book.shape[1], d))
 
+    return _py_vq_blocks(obs, code_book)
+
+
+def _py_vq_blocks(obs, code_book, block_size=2**20):
+    """vq of rank 2 arrays, for blocks of rows of obs whose squared
+    distances to the codes hold in about block_size items."""
+    n = obs.shape[0]
+    nc = code_book.shape[0]
     code = zeros(n, dtype=int)
     min_dist = zeros(n)
-    for i in range(n):
-        dist = np.sum((obs[i] - code_book) ** 2, 1)
-        code[i] = argmin(dist)
-        min_dist[i] = dist[code[i]]
+    rows = max(1, block_size // max(nc, 1))
+    for start in range(0, n, rows):
+        block = obs[start:start + rows]
+        # squared distances, summed one feature at a time so that no
+        # block by codes by features temporary is needed
+        dist = zeros((block.shape[0], nc))
+        for j in range(obs.shape[1]):
+            diff = block[:, j, newaxis] - code_book[newaxis, :, j]
+            dist += diff * diff
+        code[start:start + rows] = argmin(dist, 1)
+        min_dist[start:start + rows] = np.min(dist, 1)
 
     return code, sqrt(min_dist)
 
@@ -327,10 +373,10 @@ def py_vq2(obs, code_book):
 
     Notes
     -----
-    This could be faster when number of codebooks is small, but it
-    becomes a real memory hog when codebook is large. It requires
-    N by M by O storage where N=number of obs, M = number of
-    features, and O = number of codes.
+    The distances are computed for blocks of observations, one feature at
+    a time, so that the memory used is bounded by the size of a block of
+    distances instead of N by M by O storage where N=number of obs,
+    M = number of features, and O = number of codes.
 
     """
     d = shape(obs)[1]
@@ -341,14 +387,7 @@ def py_vq2(obs, code_book):
             code book(%d) and obs(%d) should have the same
             number of features (eg columns)""" % (code_book.shape[1], d))
 
-    diff = obs[newaxis, :, :] - code_book[:,newaxis,:]
-    dist = sqrt(np.sum(diff * diff, -1))
-    code = argmin(dist, 0)
-    min_dist = minimum.reduce(dist, 0)  # the next line I think is equivalent
-                                      #  - and should be faster
-    # min_dist = choose(code,dist) # but in practice, didn't seem to make
-                                  # much difference.
-    return code, min_dist
+    return _py_vq_blocks(obs, code_book)
 
 
 def _kmeans(obs, guess, thresh=1e-5):
@@ -592,7 +631,53 @@ def _krandinit(data, k):
     else:
         return init_rankn(data)
 
-_valid_init_meth = {'random': _krandinit, 'points': _kpoints}
+
+def _kpp(data, k):
+    """Picks k points in data with the k-means++ seeding.
+
+    The first point is picked at random, and each following one with a
+    probability proportional to its squared distance to the nearest point
+    already picked.
+
+    Parameters
+    ----------
+    data : ndarray
+        Expect a rank 1 or 2 array. Rank 1 are assumed to describe one
+        dimensional data, rank 2 multidimensional data, in which case one
+        row is one observation.
+    k : int
+        Number of samples to generate.
+
+    References
+    ----------
+    .. [1] D. Arthur and S. Vassilvitskii, "k-means++: the advantages of
+       careful seeding", Proceedings of the Eighteenth Annual ACM-SIAM
+       Symposium on Discrete Algorithms, 2007.
+
+    """
+    x = np.atleast_2d(data.T).T
+    n = x.shape[0]
+    norms = np.einsum('ij,ij->i', x, x)
+
+    idx = np.empty(k, dtype=np.intp)
+    idx[0] = randint(n)
+    dist = norms - 2 * np.dot(x, x[idx[0]]) + norms[idx[0]]
+    np.maximum(dist, 0, out=dist)
+    for i in range(1, k):
+        cumdist = np.cumsum(dist)
+        if cumdist[-1] > 0:
+            idx[i] = np.searchsorted(cumdist, np.random.rand() * cumdist[-1],
+                                     side='right')
+        else:
+            # All the points coincide with the ones already picked
+            idx[i] = randint(n)
+        d = norms - 2 * np.dot(x, x[idx[i]]) + norms[idx[i]]
+        np.minimum(dist, d, out=dist)
+        np.maximum(dist, 0, out=dist)
+
+    return data[idx].copy()
+
+_valid_init_meth = {'random': _krandinit, 'points': _kpoints, '++': _kpp}
 
 
 def _missing_warn():
@@ -636,7 +721,7 @@ def kmeans2(data, k, iter=10, thresh=1e-5, minit='random',
         (not used yet)
     minit : string
         Method for initialization. Available methods are 'random',
-        'points', 'uniform', and 'matrix':
+        'points', '++', 'uniform', and 'matrix':
 
         'random': generate k centroids from a Gaussian with mean and
         variance estimated from the data.
@@ -644,6 +729,11 @@ def kmeans2(data, k, iter=10, thresh=1e-5, minit='random',
         'points': choose k observations (rows) at random from data for
         the initial centroids.
 
+        '++': choose k observations from data with the k-means++
+        seeding: each observation is chosen with a probability
+        proportional to its squared distance to the nearest centroid
+        chosen before it.
+
         'uniform': generate k observations from the data from a uniform
         distribution defined by the data set (unsupported).
 
@@ -717,6 +807,25 @@ def _kmeans2(data, code, niter, nc, missing):
     Run k-means with a given initial codebook.
 
     """
+    ct = common_type(data, code)
+    if ct is single or ct is double:
+        try:
+            from . import _vq
+        except ImportError:
+            pass
+        else:
+            # The compiled version bounds the distances to the centroids
+            # with the triangle inequality (Hamerly's algorithm), so that
+            # most of them need not be computed after the first iterations,
+            # and stops once the labels do not change anymore.
+            code = np.array(code, dtype=ct)
+            label, nempty = _vq.kmeans(np.asarray(data, dtype=ct), code,
+                                       int(niter))
+            # once for every centroid left empty by an iteration, as below
+            for i in range(nempty):
+                missing()
+            return code, label
+
     for i in range(niter):
         # Compute the nearest neighbour for each obs
         # using the current code book
@@ -731,6 +840,168 @@ def _kmeans2(data, code, niter, nc, missing):
 
     return code, label
 
+
+class MiniBatchKMeans(object):
+    """
+    Incremental k-means on a stream of observations.
+
+    The observations are fed in chunks to `partial_fit`, which assigns
+    each of them to its nearest centroid with `vq` and moves the
+    centroids to the mean of all the observations assigned to them so
+    far.  Only the code book and the number of observations of each
+    centroid are kept, so the memory used does not grow with the length
+    of the stream.
+
+    Parameters
+    ----------
+    k : int or ndarray
+        The number of centroids, or a 'k' by 'N' array (or a length 'k'
+        array for one-dimensional data) of initial centroids.  A length
+        'N' array fed with 'M' by 'N' observations is a single centroid.
+    minit : string, optional
+        Method used to pick the initial centroids from the first chunk
+        when `k` is an int: 'random', 'points' or '++', as in `kmeans2`.
+        Default is '++'.
+
+    Attributes
+    ----------
+    code_book : ndarray
+        The current centroids, or None before the first call to
+        `partial_fit` when `k` is an int.
+    counts : ndarray
+        counts[i] is the number of observations assigned so far to the
+        i'th centroid.
+
+    See Also
+    --------
+    kmeans2 : k-means on observations that fit in memory
+
+    Notes
+    -----
+    Each chunk is one step of the mini-batch k-means of Sculley [1]_
+    with a per-centroid learning rate of one over its count.
+
+    References
+    ----------
+    .. [1] D. Sculley, "Web-scale k-means clustering", Proceedings of the
+       19th international conference on World Wide Web, 2010.
+
+    Examples
+    --------
+    >>> from scipy.cluster.vq import MiniBatchKMeans
+    >>> km = MiniBatchKMeans(2)
+    >>> for i in range(10):
+    ...     chunk = np.concatenate([np.random.randn(100, 2),
+    ...                             np.random.randn(100, 2) + 10])
+    ...     km = km.partial_fit(chunk)
+    >>> label = km.predict(np.array([[0., 0.], [10., 10.]]))
+
+    """
+    def __init__(self, k, minit='++'):
+        if np.ndim(k) > 0:
+            k = np.asarray(k)
+            if k.ndim > 2 or k.shape[0] == 0:
+                raise ValueError("k is not an int and not a 1-D or 2-D "
+                                 "array of centroids")
+            self.code_book = k.astype(common_type(k))
+            self.k = self.code_book.shape[0]
+        else:
+            self.code_book = None
+            self.k = int(k)
+            if self.k < 1:
+                raise ValueError("MiniBatchKMeans for 0 clusters ? "
+                                 "(k was %s)" % str(k))
+        if minit not in _valid_init_meth:
+            raise ValueError("unknown init method %s" % str(minit))
+        self.minit = minit
+        self.counts = np.zeros(self.k)
+
+    def partial_fit(self, obs):
+        """
+        Update the centroids with a chunk of observations.
+
+        Parameters
+        ----------
+        obs : ndarray
+            A 'M' by 'N' array of 'M' observations in 'N' dimensions or a
+            length 'M' array of 'M' one-dimensional observations.
+
+        Returns
+        -------
+        self : MiniBatchKMeans
+            The updated object.
+
+        """
+        obs = np.asarray(obs)
+        if obs.ndim > 2:
+            raise ValueError("Input of rank > 2 not supported")
+        if obs.shape[0] == 0:
+            return self
+        if self.code_book is None:
+            if obs.shape[0] < self.k:
+                raise ValueError("the first chunk must have at least k "
+                                 "observations")
+            init = _valid_init_meth[self.minit]
+            self.code_book = np.array(init(obs, self.k),
+                                      dtype=common_type(obs))
+        self._match_rank(obs)
+
+        label = vq(obs, self.code_book)[0]
+        count = np.bincount(label, minlength=self.k).astype(double)
+        total = self.counts + count
+        seen = count > 0
+        # Running means: the centroids move towards the mean of their new
+        # observations, weighted by their share of all the observations.
+        if obs.ndim == 1:
+            sums = np.bincount(label, weights=obs, minlength=self.k)
+            self.code_book[seen] = ((self.counts * self.code_book +
+                                     sums)[seen] / total[seen])
+        else:
+            sums = np.empty((self.k, obs.shape[1]))
+            for j in range(obs.shape[1]):
+                sums[:, j] = np.bincount(label, weights=obs[:, j],
+                                         minlength=self.k)
+            self.code_book[seen] = ((self.counts[:, newaxis] * self.code_book +
+                                     sums)[seen] / total[seen, newaxis])
+        self.counts = total
+        return self
+
+    def predict(self, obs):
+        """
+        Assign each observation of a chunk to its nearest centroid.
+
+        Parameters
+        ----------
+        obs : ndarray
+            A 'M' by 'N' array of 'M' observations in 'N' dimensions or a
+            length 'M' array of 'M' one-dimensional observations.
+
+        Returns
+        -------
+        label : ndarray
+            label[i] is the index of the centroid the i'th observation is
+            closest to.
+
+        """
+        if self.code_book is None:
+            raise ValueError("partial_fit must be called before predict")
+        obs = np.asarray(obs)
+        self._match_rank(obs)
+        return vq(obs, self.code_book)[0]
+
+    def _match_rank(self, obs):
+        # A 1-D code book given for 2-D observations is one centroid.
+        if (self.code_book.ndim == 1 and obs.ndim == 2 and
+                self.counts.sum() == 0 and
+                len(self.code_book) == obs.shape[1]):
+            self.code_book = self.code_book[newaxis, :]
+            self.k = 1
+            self.counts = np.zeros(1)
+        if self.code_book.ndim != obs.ndim:
+            raise ValueError("obs and the code book should have the same "
+                             "rank")
+
+
 if __name__ == '__main__':
     pass
     # import _vq
@@ -0,0 +1,46 @@
+""" Helpers for running work in a few Python threads
+
+The compiled routines that use these release the GIL, so the threads
+run in parallel.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import threading
+
+
+def cpu_count():
+    """Return the number of CPUs, or 1 if it cannot be determined."""
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+
+
+def run_threads(func, argslist):
+    """Call func(*args) for every args in argslist, each in its own
+    thread, and re-raise the first exception raised by any of them.
+
+    A single args is run in the calling thread.
+    """
+    if len(argslist) == 1:
+        func(*argslist[0])
+        return
+    errors = []
+
+    def target(args):
+        try:
+            func(*args)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=target, args=(args,))
+               for args in argslist]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,40 @@
+""" Test for the thread helpers
+"""
+from __future__ import division, print_function, absolute_import
+
+import threading
+
+from scipy.lib._threads import cpu_count, run_threads
+
+from nose.tools import assert_equal, assert_true, raises
+
+
+def test_cpu_count():
+    assert_true(cpu_count() >= 1)
+
+
+def test_run_threads():
+    results = {}
+    lock = threading.Lock()
+
+    def func(k, x):
+        with lock:
+            results[k] = (x, threading.current_thread())
+
+    run_threads(func, [(k, 2 * k) for k in range(5)])
+    assert_equal(sorted(results), list(range(5)))
+    assert_equal([results[k][0] for k in range(5)], [0, 2, 4, 6, 8])
+
+    # a single call runs in this thread
+    results.clear()
+    run_threads(func, [(0, 1)])
+    assert_true(results[0][1] is threading.current_thread())
+
+
+@raises(ZeroDivisionError)
+def test_run_threads_error():
+    def func(k):
+        if k == 3:
+            1 // 0
+
+    run_threads(func, [(k,) for k in range(5)])
@@ -61,6 +61,14 @@ Identifying sparse matrices:
    isspmatrix_coo
    isspmatrix_dia
 
+Parallelism:
+
+.. autosummary::
+   :toctree: generated/
+
+   set_num_threads - Set the number of threads of sparse matrix products
+   get_num_threads - Number of threads of sparse matrix products
+
 Submodules
 ----------
 
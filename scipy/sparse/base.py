@@ -2,7 +2,8 @@
 from __future__ import division, print_function, absolute_import
 
 __all__ = ['spmatrix', 'isspmatrix', 'issparse',
-        'SparseWarning','SparseEfficiencyWarning']
+        'SparseWarning','SparseEfficiencyWarning',
+        'set_num_threads', 'get_num_threads']
 
 import sys
 from warnings import warn
@@ -10,6 +11,7 @@ from warnings import warn
 import numpy as np
 
 from scipy.lib.six.moves import xrange
+from scipy.lib._threads import cpu_count
 from .sputils import isdense, isscalarlike, isintlike
 
 
@@ -51,6 +53,48 @@ _formats = {'csc':[0, "Compressed Sparse Column"],
 
 MAXPRINT = 50
 
+# number of threads of the products of compressed matrices
+_NUM_THREADS = 1
+
+
+def set_num_threads(n):
+    """Set the number of threads computing sparse matrix products.
+
+    The products of CSR and CSC matrices with dense vectors and blocks of
+    vectors are split in this number of parts, of about the same number
+    of nonzeros, which are computed without the GIL in as many threads.
+
+    Parameters
+    ----------
+    n : int
+        Number of threads.  If -1 is given, all CPU cores are used.
+        The default is 1.
+
+    See Also
+    --------
+    get_num_threads
+
+    """
+    global _NUM_THREADS
+    n = int(n)
+    if n == -1:
+        n = cpu_count()
+    elif n < 1:
+        raise ValueError("the number of threads must be a positive integer "
+                         "or -1")
+    _NUM_THREADS = n
+
+
+def get_num_threads():
+    """Return the number of threads computing sparse matrix products.
+
+    See Also
+    --------
+    set_num_threads
+
+    """
+    return _NUM_THREADS
+
 
 class spmatrix(object):
     """ This class provides a base class for all sparse matrices.  It
@@ -227,6 +271,43 @@ class spmatrix(object):
     def dot(self, other):
         return self * other
 
+    def masked_dot(self, other, mask):
+        """Matrix product with other, computed only at the nonzero
+        entries of mask.
+
+        Parameters
+        ----------
+        other : sparse matrix or array_like
+            The right operand, with as many rows as self has columns.
+        mask : sparse matrix or array_like
+            The entries of the product to compute, with the shape of the
+            product.
+
+        Returns
+        -------
+        C : sparse matrix
+            The entries of ``self * other`` at the nonzero entries of
+            mask, and no others.  C keeps the sparsity structure of mask
+            even where the product is zero.
+
+        Notes
+        -----
+        Only the products of entries of self and other that contribute to
+        the nonzero entries of mask are computed, which saves most of the
+        work when mask is much sparser than the product, as in triangle
+        counting ``A.masked_dot(A, A)`` of a graph adjacency matrix A.
+
+        Examples
+        --------
+        >>> from scipy.sparse import csr_matrix
+        >>> A = csr_matrix([[1, 2], [0, 3]])
+        >>> A.masked_dot(A, [[0, 1], [1, 0]]).todense()
+        matrix([[0, 8],
+                [0, 0]])
+
+        """
+        return self.tocsr().masked_dot(other, mask)
+
     def __eq__(self, other):
         return self.tocsr().__eq__(other)
 
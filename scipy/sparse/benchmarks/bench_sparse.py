@@ -213,6 +213,93 @@ class BenchmarkSparse(TestCase):
 
             print(fmt % (A.format,name,shape,A.nnz,MFLOPs))
 
+    def bench_matvec_threads(self):
+        matrices = []
+        matrices.append(('Poisson5pt', poisson2d(1000,format='csr')))
+        matrices.append(('Poisson5pt', poisson2d(1000,format='csc')))
+        matrices.append(('Random', random_sparse(10**5,10**5,50)))
+        matrices.append(('Random', random_sparse(10**5,10**5,50).tocsc()))
+
+        n_threads = [1, 2, 4, 8]
+
+        print()
+        print('          Sparse Matrix Vector Product with Threads')
+        print('==================================================================')
+        print(' type |    name      |    nnz   | n_vecs | threads |  MFLOPs  ')
+        print('------------------------------------------------------------------')
+        fmt = '  %3s | %12s | %8d | %6d | %7d |  %6.1f '
+
+        default = sparse.get_num_threads()
+        try:
+            for name,A in matrices:
+                for n_vecs in [1, 10]:
+                    if n_vecs == 1:
+                        x = ones(A.shape[1],dtype=A.dtype)
+                    else:
+                        x = ones((A.shape[1],n_vecs),dtype=A.dtype)
+
+                    for n in n_threads:
+                        sparse.set_num_threads(n)
+                        y = A*x  # warmup
+
+                        # wall clock time, as the threads add CPU time
+                        start = time.time()
+                        iter = 0
+                        while iter < 5 or time.time() < start + 1:
+                            y = A*x
+                            iter += 1
+                        end = time.time()
+
+                        del y
+
+                        MFLOPs = (2*n_vecs*A.nnz*iter/(end-start))/float(1e6)
+
+                        print(fmt % (A.format,name.center(12),A.nnz,n_vecs,n,MFLOPs))
+        finally:
+            sparse.set_num_threads(default)
+
+    def bench_matmat_threads(self):
+        matrices = []
+        matrices.append(('Poisson5pt', poisson2d(300,format='csr')))
+        matrices.append(('Poisson5pt', poisson2d(300,format='csc')))
+        matrices.append(('Random', random_sparse(10**5,10**5,10)))
+        matrices.append(('Random', random_sparse(10**5,10**5,10).tocsc()))
+
+        n_threads = [1, 2, 4, 8]
+
+        print()
+        print('          Sparse Matrix Matrix Product with Threads')
+        print('==================================================================')
+        print(' type |    name      |    nnz   |  product | threads |  time    ')
+        print('------------------------------------------------------------------')
+        fmt = '  %3s | %12s | %8d | %8s | %7d | %6.4fs '
+
+        default = sparse.get_num_threads()
+        try:
+            for name,A in matrices:
+                B = A.T.asformat(A.format)
+                for product in ['A*A.T', 'masked']:
+                    for n in n_threads:
+                        sparse.set_num_threads(n)
+
+                        # wall clock time, as the threads add CPU time
+                        start = time.time()
+                        iter = 0
+                        while iter < 3 or time.time() < start + 1:
+                            if product == 'masked':
+                                C = A.masked_dot(A, A)
+                            else:
+                                C = A*B
+                            iter += 1
+                        end = time.time()
+
+                        del C
+
+                        print(fmt % (A.format,name.center(12),A.nnz,product,n,
+                                     (end-start)/float(iter)))
+        finally:
+            sparse.set_num_threads(default)
+
     def bench_construction(self):
         """build matrices by inserting single values"""
         matrices = []
@@ -13,7 +13,7 @@ import numpy as np
 from .data import _data_matrix, _minmax_mixin
 from .compressed import _cs_matrix
 from .base import isspmatrix, _formats
-from .sputils import isshape, getdtype, to_native, upcast
+from .sputils import isshape, getdtype, to_native, upcast, get_index_dtype
 from . import sparsetools
 from .sparsetools import bsr_matvec, bsr_matvecs, csr_matmat_pass1, \
                         bsr_matmat_pass2, bsr_transpose, bsr_sort_indices
@@ -138,13 +138,14 @@ class bsr_matrix(_cs_matrix, _minmax_mixin):
                         raise ValueError('invalid blocksize=%s' % blocksize)
                     blocksize = tuple(blocksize)
                 self.data = np.zeros((0,) + blocksize, getdtype(dtype, default=float))
-                self.indices = np.zeros(0, dtype=np.intc)
 
                 R,C = blocksize
                 if (M % R) != 0 or (N % C) != 0:
                     raise ValueError('shape must be multiple of blocksize')
 
-                self.indptr = np.zeros(M//R + 1, dtype=np.intc)
+                idx_dtype = get_index_dtype(maxval=max(M//R, N//C, R, C))
+                self.indices = np.zeros(0, dtype=idx_dtype)
+                self.indptr = np.zeros(M//R + 1, dtype=idx_dtype)
 
             elif len(arg1) == 2:
                 # (data,(row,col)) format
@@ -154,8 +155,15 @@ class bsr_matrix(_cs_matrix, _minmax_mixin):
             elif len(arg1) == 3:
                 # (data,indices,indptr) format
                 (data, indices, indptr) = arg1
-                self.indices = np.array(indices, copy=copy)
-                self.indptr = np.array(indptr, copy=copy)
+                # use 32-bit indices whenever the values fit
+                maxval = None
+                if shape is not None:
+                    maxval = max(shape)
+                idx_dtype = get_index_dtype((indices, indptr),
+                                            maxval=maxval,
+                                            check_contents=True)
+                self.indices = np.array(indices, copy=copy, dtype=idx_dtype)
+                self.indptr = np.array(indptr, copy=copy, dtype=idx_dtype)
                 self.data = np.array(data, copy=copy, dtype=getdtype(dtype, data))
             else:
                 raise ValueError('unrecognized bsr_matrix constructor usage')
@@ -216,9 +224,10 @@ class bsr_matrix(_cs_matrix, _minmax_mixin):
             warn("indices array has non-integer dtype (%s)"
                     % self.indices.dtype.name)
 
-        # only support 32-bit ints for now
-        self.indptr = np.asarray(self.indptr, np.intc)
-        self.indices = np.asarray(self.indices, np.intc)
+        # 32-bit or 64-bit indices, the same for both arrays
+        idx_dtype = get_index_dtype((self.indptr, self.indices))
+        self.indptr = np.asarray(self.indptr, dtype=idx_dtype)
+        self.indices = np.asarray(self.indices, dtype=idx_dtype)
         self.data = to_native(self.data)
 
         # check array shapes
@@ -337,8 +346,6 @@ class bsr_matrix(_cs_matrix, _minmax_mixin):
         M, K1 = self.shape
         K2, N = other.shape
 
-        indptr = np.empty_like(self.indptr)
-
         R,n = self.blocksize
 
         # convert to this format
@@ -354,18 +361,33 @@ class bsr_matrix(_cs_matrix, _minmax_mixin):
         else:
             other = other.tobsr(blocksize=(n,C))
 
+        idx_dtype = get_index_dtype((self.indptr, self.indices,
+                                     other.indptr, other.indices),
+                                    maxval=(M//R)*(N//C))
+        indptr = np.empty(self.indptr.shape, dtype=idx_dtype)
+
         csr_matmat_pass1(M//R, N//C,
-                self.indptr, self.indices,
-                other.indptr, other.indices,
+                np.asarray(self.indptr, dtype=idx_dtype),
+                np.asarray(self.indices, dtype=idx_dtype),
+                np.asarray(other.indptr, dtype=idx_dtype),
+                np.asarray(other.indices, dtype=idx_dtype),
                 indptr)
 
         bnnz = indptr[-1]
-        indices = np.empty(bnnz, dtype=np.intc)
+        idx_dtype = get_index_dtype((self.indptr, self.indices,
+                                     other.indptr, other.indices),
+                                    maxval=bnnz)
+        indptr = np.asarray(indptr, dtype=idx_dtype)
+        indices = np.empty(bnnz, dtype=idx_dtype)
         data = np.empty(R*C*bnnz, dtype=upcast(self.dtype,other.dtype))
 
         bsr_matmat_pass2(M//R, N//C, R, C, n,
-                self.indptr, self.indices, np.ravel(self.data),
-                other.indptr, other.indices, np.ravel(other.data),
+                np.asarray(self.indptr, dtype=idx_dtype),
+                np.asarray(self.indices, dtype=idx_dtype),
+                np.ravel(self.data),
+                np.asarray(other.indptr, dtype=idx_dtype),
+                np.asarray(other.indices, dtype=idx_dtype),
+                np.ravel(other.data),
                 indptr, indices, data)
 
         data = data.reshape(-1,R,C)
@@ -514,8 +536,11 @@ class bsr_matrix(_cs_matrix, _minmax_mixin):
         R,C = self.blocksize
 
         max_bnnz = len(self.data) + len(other.data)
-        indptr = np.empty_like(self.indptr)
-        indices = np.empty(max_bnnz, dtype=np.intc)
+        idx_dtype = get_index_dtype((self.indptr, self.indices,
+                                     other.indptr, other.indices),
+                                    maxval=max_bnnz)
+        indptr = np.empty(self.indptr.shape, dtype=idx_dtype)
+        indices = np.empty(max_bnnz, dtype=idx_dtype)
 
         bool_ops = ['_ne_', '_lt_', '_gt_', '_le_', '_ge_']
         if op in bool_ops:
@@ -524,8 +549,12 @@ class bsr_matrix(_cs_matrix, _minmax_mixin):
             data = np.empty(R*C*max_bnnz, dtype=upcast(self.dtype,other.dtype))
 
         fn(self.shape[0]//R, self.shape[1]//C, R, C,
-                self.indptr, self.indices, np.ravel(self.data),
-                other.indptr, other.indices, np.ravel(other.data),
+                np.asarray(self.indptr, dtype=idx_dtype),
+                np.asarray(self.indices, dtype=idx_dtype),
+                np.ravel(self.data),
+                np.asarray(other.indptr, dtype=idx_dtype),
+                np.asarray(other.indices, dtype=idx_dtype),
+                np.ravel(other.data),
                 indptr, indices, data)
 
         actual_bnnz = indptr[-1]
@@ -7,13 +7,20 @@ from warnings import warn
 
 import numpy as np
 from scipy.lib.six.moves import xrange
+from scipy.lib._threads import run_threads
 
-from .base import spmatrix, isspmatrix, SparseEfficiencyWarning
+from .base import spmatrix, isspmatrix, SparseEfficiencyWarning, \
+     get_num_threads
 from .data import _data_matrix, _minmax_mixin
 from .dia import dia_matrix
 from . import sparsetools
 from .sputils import upcast, upcast_char, to_native, isdense, isshape, \
-     getdtype, isscalarlike, isintlike, IndexMixin
+     getdtype, isscalarlike, isintlike, IndexMixin, get_index_dtype, \
+     _nnz_blocks
+
+# smallest number of nonzeros of a block of a product computed in its own
+# thread
+_MIN_THREAD_NNZ = 10000
 
 
 class _cs_matrix(_data_matrix, _minmax_mixin, IndexMixin):
@@ -35,9 +42,10 @@ class _cs_matrix(_data_matrix, _minmax_mixin, IndexMixin):
                 # create empty matrix
                 self.shape = arg1   # spmatrix checks for errors here
                 M, N = self.shape
+                idx_dtype = get_index_dtype(maxval=max(M,N))
                 self.data = np.zeros(0, getdtype(dtype, default=float))
-                self.indices = np.zeros(0, np.intc)
-                self.indptr = np.zeros(self._swap((M,N))[0] + 1, dtype=np.intc)
+                self.indices = np.zeros(0, idx_dtype)
+                self.indptr = np.zeros(self._swap((M,N))[0] + 1, dtype=idx_dtype)
             else:
                 if len(arg1) == 2:
                     # (data, ij) format
@@ -47,8 +55,15 @@ class _cs_matrix(_data_matrix, _minmax_mixin, IndexMixin):
                 elif len(arg1) == 3:
                     # (data, indices, indptr) format
                     (data, indices, indptr) = arg1
-                    self.indices = np.array(indices, copy=copy)
-                    self.indptr = np.array(indptr, copy=copy)
+                    # use 32-bit indices whenever the values fit
+                    maxval = None
+                    if shape is not None:
+                        maxval = max(shape)
+                    idx_dtype = get_index_dtype((indices, indptr),
+                                                maxval=maxval,
+                                                check_contents=True)
+                    self.indices = np.array(indices, copy=copy, dtype=idx_dtype)
+                    self.indptr = np.array(indptr, copy=copy, dtype=idx_dtype)
                     self.data = np.array(data, copy=copy, dtype=getdtype(dtype, data))
                 else:
                     raise ValueError("unrecognized %s_matrix constructor usage" %
@@ -121,9 +136,10 @@ class _cs_matrix(_data_matrix, _minmax_mixin, IndexMixin):
             warn("indices array has non-integer dtype (%s)"
                     % self.indices.dtype.name)
 
-        # only support 32-bit ints for now
-        self.indptr = np.asarray(self.indptr, dtype=np.intc)
-        self.indices = np.asarray(self.indices, dtype=np.intc)
+        # 32-bit or 64-bit indices, the same for both arrays
+        idx_dtype = get_index_dtype((self.indptr, self.indices))
+        self.indptr = np.asarray(self.indptr, dtype=idx_dtype)
+        self.indices = np.asarray(self.indices, dtype=idx_dtype)
         self.data = to_native(self.data)
 
         # check array shapes
@@ -486,7 +502,13 @@ class _cs_matrix(_data_matrix, _minmax_mixin, IndexMixin):
 
         # csr_matvec or csc_matvec
         fn = getattr(sparsetools,self.format + '_matvec')
-        fn(M, N, self.indptr, self.indices, self.data, other, result)
+        blocks = self._product_blocks(other, result)
+        if blocks is None:
+            fn(M, N, self.indptr, self.indices, self.data, other, result)
+        else:
+            self._mul_blocks(blocks, np.ascontiguousarray(other), result,
+                    lambda m, n, indptr, x, y:
+                        fn(m, n, indptr, self.indices, self.data, x, y))
 
         return result
 
@@ -499,34 +521,188 @@ class _cs_matrix(_data_matrix, _minmax_mixin, IndexMixin):
 
         # csr_matvecs or csc_matvecs
         fn = getattr(sparsetools,self.format + '_matvecs')
-        fn(M, N, n_vecs, self.indptr, self.indices, self.data, other.ravel(), result.ravel())
+        blocks = self._product_blocks(other, result)
+        if blocks is None:
+            fn(M, N, n_vecs, self.indptr, self.indices, self.data, other.ravel(), result.ravel())
+        else:
+            self._mul_blocks(blocks, np.ascontiguousarray(other), result,
+                    lambda m, n, indptr, x, y:
+                        fn(m, n, n_vecs, indptr, self.indices, self.data,
+                           x.ravel(), y.ravel()))
 
         return result
 
+    def _product_blocks(self, other, result):
+        """Blocks of rows (CSR) or columns (CSC) of about the same number
+        of nonzeros, whose products with other are computed in separate
+        threads, or None to compute the product in the calling thread."""
+        n_threads = min(get_num_threads(), self.nnz // _MIN_THREAD_NNZ)
+        if n_threads < 2 or not (self.dtype == other.dtype == result.dtype):
+            return None
+        return _nnz_blocks(self.indptr, n_threads)
+
+    def _mul_blocks(self, blocks, other, result, fn):
+        """Compute result += self * other in a thread per block, where
+        fn(n_row, n_col, indptr, x, y) computes y += A*x for the compressed
+        matrix A whose major axis is cut to indptr."""
+        M,N = self.shape
+        if self.format == 'csr':
+            # each block of rows gives a block of rows of the result
+            def worker(start, stop):
+                fn(stop - start, N, self.indptr[start:stop + 1], other,
+                   result[start:stop])
+            run_threads(worker, blocks)
+        else:
+            # each block of columns adds to all the rows of the result,
+            # so that all but the first one need their own result
+            partial = [result] + [np.zeros_like(result) for b in blocks[1:]]
+
+            def worker(k, start, stop):
+                fn(M, stop - start, self.indptr[start:stop + 1],
+                   other[start:stop], partial[k])
+            run_threads(worker, [(k, start, stop)
+                                  for k, (start, stop) in enumerate(blocks)])
+            for y in partial[1:]:
+                result += y
+
+    def _matmat_blocks(self, other):
+        """Blocks of rows of self (CSR) or columns of other (CSC) that take
+        about the same number of multiplications in the product of self
+        and other, computed in separate threads, or None to compute the
+        product in the calling thread."""
+        if self.format == 'csr':
+            outer, inner = self, other
+        else:
+            outer, inner = other, self
+        n_threads = min(get_num_threads(), outer.nnz // _MIN_THREAD_NNZ)
+        if n_threads < 2:
+            return None
+        # the number of multiplications up to each row (CSR) or column
+        # (CSC) of the product
+        work = np.cumsum(np.diff(inner.indptr)[outer.indices])
+        work = np.r_[0, work][outer.indptr]
+        return _nnz_blocks(work, n_threads)
+
+    def _matmat_cut(self, shape, start, stop, indptr, other_indptr):
+        """The shape of the product of self and other and the index
+        pointers of self and other, cut to the rows start:stop of self
+        (CSR) or to the columns start:stop of other (CSC)."""
+        M, N = shape
+        if self.format == 'csr':
+            return stop - start, N, indptr[start:stop + 1], other_indptr
+        else:
+            return M, stop - start, indptr, other_indptr[start:stop + 1]
+
     def _mul_sparse_matrix(self, other):
         M, K1 = self.shape
         K2, N = other.shape
 
         major_axis = self._swap((M,N))[0]
-        indptr = np.empty(major_axis + 1, dtype=np.intc)
-
         other = self.__class__(other)  # convert to this format
+
+        # blocks of rows (CSR) or columns (CSC) of the result, each one
+        # computed in its own thread, in two passes: the first one counts
+        # the nonzeros of the block, the second one computes them
+        blocks = self._matmat_blocks(other)
+        if blocks is None:
+            blocks = [(0, major_axis)]
+
+        arrays = (self.indptr, self.indices, other.indptr, other.indices)
+        idx_dtype = get_index_dtype(arrays, maxval=M*N)
+        Ap, Aj, Bp, Bj = [np.asarray(x, dtype=idx_dtype) for x in arrays]
+        indptrs = [np.empty(stop - start + 1, dtype=idx_dtype)
+                   for start, stop in blocks]
+
         fn = getattr(sparsetools, self.format + '_matmat_pass1')
-        fn(M, N, self.indptr, self.indices,
-                  other.indptr, other.indices,
-                  indptr)
 
-        nnz = indptr[-1]
-        indices = np.empty(nnz, dtype=np.intc)
-        data = np.empty(nnz, dtype=upcast(self.dtype,other.dtype))
+        def pass1(k, start, stop):
+            m, n, Ap_k, Bp_k = self._matmat_cut((M,N), start, stop, Ap, Bp)
+            fn(m, n, Ap_k, Aj, Bp_k, Bj, indptrs[k])
+        run_threads(pass1, [(k, start, stop)
+                             for k, (start, stop) in enumerate(blocks)])
+
+        # the number of nonzeros is known now, so that the result
+        # may need only 32-bit indices after all
+        nnz = sum([int(indptr[-1]) for indptr in indptrs])
+        idx_dtype = get_index_dtype(arrays, maxval=nnz)
+        Ap, Aj, Bp, Bj = [np.asarray(x, dtype=idx_dtype) for x in arrays]
+        indptrs = [np.asarray(indptr, dtype=idx_dtype) for indptr in indptrs]
+        indices = [np.empty(indptr[-1], dtype=idx_dtype) for indptr in indptrs]
+        dtype = upcast(self.dtype, other.dtype)
+        Ax = np.asarray(self.data, dtype=dtype)
+        Bx = np.asarray(other.data, dtype=dtype)
+        data = [np.empty(indptr[-1], dtype=dtype) for indptr in indptrs]
 
         fn = getattr(sparsetools, self.format + '_matmat_pass2')
-        fn(M, N, self.indptr, self.indices, self.data,
-                  other.indptr, other.indices, other.data,
-                  indptr, indices, data)
+
+        def pass2(k, start, stop):
+            m, n, Ap_k, Bp_k = self._matmat_cut((M,N), start, stop, Ap, Bp)
+            fn(m, n, Ap_k, Aj, Ax, Bp_k, Bj, Bx,
+               indptrs[k], indices[k], data[k])
+        run_threads(pass2, [(k, start, stop)
+                             for k, (start, stop) in enumerate(blocks)])
+
+        if len(blocks) == 1:
+            indptr, indices, data = indptrs[0], indices[0], data[0]
+        else:
+            # the second pass leaves out the entries that cancel out, so
+            # that the blocks may have less nonzeros than counted
+            nnzs = [indptr[-1] for indptr in indptrs]
+            offsets = np.cumsum([0] + nnzs[:-1])
+            indptr = np.concatenate([indptrs[0][:1]] +
+                                    [indptr[1:] + offset for indptr, offset
+                                     in zip(indptrs, offsets)])
+            indices = np.concatenate([Cj[:n] for Cj, n in zip(indices, nnzs)])
+            data = np.concatenate([Cx[:n] for Cx, n in zip(data, nnzs)])
 
         return self.__class__((data,indices,indptr),shape=(M,N))
 
+    def masked_dot(self, other, mask):
+        if self.format not in ('csr', 'csc'):
+            return spmatrix.masked_dot(self, other, mask)
+
+        M, K1 = self.shape
+        other = self.__class__(other)  # convert to this format
+        K2, N = other.shape
+        if K1 != K2:
+            raise ValueError('dimension mismatch')
+
+        # the nonzero entries of mask, each one once
+        mask = self.__class__(mask, copy=True)
+        if mask.shape != (M, N):
+            raise ValueError('mask has shape %s instead of %s'
+                             % (mask.shape, (M, N)))
+        mask.eliminate_zeros()
+        mask.sum_duplicates()
+
+        arrays = (self.indptr, self.indices, other.indptr, other.indices,
+                  mask.indptr, mask.indices)
+        idx_dtype = get_index_dtype(arrays)
+        Ap, Aj, Bp, Bj, Cp, Cj = [np.asarray(x, dtype=idx_dtype)
+                                  for x in arrays]
+        dtype = upcast(self.dtype, other.dtype)
+        Ax = np.asarray(self.data, dtype=dtype)
+        Bx = np.asarray(other.data, dtype=dtype)
+        data = np.empty(len(Cj), dtype=dtype)
+
+        # the blocks of rows (CSR) or columns (CSC) of the result write to
+        # separate parts of data, since the cut Cp still points into Cj
+        blocks = self._matmat_blocks(other)
+        if blocks is None:
+            blocks = [(0, self._swap((M,N))[0])]
+
+        fn = getattr(sparsetools, self.format + '_matmat_masked')
+
+        def worker(start, stop):
+            m, n, Ap_k, Bp_k = self._matmat_cut((M,N), start, stop, Ap, Bp)
+            fn(m, n, Ap_k, Aj, Ax, Bp_k, Bj, Bx,
+               Cp[start:stop + 1], Cj, data)
+        run_threads(worker, blocks)
+
+        return self.__class__((data, Cj, Cp), shape=(M,N))
+
+    masked_dot.__doc__ = spmatrix.masked_dot.__doc__
+
     def diagonal(self):
         """Returns the main diagonal of the matrix
         """
@@ -776,7 +952,7 @@ class _cs_matrix(_data_matrix, _minmax_mixin, IndexMixin):
             data = data.copy()
             minor_indices = minor_indices.copy()
 
-        major_indices = np.empty(len(minor_indices), dtype=np.intc)
+        major_indices = np.empty(len(minor_indices), dtype=minor_indices.dtype)
 
         sparsetools.expandptr(major_dim,self.indptr,major_indices)
 
@@ -898,8 +1074,11 @@ class _cs_matrix(_data_matrix, _minmax_mixin, IndexMixin):
         fn = getattr(sparsetools, self.format + op + self.format)
 
         maxnnz = self.nnz + other.nnz
-        indptr = np.empty_like(self.indptr)
-        indices = np.empty(maxnnz, dtype=np.intc)
+        idx_dtype = get_index_dtype((self.indptr, self.indices,
+                                     other.indptr, other.indices),
+                                    maxval=maxnnz)
+        indptr = np.empty(self.indptr.shape, dtype=idx_dtype)
+        indices = np.empty(maxnnz, dtype=idx_dtype)
 
         bool_ops = ['_ne_', '_lt_', '_gt_', '_le_', '_ge_']
         if op in bool_ops:
@@ -908,9 +1087,13 @@ class _cs_matrix(_data_matrix, _minmax_mixin, IndexMixin):
             data = np.empty(maxnnz, dtype=upcast(self.dtype, other.dtype))
 
         fn(self.shape[0], self.shape[1],
-                self.indptr, self.indices, self.data,
-                other.indptr, other.indices, other.data,
-                indptr, indices, data)
+           np.asarray(self.indptr, dtype=idx_dtype),
+           np.asarray(self.indices, dtype=idx_dtype),
+           self.data,
+           np.asarray(other.indptr, dtype=idx_dtype),
+           np.asarray(other.indices, dtype=idx_dtype),
+           other.data,
+           indptr, indices, data)
 
         actual_nnz = indptr[-1]
         indices = indices[:actual_nnz]
@@ -14,7 +14,8 @@ from scipy.lib.six.moves import zip as izip
 from .sparsetools import coo_tocsr, coo_todense, coo_matvec
 from .base import isspmatrix
 from .data import _data_matrix, _minmax_mixin
-from .sputils import upcast, upcast_char, to_native, isshape, getdtype, isintlike
+from .sputils import upcast, upcast_char, to_native, isshape, getdtype, \
+     isintlike, get_index_dtype
 
 
 class coo_matrix(_data_matrix, _minmax_mixin):
@@ -119,8 +120,9 @@ class coo_matrix(_data_matrix, _minmax_mixin):
             if isshape(arg1):
                 M, N = arg1
                 self.shape = (M,N)
-                self.row = np.array([], dtype=np.intc)
-                self.col = np.array([], dtype=np.intc)
+                idx_dtype = get_index_dtype(maxval=max(M, N))
+                self.row = np.array([], dtype=idx_dtype)
+                self.col = np.array([], dtype=idx_dtype)
                 self.data = np.array([], getdtype(dtype, default=float))
             else:
                 try:
@@ -134,21 +136,25 @@ class coo_matrix(_data_matrix, _minmax_mixin):
                 except TypeError:
                     raise TypeError('invalid input format')
 
-                self.row = np.array(ij[0], copy=copy, dtype=np.intc)
-                self.col = np.array(ij[1], copy=copy, dtype=np.intc)
-                self.data = np.array(obj, copy=copy)
+                row, col = np.asarray(ij[0]), np.asarray(ij[1])
 
                 if shape is None:
-                    if len(self.row) == 0 or len(self.col) == 0:
+                    if len(row) == 0 or len(col) == 0:
                         raise ValueError('cannot infer dimensions from zero sized index arrays')
-                    M = self.row.max() + 1
-                    N = self.col.max() + 1
+                    M = int(row.max()) + 1
+                    N = int(col.max()) + 1
                     self.shape = (M, N)
                 else:
                     # Use 2 steps to ensure shape has length 2.
                     M, N = shape
                     self.shape = (M, N)
 
+                # 32-bit indices unless the matrix is too large for them
+                idx_dtype = get_index_dtype(maxval=max(self.shape))
+                self.row = np.array(row, copy=copy, dtype=idx_dtype)
+                self.col = np.array(col, copy=copy, dtype=idx_dtype)
+                self.data = np.array(obj, copy=copy)
+
         elif arg1 is None:
             # Initialize an empty matrix.
             if not isinstance(shape, tuple) or not isintlike(shape[0]):
@@ -157,8 +163,9 @@ class coo_matrix(_data_matrix, _minmax_mixin):
                     'use coo_matrix( (M,N) ) instead', DeprecationWarning)
             self.shape = shape
             self.data = np.array([], getdtype(dtype, default=float))
-            self.row = np.array([], dtype=np.intc)
-            self.col = np.array([], dtype=np.intc)
+            idx_dtype = get_index_dtype(maxval=max(self.shape))
+            self.row = np.array([], dtype=idx_dtype)
+            self.col = np.array([], dtype=idx_dtype)
         else:
             if isspmatrix(arg1):
                 if isspmatrix_coo(arg1) and copy:
@@ -215,9 +222,10 @@ class coo_matrix(_data_matrix, _minmax_mixin):
             warn("col index array has non-integer dtype (%s) "
                     % self.col.dtype.name)
 
-        # only support 32-bit ints for now
-        self.row = np.asarray(self.row, dtype=np.intc)
-        self.col = np.asarray(self.col, dtype=np.intc)
+        # 32-bit indices unless the matrix is too large for them
+        idx_dtype = get_index_dtype(maxval=max(self.shape))
+        self.row = np.asarray(self.row, dtype=idx_dtype)
+        self.col = np.asarray(self.col, dtype=idx_dtype)
         self.data = to_native(self.data)
 
         if nnz > 0:
@@ -270,13 +278,16 @@ class coo_matrix(_data_matrix, _minmax_mixin):
             return csc_matrix(self.shape, dtype=self.dtype)
         else:
             M,N = self.shape
-            indptr = np.empty(N + 1, dtype=np.intc)
-            indices = np.empty(self.nnz, dtype=np.intc)
+            idx_dtype = get_index_dtype((self.col, self.row),
+                                        maxval=max(self.nnz, M))
+            indptr = np.empty(N + 1, dtype=idx_dtype)
+            indices = np.empty(self.nnz, dtype=idx_dtype)
             data = np.empty(self.nnz, dtype=upcast(self.dtype))
 
             coo_tocsr(N, M, self.nnz,
-                      self.col, self.row, self.data,
-                      indptr, indices, data)
+                      np.asarray(self.col, dtype=idx_dtype),
+                      np.asarray(self.row, dtype=idx_dtype),
+                      self.data, indptr, indices, data)
 
             A = csc_matrix((data, indices, indptr), shape=self.shape)
             A.sum_duplicates()
@@ -308,13 +319,16 @@ class coo_matrix(_data_matrix, _minmax_mixin):
             return csr_matrix(self.shape, dtype=self.dtype)
         else:
             M,N = self.shape
-            indptr = np.empty(M + 1, dtype=np.intc)
-            indices = np.empty(self.nnz, dtype=np.intc)
+            idx_dtype = get_index_dtype((self.row, self.col),
+                                        maxval=max(self.nnz, N))
+            indptr = np.empty(M + 1, dtype=idx_dtype)
+            indices = np.empty(self.nnz, dtype=idx_dtype)
             data = np.empty(self.nnz, dtype=upcast(self.dtype))
 
             coo_tocsr(M, N, self.nnz,
-                      self.row, self.col, self.data,
-                      indptr, indices, data)
+                      np.asarray(self.row, dtype=idx_dtype),
+                      np.asarray(self.col, dtype=idx_dtype),
+                      self.data, indptr, indices, data)
 
             A = csr_matrix((data, indices, indptr), shape=self.shape)
             A.sum_duplicates()
@@ -6,6 +6,20 @@ from ._tools import csgraph_to_dense, csgraph_from_dense,\
     csgraph_masked_from_dense, csgraph_from_masked
 
 DTYPE = np.float64
+ITYPE = np.int32
+
+
+def _with_itype_indices(csgraph):
+    """The graph routines use 32-bit indices: downcast the indices of a
+    csr graph with 64-bit indices, or raise ValueError if it is too large"""
+    if csgraph.indices.dtype == ITYPE and csgraph.indptr.dtype == ITYPE:
+        return csgraph
+    if max(csgraph.nnz, max(csgraph.shape)) > np.iinfo(ITYPE).max:
+        raise ValueError("graph is too large for the csgraph routines")
+    return csr_matrix((csgraph.data,
+                       np.asarray(csgraph.indices, dtype=ITYPE),
+                       np.asarray(csgraph.indptr, dtype=ITYPE)),
+                      shape=csgraph.shape)
 
 
 def validate_graph(csgraph, directed, dtype=DTYPE,
@@ -25,6 +39,7 @@ def validate_graph(csgraph, directed, dtype=DTYPE,
     if isspmatrix(csgraph):
         if csr_output:
             csgraph = csr_matrix(csgraph, dtype=DTYPE, copy=copy_if_sparse)
+            csgraph = _with_itype_indices(csgraph)
         else:
             csgraph = csgraph_to_dense(csgraph, null_value=null_value_out)
     elif np.ma.is_masked(csgraph):
@@ -13,7 +13,8 @@ from scipy.lib.six.moves import zip as izip, xrange
 from scipy.lib.six import iteritems
 
 from .base import spmatrix, isspmatrix
-from .sputils import isdense, getdtype, isshape, isintlike, isscalarlike, upcast
+from .sputils import isdense, getdtype, isshape, isintlike, isscalarlike, \
+     upcast, get_index_dtype
 
 try:
     from operator import isSequenceType as _is_sequence
@@ -524,7 +525,8 @@ class dok_matrix(spmatrix, dict):
             return coo_matrix(self.shape, dtype=self.dtype)
         else:
             data = np.asarray(_list(self.values()), dtype=self.dtype)
-            indices = np.asarray(_list(self.keys()), dtype=np.intc).T
+            idx_dtype = get_index_dtype(maxval=max(self.shape))
+            indices = np.asarray(_list(self.keys()), dtype=idx_dtype).T
             return coo_matrix((data,indices), shape=self.shape,
                               dtype=self.dtype)
 
@@ -2,6 +2,7 @@ from __future__ import division, print_function, absolute_import
 
 from warnings import warn
 
+import numpy as np
 from numpy import asarray, empty, where, squeeze, prod
 from scipy.sparse import isspmatrix_csc, isspmatrix_csr, isspmatrix, \
         SparseEfficiencyWarning, csc_matrix
@@ -23,6 +24,28 @@ useUmfpack = True
 __all__ = ['use_solver', 'spsolve', 'splu', 'spilu', 'factorized']
 
 
+def _get_umf_family(A):
+    """Get the umfpack family string for the data and index types of A."""
+    family = {'d': 'd', 'D': 'z'}[A.dtype.char]
+    if A.indices.dtype == np.intc:
+        return family + 'i'
+    return family + 'l'
+
+
+def _safe_downcast_indices(A):
+    """Return the indices and indptr of A as C ints, which SuperLU needs,
+    or raise ValueError if they do not fit."""
+    max_value = np.iinfo(np.intc).max
+    if A.indptr[-1] > max_value:  # indptr[-1] is max b/c indptr always sorted
+        raise ValueError("indptr values too large for SuperLU")
+    if max(A.shape) > max_value:  # only check large enough arrays
+        if np.any(A.indices > max_value):
+            raise ValueError("indices values too large for SuperLU")
+    indices = asarray(A.indices, dtype=np.intc)
+    indptr = asarray(A.indptr, dtype=np.intc)
+    return indices, indptr
+
+
 def use_solver(**kwargs):
     """
     Valid keyword arguments with defaults (other ignored)::
@@ -128,8 +151,7 @@ def spsolve(A, b, permc_spec=None, use_umfpack=True):
 
         b = asarray(b, dtype=A.dtype).reshape(-1)
 
-        family = {'d': 'di', 'D': 'zi'}
-        umf = umfpack.UmfpackContext(family[A.dtype.char])
+        umf = umfpack.UmfpackContext(_get_umf_family(A))
         x = umf.linsolve(umfpack.UMFPACK_A, A, b,
                          autoTranspose=True)
 
@@ -144,7 +166,8 @@ def spsolve(A, b, permc_spec=None, use_umfpack=True):
 
         b = asarray(b, dtype=A.dtype)
         options = dict(ColPerm=permc_spec)
-        x = _superlu.gssv(N, A.nnz, A.data, A.indices, A.indptr, b, flag,
+        indices, indptr = _safe_downcast_indices(A)
+        x = _superlu.gssv(N, A.nnz, A.data, indices, indptr, b, flag,
                           options=options)[0]
     else:
         # Cover the case where b is also a matrix
@@ -230,7 +253,8 @@ def splu(A, permc_spec=None, diag_pivot_thresh=None,
                     PanelSize=panel_size, Relax=relax)
     if options is not None:
         _options.update(options)
-    return _superlu.gstrf(N, A.nnz, A.data, A.indices, A.indptr,
+    indices, indptr = _safe_downcast_indices(A)
+    return _superlu.gstrf(N, A.nnz, A.data, indices, indptr,
                           ilu=False, options=_options)
 
 
@@ -297,7 +321,8 @@ def spilu(A, drop_tol=None, fill_factor=None, drop_rule=None, permc_spec=None,
                     PanelSize=panel_size, Relax=relax)
     if options is not None:
         _options.update(options)
-    return _superlu.gstrf(N, A.nnz, A.data, A.indices, A.indptr,
+    indices, indptr = _safe_downcast_indices(A)
+    return _superlu.gstrf(N, A.nnz, A.data, indices, indptr,
                           ilu=True, options=_options)
 
 
@@ -345,8 +370,7 @@ def factorized(A):
             raise ValueError("convert matrix data to double, please, using"
                   " .astype(), or set linsolve.useUmfpack = False")
 
-        family = {'d': 'di', 'D': 'zi'}
-        umf = umfpack.UmfpackContext(family[A.dtype.char])
+        umf = umfpack.UmfpackContext(_get_umf_family(A))
 
         # Make LU decomposition.
         umf.numeric(A)
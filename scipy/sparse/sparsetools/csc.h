@@ -135,6 +135,20 @@ void csc_matmat_pass2(const I n_row,
       	                    T Cx[])
 { csr_matmat_pass2(n_col, n_row, Bp, Bi, Bx, Ap, Ai, Ax, Cp, Ci, Cx); }
 
+template <class I, class T>
+void csc_matmat_masked(const I n_row,
+                       const I n_col,
+                       const I Ap[],
+                       const I Ai[],
+                       const T Ax[],
+                       const I Bp[],
+                       const I Bi[],
+                       const T Bx[],
+                       const I Cp[],
+                       const I Ci[],
+                             T Cx[])
+{ csr_matmat_masked(n_col, n_row, Bp, Bi, Bx, Ap, Ai, Ax, Cp, Ci, Cx); }
+
 template <class I, class T, class T2>
 void csc_ne_csc(const I n_row, const I n_col, 
                    const I Ap[], const I Ai[], const T Ax[],
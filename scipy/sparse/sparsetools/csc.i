@@ -7,6 +7,34 @@
 #include "csc.h"
 %}
 
+/* The products with dense vectors and sparse matrices do not touch
+ * Python objects, and may run in several threads at once. */
+%exception csc_matvec {
+    Py_BEGIN_ALLOW_THREADS
+    $action
+    Py_END_ALLOW_THREADS
+}
+%exception csc_matvecs {
+    Py_BEGIN_ALLOW_THREADS
+    $action
+    Py_END_ALLOW_THREADS
+}
+%exception csc_matmat_pass1 {
+    Py_BEGIN_ALLOW_THREADS
+    $action
+    Py_END_ALLOW_THREADS
+}
+%exception csc_matmat_pass2 {
+    Py_BEGIN_ALLOW_THREADS
+    $action
+    Py_END_ALLOW_THREADS
+}
+%exception csc_matmat_masked {
+    Py_BEGIN_ALLOW_THREADS
+    $action
+    Py_END_ALLOW_THREADS
+}
+
 %include "csc.h" 
 
 INSTANTIATE_INDEX(csc_matmat_pass1);
@@ -14,6 +42,7 @@ INSTANTIATE_INDEX(csc_matmat_pass1);
 INSTANTIATE_ALL(csc_diagonal)
 INSTANTIATE_ALL(csc_tocsr)
 INSTANTIATE_ALL(csc_matmat_pass2)
+INSTANTIATE_ALL(csc_matmat_masked)
 INSTANTIATE_ALL(csc_matvec)
 INSTANTIATE_ALL(csc_matvecs)
 INSTANTIATE_ALL(csc_elmul_csc)
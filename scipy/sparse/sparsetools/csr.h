@@ -618,6 +618,79 @@ void csr_matmat_pass2(const I n_row,
 }
 
 
+/*
+ * Compute the entries of the matrix product C = A*B in a given sparsity
+ * structure of C (a mask), for CSR matrices A, B and C.  Only the
+ * products that contribute to the entries of the structure are computed.
+ *
+ * Input Arguments:
+ *   I  n_row       - number of rows in A and C
+ *   I  n_col       - number of columns in B and C
+ *   I  Ap[n_row+1] - row pointer
+ *   I  Aj[nnz(A)]  - column indices
+ *   T  Ax[nnz(A)]  - nonzeros
+ *   I  Bp[?]       - row pointer
+ *   I  Bj[nnz(B)]  - column indices
+ *   T  Bx[nnz(B)]  - nonzeros
+ *   I  Cp[n_row+1] - row pointer
+ *   I  Cj[nnz(C)]  - column indices
+ * Output Arguments:
+ *   T  Cx[nnz(C)]  - nonzeros
+ *
+ * Note:
+ *   Output array Cx must be preallocated
+ *
+ *   C must not have duplicate entries
+ *
+ *   Ap and Cp may be cut to a block of rows of A and C, as long as
+ *   Aj, Ax, Cj and Cx are not: the rows are indexed with the values
+ *   of Ap and Cp as they are, so that several blocks of rows may be
+ *   computed at once, each with its own cut of Ap and Cp
+ *
+ *   Complexity: O(nnz(C) + sum of nnz(B[j,:]) over the nonzeros A[i,j])
+ *
+ */
+template <class I, class T>
+void csr_matmat_masked(const I n_row,
+                       const I n_col,
+                       const I Ap[],
+                       const I Aj[],
+                       const T Ax[],
+                       const I Bp[],
+                       const I Bj[],
+                       const T Bx[],
+                       const I Cp[],
+                       const I Cj[],
+                             T Cx[])
+{
+    // position in Cj of column k of the current row, or -1
+    std::vector<I> pos(n_col, -1);
+
+    for(I i = 0; i < n_row; i++){
+        for(I kk = Cp[i]; kk < Cp[i+1]; kk++){
+            pos[Cj[kk]] = kk;
+            Cx[kk] = 0;
+        }
+
+        for(I jj = Ap[i]; jj < Ap[i+1]; jj++){
+            I j = Aj[jj];
+            T v = Ax[jj];
+
+            for(I kk = Bp[j]; kk < Bp[j+1]; kk++){
+                I k = pos[Bj[kk]];
+                if(k != -1){
+                    Cx[k] += v*Bx[kk];
+                }
+            }
+        }
+
+        for(I kk = Cp[i]; kk < Cp[i+1]; kk++){
+            pos[Cj[kk]] = -1;
+        }
+    }
+}
+
+
 /*
  * Compute C = A (binary_op) B for CSR matrices that are not
  * necessarily canonical CSR format.  Specifically, this method
@@ -559,5 +559,5 @@ INSTANTIATE_TYPEMAPS(PyObject,                NPY_OBJECT     )
 #undef TYPEMAP_INPLACE2
 #undef TYPEMAP_ARGOUT1
 #undef TYPEMAP_ARGOUT2
-#under NPY_TYPECHECK
+#undef NPY_TYPECHECK
 
@@ -4,7 +4,7 @@
 from __future__ import division, print_function, absolute_import
 
 __all__ = ['upcast','getdtype','isscalarlike','isintlike',
-            'isshape','issequence','isdense','ismatrix']
+            'isshape','issequence','isdense','ismatrix','get_index_dtype']
 
 import numpy as np
 
@@ -69,6 +69,59 @@ def upcast_char(*args):
     return t
 
 
+def get_index_dtype(arrays=(), maxval=None, check_contents=False):
+    """
+    Based on input (integer) arrays `a`, determine a suitable index data
+    type that can hold the data in the arrays.
+
+    The result is np.intc (32-bit indices) unless one of the arrays is of
+    a wider integer type, or maxval does not fit in 32 bits, in which case
+    it is np.int64.
+
+    Parameters
+    ----------
+    arrays : tuple of array_like
+        Input arrays whose types/contents to check
+    maxval : float, optional
+        Maximum value needed
+    check_contents : bool, optional
+        Whether to check the values in the arrays and not just their types.
+        Default: False (check only the types)
+
+    Returns
+    -------
+    dtype : dtype
+        Suitable index data type (int32 or int64)
+
+    """
+    int32max = np.iinfo(np.intc).max
+
+    dtype = np.intc
+    if maxval is not None:
+        if maxval > int32max:
+            dtype = np.int64
+
+    if isinstance(arrays, np.ndarray):
+        arrays = (arrays,)
+
+    for arr in arrays:
+        arr = np.asarray(arr)
+        if np.can_cast(arr.dtype, np.intc):
+            continue
+        if check_contents:
+            if arr.size == 0:
+                # a bigger type is not needed
+                continue
+            elif arr.dtype.kind in 'iu':
+                if arr.max() <= int32max and arr.min() >= -int32max - 1:
+                    # a bigger type is not needed
+                    continue
+        dtype = np.int64
+        break
+
+    return dtype
+
+
 def to_native(A):
     return np.asarray(A,dtype=A.dtype.newbyteorder('native'))
 
@@ -240,3 +293,13 @@ class IndexMixin(object):
             raise IndexError("Index dimension must be <= 2")
 
         return i, j
+
+
+def _nnz_blocks(indptr, n_blocks):
+    """Split the rows (or columns) of a compressed matrix with the given
+    indptr in at most n_blocks contiguous blocks of about the same number
+    of nonzeros, and return the (start, stop) of each nonempty block."""
+    n = len(indptr) - 1
+    targets = np.linspace(0, indptr[-1], n_blocks + 1)[1:-1]
+    bounds = np.unique(np.r_[0, np.searchsorted(indptr, targets), n])
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
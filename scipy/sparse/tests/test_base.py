@@ -1040,6 +1040,24 @@ class _TestCommon:
         # Currently M.matvec(asarray(col)) is rank-1, whereas M.matvec(col)
         # is rank-2.  Is this desirable?
 
+    def test_masked_dot(self):
+        a = matrix([[3,0,0],[0,1,0],[2,0,3.0],[2,3,0]])
+        b = matrix([[0,1],[1,0],[0,2]],'d')
+        mask = array([[1,1],[0,1],[1,0],[1,0]])
+        asp = self.spmatrix(a)
+        bsp = self.spmatrix(b)
+
+        for m in [mask, csr_matrix(mask), self.spmatrix(mask)]:
+            c = asp.masked_dot(bsp, m)
+            assert_array_equal(c.todense(), np.multiply(a * b, mask))
+            # the structure of the mask is kept where the product is zero
+            assert_equal(c.nnz, 5)
+        assert_array_equal(asp.masked_dot(b, mask).todense(),
+                           np.multiply(a * b, mask))
+
+        assert_raises(ValueError, asp.masked_dot, bsp, mask.T)
+        assert_raises(ValueError, asp.masked_dot, asp, mask)
+
     def test_matmat_sparse(self):
         a = matrix([[3,0,0],[0,1,0],[2,0,3.0],[2,3,0]])
         a2 = array([[3,0,0],[0,1,0],[2,0,3.0],[2,3,0]])
@@ -2296,22 +2314,65 @@ class TestCSR(sparse_test_class()):
         assert_array_equal(bsp.indptr,[0,1,2,3])
         assert_array_almost_equal(bsp.todense(),b)
 
-### currently disabled
-##    def test_constructor4(self):
-##        """try using int64 indices"""
-##        data = arange( 6 ) + 1
-##        col = array( [1, 2, 1, 0, 0, 2], dtype='int64' )
-##        ptr = array( [0, 2, 4, 6], dtype='int64' )
-##
-##        a = csr_matrix( (data, col, ptr), shape = (3,3) )
-##
-##        b = matrix([[0,1,2],
-##                    [4,3,0],
-##                    [5,0,6]],'d')
-##
-##        assert_equal(a.indptr.dtype,numpy.dtype('int64'))
-##        assert_equal(a.indices.dtype,numpy.dtype('int64'))
-##        assert_array_equal(a.todense(),b)
+    def test_constructor_int64_indices(self):
+        data = arange(6) + 1
+        col = array([1, 2, 1, 0, 0, 2], dtype='int64')
+        ptr = array([0, 2, 4, 6], dtype='int64')
+        b = matrix([[0,1,2],
+                    [4,3,0],
+                    [5,0,6]],'d')
+
+        # int64 index arrays are kept as 32-bit when the values fit
+        a = csr_matrix((data, col, ptr), shape=(3,3))
+        assert_equal(a.indptr.dtype, np.dtype(np.intc))
+        assert_equal(a.indices.dtype, np.dtype(np.intc))
+        assert_array_equal(a.todense(), b)
+
+        # and used as they are otherwise
+        a.indptr = ptr
+        a.indices = col
+        a.check_format()
+        assert_equal(a.indptr.dtype, np.dtype('int64'))
+        assert_equal(a.indices.dtype, np.dtype('int64'))
+        assert_array_equal(a.todense(), b)
+
+    def test_int64_indices(self):
+        np.random.seed(1234)
+        D = np.random.rand(6, 5)
+        D[D < 0.5] = 0
+        A = csr_matrix(D)
+        B = csr_matrix(D)
+        B.indptr = B.indptr.astype(np.int64)
+        B.indices = B.indices.astype(np.int64)
+        B.check_format()
+
+        # conversions
+        for fmt in ['csc', 'coo', 'bsr', 'lil', 'dok', 'dia']:
+            assert_array_equal(B.asformat(fmt).toarray(), D)
+        assert_array_equal(B.tocsc().tocsr().toarray(), D)
+
+        # arithmetic, also mixed with 32-bit indices
+        for X in [A, B]:
+            assert_array_almost_equal((B + X).toarray(), D + D)
+            assert_array_almost_equal((B - X).toarray(), 0 * D)
+            assert_array_almost_equal(B.multiply(X).toarray(), D * D)
+            assert_array_almost_equal((B * X.T).toarray(), dot(D, D.T))
+            assert_array_almost_equal((X.T * B).toarray(), dot(D.T, D))
+        assert_array_almost_equal(B * np.ones(5), dot(D, np.ones(5)))
+        assert_array_almost_equal(B.T * np.ones(6), dot(D.T, np.ones(6)))
+
+        # slicing
+        assert_array_equal(B[1:4, 2:].toarray(), D[1:4, 2:])
+        assert_array_equal(B[2, :].toarray(), D[2:3, :])
+        assert_array_equal(B[[0, 3], :].toarray(), D[[0, 3], :])
+        assert_array_equal(B[[0, 3], [1, 2]], D[[[0, 3]], [1, 2]])
+
+        # sparse.linalg
+        E = B * B.T + 10 * eye(6, format='csr')
+        E.indptr = E.indptr.astype(np.int64)
+        E.indices = E.indices.astype(np.int64)
+        x = np.arange(6.)
+        assert_array_almost_equal(splu(E.tocsc()).solve(E * x), x)
 
     def test_constructor4(self):
         # using (data, ij) format
@@ -1,8 +1,9 @@
 from __future__ import division, print_function, absolute_import
 
 import numpy as np
-from numpy.testing import assert_array_almost_equal, run_module_suite, assert_
-from scipy.sparse import csr_matrix
+from numpy.testing import assert_array_almost_equal, run_module_suite, assert_, \
+        assert_raises, assert_array_equal, assert_equal
+from scipy.sparse import csr_matrix, set_num_threads, get_num_threads
 
 
 def _check_csr_rowslice(i, sl, X, Xcsr):
@@ -59,5 +60,53 @@ def test_csr_getcol():
         assert_(type(csr_col) is csr_matrix)
 
 
+def test_csr_matvec_threads():
+    np.random.seed(0)
+    X = np.random.random((300, 200))
+    X[X > 0.8] = 0
+    Xcsr = csr_matrix(X)
+    v = np.random.random(200)
+    V = np.random.random((200, 3))
+
+    n_threads = get_num_threads()
+    try:
+        for n in [1, 2, 3, -1]:
+            set_num_threads(n)
+            assert_array_almost_equal(Xcsr * v, np.dot(X, v))
+            assert_array_almost_equal(Xcsr * V, np.dot(X, V))
+            assert_array_almost_equal(Xcsr * np.asfortranarray(V),
+                                      np.dot(X, V))
+    finally:
+        set_num_threads(n_threads)
+    assert_raises(ValueError, set_num_threads, 0)
+
+
+def test_csr_matmat_threads():
+    np.random.seed(0)
+    X = np.random.randint(1, 10, size=(300, 200))
+    X[np.random.random(X.shape) > 0.5] = 0
+    Y = np.random.randint(1, 10, size=(200, 150))
+    Y[np.random.random(Y.shape) > 0.5] = 0
+    # the last rows of the product cancel out
+    A = np.hstack([X, X])
+    A[150:, 200:] *= -1
+    B = np.vstack([Y, Y])
+    AB = np.dot(A, B)
+    mask = np.random.random(AB.shape) > 0.9
+
+    n_threads = get_num_threads()
+    try:
+        for n in [1, 2, 3, -1]:
+            set_num_threads(n)
+            C = csr_matrix(A) * csr_matrix(B)
+            assert_array_equal(C.toarray(), AB)
+            assert_equal(C.nnz, np.count_nonzero(AB))
+            C = csr_matrix(A).masked_dot(csr_matrix(B), mask)
+            assert_array_equal(C.toarray(), AB * mask)
+            assert_equal(C.nnz, mask.sum())
+    finally:
+        set_num_threads(n_threads)
+
+
 if __name__ == "__main__":
     run_module_suite()
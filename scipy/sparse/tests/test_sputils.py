@@ -67,5 +67,31 @@ class TestSparseUtils(TestCase):
         assert_equal(sputils.isdense(np.array([1])),True)
         assert_equal(sputils.isdense(np.matrix([1])),True)
 
+    def test_get_index_dtype(self):
+        imax = np.iinfo(np.int32).max
+        a32 = np.array([1, 2], dtype=np.int32)
+        a64 = np.array([1, 2], dtype=np.int64)
+        big = np.array([1, imax + 1], dtype=np.int64)
+
+        assert_equal(sputils.get_index_dtype(), np.intc)
+        assert_equal(sputils.get_index_dtype(maxval=imax), np.intc)
+        assert_equal(sputils.get_index_dtype(maxval=imax + 1), np.int64)
+        assert_equal(sputils.get_index_dtype((a32, a32)), np.intc)
+        assert_equal(sputils.get_index_dtype((a32, a64)), np.int64)
+        assert_equal(sputils.get_index_dtype((a32, a64),
+                                             check_contents=True), np.intc)
+        assert_equal(sputils.get_index_dtype((a32, big),
+                                             check_contents=True), np.int64)
+        assert_equal(sputils.get_index_dtype((a64, a64), maxval=imax + 1,
+                                             check_contents=True), np.int64)
+
+        # uint32 does not fit in intc, only its small values do
+        u32 = np.array([0, 3000000000], dtype=np.uint32)
+        assert_equal(sputils.get_index_dtype((a32, u32)), np.int64)
+        assert_equal(sputils.get_index_dtype((a32, u32),
+                                             check_contents=True), np.int64)
+        assert_equal(sputils.get_index_dtype((a32, a32.astype(np.uint32)),
+                                             check_contents=True), np.intc)
+
 if __name__ == "__main__":
     run_module_suite()
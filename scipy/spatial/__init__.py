@@ -12,6 +12,9 @@ Nearest-neighbor Queries
 
    KDTree      -- class for efficient nearest-neighbor queries
    cKDTree     -- class for efficient nearest-neighbor queries (faster impl.)
+   DynamicKDTree -- kd-tree supporting insertion and removal of points
+   BallTree    -- ball tree for nearest-neighbor queries in many dimensions
+   RPForest    -- random projection forest for approximate neighbors
    distance    -- module containing many different distance measures
 
 Delaunay Triangulation, Convex Hulls and Voronoi Diagrams
@@ -88,6 +91,9 @@ from __future__ import division, print_function, absolute_import
 
 from .kdtree import *
 from .ckdtree import *
+from ._balltree import *
+from ._rpforest import *
+from ._dynamic_kdtree import *
 from .qhull import *
 from ._plotutils import *
 
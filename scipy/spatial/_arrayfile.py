@@ -0,0 +1,95 @@
+"""
+Storage of a group of named arrays in a single memory-mappable file.
+
+The file is a sequence of records in the ``.npy`` format of
+`numpy.lib.format`.  The first record is a string array holding a format
+tag followed by the names of the arrays; the arrays follow in the same
+order.  Because each record is a plain ``.npy`` record, the arrays can be
+memory mapped directly from the file without reading them.
+
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import numpy as np
+from numpy.lib import format as npformat
+
+__all__ = ['save_arrays', 'load_arrays']
+
+
+def save_arrays(filename, tag, arrays):
+    """
+    Write named arrays to a file.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file to write.
+    tag : str
+        Format tag, checked by `load_arrays`.
+    arrays : sequence of (str, ndarray)
+        The names and the arrays to store.  The arrays must not have
+        object dtype.
+
+    """
+    names = [name for name, _ in arrays]
+    header = np.array([tag] + names)
+    with open(filename, 'wb') as f:
+        npformat.write_array(f, header)
+        for name, arr in arrays:
+            arr = np.asanyarray(arr)
+            if arr.dtype.hasobject:
+                raise ValueError("array %r has object dtype" % (name,))
+            npformat.write_array(f, np.ascontiguousarray(arr))
+
+
+def _read_header(f):
+    version = npformat.read_magic(f)
+    if version == (1, 0):
+        return npformat.read_array_header_1_0(f)
+    elif version == (2, 0):
+        return npformat.read_array_header_2_0(f)
+    else:
+        raise ValueError("unsupported .npy format version %s" % (version,))
+
+
+def load_arrays(filename, tag, mmap_mode=None):
+    """
+    Read named arrays written by `save_arrays`.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file to read.
+    tag : str
+        Expected format tag.  A ValueError is raised if the file has
+        a different tag.
+    mmap_mode : {None, 'r', 'r+', 'c'}, optional
+        If not None, the arrays are memory mapped from the file with the
+        given mode (see `numpy.memmap`) instead of being read into memory.
+
+    Returns
+    -------
+    arrays : dict
+        The stored arrays, by name.
+
+    """
+    arrays = {}
+    with open(filename, 'rb') as f:
+        header = npformat.read_array(f)
+        if header.ndim != 1 or header.shape[0] < 1 or header[0] != tag:
+            raise ValueError("%r is not a %s file" % (filename, tag))
+        for name in header[1:]:
+            shape, fortran_order, dtype = _read_header(f)
+            offset = f.tell()
+            count = int(np.prod(shape))
+            if mmap_mode is not None and count > 0:
+                arr = np.memmap(filename, dtype=dtype, mode=mmap_mode,
+                                offset=offset, shape=shape,
+                                order='F' if fortran_order else 'C')
+                f.seek(offset + count * dtype.itemsize)
+            else:
+                arr = np.fromfile(f, dtype=dtype, count=count)
+                arr = arr.reshape(shape, order='F' if fortran_order else 'C')
+            arrays[str(name)] = arr
+    return arrays
@@ -0,0 +1,670 @@
+# Released under the scipy license
+"""
+Ball tree for nearest-neighbor queries in many dimensions.
+"""
+import numpy as np
+
+from scipy.lib._threads import run_threads, cpu_count
+
+cimport numpy as np
+cimport libc.stdlib as stdlib
+from libc.math cimport sqrt, pow, fabs
+from libc.string cimport memcpy
+
+cdef np.float64_t infinity = np.inf
+
+__all__ = ['BallTree']
+
+
+# Metrics
+# =======
+#
+# The tree always works with a Minkowski p-norm.  The other metrics are
+# reduced to the Euclidean distance by transforming the points:
+#
+#   cosine       x -> x / |x|, and d = e**2 / 2
+#   correlation  x -> (x - mean(x)) / |x - mean(x)|, and d = e**2 / 2
+#   mahalanobis  x -> x L, where VI = L L^T, and d = e
+#
+# where e is the Euclidean distance between the transformed points.
+
+_MINKOWSKI_METRICS = {'euclidean': 2., 'cityblock': 1., 'chebyshev': infinity}
+
+
+cdef inline np.float64_t minkowski_distance(np.float64_t *x, np.float64_t *y,
+                                            np.intp_t m,
+                                            np.float64_t p) nogil:
+    cdef np.intp_t i
+    cdef np.float64_t r = 0, z
+    if p == 2:
+        for i in range(m):
+            z = x[i] - y[i]
+            r += z*z
+        return sqrt(r)
+    elif p == 1:
+        for i in range(m):
+            r += fabs(x[i] - y[i])
+        return r
+    elif p == infinity:
+        for i in range(m):
+            z = fabs(x[i] - y[i])
+            if z > r:
+                r = z
+        return r
+    else:
+        for i in range(m):
+            r += pow(fabs(x[i] - y[i]), p)
+        return pow(r, 1. / p)
+
+
+# Building the tree
+# =================
+
+cdef struct ballnode:
+    np.intp_t start_idx
+    np.intp_t end_idx
+    np.intp_t less      # index of the children; -1 for a leaf
+    np.intp_t greater
+    np.float64_t radius
+
+# numpy description of ballnode, used to store the node array
+_node_dtype = np.dtype([('start_idx', np.intp),
+                        ('end_idx', np.intp),
+                        ('less', np.intp),
+                        ('greater', np.intp),
+                        ('radius', np.float64)], align=True)
+
+
+cdef inline void swap_indices(np.intp_t *indices, np.intp_t i,
+                              np.intp_t j) nogil:
+    cdef np.intp_t t = indices[i]
+    indices[i] = indices[j]
+    indices[j] = t
+
+
+cdef void select_nth(np.float64_t *data, np.intp_t *indices, np.intp_t m,
+                     np.intp_t lo, np.intp_t hi, np.intp_t k,
+                     np.intp_t d) nogil:
+    # Quickselect: reorder indices[lo:hi] so that indices[k] has the
+    # (k-lo)-th smallest coordinate d, with no larger ones before it and
+    # no smaller ones after it.
+    cdef np.intp_t i, j
+    cdef np.float64_t a, b, c, pivot
+    while hi - lo > 1:
+        # median of three
+        a = data[indices[lo]*m + d]
+        b = data[indices[lo + (hi - lo) // 2]*m + d]
+        c = data[indices[hi - 1]*m + d]
+        if (a <= b) == (b <= c):
+            pivot = b
+        elif (b <= a) == (a <= c):
+            pivot = a
+        else:
+            pivot = c
+
+        # Hoare partition; the pivot is one of the keys, so the scans
+        # stop inside the range
+        i = lo
+        j = hi - 1
+        while i <= j:
+            while data[indices[i]*m + d] < pivot:
+                i += 1
+            while data[indices[j]*m + d] > pivot:
+                j -= 1
+            if i <= j:
+                swap_indices(indices, i, j)
+                i += 1
+                j -= 1
+        if k <= j:
+            hi = j + 1
+        elif k >= i:
+            lo = i
+        else:
+            return
+
+
+# Collecting query results
+# ========================
+
+cdef struct index_buffer:
+    np.intp_t *indices
+    np.intp_t n, space
+
+cdef inline int index_buffer_append(index_buffer *buf, np.intp_t i) nogil:
+    cdef void *tmp
+    if buf.n == buf.space:
+        tmp = stdlib.realloc(buf.indices,
+                             (2*buf.space + 16) * sizeof(np.intp_t))
+        if tmp == NULL:
+            return -1
+        buf.indices = <np.intp_t*> tmp
+        buf.space = 2*buf.space + 16
+    buf.indices[buf.n] = i
+    buf.n += 1
+    return 0
+
+cdef struct knn_state:
+    np.intp_t k
+    np.float64_t *dd     # the k nearest distances found, in increasing order
+    np.intp_t *ii
+    np.float64_t upper_bound
+    np.float64_t epsfac
+
+
+# Main class
+# ==========
+
+cdef class BallTree:
+    """
+    BallTree(data, leafsize=40, metric='euclidean', p=2, VI=None)
+
+    Ball tree for nearest-neighbor lookup in many dimensions
+
+    A ball tree partitions the points into nested balls instead of the
+    axis-aligned boxes of a kd-tree.  Every node stores the centroid of
+    its points and the largest distance from the centroid to one of its
+    points, so that a node can be pruned from a search by the triangle
+    inequality alone.  This bound does not deteriorate as quickly with
+    the dimension as the bounding boxes of a kd-tree, and it applies to
+    any metric, so the tree also prunes searches for the metrics below
+    that are not Minkowski norms.
+
+    Nodes are split in two at the median along the coordinate of largest
+    spread.  The query methods follow those of `cKDTree`.
+
+    Parameters
+    ----------
+    data : array_like, shape (n,m)
+        The n data points of dimension m to be indexed.
+    leafsize : positive int, optional
+        The number of points at which the algorithm switches over to
+        brute-force.  Default: 40.
+    metric : str, optional
+        The distance metric, one of 'euclidean', 'cityblock', 'chebyshev',
+        'minkowski', 'cosine', 'correlation' or 'mahalanobis'.  The
+        distances are defined as in `scipy.spatial.distance`.
+        Default: 'euclidean'.
+    p : float, 1<=p<=infinity, optional
+        The order of the norm for ``metric='minkowski'``.  Default: 2.
+    VI : ndarray, optional
+        The inverse of the covariance matrix for ``metric='mahalanobis'``.
+        By default it is computed from `data`.
+
+    Notes
+    -----
+    The cosine and correlation distances are computed from the Euclidean
+    distance between the normalized (and, for the correlation, centered)
+    points, and the Mahalanobis distance from the Euclidean distance
+    between the points multiplied by the Cholesky factor of `VI`.  The
+    tree is built on the transformed points.  A copy of the (transformed)
+    points is stored in the order of the tree nodes, in addition to
+    `data`.  The cosine and correlation distances are undefined for
+    points of zero norm or, respectively, zero variance, which are
+    therefore rejected.
+
+    """
+
+    cdef readonly np.ndarray data
+    cdef readonly np.intp_t n, m
+    cdef readonly np.intp_t leafsize
+    cdef readonly object metric
+    cdef readonly np.float64_t p
+    cdef readonly object VI
+    cdef readonly np.ndarray indices
+    # the transformed points; during the build in the order of data,
+    # afterwards in the order of the nodes
+    cdef np.ndarray tree_data
+    cdef np.ndarray transform
+    cdef np.ndarray nodes
+    cdef np.ndarray centroids
+    cdef np.intp_t n_nodes
+    cdef np.float64_t *raw_data
+    cdef np.intp_t *raw_indices
+    cdef ballnode *raw_nodes
+    cdef np.float64_t *raw_centroids
+
+    def __init__(BallTree self, data, np.intp_t leafsize=40,
+                 metric='euclidean', p=2, VI=None):
+        cdef np.intp_t max_nodes
+        self.data = np.ascontiguousarray(data, dtype=np.float64)
+        if self.data.ndim != 2:
+            raise ValueError("data must be a two-dimensional array")
+        self.n, self.m = np.shape(self.data)
+        if leafsize < 1:
+            raise ValueError("leafsize must be at least 1")
+        self.leafsize = leafsize
+        self.__set_metric(metric, p, VI)
+
+        self.tree_data = self._transform(self.data)
+        self.raw_data = <np.float64_t*>np.PyArray_DATA(self.tree_data)
+        self.indices = np.arange(self.n, dtype=np.intp)
+        self.raw_indices = <np.intp_t*>np.PyArray_DATA(self.indices)
+
+        # leaves hold at least (leafsize+1)//2 points
+        max_nodes = 2*(self.n // ((leafsize + 1) // 2)) + 1
+        self.nodes = np.empty(max_nodes, dtype=_node_dtype)
+        self.centroids = np.empty((max_nodes, self.m), dtype=np.float64)
+        self.raw_nodes = <ballnode*>np.PyArray_DATA(self.nodes)
+        self.raw_centroids = <np.float64_t*>np.PyArray_DATA(self.centroids)
+        self.n_nodes = 0
+        with nogil:
+            self.__build(0, self.n)
+
+        # Store the points in tree order, so that the points of a node
+        # are contiguous in memory for the queries.
+        self.tree_data = self.tree_data[self.indices]
+        self.raw_data = <np.float64_t*>np.PyArray_DATA(self.tree_data)
+
+    cdef __set_metric(BallTree self, metric, p, VI):
+        self.VI = None
+        self.transform = None
+        if metric in _MINKOWSKI_METRICS:
+            self.p = _MINKOWSKI_METRICS[metric]
+        elif metric == 'minkowski':
+            if p < 1:
+                raise ValueError("Only p-norms with 1<=p<=infinity permitted")
+            self.p = p
+        elif metric in ('cosine', 'correlation'):
+            self.p = 2
+        elif metric == 'mahalanobis':
+            self.p = 2
+            if VI is None:
+                VI = np.linalg.inv(np.cov(self.data.T)).T
+            VI = np.atleast_2d(np.asarray(VI, dtype=np.float64))
+            if VI.shape != (self.m, self.m):
+                raise ValueError("VI must have shape (%d, %d)"
+                                 % (self.m, self.m))
+            try:
+                # (u-v) VI (u-v)^T = |(u-v) L|**2
+                self.transform = np.linalg.cholesky(VI)
+            except np.linalg.LinAlgError:
+                raise ValueError("VI must be symmetric and positive definite")
+            self.VI = VI
+        else:
+            raise ValueError("Unknown metric %r" % (metric,))
+        self.metric = metric
+
+    def _transform(BallTree self, x):
+        # Map points to the space in which the tree measures distances.
+        if self.metric in ('cosine', 'correlation'):
+            x = np.array(x, dtype=np.float64)
+            if self.metric == 'correlation':
+                x -= x.mean(axis=-1)[..., np.newaxis]
+            norms = np.sqrt(np.sum(x*x, axis=-1))
+            if np.any(norms == 0):
+                raise ValueError("the %s distance is undefined for points "
+                                 "of zero norm" % self.metric)
+            x /= norms[..., np.newaxis]
+        elif self.metric == 'mahalanobis':
+            x = np.dot(x, self.transform)
+        return np.ascontiguousarray(x, dtype=np.float64)
+
+    def _to_tree_distance(BallTree self, d):
+        # Convert distances in the metric to distances between the
+        # transformed points.
+        if self.metric in ('cosine', 'correlation'):
+            return np.sqrt(2 * np.maximum(d, 0))
+        return d
+
+    def _from_tree_distance(BallTree self, e):
+        if self.metric in ('cosine', 'correlation'):
+            return e * e / 2
+        return e
+
+    cdef np.intp_t __build(BallTree self, np.intp_t start_idx,
+                           np.intp_t end_idx) nogil:
+        # Add the subtree over raw_indices[start_idx:end_idx] to the node
+        # array and return the index of its root.
+        cdef ballnode *node
+        cdef np.float64_t *centroid
+        cdef np.float64_t *x
+        cdef np.float64_t r, spread, lo, hi, best_spread
+        cdef np.intp_t node_index, i, j, d, mid, m = self.m
+
+        node_index = self.n_nodes
+        self.n_nodes += 1
+        node = self.raw_nodes + node_index
+        node.start_idx = start_idx
+        node.end_idx = end_idx
+        node.less = node.greater = -1
+
+        # centroid and radius
+        centroid = self.raw_centroids + node_index*m
+        for j in range(m):
+            centroid[j] = 0
+        for i in range(start_idx, end_idx):
+            x = self.raw_data + self.raw_indices[i]*m
+            for j in range(m):
+                centroid[j] += x[j]
+        if end_idx > start_idx:
+            for j in range(m):
+                centroid[j] /= end_idx - start_idx
+        node.radius = 0
+        for i in range(start_idx, end_idx):
+            r = minkowski_distance(centroid, self.raw_data + self.raw_indices[i]*m,
+                                   m, self.p)
+            if r > node.radius:
+                node.radius = r
+
+        if end_idx - start_idx <= self.leafsize:
+            return node_index
+
+        # split at the median of the coordinate of largest spread
+        d = 0
+        best_spread = -1
+        for j in range(m):
+            lo = hi = self.raw_data[self.raw_indices[start_idx]*m + j]
+            for i in range(start_idx + 1, end_idx):
+                r = self.raw_data[self.raw_indices[i]*m + j]
+                if r < lo:
+                    lo = r
+                elif r > hi:
+                    hi = r
+            spread = hi - lo
+            if spread > best_spread:
+                best_spread = spread
+                d = j
+        mid = start_idx + (end_idx - start_idx) // 2
+        select_nth(self.raw_data, self.raw_indices, m, start_idx, end_idx,
+                   mid, d)
+
+        i = self.__build(start_idx, mid)
+        j = self.__build(mid, end_idx)
+        node = self.raw_nodes + node_index
+        node.less = i
+        node.greater = j
+        return node_index
+
+    def __reduce__(BallTree self):
+        return (BallTree, (self.data, self.leafsize, self.metric, self.p,
+                           self.VI))
+
+    # -----
+    # query
+    # -----
+
+    cdef inline np.float64_t __node_min_distance(BallTree self,
+                                                 np.intp_t node_index,
+                                                 np.float64_t *x) nogil:
+        cdef np.float64_t d
+        d = minkowski_distance(x, self.raw_centroids + node_index*self.m,
+                               self.m, self.p)
+        d -= self.raw_nodes[node_index].radius
+        if d < 0:
+            return 0
+        return d
+
+    cdef void __query_node(BallTree self, np.intp_t node_index,
+                           np.float64_t *x, knn_state *st) nogil:
+        cdef ballnode *node = self.raw_nodes + node_index
+        cdef np.intp_t i, j, near, far
+        cdef np.float64_t d, d_near, d_far, bound
+
+        if node.less == -1:
+            for i in range(node.start_idx, node.end_idx):
+                d = minkowski_distance(
+                    x, self.raw_data + i*self.m,
+                    self.m, self.p)
+                if d < st.dd[st.k - 1] and d < st.upper_bound:
+                    # insert into the sorted list of neighbors
+                    j = st.k - 1
+                    while j > 0 and st.dd[j - 1] > d:
+                        st.dd[j] = st.dd[j - 1]
+                        st.ii[j] = st.ii[j - 1]
+                        j -= 1
+                    st.dd[j] = d
+                    st.ii[j] = self.raw_indices[i]
+            return
+
+        # visit the nearer child first
+        near = node.less
+        far = node.greater
+        d_near = self.__node_min_distance(near, x)
+        d_far = self.__node_min_distance(far, x)
+        if d_far < d_near:
+            near, far = far, near
+            d_near, d_far = d_far, d_near
+
+        bound = st.dd[st.k - 1]
+        if st.upper_bound < bound:
+            bound = st.upper_bound
+        if d_near > bound * st.epsfac:
+            return
+        self.__query_node(near, x, st)
+
+        bound = st.dd[st.k - 1]
+        if st.upper_bound < bound:
+            bound = st.upper_bound
+        if d_far > bound * st.epsfac:
+            return
+        self.__query_node(far, x, st)
+
+    cdef int __query_rows(BallTree self, np.ndarray dd, np.ndarray ii,
+                          np.ndarray xx, np.intp_t start, np.intp_t stop,
+                          np.intp_t k, np.float64_t eps,
+                          np.float64_t distance_upper_bound) except -1:
+        cdef knn_state st
+        cdef np.intp_t c
+        cdef np.float64_t *raw_dd = <np.float64_t*>np.PyArray_DATA(dd)
+        cdef np.intp_t *raw_ii = <np.intp_t*>np.PyArray_DATA(ii)
+        cdef np.float64_t *raw_xx = <np.float64_t*>np.PyArray_DATA(xx)
+
+        st.k = k
+        st.upper_bound = distance_upper_bound
+        st.epsfac = 1 / (1 + eps)
+        with nogil:
+            for c in range(start, stop):
+                st.dd = raw_dd + c*k
+                st.ii = raw_ii + c*k
+                if self.n > 0:
+                    self.__query_node(0, raw_xx + c*self.m, &st)
+        return 0
+
+    def _query_rows_worker(BallTree self, np.ndarray dd, np.ndarray ii,
+                           np.ndarray xx, np.intp_t start, np.intp_t stop,
+                           np.intp_t k, np.float64_t eps,
+                           np.float64_t distance_upper_bound):
+        # thread entry point for query(..., n_jobs>1)
+        self.__query_rows(dd, ii, xx, start, stop, k, eps,
+                          distance_upper_bound)
+
+    def query(BallTree self, object x, np.intp_t k=1, np.float64_t eps=0,
+              np.float64_t distance_upper_bound=infinity, n_jobs=1):
+        """query(self, x, k=1, eps=0, distance_upper_bound=np.inf, n_jobs=1)
+
+        Query the ball tree for nearest neighbors
+
+        Parameters
+        ----------
+        x : array_like, last dimension self.m
+            An array of points to query.
+        k : integer
+            The number of nearest neighbors to return.
+        eps : non-negative float
+            Return approximate nearest neighbors; the k-th returned value
+            is guaranteed to be no further than (1+eps) times the
+            distance to the real k-th nearest neighbor, as measured
+            between the transformed points (see Notes of `BallTree`).
+        distance_upper_bound : nonnegative float
+            Return only neighbors within this distance.
+        n_jobs : int, optional
+            Number of threads to use for the queries.  If -1 is given,
+            all CPU cores are used.  Default: 1.
+
+        Returns
+        -------
+        d : array of floats
+            The distances to the nearest neighbors, in the metric of the
+            tree.  If x has shape tuple+(self.m,), then d has shape
+            tuple+(k,).  When k == 1, the last dimension of the output is
+            squeezed.  Missing neighbors are indicated with infinite
+            distances.
+        i : ndarray of ints
+            The locations of the neighbors in self.data.  Missing
+            neighbors are indicated with self.n.
+
+        """
+        cdef np.ndarray dd, ii, xx
+        cdef np.intp_t n, i, chunk
+        x = np.asarray(x, dtype=np.float64)
+        if np.shape(x)[-1] != self.m:
+            raise ValueError("x must consist of vectors of length %d but has "
+                             "shape %s" % (int(self.m), np.shape(x)))
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        if eps < 0:
+            raise ValueError("eps must be non-negative")
+        if n_jobs == -1:
+            n_jobs = cpu_count()
+        elif n_jobs < 1:
+            raise ValueError("n_jobs must be a positive integer or -1")
+        single = (x.ndim == 1)
+        retshape = np.shape(x)[:-1]
+        n = <np.intp_t> np.prod(retshape)
+        xx = self._transform(np.reshape(x, (n, self.m)))
+        dd = np.empty((n, k), dtype=np.float64)
+        dd.fill(infinity)
+        ii = np.empty((n, k), dtype=np.intp)
+        ii.fill(self.n)
+        distance_upper_bound = self._to_tree_distance(distance_upper_bound)
+
+        if n_jobs == 1 or n < 2:
+            self.__query_rows(dd, ii, xx, 0, n, k, eps, distance_upper_bound)
+        else:
+            chunk = (n + n_jobs - 1) // n_jobs
+            run_threads(self._query_rows_worker,
+                         [(dd, ii, xx, i, min(i + chunk, n), k, eps,
+                           distance_upper_bound)
+                          for i in range(0, n, chunk)])
+        dd = self._from_tree_distance(dd)
+
+        if single:
+            if k == 1:
+                return float(dd[0, 0]), int(ii[0, 0])
+            return dd[0], ii[0]
+        elif k == 1:
+            return np.reshape(dd[..., 0], retshape), np.reshape(ii[..., 0], retshape)
+        else:
+            return np.reshape(dd, retshape + (k,)), np.reshape(ii, retshape + (k,))
+
+    # ----------------
+    # query_ball_point
+    # ----------------
+
+    cdef int __query_ball_node(BallTree self, np.intp_t node_index,
+                               np.float64_t *x, np.float64_t r,
+                               np.float64_t eps,
+                               index_buffer *buf) nogil:
+        cdef ballnode *node = self.raw_nodes + node_index
+        cdef np.float64_t d
+        cdef np.intp_t i
+
+        d = minkowski_distance(x, self.raw_centroids + node_index*self.m,
+                               self.m, self.p)
+        if d - node.radius > r / (1 + eps):
+            return 0
+        if d + node.radius <= r * (1 + eps):
+            # the whole ball is within range
+            for i in range(node.start_idx, node.end_idx):
+                if index_buffer_append(buf, self.raw_indices[i]) < 0:
+                    return -1
+            return 0
+        if node.less == -1:
+            for i in range(node.start_idx, node.end_idx):
+                d = minkowski_distance(
+                    x, self.raw_data + i*self.m,
+                    self.m, self.p)
+                if d <= r:
+                    if index_buffer_append(buf, self.raw_indices[i]) < 0:
+                        return -1
+            return 0
+        if self.__query_ball_node(node.less, x, r, eps, buf) < 0:
+            return -1
+        return self.__query_ball_node(node.greater, x, r, eps, buf)
+
+    def query_ball_point(BallTree self, object x, np.float64_t r,
+                         np.float64_t eps=0, output='list'):
+        """query_ball_point(self, x, r, eps=0, output='list')
+
+        Find all points within distance r of point(s) x.
+
+        Parameters
+        ----------
+        x : array_like, shape tuple + (self.m,)
+            The point or points to search for neighbors of.
+        r : positive float
+            The radius of points to return, in the metric of the tree.
+        eps : nonnegative float, optional
+            Approximate search, as for `cKDTree.query_ball_point`.
+        output : {'list', 'csr', 'count'}, optional
+            Format of the result, as for `cKDTree.query_ball_point`.
+
+        Returns
+        -------
+        results : list or array of lists
+            If `x` is a single point, returns a list of the indices of the
+            neighbors of `x`. If `x` is an array of points, returns an
+            object array of shape tuple containing lists of neighbors.
+            Returned for ``output='list'``.
+        indices, offsets : ndarray of ints
+            Returned for ``output='csr'``; the neighbors of the i-th query
+            point are ``indices[offsets[i]:offsets[i+1]]``.
+        counts : int or ndarray of ints
+            Returned for ``output='count'``.
+
+        """
+        cdef np.ndarray xx, offsets, indices
+        cdef np.intp_t c, n, failed = 0
+        cdef np.intp_t *raw_offsets
+        cdef np.float64_t *raw_xx
+        cdef index_buffer buf
+
+        if output not in ('list', 'csr', 'count'):
+            raise ValueError("output must be one of 'list', 'csr' or 'count'")
+        x = np.asarray(x, dtype=np.float64)
+        if x.shape[-1] != self.m:
+            raise ValueError("Searching for a %d-dimensional point in a "
+                             "%d-dimensional BallTree"
+                             % (int(x.shape[-1]), int(self.m)))
+        retshape = x.shape[:-1]
+        n = <np.intp_t> np.prod(retshape)
+        xx = self._transform(np.reshape(x, (n, self.m)))
+        raw_xx = <np.float64_t*>np.PyArray_DATA(xx)
+        r = self._to_tree_distance(r)
+
+        offsets = np.zeros(n + 1, dtype=np.intp)
+        raw_offsets = <np.intp_t*>np.PyArray_DATA(offsets)
+        buf.indices = NULL
+        buf.n = buf.space = 0
+        try:
+            with nogil:
+                for c in range(n):
+                    if self.n > 0:
+                        if self.__query_ball_node(0, raw_xx + c*self.m, r,
+                                                  eps, &buf) < 0:
+                            failed = 1
+                            break
+                    raw_offsets[c + 1] = buf.n
+            if failed:
+                raise MemoryError
+            indices = np.empty(buf.n, dtype=np.intp)
+            if buf.n > 0:
+                memcpy(np.PyArray_DATA(indices), buf.indices,
+                       buf.n * sizeof(np.intp_t))
+        finally:
+            stdlib.free(buf.indices)
+
+        if output == 'count':
+            counts = np.diff(offsets)
+            if x.ndim == 1:
+                return int(counts[0])
+            return np.reshape(counts, retshape)
+        elif output == 'csr':
+            return indices, offsets
+        elif x.ndim == 1:
+            return indices.tolist()
+        else:
+            result = np.empty(n, dtype=object)
+            for c in range(n):
+                result[c] = indices[offsets[c]:offsets[c+1]].tolist()
+            return np.reshape(result, retshape)
@@ -0,0 +1,352 @@
+"""
+A kd-tree supporting insertion and removal of points.
+"""
+from __future__ import division, print_function, absolute_import
+
+import numpy as np
+
+from .ckdtree import cKDTree
+
+__all__ = ['DynamicKDTree']
+
+
+class _Bucket(object):
+    """A static cKDTree over some of the points of a DynamicKDTree."""
+
+    def __init__(self, data, ids, leafsize):
+        self.tree = cKDTree(data, leafsize=leafsize)
+        self.ids = ids
+        self.alive = np.ones(len(ids), dtype=bool)
+        self.n_dead = 0
+
+    @property
+    def n_alive(self):
+        return len(self.ids) - self.n_dead
+
+    def live_points(self):
+        return self.tree.data[self.alive], self.ids[self.alive]
+
+
+class DynamicKDTree(object):
+    """
+    DynamicKDTree(data=None, m=None, leafsize=10)
+
+    kd-tree for nearest-neighbor lookup in a changing set of points
+
+    The points are kept in a logarithmic forest of static `cKDTree`
+    instances, whose sizes are at most distinct powers of two.  Inserting
+    k points merges the new points with the smallest trees into a new
+    tree, like carrying in a binary counter, so that every point is
+    rebuilt into a larger tree O(log n) times over its lifetime, and an
+    insertion costs O(k log n) amortized tree-building work instead of
+    the O(n log n) of rebuilding a single tree.  Removed points are only
+    marked as deleted, and a tree is rebuilt from its remaining points
+    once half of its points have been removed.
+
+    Queries are answered by querying every tree of the forest and merging
+    the results, and give the same results as `cKDTree` queries on a
+    tree built from the current points.
+
+    Parameters
+    ----------
+    data : array_like, shape (n,m), optional
+        Initial points.
+    m : int, optional
+        The dimension of the points.  Required if `data` is not given.
+    leafsize : positive int, optional
+        The leafsize of the `cKDTree` instances.
+
+    Attributes
+    ----------
+    n : int
+        The number of points currently in the tree.
+    m : int
+        The dimension of the points.
+
+    Notes
+    -----
+    Every point is identified by the integer id returned by `insert`.
+    Ids are assigned consecutively from 0 and are never reused; the ids
+    of the initial `data` are ``0 .. n-1``.  The query methods return ids
+    instead of positions in an array of points.
+
+    Examples
+    --------
+    >>> from scipy.spatial import DynamicKDTree
+    >>> tree = DynamicKDTree(m=2)
+    >>> ids = tree.insert([[0, 0], [1, 0], [0, 1]])
+    >>> tree.query([0.25, 0])
+    (0.25, 0)
+    >>> tree.remove([0])
+    >>> tree.query([0.25, 0])
+    (0.75, 1)
+
+    """
+
+    def __init__(self, data=None, m=None, leafsize=10):
+        if data is None and m is None:
+            raise ValueError("either data or m must be given")
+        if leafsize < 1:
+            raise ValueError("leafsize must be at least 1")
+        self.leafsize = leafsize
+        self.m = m
+        self.n = 0
+        self._n_ids = 0
+        # _levels[i] is None or a _Bucket with at most 2**i points
+        self._levels = []
+        # bucket level and position in the bucket of every id; -1 if removed
+        self._level_of = np.empty(0, dtype=np.intp)
+        self._pos_of = np.empty(0, dtype=np.intp)
+        if data is not None:
+            self.insert(data)
+
+    def _check_points(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if self.m is None:
+            self.m = x.shape[-1]
+        if x.shape[-1] != self.m:
+            raise ValueError("points must have dimension %d, got %d"
+                             % (self.m, x.shape[-1]))
+        return x
+
+    def _set_bucket(self, level, data, ids):
+        while len(self._levels) <= level:
+            self._levels.append(None)
+        if len(ids) == 0:
+            self._levels[level] = None
+            return
+        self._levels[level] = _Bucket(data, ids, self.leafsize)
+        self._level_of[ids] = level
+        self._pos_of[ids] = np.arange(len(ids))
+
+    def insert(self, points):
+        """
+        Insert points into the tree.
+
+        Parameters
+        ----------
+        points : array_like, shape (k,m) or (m,)
+            The points to insert.
+
+        Returns
+        -------
+        ids : ndarray of ints, shape (k,)
+            The ids of the new points.
+
+        """
+        points = self._check_points(points)
+        points = np.reshape(points, (-1, self.m))
+        k = points.shape[0]
+        ids = np.arange(self._n_ids, self._n_ids + k, dtype=np.intp)
+        if k == 0:
+            return ids
+
+        self._n_ids += k
+        self._level_of = np.concatenate((self._level_of,
+                                         np.empty(k, dtype=np.intp)))
+        self._pos_of = np.concatenate((self._pos_of,
+                                       np.empty(k, dtype=np.intp)))
+
+        # Carry: merge the new points with the smallest buckets until they
+        # fit into an empty level.
+        data_parts = [points]
+        id_parts = [ids]
+        total = k
+        level = 0
+        while True:
+            if level < len(self._levels) and self._levels[level] is not None:
+                data, bucket_ids = self._levels[level].live_points()
+                data_parts.append(data)
+                id_parts.append(bucket_ids)
+                total += len(bucket_ids)
+                self._levels[level] = None
+            elif total <= 2**level:
+                break
+            level += 1
+
+        self._set_bucket(level, np.concatenate(data_parts),
+                         np.concatenate(id_parts))
+        self.n += k
+        return ids
+
+    def remove(self, ids):
+        """
+        Remove points from the tree.
+
+        Parameters
+        ----------
+        ids : array_like of ints
+            The ids of the points to remove, as returned by `insert`.
+
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.intp))
+        if len(ids) == 0:
+            return
+        if ids[0] < 0 or ids[-1] >= self._n_ids:
+            raise ValueError("invalid point id")
+        if np.any(self._level_of[ids] < 0):
+            raise ValueError("point has already been removed")
+
+        levels = self._level_of[ids]
+        for level in np.unique(levels):
+            bucket = self._levels[level]
+            pos = self._pos_of[ids[levels == level]]
+            bucket.alive[pos] = False
+            bucket.n_dead += len(pos)
+            if 2*bucket.n_dead >= len(bucket.ids):
+                # rebuild the bucket from its remaining points
+                data, bucket_ids = bucket.live_points()
+                self._set_bucket(level, data, bucket_ids)
+        self._level_of[ids] = -1
+        self._pos_of[ids] = -1
+        self.n -= len(ids)
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def data(self):
+        """The current points, ordered by id."""
+        data, ids = self._live_points()
+        return data[np.argsort(ids)]
+
+    @property
+    def ids(self):
+        """The ids of the current points, in increasing order."""
+        return np.nonzero(self._level_of >= 0)[0]
+
+    def _live_points(self):
+        data = [np.empty((0, self.m or 0))]
+        ids = [np.empty(0, dtype=np.intp)]
+        for bucket in self._levels:
+            if bucket is not None:
+                d, i = bucket.live_points()
+                data.append(d)
+                ids.append(i)
+        return np.concatenate(data), np.concatenate(ids)
+
+    def query(self, x, k=1, eps=0, p=2, distance_upper_bound=np.inf):
+        """
+        Query the tree for nearest neighbors.
+
+        Parameters
+        ----------
+        x : array_like, last dimension self.m
+            An array of points to query.
+        k : integer
+            The number of nearest neighbors to return.
+        eps : non-negative float
+            Return approximate nearest neighbors, see `cKDTree.query`.
+        p : float, 1<=p<=infinity
+            Which Minkowski p-norm to use.
+        distance_upper_bound : nonnegative float
+            Return only neighbors within this distance.
+
+        Returns
+        -------
+        d : array of floats
+            The distances to the nearest neighbors, as for `cKDTree.query`.
+            Missing neighbors are indicated with infinite distances.
+        i : ndarray of ints
+            The ids of the neighbors.  Missing neighbors are indicated
+            with -1.
+
+        """
+        x = self._check_points(x)
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        single = (x.ndim == 1)
+        retshape = x.shape[:-1]
+        xx = np.reshape(x, (-1, self.m))
+        nq = xx.shape[0]
+
+        dd = [np.empty((nq, 0))]
+        ii = [np.empty((nq, 0), dtype=np.intp)]
+        for bucket in self._levels:
+            if bucket is None:
+                continue
+            # ask for enough neighbors that k of them are still present
+            kk = min(k + bucket.n_dead, len(bucket.ids))
+            d, i = bucket.tree.query(xx, k=kk, eps=eps, p=p,
+                                     distance_upper_bound=distance_upper_bound)
+            d = np.reshape(d, (nq, kk))
+            i = np.reshape(i, (nq, kk))
+            found = (i < len(bucket.ids))
+            found[found] = bucket.alive[i[found]]
+            d = np.where(found, d, np.inf)
+            ids = np.where(found, bucket.ids[np.where(found, i, 0)], -1)
+            dd.append(d)
+            ii.append(ids)
+
+        dd = np.concatenate(dd, axis=1)
+        ii = np.concatenate(ii, axis=1)
+        if dd.shape[1] < k:
+            pad = k - dd.shape[1]
+            dd = np.hstack((dd, np.empty((nq, pad)) + np.inf))
+            ii = np.hstack((ii, -np.ones((nq, pad), dtype=np.intp)))
+        order = np.argsort(dd, axis=1, kind='mergesort')[:, :k]
+        rows = np.arange(nq)[:, np.newaxis]
+        dd = dd[rows, order]
+        ii = ii[rows, order]
+
+        if k == 1:
+            dd = np.reshape(dd, retshape)
+            ii = np.reshape(ii, retshape)
+            if single:
+                return dd[()], int(ii[()])
+        else:
+            dd = np.reshape(dd, retshape + (k,))
+            ii = np.reshape(ii, retshape + (k,))
+        return dd, ii
+
+    def query_ball_point(self, x, r, p=2., eps=0):
+        """
+        Find all points within distance r of point(s) x.
+
+        Parameters
+        ----------
+        x : array_like, shape tuple + (self.m,)
+            The point or points to search for neighbors of.
+        r : positive float
+            The radius of points to return.
+        p : float, optional
+            Which Minkowski p-norm to use.
+        eps : nonnegative float, optional
+            Approximate search, see `cKDTree.query_ball_point`.
+
+        Returns
+        -------
+        results : list or array of lists
+            If `x` is a single point, returns a sorted list of the ids of
+            the neighbors of `x`.  If `x` is an array of points, returns an
+            object array of shape tuple containing such lists.
+
+        """
+        x = self._check_points(x)
+        retshape = x.shape[:-1]
+        xx = np.reshape(x, (-1, self.m))
+        nq = xx.shape[0]
+
+        id_parts = []
+        offset_parts = []
+        for bucket in self._levels:
+            if bucket is None:
+                continue
+            indices, offsets = bucket.tree.query_ball_point(
+                xx, r, p=p, eps=eps, output='csr')
+            alive = bucket.alive[indices]
+            # number of neighbors still present for each query point
+            counts = np.add.reduceat(np.append(alive, 0).astype(np.intp),
+                                     offsets[:-1]) * (np.diff(offsets) > 0)
+            id_parts.append(bucket.ids[indices[alive]])
+            offset_parts.append(np.concatenate(([0], np.cumsum(counts))))
+
+        results = np.empty(nq, dtype=object)
+        for c in range(nq):
+            found = [ids[offsets[c]:offsets[c+1]]
+                     for ids, offsets in zip(id_parts, offset_parts)]
+            results[c] = np.sort(np.concatenate(
+                found + [np.empty(0, dtype=np.intp)])).tolist()
+        if x.ndim == 1:
+            return results[0]
+        return np.reshape(results, retshape)
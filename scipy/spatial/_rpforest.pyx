@@ -0,0 +1,664 @@
+# Released under the scipy license
+"""
+Random projection forest for approximate nearest-neighbor queries.
+"""
+import numpy as np
+
+from scipy.lib._threads import run_threads, cpu_count
+
+cimport numpy as np
+cimport libc.stdlib as stdlib
+from libc.math cimport sqrt
+
+cdef np.float64_t infinity = np.inf
+
+__all__ = ['RPForest']
+
+
+# Tree nodes
+# ==========
+#
+# An inner node splits its points by a hyperplane: the points x with
+# dot(direction, x) < split go to the less child.  The directions are
+# unit vectors, so that |dot(direction, x) - split| is the distance of x
+# to the hyperplane.
+
+cdef struct rpnode:
+    np.intp_t start_idx
+    np.intp_t end_idx
+    np.intp_t less      # index of the children; -1 for a leaf
+    np.intp_t greater
+    np.float64_t split
+
+# numpy description of rpnode, used to store the node array
+_node_dtype = np.dtype([('start_idx', np.intp),
+                        ('end_idx', np.intp),
+                        ('less', np.intp),
+                        ('greater', np.intp),
+                        ('split', np.float64)], align=True)
+
+
+cdef inline np.float64_t dot(np.float64_t *x, np.float64_t *y,
+                             np.intp_t m) nogil:
+    cdef np.intp_t i
+    cdef np.float64_t r = 0
+    for i in range(m):
+        r += x[i] * y[i]
+    return r
+
+
+cdef inline np.float64_t sqeuclidean(np.float64_t *x, np.float64_t *y,
+                                     np.intp_t m) nogil:
+    cdef np.intp_t i
+    cdef np.float64_t r = 0, z
+    for i in range(m):
+        z = x[i] - y[i]
+        r += z*z
+    return r
+
+
+# Building a tree
+# ===============
+
+cdef struct tree_builder:
+    np.float64_t *data
+    np.intp_t m, leafsize
+    np.intp_t *indices      # permutation of the points of this tree
+    np.float64_t *proj      # projections of the points, by position
+    np.intp_t *random       # two random numbers for every node
+    rpnode *nodes
+    np.float64_t *directions
+    np.intp_t n_nodes
+
+
+cdef void select_nth(np.float64_t *proj, np.intp_t *indices, np.intp_t lo,
+                     np.intp_t hi, np.intp_t k) nogil:
+    # Quickselect on proj[lo:hi], permuting indices along with it, so that
+    # proj[k] is in its sorted position.
+    cdef np.intp_t i, j, t
+    cdef np.float64_t a, b, c, pivot, s
+    while hi - lo > 1:
+        a = proj[lo]
+        b = proj[lo + (hi - lo) // 2]
+        c = proj[hi - 1]
+        if (a <= b) == (b <= c):
+            pivot = b
+        elif (b <= a) == (a <= c):
+            pivot = a
+        else:
+            pivot = c
+        i = lo
+        j = hi - 1
+        while i <= j:
+            while proj[i] < pivot:
+                i += 1
+            while proj[j] > pivot:
+                j -= 1
+            if i <= j:
+                s = proj[i]
+                proj[i] = proj[j]
+                proj[j] = s
+                t = indices[i]
+                indices[i] = indices[j]
+                indices[j] = t
+                i += 1
+                j -= 1
+        if k <= j:
+            hi = j + 1
+        elif k >= i:
+            lo = i
+        else:
+            return
+
+
+cdef np.intp_t build_node(tree_builder *b, np.intp_t start_idx,
+                          np.intp_t end_idx) nogil:
+    # Add the subtree over indices[start_idx:end_idx] to the node array
+    # and return the index of its root.
+    cdef rpnode *node
+    cdef np.intp_t node_index, i, j, d, n, mid, pa, pb, m = b.m
+    cdef np.float64_t *w
+    cdef np.float64_t *xa
+    cdef np.float64_t norm, max_less
+
+    node_index = b.n_nodes
+    b.n_nodes += 1
+    node = b.nodes + node_index
+    node.start_idx = start_idx
+    node.end_idx = end_idx
+    node.less = node.greater = -1
+    node.split = 0
+
+    n = end_idx - start_idx
+    if n <= b.leafsize:
+        return node_index
+
+    # The hyperplane is normal to the difference of two random points;
+    # this adapts the directions to the distribution of the data.
+    w = b.directions + node_index*m
+    pa = start_idx + b.random[2*node_index] % n
+    pb = start_idx + b.random[2*node_index + 1] % (n - 1)
+    if pb >= pa:
+        pb += 1
+    xa = b.data + b.indices[pa]*m
+    norm = 0
+    j = pb
+    for i in range(n):
+        # fall back to other points if the two points coincide
+        for d in range(m):
+            w[d] = b.data[b.indices[j]*m + d] - xa[d]
+        norm = sqrt(dot(w, w, m))
+        if norm > 0:
+            break
+        j += 1
+        if j == end_idx:
+            j = start_idx
+    if norm == 0:
+        # all points are identical
+        return node_index
+    for d in range(m):
+        w[d] /= norm
+
+    # split at the median projection
+    for i in range(start_idx, end_idx):
+        b.proj[i] = dot(w, b.data + b.indices[i]*m, m)
+    mid = start_idx + n // 2
+    select_nth(b.proj, b.indices, start_idx, end_idx, mid)
+    max_less = b.proj[start_idx]
+    for i in range(start_idx + 1, mid):
+        if b.proj[i] > max_less:
+            max_less = b.proj[i]
+    node.split = (max_less + b.proj[mid]) / 2
+
+    i = build_node(b, start_idx, mid)
+    j = build_node(b, mid, end_idx)
+    node = b.nodes + node_index
+    node.less = i
+    node.greater = j
+    return node_index
+
+
+# Searching the forest
+# ====================
+#
+# All trees are searched together, best cell first.  The cost of a cell
+# is the largest distance from the query point to a hyperplane that
+# separates it from the cell, which is a lower bound of the distance to
+# the points of the cell.
+
+cdef struct cellitem:
+    np.float64_t cost
+    np.intp_t node
+
+cdef struct cellheap:
+    cellitem *items
+    np.intp_t n, space
+
+cdef inline int cellheap_push(cellheap *h, np.float64_t cost,
+                              np.intp_t node) nogil:
+    cdef void *tmp
+    cdef np.intp_t i
+    cdef cellitem t
+    if h.n == h.space:
+        tmp = stdlib.realloc(h.items, (2*h.space + 16) * sizeof(cellitem))
+        if tmp == NULL:
+            return -1
+        h.items = <cellitem*> tmp
+        h.space = 2*h.space + 16
+    i = h.n
+    h.n += 1
+    h.items[i].cost = cost
+    h.items[i].node = node
+    while i > 0 and h.items[i].cost < h.items[(i - 1) // 2].cost:
+        t = h.items[(i - 1) // 2]
+        h.items[(i - 1) // 2] = h.items[i]
+        h.items[i] = t
+        i = (i - 1) // 2
+    return 0
+
+cdef inline cellitem cellheap_pop(cellheap *h) nogil:
+    cdef cellitem top = h.items[0], t
+    cdef np.intp_t i = 0, l
+    h.n -= 1
+    h.items[0] = h.items[h.n]
+    while True:
+        l = 2*i + 1
+        if l >= h.n:
+            break
+        if l + 1 < h.n and h.items[l + 1].cost < h.items[l].cost:
+            l += 1
+        if h.items[i].cost <= h.items[l].cost:
+            break
+        t = h.items[l]
+        h.items[l] = h.items[i]
+        h.items[i] = t
+        i = l
+    return top
+
+
+# Main class
+# ==========
+
+cdef class RPForest:
+    """
+    RPForest(data, n_trees=10, leafsize=30, random_state=None, n_jobs=1)
+
+    Random projection forest for approximate nearest-neighbor lookup
+
+    Each tree of the forest splits the points recursively in halves by
+    hyperplanes normal to the difference of two randomly chosen points.
+    A query searches the cells of all trees together, nearest cell first,
+    and computes the exact distances to the points of the cells it
+    visits until `search_k` points have been examined.  Because points
+    that are close to a query point but separated from it by a hyperplane
+    in one tree usually lie on the same side in another tree, a few trees
+    find most of the nearest neighbors while examining only a small
+    fraction of the points, even in many dimensions where `cKDTree` visits
+    most of its leaves.
+
+    Distances are Euclidean.
+
+    Parameters
+    ----------
+    data : array_like, shape (n,m)
+        The n data points of dimension m to be indexed.
+    n_trees : positive int, optional
+        The number of trees.  More trees give a higher recall for the
+        same number of examined points, at the cost of memory and build
+        time.  Default: 10.
+    leafsize : positive int, optional
+        The largest number of points in a leaf.  Default: 30.
+    random_state : int or numpy.random.RandomState, optional
+        Seed or random number generator for choosing the hyperplanes.
+    n_jobs : int, optional
+        Number of threads used to build the trees.  If -1 is given, all
+        CPU cores are used.  Default: 1.
+
+    See Also
+    --------
+    cKDTree : exact nearest-neighbor queries
+
+    Notes
+    -----
+    The cost of a cell is the largest distance from the query point to
+    the hyperplanes that separate the point from the cell.  This is a lower
+    bound of the distance to every point in the cell, so the search stops
+    early, with exact results, once no cell can contain a point nearer than
+    the k-th neighbor found.  With ``search_k >= n_trees * n`` the search
+    is therefore always exact.
+
+    Examples
+    --------
+    >>> from scipy.spatial import RPForest
+    >>> data = np.random.randn(10000, 64)
+    >>> forest = RPForest(data, n_trees=20)
+    >>> d, i = forest.query(data[:5], k=10, search_k=5000)
+
+    """
+
+    cdef readonly np.ndarray data
+    cdef readonly np.intp_t n, m
+    cdef readonly np.intp_t n_trees, leafsize
+    cdef np.ndarray nodes
+    cdef np.ndarray directions
+    cdef np.ndarray indices
+    cdef np.ndarray roots
+    cdef np.float64_t *raw_data
+    cdef rpnode *raw_nodes
+    cdef np.float64_t *raw_directions
+    cdef np.intp_t *raw_indices
+    cdef np.intp_t *raw_roots
+
+    def __init__(RPForest self, data, np.intp_t n_trees=10,
+                 np.intp_t leafsize=30, random_state=None, n_jobs=1):
+        self.data = np.ascontiguousarray(data, dtype=np.float64)
+        if self.data.ndim != 2:
+            raise ValueError("data must be a two-dimensional array")
+        self.n, self.m = np.shape(self.data)
+        self.raw_data = <np.float64_t*>np.PyArray_DATA(self.data)
+        if n_trees < 1:
+            raise ValueError("n_trees must be at least 1")
+        if leafsize < 1:
+            raise ValueError("leafsize must be at least 1")
+        self.n_trees = n_trees
+        self.leafsize = leafsize
+        if n_jobs == -1:
+            n_jobs = cpu_count()
+        elif n_jobs < 1:
+            raise ValueError("n_jobs must be a positive integer or -1")
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+
+        # leaves hold at least (leafsize+1)//2 points
+        max_nodes = 2*(self.n // ((leafsize + 1) // 2)) + 1
+        self.indices = np.empty((n_trees, self.n), dtype=np.intp)
+        self.indices[...] = np.arange(self.n)
+        randoms = [random_state.randint(0, 2**30, size=2*max_nodes)
+                   .astype(np.intp) for t in range(n_trees)]
+        trees = [None] * n_trees
+
+        def build(t):
+            trees[t] = self._build_tree(self.indices[t], randoms[t],
+                                        max_nodes)
+
+        if n_jobs == 1:
+            for t in range(n_trees):
+                build(t)
+        else:
+            for first in range(0, n_trees, n_jobs):
+                run_threads(build, [(t,) for t in
+                                     range(first, min(first + n_jobs, n_trees))])
+
+        # concatenate the node arrays of the trees
+        roots = []
+        nodes = []
+        base = 0
+        for tree_nodes, tree_directions in trees:
+            inner = tree_nodes['less'] >= 0
+            tree_nodes['less'][inner] += base
+            tree_nodes['greater'][inner] += base
+            roots.append(base)
+            nodes.append(tree_nodes)
+            base += len(tree_nodes)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.nodes = np.concatenate(nodes)
+        self.directions = np.ascontiguousarray(
+            np.concatenate([d for _, d in trees]))
+
+        self.raw_nodes = <rpnode*>np.PyArray_DATA(self.nodes)
+        self.raw_directions = <np.float64_t*>np.PyArray_DATA(self.directions)
+        self.raw_indices = <np.intp_t*>np.PyArray_DATA(self.indices)
+        self.raw_roots = <np.intp_t*>np.PyArray_DATA(self.roots)
+
+    def _build_tree(RPForest self, np.ndarray indices, np.ndarray random,
+                    np.intp_t max_nodes):
+        # Build one tree, permuting indices; return its nodes and the
+        # directions of their hyperplanes.
+        cdef tree_builder b
+        cdef np.ndarray nodes, directions, proj
+        nodes = np.empty(max_nodes, dtype=_node_dtype)
+        directions = np.empty((max_nodes, self.m), dtype=np.float64)
+        proj = np.empty(self.n, dtype=np.float64)
+        b.data = self.raw_data
+        b.m = self.m
+        b.leafsize = self.leafsize
+        b.indices = <np.intp_t*>np.PyArray_DATA(indices)
+        b.proj = <np.float64_t*>np.PyArray_DATA(proj)
+        b.random = <np.intp_t*>np.PyArray_DATA(random)
+        b.nodes = <rpnode*>np.PyArray_DATA(nodes)
+        b.directions = <np.float64_t*>np.PyArray_DATA(directions)
+        b.n_nodes = 0
+        with nogil:
+            build_node(&b, 0, self.n)
+        return nodes[:b.n_nodes].copy(), directions[:b.n_nodes]
+
+    def __reduce__(RPForest self):
+        return (_rpforest_from_state, (self._state(),))
+
+    def _state(RPForest self):
+        return {'data': self.data, 'n_trees': self.n_trees,
+                'leafsize': self.leafsize, 'nodes': self.nodes,
+                'directions': self.directions, 'indices': self.indices,
+                'roots': self.roots}
+
+    def _set_state(RPForest self, state):
+        self.data = np.ascontiguousarray(state['data'], dtype=np.float64)
+        if self.data.ndim != 2:
+            raise ValueError("inconsistent RPForest arrays")
+        self.n, self.m = np.shape(self.data)
+        self.n_trees = state['n_trees']
+        self.leafsize = state['leafsize']
+        self.nodes = np.ascontiguousarray(state['nodes'], dtype=_node_dtype)
+        self.directions = np.ascontiguousarray(state['directions'],
+                                               dtype=np.float64)
+        self.indices = np.ascontiguousarray(state['indices'], dtype=np.intp)
+        self.roots = np.ascontiguousarray(state['roots'], dtype=np.intp)
+        if (self.n_trees < 1 or self.leafsize < 1
+                or self.nodes.ndim != 1 or self.nodes.shape[0] < 1
+                or np.shape(self.directions) != (self.nodes.shape[0], self.m)
+                or np.shape(self.indices) != (self.n_trees, self.n)
+                or np.shape(self.roots) != (self.n_trees,)
+                or not _valid_forest_nodes(self.nodes, self.roots, self.n)
+                or (self.n > 0 and (self.indices.min() < 0
+                                    or self.indices.max() >= self.n))):
+            raise ValueError("inconsistent RPForest arrays")
+        self.raw_data = <np.float64_t*>np.PyArray_DATA(self.data)
+        self.raw_nodes = <rpnode*>np.PyArray_DATA(self.nodes)
+        self.raw_directions = <np.float64_t*>np.PyArray_DATA(self.directions)
+        self.raw_indices = <np.intp_t*>np.PyArray_DATA(self.indices)
+        self.raw_roots = <np.intp_t*>np.PyArray_DATA(self.roots)
+
+    # -----
+    # query
+    # -----
+
+    cdef int __query_point(RPForest self, np.float64_t *x, np.intp_t k,
+                           np.intp_t search_k, np.float64_t upper_bound,
+                           np.float64_t *dd, np.intp_t *ii,
+                           np.intp_t *seen, np.intp_t stamp,
+                           cellheap *heap) nogil:
+        # Search for the k nearest neighbors of x and store their squared
+        # distances and indices in dd and ii, in increasing order.
+        cdef rpnode *node
+        cdef cellitem item
+        cdef np.intp_t t, i, j, idx, examined = 0
+        cdef np.float64_t d, margin, bound
+
+        heap.n = 0
+        for t in range(self.n_trees):
+            if cellheap_push(heap, 0, self.raw_roots[t]) < 0:
+                return -1
+
+        while heap.n > 0 and examined < search_k:
+            item = cellheap_pop(heap)
+            bound = dd[k - 1]
+            if upper_bound < bound:
+                bound = upper_bound
+            if item.cost * item.cost >= bound:
+                # no remaining cell can hold a nearer point
+                break
+
+            # descend to a leaf, queueing the far sides
+            node = self.raw_nodes + item.node
+            while node.less >= 0:
+                margin = dot(self.raw_directions + (node - self.raw_nodes)*self.m,
+                             x, self.m) - node.split
+                if margin < 0:
+                    if cellheap_push(heap, max_cost(item.cost, -margin),
+                                     node.greater) < 0:
+                        return -1
+                    node = self.raw_nodes + node.less
+                else:
+                    if cellheap_push(heap, max_cost(item.cost, margin),
+                                     node.less) < 0:
+                        return -1
+                    node = self.raw_nodes + node.greater
+
+            # the tree of a node is found from its position in indices
+            t = tree_of_node(self, node - self.raw_nodes)
+            for i in range(node.start_idx, node.end_idx):
+                idx = self.raw_indices[t*self.n + i]
+                examined += 1
+                if seen[idx] == stamp:
+                    continue
+                seen[idx] = stamp
+                d = sqeuclidean(x, self.raw_data + idx*self.m, self.m)
+                if d < dd[k - 1] and d < upper_bound:
+                    j = k - 1
+                    while j > 0 and dd[j - 1] > d:
+                        dd[j] = dd[j - 1]
+                        ii[j] = ii[j - 1]
+                        j -= 1
+                    dd[j] = d
+                    ii[j] = idx
+        return 0
+
+    cdef int __query_rows(RPForest self, np.ndarray dd, np.ndarray ii,
+                          np.ndarray xx, np.intp_t start, np.intp_t stop,
+                          np.intp_t k, np.intp_t search_k,
+                          np.float64_t upper_bound) except -1:
+        cdef np.ndarray seen
+        cdef np.intp_t c, failed = 0
+        cdef cellheap heap
+        cdef np.float64_t *raw_dd = <np.float64_t*>np.PyArray_DATA(dd)
+        cdef np.intp_t *raw_ii = <np.intp_t*>np.PyArray_DATA(ii)
+        cdef np.float64_t *raw_xx = <np.float64_t*>np.PyArray_DATA(xx)
+        cdef np.intp_t *raw_seen
+
+        # seen[i] == c marks the points examined for query point c
+        seen = np.empty(self.n, dtype=np.intp)
+        seen.fill(-1)
+        raw_seen = <np.intp_t*>np.PyArray_DATA(seen)
+        heap.items = NULL
+        heap.n = heap.space = 0
+        with nogil:
+            for c in range(start, stop):
+                if self.__query_point(raw_xx + c*self.m, k, search_k,
+                                      upper_bound, raw_dd + c*k,
+                                      raw_ii + c*k, raw_seen, c, &heap) < 0:
+                    failed = 1
+                    break
+            stdlib.free(heap.items)
+        if failed:
+            raise MemoryError
+        return 0
+
+    def _query_rows_worker(RPForest self, np.ndarray dd, np.ndarray ii,
+                           np.ndarray xx, np.intp_t start, np.intp_t stop,
+                           np.intp_t k, np.intp_t search_k,
+                           np.float64_t upper_bound):
+        # thread entry point for query(..., n_jobs>1)
+        self.__query_rows(dd, ii, xx, start, stop, k, search_k, upper_bound)
+
+    def query(RPForest self, object x, np.intp_t k=1, search_k=None,
+              np.float64_t distance_upper_bound=infinity, n_jobs=1):
+        """query(self, x, k=1, search_k=None, distance_upper_bound=np.inf, n_jobs=1)
+
+        Query the forest for approximate nearest neighbors
+
+        Parameters
+        ----------
+        x : array_like, last dimension self.m
+            An array of points to query.
+        k : integer
+            The number of nearest neighbors to return.
+        search_k : int, optional
+            The number of points to examine for each query point, counting
+            a point once for every tree in which it is examined.  This is
+            the trade-off between recall and speed: the time of a query
+            grows linearly with `search_k`.  Default: ``n_trees * leafsize``,
+            about one leaf per tree.
+        distance_upper_bound : nonnegative float
+            Return only neighbors within this distance.
+        n_jobs : int, optional
+            Number of threads to use for the queries.  If -1 is given, all
+            CPU cores are used.  Default: 1.
+
+        Returns
+        -------
+        d : array of floats
+            The distances to the nearest neighbors found, in the format of
+            `cKDTree.query`.  Missing neighbors are indicated with
+            infinite distances.
+        i : ndarray of ints
+            The locations of the neighbors in self.data.  Missing
+            neighbors are indicated with self.n.
+
+        """
+        cdef np.ndarray dd, ii, xx
+        cdef np.intp_t n, i, chunk
+        x = np.asarray(x, dtype=np.float64)
+        if np.shape(x)[-1] != self.m:
+            raise ValueError("x must consist of vectors of length %d but has "
+                             "shape %s" % (int(self.m), np.shape(x)))
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        if search_k is None:
+            search_k = self.n_trees * self.leafsize
+        elif search_k < 1:
+            raise ValueError("search_k must be at least 1")
+        # examining more points than are in the trees is exhaustive
+        search_k = min(search_k, self.n_trees * self.n)
+        if n_jobs == -1:
+            n_jobs = cpu_count()
+        elif n_jobs < 1:
+            raise ValueError("n_jobs must be a positive integer or -1")
+        single = (x.ndim == 1)
+        retshape = np.shape(x)[:-1]
+        n = <np.intp_t> np.prod(retshape)
+        xx = np.ascontiguousarray(np.reshape(x, (n, self.m)))
+        dd = np.empty((n, k), dtype=np.float64)
+        dd.fill(infinity)
+        ii = np.empty((n, k), dtype=np.intp)
+        ii.fill(self.n)
+        # internally, distances are squared
+        upper_bound = distance_upper_bound * distance_upper_bound
+
+        if n_jobs == 1 or n < 2:
+            self.__query_rows(dd, ii, xx, 0, n, k, search_k, upper_bound)
+        else:
+            chunk = (n + n_jobs - 1) // n_jobs
+            run_threads(self._query_rows_worker,
+                         [(dd, ii, xx, i, min(i + chunk, n), k, search_k,
+                           upper_bound)
+                          for i in range(0, n, chunk)])
+        dd = np.sqrt(dd)
+
+        if single:
+            if k == 1:
+                return float(dd[0, 0]), int(ii[0, 0])
+            return dd[0], ii[0]
+        elif k == 1:
+            return np.reshape(dd[..., 0], retshape), np.reshape(ii[..., 0], retshape)
+        else:
+            return np.reshape(dd, retshape + (k,)), np.reshape(ii, retshape + (k,))
+
+
+cdef inline np.float64_t max_cost(np.float64_t a, np.float64_t b) nogil:
+    if a > b:
+        return a
+    return b
+
+
+cdef inline np.intp_t tree_of_node(RPForest forest, np.intp_t node) nogil:
+    # the roots are in increasing order; find the last one <= node
+    cdef np.intp_t lo = 0, hi = forest.n_trees, mid
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if forest.raw_roots[mid] <= node:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def _valid_forest_nodes(nodes, roots, n):
+    # Whether the node array of a pickled forest can be walked safely: the
+    # trees are consecutive runs of nodes starting at their roots, every
+    # node covers a range of the n points, and the children of every inner
+    # node are later nodes of its tree that split its range in two.
+    n_nodes = nodes.shape[0]
+    start = nodes['start_idx']
+    end = nodes['end_idx']
+    if (roots[0] != 0 or np.any(np.diff(roots) <= 0)
+            or roots[-1] >= n_nodes
+            or np.any(start[roots] != 0) or np.any(end[roots] != n)
+            or np.any((start < 0) | (start > end) | (end > n))):
+        return False
+    inner = np.nonzero(nodes['less'] >= 0)[0]
+    less = nodes['less'][inner]
+    greater = nodes['greater'][inner]
+    tree_end = np.append(roots[1:], n_nodes)[
+        np.searchsorted(roots, inner, side='right') - 1]
+    if (np.any((less <= inner) | (less >= tree_end))
+            or np.any((greater <= inner) | (greater >= tree_end))):
+        return False
+    return not (np.any(start[less] != start[inner])
+                or np.any(end[less] != start[greater])
+                or np.any(end[greater] != end[inner]))
+
+
+def _rpforest_from_state(state):
+    forest = RPForest.__new__(RPForest)
+    forest._set_state(state)
+    return forest
@@ -2,7 +2,7 @@ from __future__ import division, print_function, absolute_import
 
 import sys
 from numpy.testing import *
-from scipy.spatial import cKDTree, KDTree
+from scipy.spatial import cKDTree, KDTree, RPForest
 import numpy as np
 
 
@@ -27,6 +27,29 @@ class TestBuild(TestCase):
             sys.stdout.flush()
             print('')
 
+    def bench_build_options(self):
+        print()
+        print('             Constructing cKDTree')
+        print('=================================================================')
+        print(' dim | # points | midpoint | balanced | midpoint  | balanced  ')
+        print('     |          |          |          | all cores | all cores ')
+
+        for (m, n, repeat) in [(3,1000000,1), (8,1000000,1), (3,4000000,1)]:
+            print('%4s | %8s ' % (m, n), end=' ')
+            sys.stdout.flush()
+
+            # clustered data, for which the two splitting rules differ
+            data = np.concatenate((np.random.randn(n//2,m),
+                                   np.random.randn(n-n//2,m)*0.01+np.ones(m)))
+
+            for stmt in ['cKDTree(data)',
+                         'cKDTree(data, balanced_tree=True)',
+                         'cKDTree(data, n_jobs=-1)',
+                         'cKDTree(data, balanced_tree=True, n_jobs=-1)']:
+                print('| %7.3fs ' % (measure(stmt, repeat) / repeat), end=' ')
+                sys.stdout.flush()
+            print('')
+
 
 class TestQuery(TestCase):
 
@@ -182,5 +205,34 @@ class TestCountNeighbors(TestCase):
                 sys.stdout.flush()
                 print('')
 
+
+class TestApproximateQuery(TestCase):
+    def bench_rpforest(self):
+        print()
+        print('        Approximate 10-nearest-neighbor queries, RPForest vs cKDTree')
+        print('========================================================================')
+        print(' dim | # points | # queries |   method                |  recall | queries/s')
+
+        for (m, n, r) in [(16,100000,1000), (64,100000,1000), (128,50000,500)]:
+            data = np.random.randn(n,m)
+            queries = np.random.randn(r,m)
+
+            T = cKDTree(data)
+            F = RPForest(data, n_trees=10)
+            t = measure('d0, i0 = T.query(queries, k=10)', 1)
+            d0, i0 = T.query(queries, k=10)
+            print('%4s | %8s | %9s | %-23s | %7.3f | %9.0f' %
+                  (m, n, r, 'cKDTree (exact)', 1, r / t))
+
+            for search_k in (300, 1000, 3000, 10000):
+                t = measure('d, i = F.query(queries, k=10, search_k=search_k)', 1)
+                d, i = F.query(queries, k=10, search_k=search_k)
+                recall = np.mean([len(set(a) & set(b)) / 10.
+                                  for a, b in zip(i, i0)])
+                print('%4s | %8s | %9s | %-23s | %7.3f | %9.0f' %
+                      (m, n, r, 'RPForest search_k=%d' % search_k, recall,
+                       r / t))
+                sys.stdout.flush()
+
 if __name__ == "__main__":
     run_module_suite()
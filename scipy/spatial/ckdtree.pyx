@@ -3,9 +3,14 @@
 # Released under the scipy license
 import numpy as np
 import scipy.sparse
+import threading
+
+from scipy.lib._threads import run_threads, cpu_count
+from ._arrayfile import save_arrays, load_arrays
 
 cimport numpy as np
 cimport libc.stdlib as stdlib
+from libc.string cimport memcpy
 cimport cython
 
 cdef extern from "limits.h":
@@ -14,6 +19,29 @@ cdef np.float64_t infinity = np.inf
 
 __all__ = ['cKDTree']
 
+_CKDTREE_FILE_TAG = 'scipy.spatial.cKDTree'
+
+
+# Thread pool helpers
+# ===================
+
+def _build_in_threads(builder, n_tasks, n_jobs):
+    """Build the subtrees of a _TreeBuilder in n_jobs threads, which
+    take the next unbuilt subtree whenever they are done with one."""
+    lock = threading.Lock()
+    next_task = [0]
+
+    def worker():
+        while True:
+            with lock:
+                t = next_task[0]
+                next_task[0] += 1
+            if t >= n_tasks:
+                return
+            builder.build_tasks(t, t + 1)
+
+    run_threads(worker, [()] * min(n_jobs, n_tasks))
+
 
 # Notes on int and 64-bit cleanliness
 # ===================================
@@ -85,6 +113,11 @@ cdef inline int list_append(list results, np.intp_t i) except -1:
 
 # Priority queue
 # ==============
+#
+# The heap is a plain C struct manipulated by nogil functions, so that
+# the nearest-neighbor search in cKDTree.__query can run with the GIL
+# released.  Functions that allocate memory return -1 on failure; the
+# caller is responsible for raising MemoryError once it holds the GIL.
 cdef union heapcontents:    # FIXME: Unions are not always portable, verify this 
     np.intp_t intdata     # union is never used in an ABI dependent way.
     char* ptrdata
@@ -93,105 +126,106 @@ cdef struct heapitem:
     np.float64_t priority
     heapcontents contents
 
-cdef class heap(object):
-    cdef np.intp_t n
-    cdef heapitem* heap
-    cdef np.intp_t space
-    
-    def __init__(heap self, np.intp_t initial_size):
-        cdef void *tmp
-        self.space = initial_size
-        self.heap = <heapitem*> NULL
-        tmp = stdlib.malloc(sizeof(heapitem)*self.space)
-        if tmp == NULL:
-            raise MemoryError
-        self.heap = <heapitem*> tmp  
-        self.n = 0
+cdef struct heap:
+    np.intp_t n
+    heapitem* heap
+    np.intp_t space
+
+cdef inline int heap_init(heap *self, np.intp_t initial_size) nogil:
+    self.n = 0
+    self.space = initial_size
+    self.heap = <heapitem*> stdlib.malloc(sizeof(heapitem)*self.space)
+    if self.heap == <heapitem*> NULL:
+        return -1
+    return 0
 
-    def __dealloc__(heap self):
-        if self.heap != <heapitem*> NULL:
-            stdlib.free(self.heap)
+cdef inline void heap_free(heap *self) nogil:
+    if self.heap != <heapitem*> NULL:
+        stdlib.free(self.heap)
+        self.heap = <heapitem*> NULL
 
-    cdef inline int _resize(heap self, np.intp_t new_space) except -1:
-        cdef void *tmp
-        if new_space < self.n:
-            raise ValueError("Heap containing %d items cannot be resized to %d" % (int(self.n), int(new_space)))
-        self.space = new_space
-        tmp = stdlib.realloc(<void*>self.heap, new_space*sizeof(heapitem))
-        if tmp == NULL:
-            raise MemoryError
-        self.heap = <heapitem*> tmp
-        return 0
+cdef inline int heap_resize(heap *self, np.intp_t new_space) nogil:
+    cdef void *tmp
+    if new_space < self.n:
+        return -1
+    tmp = stdlib.realloc(<void*>self.heap, new_space*sizeof(heapitem))
+    if tmp == NULL:
+        return -1
+    self.space = new_space
+    self.heap = <heapitem*> tmp
+    return 0
 
-    @cython.cdivision(True)
-    cdef inline int push(heap self, heapitem item) except -1:
-        cdef np.intp_t i
-        cdef heapitem t
+@cython.cdivision(True)
+cdef inline int heap_push(heap *self, heapitem item) nogil:
+    cdef np.intp_t i
+    cdef heapitem t
 
-        self.n += 1
-        if self.n > self.space:
-            self._resize(2 * self.space + 1)
-            
-        i = self.n - 1
-        self.heap[i] = item
+    if self.n == self.space:
+        if heap_resize(self, 2 * self.space + 1) < 0:
+            return -1
+    self.n += 1
         
-        while i > 0 and self.heap[i].priority < self.heap[(i - 1) // 2].priority:
-            t = self.heap[(i - 1) // 2]
-            self.heap[(i - 1) // 2] = self.heap[i]
-            self.heap[i] = t
-            i = (i - 1) // 2
-        return 0
-    
-    
-    cdef heapitem peek(heap self):
-        return self.heap[0]
-    
-    
-    @cython.cdivision(True)
-    cdef int remove(heap self) except -1:
-        cdef heapitem t
-        cdef np.intp_t i, j, k, l
+    i = self.n - 1
+    self.heap[i] = item
     
-        self.heap[0] = self.heap[self.n-1]
-        self.n -= 1
-        # No point in freeing up space as the heap empties.
-        # The whole heap gets deallocated at the end of any query below
-        #if self.n < self.space//4 and self.space>40: #FIXME: magic number
-        #    self._resize(self.space // 2 + 1)
-        i=0
-        j=1
-        k=2
-        while ((j<self.n and 
-                    self.heap[i].priority > self.heap[j].priority or
-                k<self.n and 
-                    self.heap[i].priority > self.heap[k].priority)):
-            if k<self.n and self.heap[j].priority>self.heap[k].priority:
-                l = k
-            else:
-                l = j
-            t = self.heap[l]
-            self.heap[l] = self.heap[i]
-            self.heap[i] = t
-            i = l
-            j = 2*i+1
-            k = 2*i+2
-        return 0
-    
-    cdef int pop(heap self, heapitem *it) except -1:
-        it[0] = self.peek()
-        self.remove()
-        return 0
+    while i > 0 and self.heap[i].priority < self.heap[(i - 1) // 2].priority:
+        t = self.heap[(i - 1) // 2]
+        self.heap[(i - 1) // 2] = self.heap[i]
+        self.heap[i] = t
+        i = (i - 1) // 2
+    return 0
+
+
+cdef inline heapitem heap_peek(heap *self) nogil:
+    return self.heap[0]
+
+
+cdef void heap_remove(heap *self) nogil:
+    cdef heapitem t
+    cdef np.intp_t i, j, k, l
+
+    self.heap[0] = self.heap[self.n-1]
+    self.n -= 1
+    # No point in freeing up space as the heap empties.
+    # The whole heap gets deallocated at the end of any query below
+    i=0
+    j=1
+    k=2
+    while ((j<self.n and 
+                self.heap[i].priority > self.heap[j].priority or
+            k<self.n and 
+                self.heap[i].priority > self.heap[k].priority)):
+        if k<self.n and self.heap[j].priority>self.heap[k].priority:
+            l = k
+        else:
+            l = j
+        t = self.heap[l]
+        self.heap[l] = self.heap[i]
+        self.heap[i] = t
+        i = l
+        j = 2*i+1
+        k = 2*i+2
+
+cdef inline void heap_pop(heap *self, heapitem *it) nogil:
+    it[0] = heap_peek(self)
+    heap_remove(self)
 
 
 # Utility functions
 # =================
-cdef inline np.float64_t dmax(np.float64_t x, np.float64_t y):
+cdef inline np.float64_t dmax(np.float64_t x, np.float64_t y) nogil:
     if x>y:
         return x
     else:
         return y
         
-cdef inline np.float64_t dabs(np.float64_t x):
+cdef inline np.float64_t dmin(np.float64_t x, np.float64_t y) nogil:
+    if x<y:
+        return x
+    else:
+        return y
+
+cdef inline np.float64_t dabs(np.float64_t x) nogil:
     if x>0:
         return x
     else:
@@ -245,11 +279,94 @@ cdef class coo_entries:
                                        shape=shape)
 
 
+# Utility for collecting neighbor pairs without building Python lists
+cdef class neighbor_entries:
+    """Collect (i, j) neighbor pairs in growable index arrays.
+
+    The number of neighbors of each i is tracked in ``counts``.  If
+    `count_only` is set, only the counts are kept and the pairs themselves
+    are not stored.
+    """
+    cdef:
+        np.intp_t n, n_max
+        bint count_only
+        np.ndarray i, j, counts
+        np.intp_t  *i_data, *j_data
+        np.intp_t  *counts_data
+
+    def __init__(self, np.intp_t n_counts, bint count_only=False):
+        self.n = 0
+        self.n_max = 10
+        self.count_only = count_only
+        self.i = np.empty(self.n_max, dtype=np.intp)
+        self.j = np.empty(self.n_max, dtype=np.intp)
+        self.counts = np.zeros(n_counts, dtype=np.intp)
+        self.i_data = <np.intp_t *>np.PyArray_DATA(self.i)
+        self.j_data = <np.intp_t *>np.PyArray_DATA(self.j)
+        self.counts_data = <np.intp_t *>np.PyArray_DATA(self.counts)
+
+    cdef inline int add(neighbor_entries self, np.intp_t i,
+                        np.intp_t j) except -1:
+        cdef np.intp_t k
+        self.counts_data[i] += 1
+        if self.count_only:
+            return 0
+        if self.n == self.n_max:
+            self.n_max *= 2
+            self.i.resize(self.n_max)
+            self.j.resize(self.n_max)
+            self.i_data = <np.intp_t *>np.PyArray_DATA(self.i)
+            self.j_data = <np.intp_t *>np.PyArray_DATA(self.j)
+        k = self.n
+        self.i_data[k] = i
+        self.j_data[k] = j
+        self.n += 1
+        return 0
+
+    def to_csr(neighbor_entries self):
+        """Return the pairs as ``(indices, offsets)``, such that the
+        neighbors of ``i`` are ``indices[offsets[i]:offsets[i+1]]``, in
+        the order in which they were added."""
+        cdef np.ndarray offsets, indices, order
+        offsets = np.empty(self.counts.shape[0] + 1, dtype=np.intp)
+        offsets[0] = 0
+        np.cumsum(self.counts, out=offsets[1:])
+        i = self.i[:self.n]
+        if self.n > 1 and np.any(i[1:] < i[:-1]):
+            order = np.argsort(i, kind='mergesort')
+            indices = self.j[order]
+        else:
+            indices = self.j[:self.n].copy()
+        return indices, offsets
+
+    def to_lists(neighbor_entries self):
+        """Return the pairs as a list with a list of neighbors for each i."""
+        indices, offsets = self.to_csr()
+        return [indices[offsets[k]:offsets[k+1]].tolist()
+                for k in range(self.counts.shape[0])]
+
+
 # Measuring distances
 # ===================
+#
+# With periodic boundary conditions, boxsize points to the lengths of the
+# periodic box along each dimension (infinity for a non-periodic
+# dimension), and all coordinates lie in [0, boxsize).  Without periodic
+# boundaries boxsize is NULL.
+
+cdef inline np.float64_t wrap_distance(np.float64_t x,
+                                       np.float64_t boxsize) nogil:
+    """Distance between two coordinates x apart on a circle of length
+    boxsize, for -boxsize < x < boxsize."""
+    x = dabs(x)
+    if boxsize - x < x:
+        return boxsize - x
+    return x
+
 cdef inline np.float64_t _distance_p(np.float64_t *x, np.float64_t *y,
                                      np.float64_t p, np.intp_t k,
-                                     np.float64_t upperbound):
+                                     np.float64_t upperbound,
+                                     np.float64_t *boxsize) nogil:
     """Compute the distance between x and y
 
     Computes the Minkowski p-distance to the power p between two points.
@@ -259,7 +376,20 @@ cdef inline np.float64_t _distance_p(np.float64_t *x, np.float64_t *y,
     cdef np.intp_t i
     cdef np.float64_t r, z
     r = 0
-    if p==2:
+    if boxsize != NULL:
+        for i in range(k):
+            z = wrap_distance(x[i] - y[i], boxsize[i])
+            if p==infinity:
+                r = dmax(r,z)
+            elif p==1:
+                r += z
+            elif p==2:
+                r += z*z
+            else:
+                r += z**p
+            if r>upperbound:
+                return r
+    elif p==2:
         for i in range(k):
             z = x[i] - y[i]
             r += z*z
@@ -290,17 +420,52 @@ cdef class Rectangle:
     cdef np.intp_t m
     cdef np.float64_t *mins
     cdef np.float64_t *maxes
-    cdef np.ndarray mins_arr, maxes_arr
+    cdef np.float64_t *boxsize
+    cdef np.ndarray mins_arr, maxes_arr, boxsize_arr
 
-    def __init__(self, mins_arr, maxes_arr):
+    def __init__(self, mins_arr, maxes_arr, boxsize_arr=None):
         # Copy array data
         self.mins_arr = np.array(mins_arr, dtype=np.float64, order='C')
         self.maxes_arr = np.array(maxes_arr, dtype=np.float64, order='C')
         self.mins = <np.float64_t*>np.PyArray_DATA(self.mins_arr)
         self.maxes = <np.float64_t*>np.PyArray_DATA(self.maxes_arr)
         self.m = self.mins_arr.shape[0]
+        if boxsize_arr is None:
+            self.boxsize = <np.float64_t*> NULL
+        else:
+            self.boxsize_arr = np.array(boxsize_arr, dtype=np.float64,
+                                        order='C')
+            self.boxsize = <np.float64_t*>np.PyArray_DATA(self.boxsize_arr)
 
 # 1-d pieces
+# The coordinate differences between points lie in [lo, hi]; compute the
+# smallest and largest distance along dimension k.
+cdef inline np.float64_t min_dist_1d(np.float64_t lo, np.float64_t hi,
+                                     np.float64_t *boxsize,
+                                     np.intp_t k) nogil:
+    if lo <= 0 and hi >= 0:
+        return 0
+    elif boxsize == NULL:
+        return dmin(dabs(lo), dabs(hi))
+    else:
+        # the wrapped distance has no minimum inside (lo, hi)
+        return dmin(wrap_distance(lo, boxsize[k]),
+                    wrap_distance(hi, boxsize[k]))
+
+cdef inline np.float64_t max_dist_1d(np.float64_t lo, np.float64_t hi,
+                                     np.float64_t *boxsize,
+                                     np.intp_t k) nogil:
+    cdef np.float64_t half
+    if boxsize == NULL:
+        return dmax(dabs(lo), dabs(hi))
+    else:
+        # the wrapped distance is largest at half the box size
+        half = 0.5 * boxsize[k]
+        if (lo <= half and hi >= half) or (lo <= -half and hi >= -half):
+            return half
+        return dmax(wrap_distance(lo, boxsize[k]),
+                    wrap_distance(hi, boxsize[k]))
+
 # These should only be used if p != infinity
 cdef inline np.float64_t min_dist_point_interval_p(np.float64_t* x,
                                                    Rectangle rect,
@@ -309,7 +474,8 @@ cdef inline np.float64_t min_dist_point_interval_p(np.float64_t* x,
     """Compute the minimum distance along dimension k between x and
     a point in the hyperrectangle.
     """
-    return dmax(0, dmax(rect.mins[k] - x[k], x[k] - rect.maxes[k])) ** p
+    return min_dist_1d(rect.mins[k] - x[k], rect.maxes[k] - x[k],
+                       rect.boxsize, k) ** p
 
 cdef inline np.float64_t max_dist_point_interval_p(np.float64_t* x,
                                                    Rectangle rect,
@@ -318,7 +484,8 @@ cdef inline np.float64_t max_dist_point_interval_p(np.float64_t* x,
     """Compute the maximum distance along dimension k between x and
     a point in the hyperrectangle.
     """
-    return dmax(rect.maxes[k] - x[k], x[k] - rect.mins[k]) ** p
+    return max_dist_1d(rect.mins[k] - x[k], rect.maxes[k] - x[k],
+                       rect.boxsize, k) ** p
 
 cdef inline np.float64_t min_dist_interval_interval_p(Rectangle rect1,
                                                       Rectangle rect2,
@@ -327,8 +494,9 @@ cdef inline np.float64_t min_dist_interval_interval_p(Rectangle rect1,
     """Compute the minimum distance along dimension k between points in
     two hyperrectangles.
     """
-    return dmax(0, dmax(rect1.mins[k] - rect2.maxes[k],
-                        rect2.mins[k] - rect1.maxes[k])) ** p
+    return min_dist_1d(rect2.mins[k] - rect1.maxes[k],
+                       rect2.maxes[k] - rect1.mins[k],
+                       rect1.boxsize, k) ** p
 
 cdef inline np.float64_t max_dist_interval_interval_p(Rectangle rect1,
                                                       Rectangle rect2,
@@ -337,7 +505,9 @@ cdef inline np.float64_t max_dist_interval_interval_p(Rectangle rect1,
     """Compute the maximum distance along dimension k between points in
     two hyperrectangles.
     """
-    return dmax(rect1.maxes[k] - rect2.mins[k], rect2.maxes[k] - rect1.mins[k]) ** p
+    return max_dist_1d(rect2.mins[k] - rect1.maxes[k],
+                       rect2.maxes[k] - rect1.mins[k],
+                       rect1.boxsize, k) ** p
 
 # Interval arithmetic in m-D
 # ==========================
@@ -349,7 +519,9 @@ cdef inline np.float64_t min_dist_point_rect_p_inf(np.float64_t* x,
     cdef np.intp_t i
     cdef np.float64_t min_dist = 0.
     for i in range(rect.m):
-        min_dist = dmax(min_dist, dmax(rect.mins[i]-x[i], x[i]-rect.maxes[i]))
+        min_dist = dmax(min_dist, min_dist_1d(rect.mins[i] - x[i],
+                                              rect.maxes[i] - x[i],
+                                              rect.boxsize, i))
     return min_dist
 
 cdef inline np.float64_t max_dist_point_rect_p_inf(np.float64_t* x,
@@ -358,7 +530,9 @@ cdef inline np.float64_t max_dist_point_rect_p_inf(np.float64_t* x,
     cdef np.intp_t i
     cdef np.float64_t max_dist = 0.
     for i in range(rect.m):
-        max_dist = dmax(max_dist, dmax(rect.maxes[i]-x[i], x[i]-rect.mins[i]))
+        max_dist = dmax(max_dist, max_dist_1d(rect.mins[i] - x[i],
+                                              rect.maxes[i] - x[i],
+                                              rect.boxsize, i))
     return max_dist
 
 cdef inline np.float64_t min_dist_rect_rect_p_inf(Rectangle rect1,
@@ -367,8 +541,9 @@ cdef inline np.float64_t min_dist_rect_rect_p_inf(Rectangle rect1,
     cdef np.intp_t i
     cdef np.float64_t min_dist = 0.
     for i in range(rect1.m):
-        min_dist = dmax(min_dist, dmax(rect1.mins[i] - rect2.maxes[i],
-                                       rect2.mins[i] - rect1.maxes[i]))
+        min_dist = dmax(min_dist, min_dist_1d(rect2.mins[i] - rect1.maxes[i],
+                                              rect2.maxes[i] - rect1.mins[i],
+                                              rect1.boxsize, i))
     return min_dist
 
 cdef inline np.float64_t max_dist_rect_rect_p_inf(Rectangle rect1,
@@ -377,10 +552,72 @@ cdef inline np.float64_t max_dist_rect_rect_p_inf(Rectangle rect1,
     cdef np.intp_t i
     cdef np.float64_t max_dist = 0.
     for i in range(rect1.m):
-        max_dist = dmax(max_dist, dmax(rect1.maxes[i] - rect2.mins[i],
-                                       rect2.maxes[i] - rect1.mins[i]))
+        max_dist = dmax(max_dist, max_dist_1d(rect2.mins[i] - rect1.maxes[i],
+                                              rect2.maxes[i] - rect1.mins[i],
+                                              rect1.boxsize, i))
     return max_dist
 
+# Counting pairs in radial bins
+# =============================
+#
+# count_neighbors sorts the pairs of points into the bins between
+# successive radii r[0] <= r[1] <= ... (as distances to the power p).
+
+cdef struct count_neighbors_info:
+    np.float64_t *r
+    # exactly one of counts and weighted_counts is set
+    np.intp_t *counts
+    np.float64_t *weighted_counts
+    # point and node weights of the two trees; NULL for unit weights
+    np.float64_t *weights1
+    np.float64_t *node_weights1
+    np.float64_t *weights2
+    np.float64_t *node_weights2
+
+cdef inline np.intp_t bisect_left(np.float64_t *r, np.intp_t lo,
+                                  np.intp_t hi, np.float64_t x) nogil:
+    """The first k in [lo, hi) with x <= r[k], or hi."""
+    cdef np.intp_t mid
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if r[mid] < x:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+cdef inline np.intp_t bisect_right(np.float64_t *r, np.intp_t lo,
+                                   np.intp_t hi, np.float64_t x) nogil:
+    """The first k in [lo, hi) with x < r[k], or hi."""
+    cdef np.intp_t mid
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if r[mid] <= x:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+cdef inline void add_pair_counts(count_neighbors_info *info, np.intp_t k,
+                                 np.intp_t node_index1, np.intp_t n1,
+                                 np.intp_t node_index2, np.intp_t n2) nogil:
+    """Add all pairs between the n1 points of one node and the n2 points
+    of another to bin k."""
+    cdef np.float64_t w1, w2
+    if info.weighted_counts == NULL:
+        info.counts[k] += n1 * n2
+        return
+    if info.node_weights1 != NULL:
+        w1 = info.node_weights1[node_index1]
+    else:
+        w1 = n1
+    if info.node_weights2 != NULL:
+        w2 = info.node_weights2[node_index2]
+    else:
+        w2 = n2
+    info.weighted_counts[k] += w1 * w2
+
+
 # Rectangle-to-rectangle distance tracker
 # =======================================
 #
@@ -401,11 +638,11 @@ cdef inline np.float64_t max_dist_rect_rect_p_inf(Rectangle rect1,
 #     ...
 #
 # dist_tracker.push_less_of(1, node1)
-# do_something(node1.less, dist_tracker)
+# do_something(node_less(node1), dist_tracker)
 # dist_tracker.pop()
 #
 # dist_tracker.push_greater_of(1, node1)
-# do_something(node1.greater, dist_tracker)
+# do_something(node_greater(node1), dist_tracker)
 # dist_tracker.pop()
 
 cdef struct RR_stack_item:
@@ -537,12 +774,12 @@ cdef class RectRectDistanceTracker(object):
 
     
     cdef inline int push_less_of(self, np.intp_t which,
-                                 innernode *node) except -1:
+                                 ckdtreenode *node) except -1:
         return self.push(which, LESS, node.split_dim, node.split)
 
     
     cdef inline int push_greater_of(self, np.intp_t which,
-                                    innernode *node) except -1:
+                                    ckdtreenode *node) except -1:
         return self.push(which, GREATER, node.split_dim, node.split)
 
     
@@ -584,11 +821,11 @@ cdef class RectRectDistanceTracker(object):
 #     ...
 #
 # dist_tracker.push_less_of(node)
-# do_something(node.less, dist_tracker)
+# do_something(node_less(node), dist_tracker)
 # dist_tracker.pop()
 #
 # dist_tracker.push_greater_of(node)
-# do_something(node.greater, dist_tracker)
+# do_something(node_greater(node), dist_tracker)
 # dist_tracker.pop()
 
 cdef struct RP_stack_item:
@@ -705,11 +942,11 @@ cdef class PointRectDistanceTracker(object):
         return 0
 
     
-    cdef inline int push_less_of(self, innernode* node) except -1:
+    cdef inline int push_less_of(self, ckdtreenode* node) except -1:
         return self.push(LESS, node.split_dim, node.split)
 
     
-    cdef inline int push_greater_of(self, innernode* node) except -1:
+    cdef inline int push_greater_of(self, ckdtreenode* node) except -1:
         return self.push(GREATER, node.split_dim, node.split)
 
     
@@ -727,33 +964,576 @@ cdef class PointRectDistanceTracker(object):
 
 # Tree structure
 # ==============
-cdef struct innernode:
+#
+# The nodes of a tree are stored in preorder in one contiguous array, the
+# root first.  Children are referred to by their offset in the array
+# relative to the parent (so that the array does not depend on where it
+# lives in memory, and can be saved to disk and memory mapped back).
+# Every node covers the points raw_indices[start_idx:end_idx]; leaves
+# have split_dim == -1.
+cdef struct ckdtreenode:
     np.intp_t split_dim
     np.intp_t children
     np.float64_t split
-    innernode* less
-    innernode* greater
-    
-cdef struct leafnode:
-    np.intp_t split_dim
-    np.intp_t children
     np.intp_t start_idx
     np.intp_t end_idx
+    np.intp_t less
+    np.intp_t greater
+
+# numpy description of ckdtreenode, used to store the node array
+_node_dtype = np.dtype([('split_dim', np.intp),
+                        ('children', np.intp),
+                        ('split', np.float64),
+                        ('start_idx', np.intp),
+                        ('end_idx', np.intp),
+                        ('less', np.intp),
+                        ('greater', np.intp)], align=True)
+
+cdef inline ckdtreenode* node_less(ckdtreenode* node) nogil:
+    return node + node.less
+
+cdef inline ckdtreenode* node_greater(ckdtreenode* node) nogil:
+    return node + node.greater
 
 
 # this is the standard trick for variable-size arrays:
-# malloc sizeof(nodeinfo)+self.m*sizeof(np.float64_t) bytes.
+# malloc sizeof(nodeinfo)+self.m*sizeof(np.float64_t) bytes (three times
+# as many doubles for a periodic tree, see cKDTree.__query).
 
 cdef struct nodeinfo:
-    innernode* node
+    ckdtreenode* node
     np.float64_t side_distances[0]  # FIXME: Only valid in C99, invalid C++ and C89
 
 
+# Building the tree
+# =================
+#
+# The tree is built by nogil functions into a growable C array of nodes,
+# so that independent subtrees can be built in parallel threads.  The
+# build can stop at a given depth and leave the subtrees below as tasks:
+# the roots of these subtrees are recorded as leaves whose bounds are
+# saved in task_bounds, and are replaced by the subtrees once they have
+# been built.
+
+cdef struct node_buffer:
+    ckdtreenode *nodes
+    np.intp_t n, space
+
+cdef struct build_info:
+    np.float64_t *data
+    np.intp_t *indices
+    np.intp_t m, leafsize
+    bint balanced
+    # subtrees at depth task_depth are left as tasks; -1 for no limit
+    np.intp_t task_depth
+    np.intp_t n_tasks
+    np.intp_t *task_nodes      # node index, start_idx, end_idx of every task
+    np.float64_t *task_bounds  # maxes, then mins, of every task
+
+cdef inline int node_buffer_init(node_buffer *buf, np.intp_t space) nogil:
+    buf.n = 0
+    buf.space = space
+    buf.nodes = <ckdtreenode*> stdlib.malloc(space * sizeof(ckdtreenode))
+    if buf.nodes == NULL:
+        return -1
+    return 0
+
+cdef inline void node_buffer_free(node_buffer *buf) nogil:
+    if buf.nodes != NULL:
+        stdlib.free(buf.nodes)
+        buf.nodes = NULL
+
+cdef inline np.intp_t new_node(node_buffer *buf) nogil:
+    # Append a node to the buffer and return its index, or -1 if out
+    # of memory.  This may move the nodes.
+    cdef void *tmp
+    if buf.n == buf.space:
+        tmp = stdlib.realloc(buf.nodes, (2*buf.space + 1) * sizeof(ckdtreenode))
+        if tmp == NULL:
+            return -1
+        buf.nodes = <ckdtreenode*> tmp
+        buf.space = 2*buf.space + 1
+    buf.n += 1
+    return buf.n - 1
+
+cdef inline np.float64_t build_key(build_info *info, np.intp_t i,
+                                   np.intp_t d) nogil:
+    return info.data[info.indices[i]*info.m + d]
+
+cdef inline void swap_indices(np.intp_t *indices, np.intp_t i,
+                              np.intp_t j) nogil:
+    cdef np.intp_t t = indices[i]
+    indices[i] = indices[j]
+    indices[j] = t
+
+cdef np.intp_t median_of_medians(build_info *info, np.intp_t lo,
+                                 np.intp_t hi, np.intp_t d) nogil:
+    # Move the medians of groups of five to the front and select their
+    # median; returns its position.
+    cdef np.intp_t g, i, j, group_end, n_groups = 0
+    for g in range(lo, hi, 5):
+        group_end = g + 5
+        if group_end > hi:
+            group_end = hi
+        # insertion sort of the group
+        for i in range(g + 1, group_end):
+            j = i
+            while j > g and build_key(info, j - 1, d) > build_key(info, j, d):
+                swap_indices(info.indices, j - 1, j)
+                j -= 1
+        swap_indices(info.indices, lo + n_groups, g + (group_end - g) // 2)
+        n_groups += 1
+    select_nth(info, lo, lo + n_groups, lo + n_groups // 2, d)
+    return lo + n_groups // 2
+
+cdef void select_nth(build_info *info, np.intp_t lo, np.intp_t hi,
+                     np.intp_t k, np.intp_t d) nogil:
+    # Introselect: reorder indices[lo:hi] so that indices[k] has the
+    # (k-lo)-th smallest coordinate d, with no larger ones before it and
+    # no smaller ones after it.  Quickselect with median-of-three pivots
+    # falls back to median-of-medians pivots when it recurses too deeply,
+    # which keeps the worst case linear.
+    cdef np.intp_t i, j, mid, depth_limit = 0, n = hi - lo
+    cdef np.float64_t a, b, c, pivot
+    while n > 1:
+        depth_limit += 2
+        n //= 2
+    while hi - lo > 1:
+        if depth_limit > 0:
+            depth_limit -= 1
+            mid = lo + (hi - lo) // 2
+            a = build_key(info, lo, d)
+            b = build_key(info, mid, d)
+            c = build_key(info, hi - 1, d)
+            if (a <= b) == (b <= c):
+                pivot = b
+            elif (b <= a) == (a <= c):
+                pivot = a
+            else:
+                pivot = c
+        else:
+            pivot = build_key(info, median_of_medians(info, lo, hi, d), d)
+
+        # Hoare partition; the pivot is one of the keys, so the scans
+        # stop inside the range.  Afterwards [lo, j] <= pivot,
+        # [i, hi) >= pivot and everything in between equals the pivot.
+        i = lo
+        j = hi - 1
+        while i <= j:
+            while build_key(info, i, d) < pivot:
+                i += 1
+            while build_key(info, j, d) > pivot:
+                j -= 1
+            if i <= j:
+                swap_indices(info.indices, i, j)
+                i += 1
+                j -= 1
+        if k <= j:
+            hi = j + 1
+        elif k >= i:
+            lo = i
+        else:
+            return
+
+cdef np.intp_t sliding_midpoint_split(build_info *info, np.intp_t start_idx,
+                                      np.intp_t end_idx, np.intp_t d,
+                                      np.float64_t maxval, np.float64_t minval,
+                                      np.float64_t *split_out) nogil:
+    # Split indices[start_idx:end_idx] at the midpoint of the cell along
+    # dimension d, sliding the split to the nearest point if one side
+    # would be empty.  Returns the start of the greater side.
+    cdef np.intp_t i, j, p, q
+    cdef np.float64_t split = (maxval+minval)/2
+
+    p = start_idx
+    q = end_idx-1
+    while p<=q:
+        if build_key(info, p, d)<split:
+            p+=1
+        elif build_key(info, q, d)>=split:
+            q-=1
+        else:
+            swap_indices(info.indices, p, q)
+            p+=1
+            q-=1
+
+    # slide midpoint if necessary
+    if p==start_idx:
+        # no points less than split
+        j = start_idx
+        split = build_key(info, j, d)
+        for i in range(start_idx+1, end_idx):
+            if build_key(info, i, d)<split:
+                j = i
+                split = build_key(info, j, d)
+        swap_indices(info.indices, start_idx, j)
+        p = start_idx+1
+    elif p==end_idx:
+        # no points greater than split
+        j = end_idx-1
+        split = build_key(info, j, d)
+        for i in range(start_idx, end_idx-1):
+            if build_key(info, i, d)>split:
+                j = i
+                split = build_key(info, j, d)
+        swap_indices(info.indices, end_idx-1, j)
+        p = end_idx-1
+
+    split_out[0] = split
+    return p
+
+cdef np.intp_t build_node(build_info *info, node_buffer *buf,
+                          np.intp_t start_idx, np.intp_t end_idx,
+                          np.float64_t *maxes, np.float64_t *mins,
+                          np.intp_t depth) nogil:
+    # Add the subtree over indices[start_idx:end_idx] to the buffer and
+    # return the index of its root, or -1 if out of memory.
+    cdef ckdtreenode* n
+    cdef np.intp_t node_index, less_index, greater_index = -1
+    cdef np.intp_t i, p, d
+    cdef np.float64_t size, split
+    cdef np.float64_t *mids
+
+    node_index = new_node(buf)
+    if node_index < 0:
+        return -1
+    n = buf.nodes + node_index
+    n.start_idx = start_idx
+    n.end_idx = end_idx
+    n.children = end_idx - start_idx
+    n.split_dim = -1
+    n.split = 0
+    n.less = n.greater = 0
+
+    if end_idx-start_idx<=info.leafsize:
+        return node_index
+
+    if depth == info.task_depth:
+        # leave the subtree to be built later
+        info.task_nodes[3*info.n_tasks] = node_index
+        info.task_nodes[3*info.n_tasks + 1] = start_idx
+        info.task_nodes[3*info.n_tasks + 2] = end_idx
+        for i in range(info.m):
+            info.task_bounds[2*info.m*info.n_tasks + i] = maxes[i]
+            info.task_bounds[2*info.m*info.n_tasks + info.m + i] = mins[i]
+        info.n_tasks += 1
+        return node_index
+
+    d = 0
+    size = 0
+    for i in range(info.m):
+        if maxes[i]-mins[i] > size:
+            d = i
+            size =  maxes[i]-mins[i]
+    if maxes[d]==mins[d]:
+        # all points are identical; warn user?
+        return node_index
+
+    if info.balanced:
+        # split at the median
+        p = start_idx + (end_idx - start_idx) // 2
+        select_nth(info, start_idx, end_idx, p, d)
+        split = build_key(info, p, d)
+    else:
+        p = sliding_midpoint_split(info, start_idx, end_idx, d,
+                                   maxes[d], mins[d], &split)
+
+    mids = <np.float64_t*>stdlib.malloc(sizeof(np.float64_t)*info.m)
+    if mids == <np.float64_t*> NULL:
+        return -1
+    for i in range(info.m):
+        mids[i] = maxes[i]
+    mids[d] = split
+    less_index = build_node(info, buf, start_idx, p, mids, mins, depth + 1)
+
+    if less_index >= 0:
+        for i in range(info.m):
+            mids[i] = mins[i]
+        mids[d] = split
+        greater_index = build_node(info, buf, p, end_idx, maxes, mids,
+                                   depth + 1)
+    stdlib.free(mids)
+    if less_index < 0 or greater_index < 0:
+        return -1
+
+    # the buffer may have moved while building the children
+    n = buf.nodes + node_index
+    n.split_dim = d
+    n.split = split
+    n.less = less_index - node_index
+    n.greater = greater_index - node_index
+    return node_index
+
+
+cdef class _TreeBuilder:
+    """Build the subtrees left as tasks by a depth-limited build, each
+    into its own node buffer, with the GIL released so that they can be
+    built in parallel threads."""
+    cdef build_info *info
+    cdef node_buffer *buffers
+    cdef np.intp_t n_tasks
+
+    def __cinit__(self):
+        self.buffers = NULL
+        self.n_tasks = 0
+
+    def __dealloc__(self):
+        cdef np.intp_t t
+        if self.buffers != NULL:
+            for t in range(self.n_tasks):
+                node_buffer_free(&self.buffers[t])
+            stdlib.free(self.buffers)
+
+    cdef int setup(self, build_info *info) except -1:
+        cdef np.intp_t t
+        self.info = info
+        self.buffers = <node_buffer*> stdlib.malloc(
+            (info.n_tasks + 1) * sizeof(node_buffer))
+        if self.buffers == NULL:
+            raise MemoryError
+        for t in range(info.n_tasks):
+            self.buffers[t].nodes = NULL
+            self.buffers[t].n = 0
+        self.n_tasks = info.n_tasks
+        return 0
+
+    def build_tasks(self, np.intp_t first, np.intp_t last):
+        cdef np.intp_t t, start_idx, end_idx, failed = 0
+        cdef np.float64_t *bounds
+        cdef build_info local = self.info[0]
+        local.task_depth = -1
+        with nogil:
+            for t in range(first, last):
+                start_idx = local.task_nodes[3*t + 1]
+                end_idx = local.task_nodes[3*t + 2]
+                bounds = local.task_bounds + 2*local.m*t
+                if node_buffer_init(&self.buffers[t],
+                        4*(end_idx - start_idx)//local.leafsize + 1) < 0:
+                    failed = 1
+                    break
+                if build_node(&local, &self.buffers[t], start_idx, end_idx,
+                              bounds, bounds + local.m, 0) < 0:
+                    failed = 1
+                    break
+        if failed:
+            raise MemoryError
+
+    cdef int merge(self, ckdtreenode *nodes, np.intp_t n_top) except -1:
+        # Copy the task subtrees behind the n_top nodes of the top of the
+        # tree, in place of the leaves that stood for them.  Only the
+        # offsets from a subtree root to its children change, since the
+        # other offsets are relative within the subtree.
+        cdef np.intp_t t, node_index, base = n_top
+        cdef node_buffer *buf
+        cdef ckdtreenode *root
+        for t in range(self.n_tasks):
+            buf = &self.buffers[t]
+            node_index = self.info.task_nodes[3*t]
+            root = nodes + node_index
+            root[0] = buf.nodes[0]
+            if root.split_dim != -1:
+                # the subtree root is not stored again at base
+                root.less += base - 1 - node_index
+                root.greater += base - 1 - node_index
+            memcpy(nodes + base, buf.nodes + 1,
+                   (buf.n - 1) * sizeof(ckdtreenode))
+            base += buf.n - 1
+        return 0
+
+    def n_task_nodes(self):
+        cdef np.intp_t t, total = 0
+        for t in range(self.n_tasks):
+            total += self.buffers[t].n - 1
+        return total
+
+
+# Minimum spanning tree
+# =====================
+#
+# Boruvka's algorithm: in every round, each component of the forest
+# finds its shortest edge to another component, and all these edges are
+# added at once, so that the number of components at least halves.  A
+# component finds its edge by searching the tree from each of its
+# points, skipping the nodes whose points all belong to the component
+# and the nodes farther away than the shortest edge found so far.
+# Edges of equal length are ordered by their end points, which keeps
+# the components from joining in a cycle.
+
+cdef struct mst_info:
+    np.float64_t *data
+    np.intp_t *indices
+    np.intp_t m
+    np.float64_t p
+    np.float64_t *boxsize
+    np.float64_t *node_mins    # bounding box of the points of every node
+    np.float64_t *node_maxes
+    np.intp_t *node_comp       # component of all points of a node, or -1
+    np.intp_t *parent          # union-find forest of the components
+    np.intp_t *comp            # component of every point
+    np.float64_t *best_dist    # shortest edge found for every component
+    np.intp_t *best_i
+    np.intp_t *best_j
+
+cdef inline np.intp_t mst_find(np.intp_t *parent, np.intp_t x) nogil:
+    cdef np.intp_t root = x, t
+    while parent[root] != root:
+        root = parent[root]
+    while parent[x] != root:
+        t = parent[x]
+        parent[x] = root
+        x = t
+    return root
+
+cdef inline bint mst_shorter(np.float64_t d, np.intp_t i, np.intp_t j,
+                             np.float64_t d0, np.intp_t i0,
+                             np.intp_t j0) nogil:
+    # Is the edge (i, j) of length d shorter than (i0, j0) of length d0?
+    cdef np.intp_t t
+    if d != d0:
+        return d < d0
+    if i > j:
+        t = i; i = j; j = t
+    if i0 > j0:
+        t = i0; i0 = j0; j0 = t
+    return i < i0 or (i == i0 and j < j0)
+
+cdef void mst_node_bounds(mst_info *info, ckdtreenode *nodes,
+                          np.intp_t n_nodes) nogil:
+    # Children follow their parent in the node array, so a reverse sweep
+    # sees them first.
+    cdef ckdtreenode *node
+    cdef np.intp_t k, i, d, m = info.m
+    cdef np.float64_t *mins, *maxes, *x
+    for k in range(n_nodes - 1, -1, -1):
+        node = nodes + k
+        mins = info.node_mins + k*m
+        maxes = info.node_maxes + k*m
+        if node.split_dim == -1:
+            for d in range(m):
+                mins[d] = infinity
+                maxes[d] = -infinity
+            for i in range(node.start_idx, node.end_idx):
+                x = info.data + info.indices[i]*m
+                for d in range(m):
+                    mins[d] = dmin(mins[d], x[d])
+                    maxes[d] = dmax(maxes[d], x[d])
+        else:
+            for d in range(m):
+                mins[d] = dmin(info.node_mins[(k + node.less)*m + d],
+                               info.node_mins[(k + node.greater)*m + d])
+                maxes[d] = dmax(info.node_maxes[(k + node.less)*m + d],
+                                info.node_maxes[(k + node.greater)*m + d])
+
+cdef void mst_node_components(mst_info *info, ckdtreenode *nodes,
+                              np.intp_t n_nodes) nogil:
+    cdef ckdtreenode *node
+    cdef np.intp_t k, i, c
+    for k in range(n_nodes - 1, -1, -1):
+        node = nodes + k
+        if node.split_dim == -1:
+            c = info.comp[info.indices[node.start_idx]]
+            for i in range(node.start_idx + 1, node.end_idx):
+                if info.comp[info.indices[i]] != c:
+                    c = -1
+                    break
+        else:
+            c = info.node_comp[k + node.less]
+            if info.node_comp[k + node.greater] != c:
+                c = -1
+        info.node_comp[k] = c
+
+cdef inline np.float64_t mst_min_dist(mst_info *info, np.intp_t k,
+                                      np.float64_t *x) nogil:
+    # Smallest distance (to the power p) from x to the box of node k
+    cdef np.intp_t d, m = info.m
+    cdef np.float64_t r = 0, z
+    for d in range(m):
+        z = min_dist_1d(info.node_mins[k*m + d] - x[d],
+                        info.node_maxes[k*m + d] - x[d], info.boxsize, d)
+        if info.p == infinity:
+            r = dmax(r, z)
+        elif info.p == 1:
+            r += z
+        elif info.p == 2:
+            r += z*z
+        else:
+            r += z**info.p
+    return r
+
+cdef void mst_search(mst_info *info, ckdtreenode *nodes, np.intp_t k,
+                     np.intp_t i, np.intp_t c) nogil:
+    # Look for a shorter edge from point i of component c under node k
+    cdef ckdtreenode *node = nodes + k
+    cdef np.intp_t idx, j, m = info.m
+    cdef np.float64_t d
+    cdef np.float64_t *x = info.data + i*m
+    if info.node_comp[k] == c or mst_min_dist(info, k, x) > info.best_dist[c]:
+        return
+    if node.split_dim == -1:
+        for idx in range(node.start_idx, node.end_idx):
+            j = info.indices[idx]
+            if info.comp[j] == c:
+                continue
+            d = _distance_p(x, info.data + j*m, info.p, m,
+                            info.best_dist[c], info.boxsize)
+            if mst_shorter(d, i, j, info.best_dist[c],
+                           info.best_i[c], info.best_j[c]):
+                info.best_dist[c] = d
+                info.best_i[c] = i
+                info.best_j[c] = j
+    elif x[node.split_dim] < node.split:
+        mst_search(info, nodes, k + node.less, i, c)
+        mst_search(info, nodes, k + node.greater, i, c)
+    else:
+        mst_search(info, nodes, k + node.greater, i, c)
+        mst_search(info, nodes, k + node.less, i, c)
+
+cdef np.intp_t mst_boruvka(mst_info *info, ckdtreenode *nodes,
+                           np.intp_t n_nodes, np.intp_t n,
+                           np.intp_t *edge_i, np.intp_t *edge_j,
+                           np.float64_t *edge_d) nogil:
+    # Returns the number of edges found, n - 1 unless the distances
+    # between some points are not finite.
+    cdef np.intp_t i, c, a, b, idx, n_edges = 0, n_added
+    for i in range(n):
+        info.parent[i] = i
+    mst_node_bounds(info, nodes, n_nodes)
+    while n_edges < n - 1:
+        for i in range(n):
+            info.comp[i] = mst_find(info.parent, i)
+            info.best_dist[i] = infinity
+            info.best_i[i] = -1
+            info.best_j[i] = -1
+        mst_node_components(info, nodes, n_nodes)
+        # points in tree order keep the search of a component local
+        for idx in range(n):
+            i = info.indices[idx]
+            mst_search(info, nodes, 0, i, info.comp[i])
+        n_added = 0
+        for c in range(n):
+            if info.comp[c] != c or info.best_i[c] == -1:
+                continue
+            a = mst_find(info.parent, info.best_i[c])
+            b = mst_find(info.parent, info.best_j[c])
+            if a == b:
+                # both components found the same edge
+                continue
+            info.parent[a] = b
+            edge_i[n_edges] = info.best_i[c]
+            edge_j[n_edges] = info.best_j[c]
+            edge_d[n_edges] = info.best_dist[c]
+            n_edges += 1
+            n_added += 1
+        if n_added == 0:
+            break
+    return n_edges
+
+
 # Main class
 # ==========
 cdef class cKDTree:
     """
-    cKDTree(data, int leafsize=10)
+    cKDTree(data, int leafsize=10, boxsize=None, balanced_tree=False, n_jobs=1)
 
     kd-tree for quick nearest-neighbor lookup
 
@@ -769,7 +1549,8 @@ cdef class cKDTree:
 
     During construction, the axis and splitting point are chosen by the 
     "sliding midpoint" rule, which ensures that the cells do not all
-    become long and thin. 
+    become long and thin.  Alternatively, the points can be split at
+    the median along the axis, which gives a balanced tree.
 
     The tree can be queried for the r closest neighbors of any given point 
     (optionally returning only those within some maximum distance of the 
@@ -790,10 +1571,40 @@ cdef class cKDTree:
     leafsize : positive integer
         The number of points at which the algorithm switches over to
         brute-force.
+    boxsize : array_like or scalar, optional
+        Apply a toroidal topology to the kd-tree: coordinate ``i`` is
+        periodic with period ``boxsize[i]``, and distances are measured
+        to the nearest periodic image of each point.  The data must lie
+        in ``[0, boxsize[i])`` along every periodic axis.  A scalar is
+        used for all dimensions, and an infinite entry makes the
+        corresponding axis non-periodic.  Default is None, for no
+        periodic boundaries.
+    balanced_tree : bool, optional
+        If True, split the nodes at the median of the points instead of
+        by the sliding midpoint rule.  The median is found in linear time
+        by introselect.  The balanced tree is somewhat slower to build,
+        but has fewer levels when the data are strongly clustered.
+        Default: False.
+    n_jobs : int, optional
+        Number of threads used to build the tree.  The top levels of the
+        tree are built first, and the subtrees below them are then built
+        concurrently with the GIL released.  The tree does not depend on
+        the number of threads.  If -1 is given, all CPU cores are used.
+        Default: 1.
+
+    Notes
+    -----
+    With periodic boundaries, query points are wrapped into the box
+    before searching, and every pair of points is only counted once, at
+    the distance of its nearest images; this requires the query radii
+    and distance bounds to be at most half of the box size for the
+    results to agree with those on an explicitly tiled point set.
 
     """
 
-    cdef innernode* tree 
+    cdef ckdtreenode* ctree
+    cdef np.ndarray tree_nodes
+    cdef np.intp_t n_nodes
     cdef readonly np.ndarray data
     cdef np.float64_t* raw_data
     cdef readonly np.intp_t n, m
@@ -802,15 +1613,25 @@ cdef class cKDTree:
     cdef np.float64_t* raw_maxes
     cdef readonly np.ndarray mins
     cdef np.float64_t* raw_mins
-    cdef np.ndarray indices
+    cdef readonly np.ndarray indices
     cdef np.intp_t* raw_indices
+    cdef readonly object boxsize
+    cdef np.float64_t* raw_boxsize
 
-    def __init__(cKDTree self, data, np.intp_t leafsize=10):
+    def __init__(cKDTree self, data, np.intp_t leafsize=10, boxsize=None,
+                 balanced_tree=False, n_jobs=1):
         self.data = np.ascontiguousarray(data,dtype=np.float64)
         self.n, self.m = np.shape(self.data)
         self.leafsize = leafsize
         if self.leafsize<1:
             raise ValueError("leafsize must be at least 1")
+        self.__set_boxsize(boxsize)
+        if self.boxsize is not None:
+            periodic = np.isfinite(self.boxsize)
+            if np.any(self.data[:, periodic] < 0) or \
+                    np.any(self.data[:, periodic] >= self.boxsize[periodic]):
+                raise ValueError("Some input data are outside of the "
+                                 "periodic box [0, boxsize)")
         self.maxes = np.ascontiguousarray(np.amax(self.data,axis=0), dtype=np.float64)
         self.mins = np.ascontiguousarray(np.amin(self.data,axis=0), dtype=np.float64)
         self.indices = np.ascontiguousarray(np.arange(self.n,dtype=np.intp))
@@ -820,136 +1641,209 @@ cdef class cKDTree:
         self.raw_mins = <np.float64_t*>np.PyArray_DATA(self.mins)
         self.raw_indices = <np.intp_t*>np.PyArray_DATA(self.indices)
 
-        self.tree = self.__build(0, self.n, self.raw_maxes, self.raw_mins)
-
-    cdef innernode* __build(cKDTree self, np.intp_t start_idx, np.intp_t end_idx,
-                            np.float64_t* maxes, np.float64_t* mins) except? <innernode*> NULL:
-        cdef leafnode* n
-        cdef innernode* ni
-        cdef np.intp_t i, j, t, p, q, d
-        cdef np.float64_t size, split, minval, maxval
-        cdef np.float64_t*mids
-        if end_idx-start_idx<=self.leafsize:
-            n = <leafnode*>stdlib.malloc(sizeof(leafnode))
-            if n == <leafnode*> NULL: 
-                raise MemoryError
-            n.split_dim = -1
-            n.children = end_idx - start_idx
-            n.start_idx = start_idx
-            n.end_idx = end_idx
-            return <innernode*>n
-        else:
-            d = 0 
-            size = 0
-            for i in range(self.m):
-                if maxes[i]-mins[i] > size:
-                    d = i
-                    size =  maxes[i]-mins[i]
-            maxval = maxes[d]
-            minval = mins[d]
-            if maxval==minval:
-                # all points are identical; warn user?
-                n = <leafnode*>stdlib.malloc(sizeof(leafnode))
-                if n == <leafnode*> NULL: 
-                    raise MemoryError
-                n.split_dim = -1
-                n.children = end_idx - start_idx
-                n.start_idx = start_idx
-                n.end_idx = end_idx
-                return <innernode*>n
-
-            split = (maxval+minval)/2
-
-            p = start_idx
-            q = end_idx-1
-            while p<=q:
-                if self.raw_data[self.raw_indices[p]*self.m+d]<split:
-                    p+=1
-                elif self.raw_data[self.raw_indices[q]*self.m+d]>=split:
-                    q-=1
-                else:
-                    t = self.raw_indices[p]
-                    self.raw_indices[p] = self.raw_indices[q]
-                    self.raw_indices[q] = t
-                    p+=1
-                    q-=1
-
-            # slide midpoint if necessary
-            if p==start_idx:
-                # no points less than split
-                j = start_idx
-                split = self.raw_data[self.raw_indices[j]*self.m+d]
-                for i in range(start_idx+1, end_idx):
-                    if self.raw_data[self.raw_indices[i]*self.m+d]<split:
-                        j = i
-                        split = self.raw_data[self.raw_indices[j]*self.m+d]
-                t = self.raw_indices[start_idx]
-                self.raw_indices[start_idx] = self.raw_indices[j]
-                self.raw_indices[j] = t
-                p = start_idx+1
-                q = start_idx
-            elif p==end_idx:
-                # no points greater than split
-                j = end_idx-1
-                split = self.raw_data[self.raw_indices[j]*self.m+d]
-                for i in range(start_idx, end_idx-1):
-                    if self.raw_data[self.raw_indices[i]*self.m+d]>split:
-                        j = i
-                        split = self.raw_data[self.raw_indices[j]*self.m+d]
-                t = self.raw_indices[end_idx-1]
-                self.raw_indices[end_idx-1] = self.raw_indices[j]
-                self.raw_indices[j] = t
-                p = end_idx-1
-                q = end_idx-2
-
-            # construct new node representation
-            ni = <innernode*>stdlib.malloc(sizeof(innernode))
-            if ni ==  <innernode*> NULL:
+        self.__build_tree(balanced_tree, n_jobs)
+
+    cdef __set_boxsize(cKDTree self, boxsize):
+        if boxsize is None:
+            self.boxsize = None
+            self.raw_boxsize = NULL
+            return
+        boxsize = np.asarray(boxsize, dtype=np.float64)
+        if boxsize.ndim > 1 or boxsize.size not in (1, self.m):
+            raise ValueError("boxsize must be a scalar or have length %d"
+                             % self.m)
+        boxsize = np.ascontiguousarray(boxsize * np.ones(self.m))
+        if np.any(np.isnan(boxsize)) or np.any(boxsize <= 0):
+            raise ValueError("boxsize must be positive")
+        self.boxsize = boxsize
+        self.raw_boxsize = <np.float64_t*>np.PyArray_DATA(boxsize)
+
+    def _check_same_box(cKDTree self, cKDTree other, name):
+        if self.boxsize is None and other.boxsize is None:
+            return
+        if self.boxsize is None or other.boxsize is None or \
+                np.any(self.boxsize != other.boxsize):
+            raise ValueError("Trees passed to %s must have the same "
+                             "boxsize" % name)
+
+    def _wrap(cKDTree self, x):
+        # Map query points into the periodic box.
+        if self.boxsize is None:
+            return x
+        periodic = np.isfinite(self.boxsize)
+        x = np.array(x, dtype=np.float64)
+        box = self.boxsize[periodic]
+        xp = x[..., periodic] % box
+        # rounding can give x % L == L
+        xp[xp >= box] = 0
+        x[..., periodic] = xp
+        return x
+
+    cdef int __build_tree(cKDTree self, bint balanced, n_jobs) except -1:
+        cdef build_info info
+        cdef node_buffer buf
+        cdef _TreeBuilder builder
+        cdef np.ndarray task_nodes, task_bounds
+        cdef np.intp_t root, n_top, n_max_tasks
+
+        if n_jobs == -1:
+            n_jobs = cpu_count()
+        elif n_jobs < 1:
+            raise ValueError("n_jobs must be a positive integer or -1")
+
+        info.data = self.raw_data
+        info.indices = self.raw_indices
+        info.m = self.m
+        info.leafsize = self.leafsize
+        info.balanced = balanced
+        info.n_tasks = 0
+        info.task_depth = -1
+        n_max_tasks = 0
+        if n_jobs > 1 and self.n > 4*n_jobs*self.leafsize:
+            # Build the top of the tree first, leaving about four subtrees
+            # per thread so that the threads stay busy even if the
+            # subtrees differ in size.
+            info.task_depth = 0
+            n_max_tasks = 1
+            while n_max_tasks < 4*n_jobs:
+                info.task_depth += 1
+                n_max_tasks *= 2
+        task_nodes = np.empty(3*n_max_tasks + 1, dtype=np.intp)
+        task_bounds = np.empty(2*self.m*n_max_tasks + 1, dtype=np.float64)
+        info.task_nodes = <np.intp_t*>np.PyArray_DATA(task_nodes)
+        info.task_bounds = <np.float64_t*>np.PyArray_DATA(task_bounds)
+
+        # a tree with leaves of leafsize/2 points has about 4*n/leafsize nodes
+        if node_buffer_init(&buf, 4*self.n//self.leafsize + 1) < 0:
+            raise MemoryError
+        try:
+            with nogil:
+                root = build_node(&info, &buf, 0, self.n,
+                                  self.raw_maxes, self.raw_mins, 0)
+            if root < 0:
                 raise MemoryError
+            n_top = buf.n
+
+            builder = _TreeBuilder()
+            builder.setup(&info)
+            if info.n_tasks > 0:
+                _build_in_threads(builder, info.n_tasks, n_jobs)
+
+            self.tree_nodes = np.empty(n_top + builder.n_task_nodes(),
+                                       dtype=_node_dtype)
+            self.ctree = <ckdtreenode*>np.PyArray_DATA(self.tree_nodes)
+            memcpy(self.ctree, buf.nodes, n_top * sizeof(ckdtreenode))
+            builder.merge(self.ctree, n_top)
+        finally:
+            node_buffer_free(&buf)
+        self.n_nodes = self.tree_nodes.shape[0]
+        return 0
 
-            try:
-                mids = <np.float64_t*>stdlib.malloc(sizeof(np.float64_t)*self.m)
-                if mids == <np.float64_t*> NULL:
-                    raise MemoryError
-                        
-                for i in range(self.m):
-                    mids[i] = maxes[i]
-                mids[d] = split
-                ni.less = self.__build(start_idx,p,mids,mins)
+    # -----------
+    # persistence
+    # -----------
 
-                for i in range(self.m):
-                    mids[i] = mins[i]
-                mids[d] = split
-                ni.greater = self.__build(p,end_idx,maxes,mids)
+    def _state(cKDTree self):
+        # The arrays that make up the tree, as (name, array) pairs.
+        return [('data', self.data),
+                ('leafsize', np.array([self.leafsize], dtype=np.intp)),
+                ('maxes', self.maxes),
+                ('mins', self.mins),
+                ('indices', self.indices),
+                ('tree_nodes', self.tree_nodes),
+                # empty if the tree is not periodic
+                ('boxsize', np.empty(0) if self.boxsize is None
+                            else self.boxsize)]
+
+    cdef int _set_state(cKDTree self, dict state) except -1:
+        # Inverse of _state: set up a tree from its arrays, without
+        # copying them and without rebuilding the tree.
+        nodes = state['tree_nodes']
+        if nodes.dtype != _node_dtype:
+            # e.g. stored on a platform with a different np.intp
+            nodes = nodes.astype(_node_dtype)
+        self.tree_nodes = np.require(nodes, requirements='C')
+        self.data = np.require(state['data'], np.float64, 'C')
+        self.indices = np.require(state['indices'], np.intp, 'C')
+        self.maxes = np.require(state['maxes'], np.float64, 'C')
+        self.mins = np.require(state['mins'], np.float64, 'C')
+        self.leafsize = state['leafsize'][0]
+        self.n, self.m = np.shape(self.data)
+        # trees saved before periodic boundaries were added have no boxsize
+        boxsize = state.get('boxsize', ())
+        self.__set_boxsize(boxsize if len(boxsize) > 0 else None)
+        self.n_nodes = self.tree_nodes.shape[0]
+        if (self.n_nodes < 1 or self.leafsize < 1
+                or self.tree_nodes.ndim != 1 or self.indices.ndim != 1
+                or self.indices.shape[0] != self.n
+                or np.shape(self.maxes) != (self.m,)
+                or np.shape(self.mins) != (self.m,)
+                or not _valid_tree_nodes(self.tree_nodes, self.n, self.m)
+                or (self.n > 0 and (self.indices.min() < 0
+                                    or self.indices.max() >= self.n))):
+            raise ValueError("inconsistent cKDTree arrays")
 
-                ni.children = ni.less.children + ni.greater.children
-            
-            except:
-                # free ni if it cannot be returned
-                if ni !=  <innernode*> NULL:
-                    stdlib.free(mids)
-                if mids != <np.float64_t*> NULL:
-                    stdlib.free(mids)
-                raise
-            else:
-                if mids != <np.float64_t*> NULL:
-                    stdlib.free(mids)
+        self.raw_data = <np.float64_t*>np.PyArray_DATA(self.data)
+        self.raw_maxes = <np.float64_t*>np.PyArray_DATA(self.maxes)
+        self.raw_mins = <np.float64_t*>np.PyArray_DATA(self.mins)
+        self.raw_indices = <np.intp_t*>np.PyArray_DATA(self.indices)
+        self.ctree = <ckdtreenode*>np.PyArray_DATA(self.tree_nodes)
+        return 0
 
-            ni.split_dim = d
-            ni.split = split
-            return ni
-                    
-    cdef __free_tree(cKDTree self, innernode* node):
-        if node.split_dim!=-1:
-            self.__free_tree(node.less)
-            self.__free_tree(node.greater)
-        stdlib.free(node)
-
-    def __dealloc__(cKDTree self):
-        if <np.intp_t>(self.tree) == 0:
-            # should happen only if __init__ was never called
-            return
-        self.__free_tree(self.tree)
+    def __reduce__(cKDTree self):
+        return (_ckdtree_from_state, (dict(self._state()),))
+
+    def save(cKDTree self, filename):
+        """save(self, filename)
+
+        Save the tree to a file.
+
+        The data points, the tree nodes and the permutation of the points
+        are written as they are stored in memory, so that `cKDTree.load`
+        can open the tree again without rebuilding it.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to write.
+
+        See Also
+        --------
+        load
+
+        """
+        save_arrays(filename, _CKDTREE_FILE_TAG, self._state())
+
+    @classmethod
+    def load(cls, filename, mmap_mode='r'):
+        """load(filename, mmap_mode='r')
+
+        Open a tree saved with `cKDTree.save`.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to read.
+        mmap_mode : {'r', 'c', None}, optional
+            By default the arrays of the tree are memory mapped read-only
+            from the file.  Opening a tree then only reads the nodes and
+            the permutation of the points to check them, the points are
+            read from disk only when a query touches them, and processes
+            that open the same file share their memory.
+            ``'c'`` maps the file copy-on-write; with None the whole tree
+            is read into memory.
+
+        Returns
+        -------
+        tree : cKDTree
+            The tree.  Its `data` is a `numpy.memmap` unless `mmap_mode`
+            is None.
+
+        """
+        if mmap_mode not in ('r', 'c', None):
+            raise ValueError("mmap_mode must be 'r', 'c' or None")
+        return _ckdtree_from_state(
+            load_arrays(filename, _CKDTREE_FILE_TAG, mmap_mode=mmap_mode))
 
     # -----
     # query
@@ -962,7 +1856,8 @@ cdef class cKDTree:
             np.intp_t k, 
             np.float64_t eps, 
             np.float64_t p, 
-            np.float64_t distance_upper_bound) except -1:
+            np.float64_t distance_upper_bound) nogil:
+        # Runs without the GIL; returns -1 if memory allocation fails.
 
         cdef heap q
         cdef heap neighbors
@@ -976,42 +1871,63 @@ cdef class cKDTree:
         cdef np.float64_t min_distance
         cdef np.float64_t far_min_distance
         cdef heapitem it, it2, neighbor
-        cdef leafnode* node
-        cdef innernode* inode
-        cdef innernode* near
-        cdef innernode* far
-        cdef np.float64_t* side_distances
-
+        cdef ckdtreenode* node
+        cdef ckdtreenode* inode
+        cdef ckdtreenode* near
+        cdef ckdtreenode* far
+        cdef ckdtreenode* child
+        cdef np.intp_t info_size, c
+        cdef np.float64_t *child_mins
+        cdef np.float64_t *child_maxes
+        cdef int failed = 0
+
+        # With periodic boundaries, a nodeinfo also holds the bounds of
+        # its cell: side_distances[m:2*m] are the mins, side_distances[2*m:]
+        # the maxes.
+        if self.raw_boxsize == NULL:
+            info_size = self.m
+        else:
+            info_size = 3 * self.m
 
         # priority queue for chasing nodes
         # entries are:
         #  minimum distance between the cell and the target
         #  distances between the nearest side of the cell and the target
         #  the head node of the cell
-        q = heap(12)
+        if heap_init(&q, 12) < 0:
+            return -1
 
         # priority queue for the nearest neighbors
         # furthest known neighbor first
         # entries are (-distance**p, i)
-        neighbors = heap(k)
+        if heap_init(&neighbors, k) < 0:
+            heap_free(&q)
+            return -1
 
         inf = inf2 = <nodeinfo*> NULL    
 
-        try:
-            # set up first nodeinfo
-            inf = <nodeinfo*>stdlib.malloc(sizeof(nodeinfo)+self.m*sizeof(np.float64_t))
-            if inf == <nodeinfo*> NULL:
-                raise MemoryError
-            inf.node = self.tree
+        # set up first nodeinfo
+        inf = <nodeinfo*>stdlib.malloc(sizeof(nodeinfo)+info_size*sizeof(np.float64_t))
+        if inf == <nodeinfo*> NULL:
+            failed = 1
+        else:
+            inf.node = self.ctree
             for i in range(self.m):
-                inf.side_distances[i] = 0
-                t = x[i]-self.raw_maxes[i]
-                if t>inf.side_distances[i]:
-                    inf.side_distances[i] = t
+                if self.raw_boxsize != NULL:
+                    inf.side_distances[i] = min_dist_1d(
+                        self.raw_mins[i] - x[i], self.raw_maxes[i] - x[i],
+                        self.raw_boxsize, i)
+                    inf.side_distances[self.m + i] = self.raw_mins[i]
+                    inf.side_distances[2*self.m + i] = self.raw_maxes[i]
                 else:
-                    t = self.raw_mins[i]-x[i]
+                    inf.side_distances[i] = 0
+                    t = x[i]-self.raw_maxes[i]
                     if t>inf.side_distances[i]:
                         inf.side_distances[i] = t
+                    else:
+                        t = self.raw_mins[i]-x[i]
+                        if t>inf.side_distances[i]:
+                            inf.side_distances[i] = t
                 if p!=1 and p!=infinity:
                     inf.side_distances[i]=inf.side_distances[i]**p
 
@@ -1035,138 +1951,221 @@ cdef class cKDTree:
             if p!=infinity and distance_upper_bound!=infinity:
                 distance_upper_bound = distance_upper_bound**p
 
-            while True:
-                if inf.node.split_dim==-1:
-                    node = <leafnode*>inf.node
+        while not failed:
+            if inf.node.split_dim==-1:
+                node = inf.node
 
-                    # brute-force
-                    for i in range(node.start_idx,node.end_idx):
-                        d = _distance_p(
-                                self.raw_data+self.raw_indices[i]*self.m,
-                                x,p,self.m,distance_upper_bound)
-                            
-                        if d<distance_upper_bound:
-                            # replace furthest neighbor
-                            if neighbors.n==k:
-                                neighbors.remove()
-                            neighbor.priority = -d
-                            neighbor.contents.intdata = self.raw_indices[i]
-                            neighbors.push(neighbor)
-
-                            # adjust upper bound for efficiency
-                            if neighbors.n==k:
-                                distance_upper_bound = -neighbors.peek().priority
-                    
-                    # done with this node, get another
+                # brute-force
+                for i in range(node.start_idx,node.end_idx):
+                    d = _distance_p(
+                            self.raw_data+self.raw_indices[i]*self.m,
+                            x,p,self.m,distance_upper_bound,
+                            self.raw_boxsize)
+                        
+                    if d<distance_upper_bound:
+                        # replace furthest neighbor
+                        if neighbors.n==k:
+                            heap_remove(&neighbors)
+                        neighbor.priority = -d
+                        neighbor.contents.intdata = self.raw_indices[i]
+                        heap_push(&neighbors, neighbor)
+
+                        # adjust upper bound for efficiency
+                        if neighbors.n==k:
+                            distance_upper_bound = -heap_peek(&neighbors).priority
+                
+                # done with this node, get another
+                stdlib.free(inf)
+                inf = <nodeinfo*> NULL
+
+                if q.n==0:
+                    # no more nodes to visit
+                    break
+                else:
+                    heap_pop(&q, &it)
+                    inf = <nodeinfo*>it.contents.ptrdata
+                    min_distance = it.priority
+            else:
+                inode = inf.node
+
+                # we don't push cells that are too far onto the queue at all,
+                # but since the distance_upper_bound decreases, we might get 
+                # here even if the cell's too far
+                if min_distance>distance_upper_bound*epsfac:
+                    # since this is the nearest cell, we're done, bail out
+                    break
+
+                if self.raw_boxsize != NULL:
+                    # With periodic boundaries the child on the same side
+                    # of the split as x is not necessarily as close as the
+                    # current cell (the other side of the cell may be
+                    # nearer across the boundary), so compute the distance
+                    # to both children and queue them.
+                    for c in range(2):
+                        inf2 = <nodeinfo*>stdlib.malloc(sizeof(nodeinfo)+info_size*sizeof(np.float64_t))
+                        if inf2 == <nodeinfo*> NULL:
+                            failed = 1
+                            break
+                        for i in range(info_size):
+                            inf2.side_distances[i] = inf.side_distances[i]
+                        child_mins = inf2.side_distances + self.m
+                        child_maxes = inf2.side_distances + 2*self.m
+                        if c == 0:
+                            inf2.node = node_less(inode)
+                            child_maxes[inode.split_dim] = inode.split
+                        else:
+                            inf2.node = node_greater(inode)
+                            child_mins[inode.split_dim] = inode.split
+                        t = min_dist_1d(
+                            child_mins[inode.split_dim] - x[inode.split_dim],
+                            child_maxes[inode.split_dim] - x[inode.split_dim],
+                            self.raw_boxsize, inode.split_dim)
+                        if p == infinity:
+                            far_min_distance = dmax(min_distance, t)
+                        else:
+                            if p != 1:
+                                t = t**p
+                            far_min_distance = min_distance - \
+                                inf.side_distances[inode.split_dim] + t
+                        inf2.side_distances[inode.split_dim] = t
+
+                        it2.contents.ptrdata = <char*> inf2
+                        it2.priority = far_min_distance
+                        if far_min_distance<=distance_upper_bound*epsfac:
+                            if heap_push(&q, it2) < 0:
+                                failed = 1
+                                break
+                        else:
+                            stdlib.free(inf2)
+                        inf2 = <nodeinfo*> NULL
+                        it2.contents.ptrdata = <char*> NULL
+                    if failed:
+                        break
+
+                    # continue with the nearest queued cell
                     stdlib.free(inf)
                     inf = <nodeinfo*> NULL
-
                     if q.n==0:
-                        # no more nodes to visit
                         break
-                    else:
-                        q.pop(&it)
-                        inf = <nodeinfo*>it.contents.ptrdata
-                        min_distance = it.priority
+                    heap_pop(&q, &it)
+                    inf = <nodeinfo*>it.contents.ptrdata
+                    min_distance = it.priority
+                    continue
+
+                # set up children for searching
+                if x[inode.split_dim]<inode.split:
+                    near = node_less(inode)
+                    far = node_greater(inode)
                 else:
-                    inode = <innernode*>inf.node
+                    near = node_greater(inode)
+                    far = node_less(inode)
+
+                # near child is at the same distance as the current node
+                # we're going here next, so no point pushing it on the queue
+                # no need to recompute the distance or the side_distances
+                inf.node = near
+
+                # far child is further by an amount depending only
+                # on the split value; compute its distance and side_distances
+                # and push it on the queue if it's near enough
+                inf2 = <nodeinfo*>stdlib.malloc(sizeof(nodeinfo)+info_size*sizeof(np.float64_t))
+                if inf2 == <nodeinfo*> NULL:
+                    failed = 1
+                    break
+        
+                it2.contents.ptrdata = <char*> inf2
+                inf2.node = far
+                # most side distances unchanged
+                for i in range(info_size):
+                    inf2.side_distances[i] = inf.side_distances[i]
+
+                # one side distance changes
+                # we can adjust the minimum distance without recomputing
+                if p == infinity:
+                    # we never use side_distances in the l_infinity case
+                    # inf2.side_distances[inode.split_dim] = dabs(inode.split-x[inode.split_dim])
+                    far_min_distance = dmax(min_distance, dabs(inode.split-x[inode.split_dim]))
+                elif p == 1:
+                    inf2.side_distances[inode.split_dim] = dabs(inode.split-x[inode.split_dim])
+                    far_min_distance = min_distance - \
+                        inf.side_distances[inode.split_dim] + \
+                        inf2.side_distances[inode.split_dim]
+                else:
+                    inf2.side_distances[inode.split_dim] = dabs(inode.split - 
+                                                                x[inode.split_dim])**p
+                    far_min_distance = min_distance - \
+                        inf.side_distances[inode.split_dim] + \
+                        inf2.side_distances[inode.split_dim]
 
-                    # we don't push cells that are too far onto the queue at all,
-                    # but since the distance_upper_bound decreases, we might get 
-                    # here even if the cell's too far
-                    if min_distance>distance_upper_bound*epsfac:
+                it2.priority = far_min_distance
 
-                        # since this is the nearest cell, we're done, bail out
-                        stdlib.free(inf)
-                        inf = <nodeinfo*> NULL
 
-                        # free all the nodes still on the heap
-                        for i in range(q.n):
-                            stdlib.free(q.heap[i].contents.ptrdata)
-                            q.heap[i].contents.ptrdata = <char*> NULL
+                # far child might be too far, if so, don't bother pushing it
+                if far_min_distance<=distance_upper_bound*epsfac:
+                    if heap_push(&q, it2) < 0:
+                        failed = 1
                         break
+                else:
+                    stdlib.free(inf2)
+                # ownership has passed to the queue (or the node is freed)
+                inf2 = <nodeinfo*> NULL
+                it2.contents.ptrdata = <char*> NULL
 
-                    # set up children for searching
-                    if x[inode.split_dim]<inode.split:
-                        near = inode.less
-                        far = inode.greater
-                    else:
-                        near = inode.greater
-                        far = inode.less
-
-                    # near child is at the same distance as the current node
-                    # we're going here next, so no point pushing it on the queue
-                    # no need to recompute the distance or the side_distances
-                    inf.node = near
-
-                    # far child is further by an amount depending only
-                    # on the split value; compute its distance and side_distances
-                    # and push it on the queue if it's near enough
-                    inf2 = <nodeinfo*>stdlib.malloc(sizeof(nodeinfo)+self.m*sizeof(np.float64_t))
-                    if inf2 == <nodeinfo*> NULL:
-                        raise MemoryError
-            
-                    it2.contents.ptrdata = <char*> inf2
-                    inf2.node = far
-                    # most side distances unchanged
-                    for i in range(self.m):
-                        inf2.side_distances[i] = inf.side_distances[i]
-
-                    # one side distance changes
-                    # we can adjust the minimum distance without recomputing
-                    if p == infinity:
-                        # we never use side_distances in the l_infinity case
-                        # inf2.side_distances[inode.split_dim] = dabs(inode.split-x[inode.split_dim])
-                        far_min_distance = dmax(min_distance, dabs(inode.split-x[inode.split_dim]))
-                    elif p == 1:
-                        inf2.side_distances[inode.split_dim] = dabs(inode.split-x[inode.split_dim])
-                        far_min_distance = min_distance - \
-                            inf.side_distances[inode.split_dim] + \
-                            inf2.side_distances[inode.split_dim]
-                    else:
-                        inf2.side_distances[inode.split_dim] = dabs(inode.split - 
-                                                                    x[inode.split_dim])**p
-                        far_min_distance = min_distance - \
-                            inf.side_distances[inode.split_dim] + \
-                            inf2.side_distances[inode.split_dim]
-
-                    it2.priority = far_min_distance
-
-
-                    # far child might be too far, if so, don't bother pushing it
-                    if far_min_distance<=distance_upper_bound*epsfac:
-                        q.push(it2)
-                    else:
-                        stdlib.free(inf2)
-                        inf2 = <nodeinfo*> NULL
-                        # just in case
-                        it2.contents.ptrdata = <char*> NULL
-
+        if not failed:
             # fill output arrays with sorted neighbors 
             for i in range(neighbors.n-1,-1,-1):
-                neighbors.pop(&neighbor)
+                heap_pop(&neighbors, &neighbor)
                 result_indices[i] = neighbor.contents.intdata
                 if p==1 or p==infinity:
                     result_distances[i] = -neighbor.priority
                 else:
                     result_distances[i] = (-neighbor.priority)**(1./p)
 
-            inf = inf2 = <nodeinfo*> NULL
-
-        finally:
-            if inf2 != <nodeinfo*> NULL:
-                stdlib.free(inf2)
-
-            if inf != <nodeinfo*> NULL:
-                stdlib.free(inf)
-
+        # free all the nodes still on the heap
+        for i in range(q.n):
+            stdlib.free(q.heap[i].contents.ptrdata)
+        if inf2 != <nodeinfo*> NULL:
+            stdlib.free(inf2)
+        if inf != <nodeinfo*> NULL:
+            stdlib.free(inf)
+        heap_free(&q)
+        heap_free(&neighbors)
+
+        if failed:
+            return -1
         return 0
 
+    cdef int __query_rows(cKDTree self,
+            np.ndarray dd,
+            np.ndarray ii,
+            np.ndarray xx,
+            np.intp_t start,
+            np.intp_t stop,
+            np.intp_t k,
+            np.float64_t eps,
+            np.float64_t p,
+            np.float64_t distance_upper_bound) except -1:
+        # Query rows start:stop of xx, writing into the preallocated
+        # dd and ii; the tree walk runs with the GIL released.
+        cdef np.float64_t *raw_dd = <np.float64_t*>np.PyArray_DATA(dd)
+        cdef np.intp_t *raw_ii = <np.intp_t*>np.PyArray_DATA(ii)
+        cdef np.float64_t *raw_xx = <np.float64_t*>np.PyArray_DATA(xx)
+        cdef np.intp_t c
+        cdef int failed = 0
+        with nogil:
+            for c in range(start, stop):
+                if self.__query(raw_dd + c*k, raw_ii + c*k, raw_xx + c*self.m,
+                                k, eps, p, distance_upper_bound) < 0:
+                    failed = 1
+                    break
+        if failed:
+            raise MemoryError
+        return 0
 
-    @cython.boundscheck(False)
     def query(cKDTree self, object x, np.intp_t k=1, np.float64_t eps=0,
-              np.float64_t p=2, np.float64_t distance_upper_bound=infinity):
-        """query(self, x, k=1, eps=0, p=2, distance_upper_bound=np.inf)
+              np.float64_t p=2, np.float64_t distance_upper_bound=infinity,
+              np.intp_t n_jobs=1):
+        """query(self, x, k=1, eps=0, p=2, distance_upper_bound=np.inf, n_jobs=1)
         
         Query the kd-tree for nearest neighbors
 
@@ -1190,6 +2189,11 @@ cdef class cKDTree:
             tree searches, so if you are doing a series of nearest-neighbor
             queries, it may help to supply the distance to the nearest neighbor
             of the most recent point.
+        n_jobs : int, optional
+            Number of threads to use for the queries.  The query points are
+            split into contiguous blocks which are searched concurrently
+            with the GIL released.  If -1 is given, all CPU cores are used.
+            Default: 1.
 
         Returns
         -------
@@ -1203,16 +2207,22 @@ cdef class cKDTree:
             Missing neighbors are indicated with self.n.
 
         """
-        cdef np.ndarray[np.intp_t, ndim=2] ii
-        cdef np.ndarray[np.float64_t, ndim=2] dd
-        cdef np.ndarray[np.float64_t, ndim=2] xx
-        cdef np.intp_t c, n, i, j
+        cdef np.ndarray ii
+        cdef np.ndarray dd
+        cdef np.ndarray xx
+        cdef np.intp_t n, i, chunk
         x = np.asarray(x).astype(np.float64)
         if np.shape(x)[-1] != self.m:
             raise ValueError("x must consist of vectors of length %d but has"
                              "shape %s" % (int(self.m), np.shape(x)))
         if p < 1:
             raise ValueError("Only p-norms with 1<=p<=infinity permitted")
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        if n_jobs == -1:
+            n_jobs = cpu_count()
+        elif n_jobs < 1:
+            raise ValueError("n_jobs must be a positive integer or -1")
         if len(x.shape)==1:
             single = True
             x = x[np.newaxis,:]
@@ -1220,40 +2230,45 @@ cdef class cKDTree:
             single = False
         retshape = np.shape(x)[:-1]
         n = <np.intp_t> np.prod(retshape)
-        xx = np.reshape(x,(n,self.m))
+        xx = np.reshape(self._wrap(x),(n,self.m))
         xx = np.ascontiguousarray(xx,dtype=np.float64)
         dd = np.empty((n,k),dtype=np.float64)
         dd.fill(infinity)
         ii = np.empty((n,k),dtype=np.intp)
         ii.fill(self.n)
-        for c in range(n):
-            self.__query(&dd[c, 0], &ii[c, 0], &xx[c, 0],
-                         k, eps, p, distance_upper_bound)
+
+        if n_jobs == 1 or n < 2:
+            self.__query_rows(dd, ii, xx, 0, n,
+                              k, eps, p, distance_upper_bound)
+        else:
+            chunk = (n + n_jobs - 1) // n_jobs
+            run_threads(self._query_rows_worker,
+                         [(dd, ii, xx, i, min(i + chunk, n),
+                           k, eps, p, distance_upper_bound)
+                          for i in range(0, n, chunk)])
 
         if single:
             if k==1:
                 if sizeof(long) < sizeof(np.intp_t):
                     # ... e.g. Windows 64
                     if ii[0,0] <= <np.intp_t>LONG_MAX:
-                        return dd[0,0], int(ii[0,0])
+                        return float(dd[0,0]), int(ii[0,0])
                     else:
-                        return dd[0,0], ii[0,0]
+                        return float(dd[0,0]), ii[0,0]
                 else:
                     # ... most other platforms
-                    return dd[0,0], ii[0,0]
+                    return float(dd[0,0]), int(ii[0,0])
             else:
                 return dd[0], ii[0]
         else:
             if sizeof(long) < sizeof(np.intp_t):
                 # ... e.g. Windows 64
-                for i in range(n):
-                    for j in range(k):
-                        if ii[i,j] > <np.intp_t>LONG_MAX:
-                            # C long overlow, return array of dtype=np.int_p
-                            if k==1:
-                                return np.reshape(dd[...,0],retshape), np.reshape(ii[...,0],retshape)
-                            else:
-                                return np.reshape(dd,retshape+(k,)), np.reshape(ii,retshape+(k,))
+                if n > 0 and ii.max() > <np.intp_t>LONG_MAX:
+                    # C long overlow, return array of dtype=np.int_p
+                    if k==1:
+                        return np.reshape(dd[...,0],retshape), np.reshape(ii[...,0],retshape)
+                    else:
+                        return np.reshape(dd,retshape+(k,)), np.reshape(ii,retshape+(k,))
 
                 # no C long overlow, return array of dtype=int
                 if k==1:
@@ -1268,81 +2283,94 @@ cdef class cKDTree:
                 else:
                     return np.reshape(dd,retshape+(k,)), np.reshape(ii,retshape+(k,))
 
+    def _query_rows_worker(cKDTree self, np.ndarray dd, np.ndarray ii,
+                           np.ndarray xx, np.intp_t start, np.intp_t stop,
+                           np.intp_t k, np.float64_t eps, np.float64_t p,
+                           np.float64_t distance_upper_bound):
+        # thread entry point for query(..., n_jobs>1)
+        self.__query_rows(dd, ii, xx, start, stop,
+                          k, eps, p, distance_upper_bound)
+
     # ----------------
     # query_ball_point
     # ----------------
     cdef int __query_ball_point_traverse_no_checking(cKDTree self,
-                                                     list results,
-                                                     innernode* node) except -1:
-        cdef leafnode* lnode
+                                                     neighbor_entries results,
+                                                     np.intp_t c,
+                                                     ckdtreenode* node) except -1:
+        cdef ckdtreenode* lnode
         cdef np.intp_t i
 
         if node.split_dim == -1:  # leaf node
-            lnode = <leafnode*> node
+            lnode = node
             for i in range(lnode.start_idx, lnode.end_idx):
-                list_append(results, self.raw_indices[i])
+                results.add(c, self.raw_indices[i])
         else:
-            self.__query_ball_point_traverse_no_checking(results, node.less)
-            self.__query_ball_point_traverse_no_checking(results, node.greater)
+            self.__query_ball_point_traverse_no_checking(results, c, node_less(node))
+            self.__query_ball_point_traverse_no_checking(results, c, node_greater(node))
 
         return 0
 
 
     @cython.cdivision(True)
     cdef int __query_ball_point_traverse_checking(cKDTree self,
-                                                  list results,
-                                                  innernode* node,
+                                                  neighbor_entries results,
+                                                  np.intp_t c,
+                                                  ckdtreenode* node,
                                                   PointRectDistanceTracker tracker) except -1:
-        cdef leafnode* lnode
+        cdef ckdtreenode* lnode
         cdef np.float64_t d
         cdef np.intp_t i
 
         if tracker.min_distance > tracker.upper_bound * tracker.epsfac:
             return 0
         elif tracker.max_distance < tracker.upper_bound / tracker.epsfac:
-            self.__query_ball_point_traverse_no_checking(results, node)
+            self.__query_ball_point_traverse_no_checking(results, c, node)
         elif node.split_dim == -1:  # leaf node
-            lnode = <leafnode*>node
+            lnode = node
             # brute-force
             for i in range(lnode.start_idx, lnode.end_idx):
                 d = _distance_p(
                     self.raw_data + self.raw_indices[i] * self.m,
-                    tracker.pt, tracker.p, self.m, tracker.upper_bound)
+                    tracker.pt, tracker.p, self.m, tracker.upper_bound,
+                    self.raw_boxsize)
                 if d <= tracker.upper_bound:
-                    list_append(results, self.raw_indices[i])
+                    results.add(c, self.raw_indices[i])
         else:
             tracker.push_less_of(node)
             self.__query_ball_point_traverse_checking(
-                results, node.less, tracker)
+                results, c, node_less(node), tracker)
             tracker.pop()
             
             tracker.push_greater_of(node)
             self.__query_ball_point_traverse_checking(
-                results, node.greater, tracker)
+                results, c, node_greater(node), tracker)
             tracker.pop()
             
         return 0
 
 
-    cdef list __query_ball_point(cKDTree self,
-                                 np.float64_t* x,
-                                 np.float64_t r,
-                                 np.float64_t p,
-                                 np.float64_t eps):
+    cdef int __query_ball_point(cKDTree self,
+                                neighbor_entries results,
+                                np.intp_t c,
+                                np.float64_t* x,
+                                np.float64_t r,
+                                np.float64_t p,
+                                np.float64_t eps) except -1:
 
         tracker = PointRectDistanceTracker()
-        tracker.init(x, Rectangle(self.mins, self.maxes),
+        tracker.init(x, Rectangle(self.mins, self.maxes, self.boxsize),
                      p, eps, r)
         
-        results = []
         self.__query_ball_point_traverse_checking(
-            results, self.tree, tracker)
-        return results
+            results, c, self.ctree, tracker)
+        return 0
 
 
     def query_ball_point(cKDTree self, object x, np.float64_t r,
-                         np.float64_t p=2., np.float64_t eps=0):
-        """query_ball_point(self, x, r, p, eps)
+                         np.float64_t p=2., np.float64_t eps=0,
+                         output='list'):
+        """query_ball_point(self, x, r, p, eps, output='list')
         
         Find all points within distance r of point(s) x.
 
@@ -1359,6 +2387,11 @@ cdef class cKDTree:
             nearest points are further than ``r / (1 + eps)``, and branches are
             added in bulk if their furthest points are nearer than
             ``r * (1 + eps)``.
+        output : {'list', 'csr', 'count'}, optional
+            Format of the result.  'list' (default) returns Python lists
+            of neighbors; 'csr' returns two index arrays and 'count' only
+            the number of neighbors of each point, without creating a
+            Python object per point.  See Returns.
 
         Returns
         -------
@@ -1366,6 +2399,17 @@ cdef class cKDTree:
             If `x` is a single point, returns a list of the indices of the
             neighbors of `x`. If `x` is an array of points, returns an object
             array of shape tuple containing lists of neighbors.
+            Returned for ``output='list'``.
+        indices, offsets : ndarray of ints
+            Returned for ``output='csr'``.  The query points are numbered
+            in C order over the shape tuple, and the neighbors of the i-th
+            query point are ``indices[offsets[i]:offsets[i+1]]``.  This is
+            the layout of `scipy.sparse.csr_matrix`, so that
+            ``csr_matrix((np.ones(len(indices)), indices, offsets),
+            shape=(len(offsets) - 1, self.n))`` is the adjacency matrix.
+        counts : int or ndarray of ints
+            Returned for ``output='count'``.  The number of neighbors of
+            each point, of shape tuple.
 
         Notes
         -----
@@ -1381,55 +2425,72 @@ cdef class cKDTree:
         >>> tree = spatial.cKDTree(points)
         >>> tree.query_ball_point([2, 0], 1)
         [4, 8, 9, 12]
+        >>> tree.query_ball_point([[2, 0], [3, 3]], 1, output='csr')
+        (array([ 4,  8,  9, 12, 11, 14, 15]), array([0, 4, 7]))
 
         """
-        cdef np.ndarray[np.float64_t, ndim=1, mode="c"] xx
+        cdef np.ndarray[np.float64_t, ndim=2, mode="c"] xx
+        cdef neighbor_entries results
+        cdef np.intp_t c, n
         
+        if output not in ('list', 'csr', 'count'):
+            raise ValueError("output must be one of 'list', 'csr' or 'count'")
+
         x = np.asarray(x).astype(np.float64)
         if x.shape[-1] != self.m:
             raise ValueError("Searching for a %d-dimensional point in a " \
                              "%d-dimensional KDTree" % (int(x.shape[-1]), int(self.m)))
-        if len(x.shape) == 1:
-            xx = np.ascontiguousarray(x, dtype=np.float64)
-            return self.__query_ball_point(&xx[0], r, p, eps)
+        retshape = x.shape[:-1]
+        n = <np.intp_t> np.prod(retshape)
+        xx = np.ascontiguousarray(np.reshape(self._wrap(x), (n, self.m)),
+                                  dtype=np.float64)
+
+        results = neighbor_entries(n, output == 'count')
+        for c in range(n):
+            self.__query_ball_point(results, c, &xx[c, 0], r, p, eps)
+
+        if output == 'count':
+            if len(x.shape) == 1:
+                return int(results.counts[0])
+            return np.reshape(results.counts, retshape)
+        elif output == 'csr':
+            return results.to_csr()
+        elif len(x.shape) == 1:
+            return results.to_lists()[0]
         else:
-            retshape = x.shape[:-1]
-            result = np.empty(retshape, dtype=np.object)
-            for c in np.ndindex(retshape):
-                xx = np.ascontiguousarray(x[c], dtype=np.float64)
-                result[c] = self.__query_ball_point(&xx[0], r, p, eps)
-            return result
+            result = np.empty(n, dtype=np.object)
+            for c, neighbors in enumerate(results.to_lists()):
+                result[c] = neighbors
+            return np.reshape(result, retshape)
 
     # ---------------
     # query_ball_tree
     # ---------------
     cdef int __query_ball_tree_traverse_no_checking(cKDTree self,
                                                     cKDTree other,
-                                                    list results,
-                                                    innernode* node1,
-                                                    innernode* node2) except -1:
-        cdef leafnode *lnode1, *lnode2
-        cdef list results_i
+                                                    neighbor_entries results,
+                                                    ckdtreenode* node1,
+                                                    ckdtreenode* node2) except -1:
+        cdef ckdtreenode *lnode1, *lnode2
         cdef np.intp_t i, j
         
         if node1.split_dim == -1:  # leaf node
-            lnode1 = <leafnode*>node1
+            lnode1 = node1
             
             if node2.split_dim == -1:  # leaf node
-                lnode2 = <leafnode*>node2
+                lnode2 = node2
                 
                 for i in range(lnode1.start_idx, lnode1.end_idx):
-                    results_i = results[self.raw_indices[i]]
                     for j in range(lnode2.start_idx, lnode2.end_idx):
-                        list_append(results_i, other.raw_indices[j])
+                        results.add(self.raw_indices[i], other.raw_indices[j])
             else:
                 
-                self.__query_ball_tree_traverse_no_checking(other, results, node1, node2.less)
-                self.__query_ball_tree_traverse_no_checking(other, results, node1, node2.greater)
+                self.__query_ball_tree_traverse_no_checking(other, results, node1, node_less(node2))
+                self.__query_ball_tree_traverse_no_checking(other, results, node1, node_greater(node2))
         else:
             
-            self.__query_ball_tree_traverse_no_checking(other, results, node1.less, node2)
-            self.__query_ball_tree_traverse_no_checking(other, results, node1.greater, node2)
+            self.__query_ball_tree_traverse_no_checking(other, results, node_less(node1), node2)
+            self.__query_ball_tree_traverse_no_checking(other, results, node_greater(node1), node2)
 
         return 0
 
@@ -1437,12 +2498,11 @@ cdef class cKDTree:
     @cython.cdivision(True)
     cdef int __query_ball_tree_traverse_checking(cKDTree self,
                                                  cKDTree other,
-                                                 list results,
-                                                 innernode* node1,
-                                                 innernode* node2,
+                                                 neighbor_entries results,
+                                                 ckdtreenode* node1,
+                                                 ckdtreenode* node2,
                                                  RectRectDistanceTracker tracker) except -1:
-        cdef leafnode *lnode1, *lnode2
-        cdef list results_i
+        cdef ckdtreenode *lnode1, *lnode2
         cdef np.float64_t d
         cdef np.intp_t i, j
 
@@ -1451,32 +2511,32 @@ cdef class cKDTree:
         elif tracker.max_distance < tracker.upper_bound / tracker.epsfac:
             self.__query_ball_tree_traverse_no_checking(other, results, node1, node2)
         elif node1.split_dim == -1:  # 1 is leaf node
-            lnode1 = <leafnode*>node1
+            lnode1 = node1
             
             if node2.split_dim == -1:  # 1 & 2 are leaves
-                lnode2 = <leafnode*>node2
+                lnode2 = node2
                 
                 # brute-force
                 for i in range(lnode1.start_idx, lnode1.end_idx):
-                    results_i = results[self.raw_indices[i]]
                     for j in range(lnode2.start_idx, lnode2.end_idx):
                         d = _distance_p(
                             self.raw_data + self.raw_indices[i] * self.m,
                             other.raw_data + other.raw_indices[j] * other.m,
-                            tracker.p, self.m, tracker.upper_bound)
+                            tracker.p, self.m, tracker.upper_bound,
+                            self.raw_boxsize)
                         if d <= tracker.upper_bound:
-                            list_append(results_i, other.raw_indices[j])
+                            results.add(self.raw_indices[i], other.raw_indices[j])
                             
             else:  # 1 is a leaf node, 2 is inner node
 
                 tracker.push_less_of(2, node2)
                 self.__query_ball_tree_traverse_checking(
-                    other, results, node1, node2.less, tracker)
+                    other, results, node1, node_less(node2), tracker)
                 tracker.pop()
                     
                 tracker.push_greater_of(2, node2)
                 self.__query_ball_tree_traverse_checking(
-                    other, results, node1, node2.greater, tracker)
+                    other, results, node1, node_greater(node2), tracker)
                 tracker.pop()
             
                 
@@ -1484,12 +2544,12 @@ cdef class cKDTree:
             if node2.split_dim == -1:  # 1 is an inner node, 2 is a leaf node
                 tracker.push_less_of(1, node1)
                 self.__query_ball_tree_traverse_checking(
-                    other, results, node1.less, node2, tracker)
+                    other, results, node_less(node1), node2, tracker)
                 tracker.pop()
                     
                 tracker.push_greater_of(1, node1)
                 self.__query_ball_tree_traverse_checking(
-                    other, results, node1.greater, node2, tracker)
+                    other, results, node_greater(node1), node2, tracker)
                 tracker.pop()
                 
             else: # 1 & 2 are inner nodes
@@ -1497,12 +2557,12 @@ cdef class cKDTree:
                 tracker.push_less_of(1, node1)
                 tracker.push_less_of(2, node2)
                 self.__query_ball_tree_traverse_checking(
-                    other, results, node1.less, node2.less, tracker)
+                    other, results, node_less(node1), node_less(node2), tracker)
                 tracker.pop()
                     
                 tracker.push_greater_of(2, node2)
                 self.__query_ball_tree_traverse_checking(
-                    other, results, node1.less, node2.greater, tracker)
+                    other, results, node_less(node1), node_greater(node2), tracker)
                 tracker.pop()
                 tracker.pop()
 
@@ -1510,12 +2570,12 @@ cdef class cKDTree:
                 tracker.push_greater_of(1, node1)
                 tracker.push_less_of(2, node2)
                 self.__query_ball_tree_traverse_checking(
-                    other, results, node1.greater, node2.less, tracker)
+                    other, results, node_greater(node1), node_less(node2), tracker)
                 tracker.pop()
                     
                 tracker.push_greater_of(2, node2)
                 self.__query_ball_tree_traverse_checking(
-                    other, results, node1.greater, node2.greater, tracker)
+                    other, results, node_greater(node1), node_greater(node2), tracker)
                 tracker.pop()
                 tracker.pop()
             
@@ -1523,8 +2583,9 @@ cdef class cKDTree:
             
 
     def query_ball_tree(cKDTree self, cKDTree other,
-                        np.float64_t r, np.float64_t p=2., np.float64_t eps=0):
-        """query_ball_tree(self, other, r, p, eps)
+                        np.float64_t r, np.float64_t p=2., np.float64_t eps=0,
+                        output='list'):
+        """query_ball_tree(self, other, r, p, eps, output='list')
 
         Find all pairs of points whose distance is at most r
 
@@ -1542,30 +2603,49 @@ cdef class cKDTree:
             if their nearest points are further than ``r/(1+eps)``, and
             branches are added in bulk if their furthest points are nearer
             than ``r * (1+eps)``.  `eps` has to be non-negative.
+        output : {'list', 'csr', 'count'}, optional
+            Format of the result, see Returns.  Default: 'list'.
 
         Returns
         -------
         results : list of lists
             For each element ``self.data[i]`` of this tree, ``results[i]`` is a
             list of the indices of its neighbors in ``other.data``.
+            Returned for ``output='list'``.
+        indices, offsets : ndarray of ints
+            Returned for ``output='csr'``.  The neighbors of
+            ``self.data[i]`` are ``indices[offsets[i]:offsets[i+1]]``.
+        counts : ndarray of ints
+            Returned for ``output='count'``.  The number of neighbors of
+            each element of ``self.data``.
 
         """
+        cdef neighbor_entries results
+
+        if output not in ('list', 'csr', 'count'):
+            raise ValueError("output must be one of 'list', 'csr' or 'count'")
 
         # Make sure trees are compatible
         if self.m != other.m:
             raise ValueError("Trees passed to query_ball_tree have different dimensionality")
+        self._check_same_box(other, "query_ball_tree")
 
         # Track node-to-node min/max distances
         tracker = RectRectDistanceTracker(
-            Rectangle(self.mins, self.maxes),
-            Rectangle(other.mins, other.maxes),
+            Rectangle(self.mins, self.maxes, self.boxsize),
+            Rectangle(other.mins, other.maxes, other.boxsize),
             p, eps, r)
         
-        results = [[] for i in range(self.n)]
+        results = neighbor_entries(self.n, output == 'count')
         self.__query_ball_tree_traverse_checking(
-            other, results, self.tree, other.tree, tracker)
+            other, results, self.ctree, other.ctree, tracker)
 
-        return results
+        if output == 'count':
+            return results.counts
+        elif output == 'csr':
+            return results.to_csr()
+        else:
+            return results.to_lists()
 
 
     # -----------
@@ -1573,17 +2653,17 @@ cdef class cKDTree:
     # -----------
     cdef int __query_pairs_traverse_no_checking(cKDTree self,
                                                 set results,
-                                                innernode* node1,
-                                                innernode* node2) except -1:
-        cdef leafnode *lnode1, *lnode2
+                                                ckdtreenode* node1,
+                                                ckdtreenode* node2) except -1:
+        cdef ckdtreenode *lnode1, *lnode2
         cdef list results_i
         cdef np.intp_t i, j, min_j
         
         if node1.split_dim == -1:  # leaf node
-            lnode1 = <leafnode*>node1
+            lnode1 = node1
             
             if node2.split_dim == -1:  # leaf node
-                lnode2 = <leafnode*>node2
+                lnode2 = node2
 
                 for i in range(lnode1.start_idx, lnode1.end_idx):
                     # Special care here to avoid duplicate pairs
@@ -1598,30 +2678,30 @@ cdef class cKDTree:
                                              self.raw_indices[j])
                             
             else:
-                self.__query_pairs_traverse_no_checking(results, node1, node2.less)
-                self.__query_pairs_traverse_no_checking(results, node1, node2.greater)
+                self.__query_pairs_traverse_no_checking(results, node1, node_less(node2))
+                self.__query_pairs_traverse_no_checking(results, node1, node_greater(node2))
         else:
             if node1 == node2:
-                # Avoid traversing (node1.less, node2.greater) and
-                # (node1.greater, node2.less) (it's the same node pair twice
+                # Avoid traversing (node_less(node1), node_greater(node2)) and
+                # (node_greater(node1), node_less(node2)) (it's the same node pair twice
                 # over, which is the source of the complication in the
                 # original KDTree.query_pairs)
-                self.__query_pairs_traverse_no_checking(results, node1.less, node2.less)
-                self.__query_pairs_traverse_no_checking(results, node1.less, node2.greater)
-                self.__query_pairs_traverse_no_checking(results, node1.greater, node2.greater)
+                self.__query_pairs_traverse_no_checking(results, node_less(node1), node_less(node2))
+                self.__query_pairs_traverse_no_checking(results, node_less(node1), node_greater(node2))
+                self.__query_pairs_traverse_no_checking(results, node_greater(node1), node_greater(node2))
             else:
-                self.__query_pairs_traverse_no_checking(results, node1.less, node2)
-                self.__query_pairs_traverse_no_checking(results, node1.greater, node2)
+                self.__query_pairs_traverse_no_checking(results, node_less(node1), node2)
+                self.__query_pairs_traverse_no_checking(results, node_greater(node1), node2)
 
         return 0
 
     @cython.cdivision(True)
     cdef int __query_pairs_traverse_checking(cKDTree self,
                                              set results,
-                                             innernode* node1,
-                                             innernode* node2,
+                                             ckdtreenode* node1,
+                                             ckdtreenode* node2,
                                              RectRectDistanceTracker tracker) except -1:
-        cdef leafnode *lnode1, *lnode2
+        cdef ckdtreenode *lnode1, *lnode2
         cdef list results_i
         cdef np.float64_t d
         cdef np.intp_t i, j, min_j
@@ -1631,10 +2711,10 @@ cdef class cKDTree:
         elif tracker.max_distance < tracker.upper_bound / tracker.epsfac:
             self.__query_pairs_traverse_no_checking(results, node1, node2)
         elif node1.split_dim == -1:  # 1 is leaf node
-            lnode1 = <leafnode*>node1
+            lnode1 = node1
             
             if node2.split_dim == -1:  # 1 & 2 are leaves
-                lnode2 = <leafnode*>node2
+                lnode2 = node2
                 
                 # brute-force
                 for i in range(lnode1.start_idx, lnode1.end_idx):
@@ -1649,7 +2729,8 @@ cdef class cKDTree:
                         d = _distance_p(
                             self.raw_data + self.raw_indices[i] * self.m,
                             self.raw_data + self.raw_indices[j] * self.m,
-                            tracker.p, self.m, tracker.upper_bound)
+                            tracker.p, self.m, tracker.upper_bound,
+                            self.raw_boxsize)
                         if d <= tracker.upper_bound:
                             set_add_ordered_pair(results,
                                                  self.raw_indices[i],
@@ -1658,53 +2739,53 @@ cdef class cKDTree:
             else:  # 1 is a leaf node, 2 is inner node
                 tracker.push_less_of(2, node2)
                 self.__query_pairs_traverse_checking(
-                    results, node1, node2.less, tracker)
+                    results, node1, node_less(node2), tracker)
                 tracker.pop()
                     
                 tracker.push_greater_of(2, node2)
                 self.__query_pairs_traverse_checking(
-                    results, node1, node2.greater, tracker)
+                    results, node1, node_greater(node2), tracker)
                 tracker.pop()
                 
         else:  # 1 is an inner node
             if node2.split_dim == -1:  # 1 is an inner node, 2 is a leaf node
                 tracker.push_less_of(1, node1)
                 self.__query_pairs_traverse_checking(
-                    results, node1.less, node2, tracker)
+                    results, node_less(node1), node2, tracker)
                 tracker.pop()
                 
                 tracker.push_greater_of(1, node1)
                 self.__query_pairs_traverse_checking(
-                    results, node1.greater, node2, tracker)
+                    results, node_greater(node1), node2, tracker)
                 tracker.pop()
                 
             else: # 1 and 2 are inner nodes
                 tracker.push_less_of(1, node1)
                 tracker.push_less_of(2, node2)
                 self.__query_pairs_traverse_checking(
-                    results, node1.less, node2.less, tracker)
+                    results, node_less(node1), node_less(node2), tracker)
                 tracker.pop()
                     
                 tracker.push_greater_of(2, node2)
                 self.__query_pairs_traverse_checking(
-                    results, node1.less, node2.greater, tracker)
+                    results, node_less(node1), node_greater(node2), tracker)
                 tracker.pop()
                 tracker.pop()
                     
                 tracker.push_greater_of(1, node1)
                 if node1 != node2:
-                    # Avoid traversing (node1.less, node2.greater) and
-                    # (node1.greater, node2.less) (it's the same node pair
+                    # Avoid traversing (node_less(node1), node_greater(node2)) and
+                    # (node_greater(node1), node_less(node2)) (it's the same node pair
                     # twice over, which is the source of the complication in
                     # the original KDTree.query_pairs)
                     tracker.push_less_of(2, node2)
                     self.__query_pairs_traverse_checking(
-                        results, node1.greater, node2.less, tracker)
+                        results, node_greater(node1), node_less(node2), tracker)
                     tracker.pop()
                     
                 tracker.push_greater_of(2, node2)
                 self.__query_pairs_traverse_checking(
-                    results, node1.greater, node2.greater, tracker)
+                    results, node_greater(node1), node_greater(node2), tracker)
                 tracker.pop()
                 tracker.pop()
                 
@@ -1739,13 +2820,13 @@ cdef class cKDTree:
         """
         
         tracker = RectRectDistanceTracker(
-            Rectangle(self.mins, self.maxes),
-            Rectangle(self.mins, self.maxes),
+            Rectangle(self.mins, self.maxes, self.boxsize),
+            Rectangle(self.mins, self.maxes, self.boxsize),
             p, eps, r)
         
         results = set()
         self.__query_pairs_traverse_checking(
-            results, self.tree, self.tree, tracker)
+            results, self.ctree, self.ctree, tracker)
         
         return results
 
@@ -1753,118 +2834,152 @@ cdef class cKDTree:
     # ---------------
     # count_neighbors
     # ---------------
+    cdef int __node_weights(cKDTree self, np.float64_t *weights,
+                            np.float64_t *node_weights) except -1:
+        # Sum the point weights under every node.  Children follow their
+        # parent in the node array, so a reverse sweep sees them first.
+        cdef ckdtreenode* node
+        cdef np.intp_t k, i
+        cdef np.float64_t w
+        for k in range(self.n_nodes - 1, -1, -1):
+            node = self.ctree + k
+            if node.split_dim == -1:
+                w = 0
+                for i in range(node.start_idx, node.end_idx):
+                    w += weights[self.raw_indices[i]]
+                node_weights[k] = w
+            else:
+                node_weights[k] = (node_weights[k + node.less] +
+                                   node_weights[k + node.greater])
+        return 0
+
     cdef int __count_neighbors_traverse(cKDTree self,
                                         cKDTree other,
-                                        np.intp_t n_queries,
-                                        np.float64_t* r,
-                                        np.intp_t * results,
-                                        np.intp_t * idx,
-                                        innernode* node1,
-                                        innernode* node2,
+                                        count_neighbors_info *info,
+                                        np.intp_t start,
+                                        np.intp_t end,
+                                        ckdtreenode* node1,
+                                        ckdtreenode* node2,
                                         RectRectDistanceTracker tracker) except -1:
-        cdef leafnode *lnode1, *lnode2
-        cdef np.float64_t d
-        cdef np.intp_t *old_idx
-        cdef np.intp_t old_n_queries, l, i, j
-
-        # Speed through pairs of nodes all of whose children are close
-        # and see if any work remains to be done
-        old_idx = idx
-        cdef np.ndarray[np.intp_t, ndim=1] inner_idx
-        inner_idx = np.empty((n_queries,), dtype=np.intp)
-        idx = &inner_idx[0]
-
-        old_n_queries = n_queries
-        n_queries = 0
-        for i in range(old_n_queries):
-            if tracker.max_distance < r[old_idx[i]]:
-                results[old_idx[i]] += node1.children * node2.children
-            elif tracker.min_distance <= r[old_idx[i]]:
-                idx[n_queries] = old_idx[i]
-                n_queries += 1
-
-        if n_queries > 0:
-            # OK, need to probe a bit deeper
-            if node1.split_dim == -1:  # 1 is leaf node
-                lnode1 = <leafnode*>node1
-                if node2.split_dim == -1:  # 1 & 2 are leaves
-                    lnode2 = <leafnode*>node2
-                    
-                    # brute-force
-                    for i in range(lnode1.start_idx, lnode1.end_idx):
-                        for j in range(lnode2.start_idx, lnode2.end_idx):
-                            d = _distance_p(
-                                self.raw_data + self.raw_indices[i] * self.m,
-                                other.raw_data + other.raw_indices[j] * other.m,
-                                tracker.p, self.m, tracker.max_distance)
-                            # I think it's usually cheaper to test d against all r's
-                            # than to generate a distance array, sort it, then
-                            # search for all r's via binary search
-                            for l in range(n_queries):
-                                if d <= r[idx[l]]:
-                                    results[idx[l]] += 1
-                                
-                else:  # 1 is a leaf node, 2 is inner node
-                    tracker.push_less_of(2, node2)
-                    self.__count_neighbors_traverse(
-                        other, n_queries, r, results, idx,
-                        node1, node2.less, tracker)
-                    tracker.pop()
+        # The pairs of points under node1 and node2 fall into the bins
+        # start..end; bin k holds the pairs with r[k-1] < d <= r[k], and
+        # bin n_r the pairs beyond the largest radius.
+        cdef ckdtreenode *lnode1, *lnode2
+        cdef np.float64_t d, w1, w2
+        cdef np.intp_t i, j, k
+
+        # Narrow down the range of bins from the distance bounds of the
+        # two nodes, and speed through pairs of nodes that lie in a single
+        # bin.
+        start = bisect_left(info.r, start, end, tracker.min_distance)
+        end = bisect_right(info.r, start, end, tracker.max_distance)
+        if start == end:
+            add_pair_counts(info, start,
+                            node1 - self.ctree, node1.children,
+                            node2 - other.ctree, node2.children)
+            return 0
+
+        # OK, need to probe a bit deeper
+        if node1.split_dim == -1:  # 1 is leaf node
+            lnode1 = node1
+            if node2.split_dim == -1:  # 1 & 2 are leaves
+                lnode2 = node2
+
+                # brute-force
+                w1 = w2 = 1
+                for i in range(lnode1.start_idx, lnode1.end_idx):
+                    if info.weights1 != NULL:
+                        w1 = info.weights1[self.raw_indices[i]]
+                    for j in range(lnode2.start_idx, lnode2.end_idx):
+                        # distances beyond r[end-1] all fall into bin end
+                        d = _distance_p(
+                            self.raw_data + self.raw_indices[i] * self.m,
+                            other.raw_data + other.raw_indices[j] * other.m,
+                            tracker.p, self.m, info.r[end - 1],
+                            self.raw_boxsize)
+                        k = bisect_left(info.r, start, end, d)
+                        if info.weighted_counts == NULL:
+                            info.counts[k] += 1
+                        else:
+                            if info.weights2 != NULL:
+                                w2 = info.weights2[other.raw_indices[j]]
+                            info.weighted_counts[k] += w1 * w2
+
+            else:  # 1 is a leaf node, 2 is inner node
+                tracker.push_less_of(2, node2)
+                self.__count_neighbors_traverse(
+                    other, info, start, end,
+                    node1, node_less(node2), tracker)
+                tracker.pop()
+
+                tracker.push_greater_of(2, node2)
+                self.__count_neighbors_traverse(
+                    other, info, start, end,
+                    node1, node_greater(node2), tracker)
+                tracker.pop()
+
+        else:  # 1 is an inner node
+            if node2.split_dim == -1:  # 1 is an inner node, 2 is a leaf node
+                tracker.push_less_of(1, node1)
+                self.__count_neighbors_traverse(
+                    other, info, start, end,
+                    node_less(node1), node2, tracker)
+                tracker.pop()
+
+                tracker.push_greater_of(1, node1)
+                self.__count_neighbors_traverse(
+                    other, info, start, end,
+                    node_greater(node1), node2, tracker)
+                tracker.pop()
+
+            else: # 1 and 2 are inner nodes
+                tracker.push_less_of(1, node1)
+                tracker.push_less_of(2, node2)
+                self.__count_neighbors_traverse(
+                    other, info, start, end,
+                    node_less(node1), node_less(node2), tracker)
+                tracker.pop()
+
+                tracker.push_greater_of(2, node2)
+                self.__count_neighbors_traverse(
+                    other, info, start, end,
+                    node_less(node1), node_greater(node2), tracker)
+                tracker.pop()
+                tracker.pop()
+
+                tracker.push_greater_of(1, node1)
+                tracker.push_less_of(2, node2)
+                self.__count_neighbors_traverse(
+                    other, info, start, end,
+                    node_greater(node1), node_less(node2), tracker)
+                tracker.pop()
+
+                tracker.push_greater_of(2, node2)
+                self.__count_neighbors_traverse(
+                    other, info, start, end,
+                    node_greater(node1), node_greater(node2), tracker)
+                tracker.pop()
+                tracker.pop()
 
-                    tracker.push_greater_of(2, node2)
-                    self.__count_neighbors_traverse(
-                        other, n_queries, r, results, idx,
-                        node1, node2.greater, tracker)
-                    tracker.pop()
-                
-            else:  # 1 is an inner node
-                if node2.split_dim == -1:  # 1 is an inner node, 2 is a leaf node
-                    tracker.push_less_of(1, node1)
-                    self.__count_neighbors_traverse(
-                        other, n_queries, r, results, idx,
-                        node1.less, node2, tracker)
-                    tracker.pop()
-                    
-                    tracker.push_greater_of(1, node1)
-                    self.__count_neighbors_traverse(
-                        other, n_queries, r, results, idx,
-                        node1.greater, node2, tracker)
-                    tracker.pop()
-                    
-                else: # 1 and 2 are inner nodes
-                    tracker.push_less_of(1, node1)
-                    tracker.push_less_of(2, node2)
-                    self.__count_neighbors_traverse(
-                        other, n_queries, r, results, idx,
-                        node1.less, node2.less, tracker)
-                    tracker.pop()
-                        
-                    tracker.push_greater_of(2, node2)
-                    self.__count_neighbors_traverse(
-                        other, n_queries, r, results, idx,
-                        node1.less, node2.greater, tracker)
-                    tracker.pop()
-                    tracker.pop()
-                        
-                    tracker.push_greater_of(1, node1)
-                    tracker.push_less_of(2, node2)
-                    self.__count_neighbors_traverse(
-                        other, n_queries, r, results, idx,
-                        node1.greater, node2.less, tracker)
-                    tracker.pop()
-                        
-                    tracker.push_greater_of(2, node2)
-                    self.__count_neighbors_traverse(
-                        other, n_queries, r, results, idx,
-                        node1.greater, node2.greater, tracker)
-                    tracker.pop()
-                    tracker.pop()
-                    
         return 0
 
+    def _prepare_weights(cKDTree self, weights):
+        # Check the point weights of this tree and compute the weight
+        # sums of its nodes.
+        cdef np.ndarray[np.float64_t, ndim=1, mode="c"] w, node_w
+        w = np.ascontiguousarray(weights, dtype=np.float64)
+        if w.ndim != 1 or w.shape[0] != self.n:
+            raise ValueError("weights must have the shape (%d,) of the "
+                             "points of the tree" % self.n)
+        node_w = np.empty(self.n_nodes, dtype=np.float64)
+        if self.n > 0:
+            self.__node_weights(&w[0], &node_w[0])
+        return w, node_w
+
     @cython.boundscheck(False)
-    def count_neighbors(cKDTree self, cKDTree other, object r, np.float64_t p=2.):
-        """count_neighbors(self, other, r, p)
+    def count_neighbors(cKDTree self, cKDTree other, object r,
+                        np.float64_t p=2., weights=None, cumulative=True):
+        """count_neighbors(self, other, r, p=2., weights=None, cumulative=True)
 
         Count how many nearby pairs can be formed.
 
@@ -1884,21 +2999,48 @@ cdef class cKDTree:
             a single tree traversal.
         p : float, 1<=p<=infinity
             Which Minkowski p-norm to use
+        weights : tuple, array_like, or None, optional
+            If None, the pairs are counted.  Otherwise the weight of a pair
+            is the product of the weights of its two points, and the weights
+            of the pairs are summed.  A tuple ``(w1, w2)`` gives the weights
+            of the points of self and of `other`; either can be None for
+            unit weights.  A single array gives the weights of the points
+            of both trees, which must then be the same tree.
+        cumulative : bool, optional
+            If True (default), ``result[i]`` counts the pairs with
+            ``distance <= r[i]``.  If False, `r` must be nondecreasing,
+            and ``result[i]`` counts the pairs with
+            ``r[i-1] < distance <= r[i]``, with ``result[0]`` counting
+            those with ``distance <= r[0]``.
 
         Returns
         -------
-        result : int or 1-D array of ints
-            The number of pairs. Note that this is internally stored in a numpy int,
-            and so may overflow if very large (2e9).
+        result : scalar or 1-D array
+            The number of pairs, or their summed weight if `weights` is
+            given.  Unweighted counts are stored in a numpy int, and so
+            may overflow if very large (2e9 on 32-bit platforms).
+
+        Notes
+        -----
+        The sums of the weights of the points under every node are
+        computed once before the traversal, so that pairs of nodes which
+        lie entirely within one radial bin are counted in constant time,
+        weighted or not.  All radii share the same traversal: a pair of
+        nodes is only opened while one of the radii falls between the
+        smallest and largest distance of their points.
 
         """
         cdef np.intp_t n_queries, i
         cdef np.ndarray[np.float64_t, ndim=1, mode="c"] real_r
-        cdef np.ndarray[np.intp_t, ndim=1, mode="c"] results, idx
+        cdef np.ndarray[np.intp_t, ndim=1, mode="c"] counts
+        cdef np.ndarray[np.float64_t, ndim=1, mode="c"] weighted_counts
+        cdef np.ndarray[np.float64_t, ndim=1, mode="c"] w1, w2, nw1, nw2
+        cdef count_neighbors_info info
 
         # Make sure trees are compatible
         if self.m != other.m:
             raise ValueError("Trees passed to count_neighbors have different dimensionality")
+        self._check_same_box(other, "count_neighbors")
 
         # Make a copy of r array to ensure it's contiguous and to modify it
         # below
@@ -1907,9 +3049,22 @@ cdef class cKDTree:
             n_queries = 1
         elif len(np.shape(r))==1:
             real_r = np.array(r, dtype=np.float64)
-            n_queries = r.shape[0]
+            n_queries = real_r.shape[0]
         else:
             raise ValueError("r must be either a single value or a one-dimensional array of values")
+        if n_queries == 0:
+            return np.zeros(0, dtype=np.intp if weights is None
+                            else np.float64)
+
+        # The radii are handled as bin edges and must be sorted
+        if n_queries > 1 and np.any(real_r[1:] < real_r[:-1]):
+            if not cumulative:
+                raise ValueError("r must be nondecreasing if cumulative "
+                                 "is False")
+            order = np.argsort(real_r, kind='mergesort')
+            real_r = real_r[order]
+        else:
+            order = None
 
         # Internally, we represent all distances as distance ** p
         if p != infinity:
@@ -1917,22 +3072,63 @@ cdef class cKDTree:
                 if real_r[i] != infinity:
                     real_r[i] = real_r[i] ** p
 
+        info.r = &real_r[0]
+        info.weights1 = info.node_weights1 = NULL
+        info.weights2 = info.node_weights2 = NULL
+        info.counts = NULL
+        info.weighted_counts = NULL
+        if weights is None:
+            counts = np.zeros((n_queries + 1,), dtype=np.intp)
+            info.counts = &counts[0]
+        else:
+            if isinstance(weights, tuple):
+                if len(weights) != 2:
+                    raise ValueError("weights must be a pair (weights of "
+                                     "self, weights of other)")
+                self_weights, other_weights = weights
+            elif self is other:
+                self_weights = other_weights = weights
+            else:
+                raise ValueError("weights must be a tuple if self and "
+                                 "other are different trees")
+            if self_weights is not None:
+                w1, nw1 = self._prepare_weights(self_weights)
+                if self.n > 0:
+                    info.weights1 = &w1[0]
+                    info.node_weights1 = &nw1[0]
+            if other_weights is not None:
+                w2, nw2 = other._prepare_weights(other_weights)
+                if other.n > 0:
+                    info.weights2 = &w2[0]
+                    info.node_weights2 = &nw2[0]
+            weighted_counts = np.zeros((n_queries + 1,), dtype=np.float64)
+            info.weighted_counts = &weighted_counts[0]
+
         # Track node-to-node min/max distances
         tracker = RectRectDistanceTracker(
-            Rectangle(self.mins, self.maxes),
-            Rectangle(other.mins, other.maxes),
+            Rectangle(self.mins, self.maxes, self.boxsize),
+            Rectangle(other.mins, other.maxes, other.boxsize),
             p, 0.0, 0.0)
-        
+
         # Go!
-        results = np.zeros((n_queries,), dtype=np.intp)
-        idx = np.arange(n_queries, dtype=np.intp)
-        self.__count_neighbors_traverse(other, n_queries,
-                                        &real_r[0], &results[0], &idx[0],
-                                        self.tree, other.tree,
+        self.__count_neighbors_traverse(other, &info, 0, n_queries,
+                                        self.ctree, other.ctree,
                                         tracker)
-        
+
+        # drop the bin of pairs beyond the largest radius
+        if weights is None:
+            results = counts[:n_queries]
+        else:
+            results = weighted_counts[:n_queries]
+        if cumulative:
+            results = np.cumsum(results)
+            if order is not None:
+                results[order] = results.copy()
+
         if np.shape(r) == ():
-            if results[0] <= <np.intp_t> LONG_MAX:
+            if weights is not None:
+                return float(results[0])
+            elif results[0] <= <np.intp_t> LONG_MAX:
                 return int(results[0])
             else:
                 return results[0]
@@ -1944,9 +3140,9 @@ cdef class cKDTree:
     # ----------------------
     cdef int __sparse_distance_matrix_traverse(cKDTree self, cKDTree other,
                                                coo_entries results,
-                                               innernode* node1, innernode* node2,
+                                               ckdtreenode* node1, ckdtreenode* node2,
                                                RectRectDistanceTracker tracker) except -1:
-        cdef leafnode *lnode1, *lnode2
+        cdef ckdtreenode *lnode1, *lnode2
         cdef list results_i
         cdef np.float64_t d
         cdef np.intp_t i, j, min_j
@@ -1954,10 +3150,10 @@ cdef class cKDTree:
         if tracker.min_distance > tracker.upper_bound:
             return 0
         elif node1.split_dim == -1:  # 1 is leaf node
-            lnode1 = <leafnode*>node1
+            lnode1 = node1
             
             if node2.split_dim == -1:  # 1 & 2 are leaves
-                lnode2 = <leafnode*>node2
+                lnode2 = node2
                 
                 # brute-force
                 for i in range(lnode1.start_idx, lnode1.end_idx):
@@ -1971,7 +3167,8 @@ cdef class cKDTree:
                         d = _distance_p(
                             self.raw_data + self.raw_indices[i] * self.m,
                             other.raw_data + other.raw_indices[j] * self.m,
-                            tracker.p, self.m, tracker.upper_bound)
+                            tracker.p, self.m, tracker.upper_bound,
+                            self.raw_boxsize)
                         if d <= tracker.upper_bound:
                             if tracker.p != 1 and tracker.p != infinity:
                                 d = d**(1. / tracker.p)
@@ -1984,53 +3181,53 @@ cdef class cKDTree:
             else:  # 1 is a leaf node, 2 is inner node
                 tracker.push_less_of(2, node2)
                 self.__sparse_distance_matrix_traverse(
-                    other, results, node1, node2.less, tracker)
+                    other, results, node1, node_less(node2), tracker)
                 tracker.pop()
                     
                 tracker.push_greater_of(2, node2)
                 self.__sparse_distance_matrix_traverse(
-                    other, results, node1, node2.greater, tracker)
+                    other, results, node1, node_greater(node2), tracker)
                 tracker.pop()
                 
         else:  # 1 is an inner node
             if node2.split_dim == -1:  # 1 is an inner node, 2 is a leaf node
                 tracker.push_less_of(1, node1)
                 self.__sparse_distance_matrix_traverse(
-                    other, results, node1.less, node2, tracker)
+                    other, results, node_less(node1), node2, tracker)
                 tracker.pop()
                 
                 tracker.push_greater_of(1, node1)
                 self.__sparse_distance_matrix_traverse(
-                    other, results, node1.greater, node2, tracker)
+                    other, results, node_greater(node1), node2, tracker)
                 tracker.pop()
                 
             else: # 1 and 2 are inner nodes
                 tracker.push_less_of(1, node1)
                 tracker.push_less_of(2, node2)
                 self.__sparse_distance_matrix_traverse(
-                    other, results, node1.less, node2.less, tracker)
+                    other, results, node_less(node1), node_less(node2), tracker)
                 tracker.pop()
                     
                 tracker.push_greater_of(2, node2)
                 self.__sparse_distance_matrix_traverse(
-                    other, results, node1.less, node2.greater, tracker)
+                    other, results, node_less(node1), node_greater(node2), tracker)
                 tracker.pop()
                 tracker.pop()
                     
                 tracker.push_greater_of(1, node1)
                 if node1 != node2:
-                    # Avoid traversing (node1.less, node2.greater) and
-                    # (node1.greater, node2.less) (it's the same node pair
+                    # Avoid traversing (node_less(node1), node_greater(node2)) and
+                    # (node_greater(node1), node_less(node2)) (it's the same node pair
                     # twice over, which is the source of the complication in
                     # the original KDTree.sparse_distance_matrix)
                     tracker.push_less_of(2, node2)
                     self.__sparse_distance_matrix_traverse(
-                        other, results, node1.greater, node2.less, tracker)
+                        other, results, node_greater(node1), node_less(node2), tracker)
                     tracker.pop()
                     
                 tracker.push_greater_of(2, node2)
                 self.__sparse_distance_matrix_traverse(
-                    other, results, node1.greater, node2.greater, tracker)
+                    other, results, node_greater(node1), node_greater(node2), tracker)
                 tracker.pop()
                 tracker.pop()
                 
@@ -2064,16 +3261,136 @@ cdef class cKDTree:
         # Make sure trees are compatible
         if self.m != other.m:
             raise ValueError("Trees passed to sparse_distance_matrix have different dimensionality")
+        self._check_same_box(other, "sparse_distance_matrix")
 
         # Calculate mins and maxes to outer box
         tracker = RectRectDistanceTracker(
-            Rectangle(self.mins, self.maxes),
-            Rectangle(other.mins, other.maxes),
+            Rectangle(self.mins, self.maxes, self.boxsize),
+            Rectangle(other.mins, other.maxes, other.boxsize),
             p, 0, max_distance)
         
         results = coo_entries()
         self.__sparse_distance_matrix_traverse(other, results,
-                                               self.tree, other.tree,
+                                               self.ctree, other.ctree,
                                                tracker)
         
         return results.to_matrix(shape=(self.n, other.n)).todok()
+
+
+    # ----------------------
+    # minimum_spanning_tree
+    # ----------------------
+    def minimum_spanning_tree(cKDTree self, np.float64_t p=2.):
+        """minimum_spanning_tree(self, p=2.)
+
+        Compute the minimum spanning tree of the data points.
+
+        The tree is found by Boruvka's algorithm, in which every
+        component of the growing forest searches the kd-tree for its
+        shortest edge to another component.  It takes O(n) memory, so
+        that it remains usable on data sets whose distance matrix does
+        not fit in memory.
+
+        Parameters
+        ----------
+        p : float, 1<=p<=infinity
+            Which Minkowski p-norm to use.
+
+        Returns
+        -------
+        i, j : ndarray of ints, shape (n-1,)
+            The points joined by the edges of the tree.
+        d : ndarray of floats, shape (n-1,)
+            The lengths of the edges.  The edges are not sorted.
+
+        Notes
+        -----
+        Edges of equal length are ordered by the indices of their end
+        points, so the tree is well defined even if it is not unique.
+        The edges of the tree, taken in order of increasing length, are
+        the merges of single linkage clustering.
+
+        """
+        cdef mst_info info
+        cdef np.intp_t n_edges
+        cdef np.ndarray[np.float64_t, ndim=1, mode="c"] node_mins, node_maxes
+        cdef np.ndarray[np.float64_t, ndim=1, mode="c"] best_dist, edge_d
+        cdef np.ndarray[np.intp_t, ndim=1, mode="c"] node_comp, parent, comp
+        cdef np.ndarray[np.intp_t, ndim=1, mode="c"] best_i, best_j
+        cdef np.ndarray[np.intp_t, ndim=1, mode="c"] edge_i, edge_j
+
+        if p < 1:
+            raise ValueError("Only p-norms with 1<=p<=infinity permitted")
+        if self.n < 2:
+            return (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp),
+                    np.zeros(0, dtype=np.float64))
+
+        node_mins = np.empty(self.n_nodes*self.m, dtype=np.float64)
+        node_maxes = np.empty(self.n_nodes*self.m, dtype=np.float64)
+        node_comp = np.empty(self.n_nodes, dtype=np.intp)
+        parent = np.empty(self.n, dtype=np.intp)
+        comp = np.empty(self.n, dtype=np.intp)
+        best_dist = np.empty(self.n, dtype=np.float64)
+        best_i = np.empty(self.n, dtype=np.intp)
+        best_j = np.empty(self.n, dtype=np.intp)
+        edge_i = np.empty(self.n - 1, dtype=np.intp)
+        edge_j = np.empty(self.n - 1, dtype=np.intp)
+        edge_d = np.empty(self.n - 1, dtype=np.float64)
+
+        info.data = self.raw_data
+        info.indices = self.raw_indices
+        info.m = self.m
+        info.p = p
+        info.boxsize = self.raw_boxsize
+        info.node_mins = &node_mins[0]
+        info.node_maxes = &node_maxes[0]
+        info.node_comp = &node_comp[0]
+        info.parent = &parent[0]
+        info.comp = &comp[0]
+        info.best_dist = &best_dist[0]
+        info.best_i = &best_i[0]
+        info.best_j = &best_j[0]
+
+        with nogil:
+            n_edges = mst_boruvka(&info, self.ctree, self.n_nodes, self.n,
+                                  &edge_i[0], &edge_j[0], &edge_d[0])
+        if n_edges < self.n - 1:
+            raise ValueError("The distances between some points are not "
+                             "finite")
+
+        # Internally, we represent all distances as distance ** p
+        if p == 2:
+            edge_d = np.sqrt(edge_d)
+        elif p != 1 and p != infinity:
+            edge_d = edge_d ** (1. / p)
+        return edge_i, edge_j, edge_d
+
+def _valid_tree_nodes(nodes, n, m):
+    # Whether the node array of a saved tree can be walked safely: every
+    # node covers a range of the n points, and the children of every inner
+    # node are later nodes of the array that split its range in two.
+    n_nodes = nodes.shape[0]
+    split_dim = nodes['split_dim']
+    start = nodes['start_idx']
+    end = nodes['end_idx']
+    if (start[0] != 0 or end[0] != n
+            or np.any((split_dim < -1) | (split_dim >= m))
+            or np.any((start < 0) | (start > end) | (end > n))
+            or np.any(nodes['children'] != end - start)):
+        return False
+    inner = np.nonzero(split_dim >= 0)[0]
+    less = inner + nodes['less'][inner]
+    greater = inner + nodes['greater'][inner]
+    if (np.any((less <= inner) | (less >= n_nodes))
+            or np.any((greater <= inner) | (greater >= n_nodes))):
+        return False
+    return not (np.any(start[less] != start[inner])
+                or np.any(end[less] != start[greater])
+                or np.any(end[greater] != end[inner]))
+
+
+def _ckdtree_from_state(state):
+    # Unpickling and cKDTree.load: set up a tree without building it
+    cdef cKDTree tree = cKDTree.__new__(cKDTree)
+    tree._set_state(state)
+    return tree
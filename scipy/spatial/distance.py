@@ -16,7 +16,10 @@ stored in a rectangular array.
 
    pdist   -- pairwise distances between observation vectors.
    cdist   -- distances between between two collections of observation vectors
+   cdist_blocks -- row blocks of the cdist matrix, under a memory budget
+   cdist_reduce -- row-wise minima, nearest neighbors or counts of cdist
    squareform -- convert distance matrix to a condensed one and vice versa
+   CondensedDistanceMatrix -- square matrix indexing of a condensed one
 
 Predicates for checking the validity of distance matrices, both
 condensed and redundant. Also contained in this module are functions
@@ -69,12 +72,15 @@ from __future__ import division, print_function, absolute_import
 import warnings
 import numpy as np
 from numpy.linalg import norm
+import scipy.sparse
 
-from scipy.lib.six import callable, string_types
+from scipy.lib.six import callable, string_types, integer_types
 from scipy.lib.six.moves import xrange
+from scipy.lib._threads import run_threads, cpu_count
 
 from . import _distance_wrap
 import collections
+import threading
 
 
 def _copy_array_if_base_present(a):
@@ -116,6 +122,15 @@ def _convert_to_double(X):
     return X
 
 
+def _convert_to_real(X):
+    # float32 observations are passed to the C code without conversion
+    if X.dtype == np.float32:
+        if not X.flags.contiguous:
+            X = X.copy()
+        return X
+    return _convert_to_double(X)
+
+
 def _validate_vector(u, dtype=None):
     # XXX Is order='c' really necessary?
     u = np.asarray(u, dtype=dtype, order='c').squeeze()
@@ -929,7 +944,188 @@ def sokalsneath(u, v):
     return float(2.0 * (ntf + nft)) / denom
 
 
-def pdist(X, metric='euclidean', p=2, w=None, V=None, VI=None):
+def _convert_pair_to_real(XA, XB):
+    XA = _convert_to_real(XA)
+    XB = _convert_to_real(XB)
+    if XA.dtype != XB.dtype:
+        XA = _convert_to_double(XA)
+        XB = _convert_to_double(XB)
+    return XA, XB
+
+
+def _row_norms(X):
+    # the norms are computed in double precision also for float32 vectors,
+    # like the dot products of the C code
+    X = np.asarray(X, dtype=np.double)
+    return np.sqrt(np.sum(X * X, axis=1))
+
+
+def _get_n_jobs(n_jobs):
+    if n_jobs == -1:
+        return cpu_count()
+    if n_jobs < 1:
+        raise ValueError('n_jobs must be a positive integer or -1.')
+    return n_jobs
+
+
+def _map_blocks(func, blocks, n_jobs):
+    """Call func(start, stop) for all blocks in n_jobs threads, each of
+    which takes the next block when it is done with one."""
+    if n_jobs == 1 or len(blocks) < 2:
+        for start, stop in blocks:
+            func(start, stop)
+        return
+    lock = threading.Lock()
+    remaining = list(reversed(blocks))
+
+    def worker():
+        while True:
+            with lock:
+                if not remaining:
+                    return
+                start, stop = remaining.pop()
+            func(start, stop)
+
+    run_threads(worker, [()] * min(n_jobs, len(blocks)))
+
+
+def _pdist_call(wrap, m, n_jobs, *args):
+    """
+    Call a pdist wrapper of the C code as wrap(*args, start, stop) in
+    n_jobs threads, for blocks of rows of the condensed distance matrix
+    with about the same number of distances.
+    """
+    if n_jobs == 1 or m < 3:
+        wrap(*args)
+        return
+    # number of distances in the rows before row i of the condensed matrix
+    i = np.arange(m)
+    before = i * (m - 1) - i * (i - 1) // 2
+    targets = np.linspace(0, before[-1], 4 * n_jobs + 1)[1:-1]
+    bounds = np.unique(np.r_[0, np.searchsorted(before, targets), m])
+    blocks = [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+    _map_blocks(lambda start, stop: wrap(*(args + (start, stop))),
+                blocks, n_jobs)
+
+
+def _cdist_call(wrap, mA, n_jobs, rows):
+    """
+    Call a cdist wrapper of the C code in n_jobs threads, each computing
+    blocks of rows of the distance matrix; rows(start, stop) returns the
+    arguments of wrap for the rows start:stop.
+    """
+    if n_jobs == 1 or mA < 2:
+        wrap(*rows(0, mA))
+        return
+    size = max(1, -(-mA // (4 * n_jobs)))
+    blocks = [(start, min(start + size, mA)) for start in xrange(0, mA, size)]
+    _map_blocks(lambda start, stop: wrap(*rows(start, stop)), blocks, n_jobs)
+
+
+# the cdist wrappers of the boolean dissimilarities
+_cdist_bool_wraps = {'yule': 'cdist_yule_bool_wrap',
+                     'matching': 'cdist_matching_bool_wrap',
+                     'kulsinski': 'cdist_kulsinski_bool_wrap',
+                     'dice': 'cdist_dice_bool_wrap',
+                     'rogerstanimoto': 'cdist_rogerstanimoto_bool_wrap',
+                     'russellrao': 'cdist_russellrao_bool_wrap',
+                     'sokalmichener': 'cdist_sokalmichener_bool_wrap',
+                     'sokalsneath': 'cdist_sokalsneath_bool_wrap'}
+
+
+# the metrics computed for sparse observations, and their kernels in the C
+# code for matrices in CSR format
+_csr_kernels = [(set(['euclidean', 'euclid', 'eu', 'e']), 'euclidean'),
+                (set(['sqeuclidean', 'sqe', 'sqeuclid']), 'euclidean'),
+                (set(['cityblock', 'cblock', 'cb', 'c']), 'city_block'),
+                (set(['cosine', 'cos']), 'cosine'),
+                (set(['hamming', 'hamm', 'ha', 'h']), 'hamming'),
+                (set(['jaccard', 'jacc', 'ja', 'j']), 'jaccard')]
+
+
+def _csr_kernel(metric):
+    if isinstance(metric, string_types):
+        mstr = metric.lower()
+        for names, kernel in _csr_kernels:
+            if mstr in names:
+                return kernel
+    raise ValueError('The metric %r is not supported for sparse observations; '
+                     'it must be one of euclidean, sqeuclidean, cityblock, '
+                     'cosine, hamming or jaccard.' % (metric,))
+
+
+def _convert_to_csr(X):
+    """
+    Return a copy of the sparse or dense matrix X in CSR format with
+    double data, in which the column indices of each row are sorted and
+    unique, as the CSR kernels of the C code require.
+    """
+    X = scipy.sparse.csr_matrix(X, dtype=np.double, copy=True)
+    X.sum_duplicates()
+    # the kernels take C int indices, which sparse matrices with more
+    # than 2**31 - 1 columns or nonzeros do not fit in
+    max_value = np.iinfo(np.intc).max
+    if X.nnz > max_value or X.shape[1] > max_value:
+        raise ValueError('The sparse matrix is too large for the sparse '
+                         'distance kernels.')
+    X.indices = np.asarray(X.indices, dtype=np.intc)
+    X.indptr = np.asarray(X.indptr, dtype=np.intc)
+    return X
+
+
+def _csr_row_norms(X):
+    return np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+
+
+def _pdist_csr(X, metric, n_jobs):
+    """pdist of the rows of a sparse matrix X."""
+    kernel = _csr_kernel(metric)
+    X = _convert_to_csr(X)
+    m, n = X.shape
+    dm = np.zeros((m * (m - 1)) // 2, dtype=np.double)
+    n_jobs = _get_n_jobs(n_jobs)
+    args = (X.data, X.indices, X.indptr, dm, n)
+    if kernel == 'cosine':
+        args += (_csr_row_norms(X),)
+    _pdist_call(getattr(_distance_wrap, 'pdist_%s_csr_wrap' % kernel),
+                m, n_jobs, *args)
+    if metric.lower() in set(['sqeuclidean', 'sqe', 'sqeuclid']):
+        dm **= 2.0
+    return dm
+
+
+def _cdist_csr(XA, XB, metric, n_jobs):
+    """cdist of the rows of XA and XB, at least one of which is sparse."""
+    kernel = _csr_kernel(metric)
+    XA = _convert_to_csr(XA)
+    XB = _convert_to_csr(XB)
+    mA, n = XA.shape
+    mB = XB.shape[0]
+    if XB.shape[1] != n:
+        raise ValueError('XA and XB must have the same number of columns '
+                         '(i.e. feature dimension.)')
+    dm = np.zeros((mA, mB), dtype=np.double)
+    n_jobs = _get_n_jobs(n_jobs)
+    if kernel == 'cosine':
+        normsA = _csr_row_norms(XA)
+        normsB = _csr_row_norms(XB)
+
+        def rows(a, b):
+            return (XA.data, XA.indices, XA.indptr[a:b + 1],
+                    XB.data, XB.indices, XB.indptr, dm[a:b], n,
+                    normsA[a:b], normsB)
+    else:
+        def rows(a, b):
+            return (XA.data, XA.indices, XA.indptr[a:b + 1],
+                    XB.data, XB.indices, XB.indptr, dm[a:b], n)
+    _cdist_call(getattr(_distance_wrap, 'cdist_%s_csr_wrap' % kernel),
+                mA, n_jobs, rows)
+    if metric.lower() in set(['sqeuclidean', 'sqe', 'sqeuclid']):
+        dm **= 2.0
+    return dm
+
+
+def pdist(X, metric='euclidean', p=2, w=None, V=None, VI=None, n_jobs=1):
     """
     Pairwise distances between observations in n-dimensional space.
 
@@ -1118,9 +1314,13 @@ def pdist(X, metric='euclidean', p=2, w=None, V=None, VI=None):
 
     Parameters
     ----------
-    X : ndarray
+    X : ndarray or sparse matrix
         An m by n array of m original observations in an
-        n-dimensional space.
+        n-dimensional space.  The built-in metrics compute the distances
+        of float32 observations without converting them to float64.
+        Sparse matrices are supported for the 'euclidean', 'sqeuclidean',
+        'cityblock', 'cosine', 'hamming' and 'jaccard' metrics, whose cost
+        then depends on the number of nonzeros instead of n.
     metric : string or function
         The distance metric to use. The distance function can
         be 'braycurtis', 'canberra', 'chebyshev', 'cityblock',
@@ -1136,6 +1336,10 @@ def pdist(X, metric='euclidean', p=2, w=None, V=None, VI=None):
             The variance vector (for standardized Euclidean).
     VI : ndarray
         The inverse of the covariance matrix (for Mahalanobis).
+    n_jobs : int, optional
+        Number of threads computing the distances of the built-in metrics,
+        each for a block of rows.  If -1 is given, all CPU cores are used.
+        Default: 1.
 
     Returns
     -------
@@ -1163,10 +1367,18 @@ def pdist(X, metric='euclidean', p=2, w=None, V=None, VI=None):
 #           using the distance metric Y but with a more succinct,
 #           verifiable, but less efficient implementation.
 
+    if scipy.sparse.issparse(X):
+        return _pdist_csr(X, metric, n_jobs)
+
     X = np.asarray(X, order='c')
 
-    # The C code doesn't do striding.
-    [X] = _copy_arrays_if_base_present([_convert_to_double(X)])
+    # The C code doesn't do striding.  The built-in metrics between real
+    # vectors are computed from float32 observations without conversion.
+    if isinstance(metric, string_types):
+        X = _convert_to_real(X)
+    else:
+        X = _convert_to_double(X)
+    [X] = _copy_arrays_if_base_present([X])
 
     s = X.shape
     if len(s) != 2:
@@ -1174,6 +1386,10 @@ def pdist(X, metric='euclidean', p=2, w=None, V=None, VI=None):
 
     m, n = s
     dm = np.zeros((m * (m - 1)) // 2, dtype=np.double)
+    n_jobs = _get_n_jobs(n_jobs)
+
+    def call(wrap, *args):
+        _pdist_call(wrap, m, n_jobs, *args)
 
     wmink_names = ['wminkowski', 'wmi', 'wm', 'wpnorm']
     if w is None and (metric == wminkowski or metric in wmink_names):
@@ -1209,29 +1425,31 @@ def pdist(X, metric='euclidean', p=2, w=None, V=None, VI=None):
         #       (mstr != 'hamming' and mstr != 'jaccard'):
         #    TypeError('A double array must be passed.')
         if mstr in set(['euclidean', 'euclid', 'eu', 'e']):
-            _distance_wrap.pdist_euclidean_wrap(_convert_to_double(X), dm)
+            call(_distance_wrap.pdist_euclidean_wrap, X, dm)
         elif mstr in set(['sqeuclidean', 'sqe', 'sqeuclid']):
-            _distance_wrap.pdist_euclidean_wrap(_convert_to_double(X), dm)
+            call(_distance_wrap.pdist_euclidean_wrap, X, dm)
             dm = dm ** 2.0
         elif mstr in set(['cityblock', 'cblock', 'cb', 'c']):
-            _distance_wrap.pdist_city_block_wrap(X, dm)
+            call(_distance_wrap.pdist_city_block_wrap, X, dm)
         elif mstr in set(['hamming', 'hamm', 'ha', 'h']):
             if X.dtype == np.bool:
-                _distance_wrap.pdist_hamming_bool_wrap(_convert_to_bool(X), dm)
+                call(_distance_wrap.pdist_hamming_bool_wrap,
+                     _convert_to_bool(X), dm)
             else:
-                _distance_wrap.pdist_hamming_wrap(_convert_to_double(X), dm)
+                call(_distance_wrap.pdist_hamming_wrap, X, dm)
         elif mstr in set(['jaccard', 'jacc', 'ja', 'j']):
             if X.dtype == np.bool:
-                _distance_wrap.pdist_jaccard_bool_wrap(_convert_to_bool(X), dm)
+                call(_distance_wrap.pdist_jaccard_bool_wrap,
+                     _convert_to_bool(X), dm)
             else:
-                _distance_wrap.pdist_jaccard_wrap(_convert_to_double(X), dm)
+                call(_distance_wrap.pdist_jaccard_wrap, X, dm)
         elif mstr in set(['chebychev', 'chebyshev', 'cheby', 'cheb', 'ch']):
-            _distance_wrap.pdist_chebyshev_wrap(_convert_to_double(X), dm)
+            call(_distance_wrap.pdist_chebyshev_wrap, X, dm)
         elif mstr in set(['minkowski', 'mi', 'm']):
-            _distance_wrap.pdist_minkowski_wrap(_convert_to_double(X), dm, p)
+            call(_distance_wrap.pdist_minkowski_wrap, X, dm, p)
         elif mstr in wmink_names:
-            _distance_wrap.pdist_weighted_minkowski_wrap(_convert_to_double(X),
-                                                         dm, p, np.asarray(w))
+            call(_distance_wrap.pdist_weighted_minkowski_wrap, X, dm, p,
+                 _convert_to_double(np.asarray(w)))
         elif mstr in set(['seuclidean', 'se', 's']):
             if V is not None:
                 V = np.asarray(V, order='c')
@@ -1249,15 +1467,15 @@ def pdist(X, metric='euclidean', p=2, w=None, V=None, VI=None):
                 # The C code doesn't do striding.
                 [VV] = _copy_arrays_if_base_present([_convert_to_double(V)])
             else:
-                VV = np.var(X, axis=0, ddof=1)
-            _distance_wrap.pdist_seuclidean_wrap(_convert_to_double(X), VV, dm)
+                VV = np.var(X, axis=0, ddof=1, dtype=np.double)
+            call(_distance_wrap.pdist_seuclidean_wrap, X, VV, dm)
         # Need to test whether vectorized cosine works better.
         # Find out: Is there a dot subtraction operator so I can
         # subtract matrices in a similar way to multiplying them?
         # Need to get rid of as much unnecessary C code as possible.
         elif mstr in set(['cosine', 'cos']):
-            norms = np.sqrt(np.sum(X * X, axis=1))
-            _distance_wrap.pdist_cosine_wrap(_convert_to_double(X), dm, norms)
+            norms = _row_norms(X)
+            call(_distance_wrap.pdist_cosine_wrap, X, dm, norms)
         elif mstr in set(['old_cosine', 'old_cos']):
             norms = np.sqrt(np.sum(X * X, axis=1))
             nV = norms.reshape(m, 1)
@@ -1269,12 +1487,10 @@ def pdist(X, metric='euclidean', p=2, w=None, V=None, VI=None):
             dm[xrange(0, m), xrange(0, m)] = 0.0
             dm = squareform(dm)
         elif mstr in set(['correlation', 'co']):
-            X2 = X - X.mean(1)[:, np.newaxis]
+            X2 = X - X.mean(1, dtype=np.double)[:, np.newaxis]
             #X2 = X - np.matlib.repmat(np.mean(X, axis=1).reshape(m, 1), 1, n)
-            norms = np.sqrt(np.sum(X2 * X2, axis=1))
-            _distance_wrap.pdist_cosine_wrap(_convert_to_double(X2),
-                                             _convert_to_double(dm),
-                                             _convert_to_double(norms))
+            norms = _row_norms(X2)
+            call(_distance_wrap.pdist_cosine_wrap, X2, dm, norms)
         elif mstr in set(['mahalanobis', 'mahal', 'mah']):
             if VI is not None:
                 VI = _convert_to_double(np.asarray(VI, order='c'))
@@ -1287,30 +1503,33 @@ def pdist(X, metric='euclidean', p=2, w=None, V=None, VI=None):
                 V = np.cov(X.T)
                 VI = _convert_to_double(np.linalg.inv(V).T.copy())
             # (u-v)V^(-1)(u-v)^T
-            _distance_wrap.pdist_mahalanobis_wrap(_convert_to_double(X),
-                                                  VI, dm)
+            call(_distance_wrap.pdist_mahalanobis_wrap, X, VI, dm)
         elif mstr == 'canberra':
-            _distance_wrap.pdist_canberra_wrap(_convert_to_double(X), dm)
+            call(_distance_wrap.pdist_canberra_wrap, X, dm)
         elif mstr == 'braycurtis':
-            _distance_wrap.pdist_bray_curtis_wrap(_convert_to_double(X), dm)
+            call(_distance_wrap.pdist_bray_curtis_wrap, X, dm)
         elif mstr == 'yule':
-            _distance_wrap.pdist_yule_bool_wrap(_convert_to_bool(X), dm)
+            call(_distance_wrap.pdist_yule_bool_wrap, _convert_to_bool(X), dm)
         elif mstr == 'matching':
-            _distance_wrap.pdist_matching_bool_wrap(_convert_to_bool(X), dm)
+            call(_distance_wrap.pdist_matching_bool_wrap, _convert_to_bool(X),
+                 dm)
         elif mstr == 'kulsinski':
-            _distance_wrap.pdist_kulsinski_bool_wrap(_convert_to_bool(X), dm)
+            call(_distance_wrap.pdist_kulsinski_bool_wrap,
+                 _convert_to_bool(X), dm)
         elif mstr == 'dice':
-            _distance_wrap.pdist_dice_bool_wrap(_convert_to_bool(X), dm)
+            call(_distance_wrap.pdist_dice_bool_wrap, _convert_to_bool(X), dm)
         elif mstr == 'rogerstanimoto':
-            _distance_wrap.pdist_rogerstanimoto_bool_wrap(_convert_to_bool(X),
-                                                          dm)
+            call(_distance_wrap.pdist_rogerstanimoto_bool_wrap,
+                 _convert_to_bool(X), dm)
         elif mstr == 'russellrao':
-            _distance_wrap.pdist_russellrao_bool_wrap(_convert_to_bool(X), dm)
+            call(_distance_wrap.pdist_russellrao_bool_wrap,
+                 _convert_to_bool(X), dm)
         elif mstr == 'sokalmichener':
-            _distance_wrap.pdist_sokalmichener_bool_wrap(_convert_to_bool(X),
-                                                         dm)
+            call(_distance_wrap.pdist_sokalmichener_bool_wrap,
+                 _convert_to_bool(X), dm)
         elif mstr == 'sokalsneath':
-            _distance_wrap.pdist_sokalsneath_bool_wrap(_convert_to_bool(X), dm)
+            call(_distance_wrap.pdist_sokalsneath_bool_wrap,
+                 _convert_to_bool(X), dm)
         elif metric == 'test_euclidean':
             dm = pdist(X, euclidean)
         elif metric == 'test_sqeuclidean':
@@ -1709,7 +1928,151 @@ def num_obs_y(Y):
     return d
 
 
-def cdist(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None):
+def _condensed_offsets(n, a, b):
+    # the offsets of the distances between a < b in the condensed matrix of
+    # n observations; they grow as n**2 / 2 and overflow narrow index types
+    # long before the indices themselves do
+    a = np.asarray(a, dtype=np.intp)
+    b = np.asarray(b, dtype=np.intp)
+    return n * a - a * (a + 1) // 2 + b - a - 1
+
+
+class CondensedDistanceMatrix(object):
+    """
+    CondensedDistanceMatrix(y)
+
+    Square matrix view of a condensed distance matrix.
+
+    Indexes the condensed distance matrix `y` returned by `pdist` like the
+    square distance matrix ``squareform(y)``, without allocating the
+    :math:`n` by :math:`n` matrix.  A single distance ``D[i, j]`` is found
+    in constant time, and rows and blocks are gathered from `y` with
+    vectorized index computations.
+
+    Parameters
+    ----------
+    y : ndarray
+        A condensed distance matrix of :math:`n` observations, with
+        :math:`{n \\choose 2}` entries.  It is not copied.
+
+    Attributes
+    ----------
+    y : ndarray
+        The condensed distance matrix.
+    n : int
+        The number of observations.
+    shape : tuple
+        The shape ``(n, n)`` of the square distance matrix.
+
+    Notes
+    -----
+    Indexing follows the rules of NumPy arrays: ``D[i, j]`` with integers
+    is a distance, ``D[i]`` a row, ``D[a:b, c:d]`` a block, and index arrays
+    are broadcast against each other, so that ``D[np.ix_(rows, cols)]``
+    selects the submatrix of the given rows and columns.  The diagonal is
+    zero.
+
+    `scipy.cluster.hierarchy.linkage` accepts a `CondensedDistanceMatrix`
+    in place of the condensed distance matrix.
+
+    Examples
+    --------
+    >>> from scipy.spatial.distance import pdist, CondensedDistanceMatrix
+    >>> X = np.array([[0., 0.], [3., 4.], [6., 8.]])
+    >>> D = CondensedDistanceMatrix(pdist(X))
+    >>> D[2, 0]
+    10.0
+    >>> D[1]
+    array([ 5.,  0.,  5.])
+    >>> D.argmin()
+    array([1, 0, 1])
+
+    """
+
+    def __init__(self, y):
+        self.y = np.asarray(y)
+        self.n = num_obs_y(self.y)
+        self.shape = (self.n, self.n)
+
+    def __len__(self):
+        return self.n
+
+    def _index(self, i):
+        if isinstance(i, slice):
+            return np.arange(self.n)[i], True
+        i = np.asarray(i)
+        if i.dtype.kind not in 'iu':
+            raise IndexError('indices must be integers or slices.')
+        if np.any(i >= self.n) or np.any(i < -self.n):
+            raise IndexError('index out of bounds.')
+        return i % self.n, False
+
+    def _lookup(self, i, j):
+        # the distances between the broadcast index arrays i and j
+        i, j = np.broadcast_arrays(i, j)
+        a = np.minimum(i, j)
+        b = np.maximum(i, j)
+        diagonal = a == b
+        k = np.where(diagonal, 0, _condensed_offsets(self.n, a, b))
+        d = np.where(diagonal, self.y.dtype.type(0), self.y[k])
+        if d.ndim == 0:
+            return d[()]
+        return d
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        if len(key) != 2:
+            raise IndexError('too many indices.')
+        i, j = key
+        if (isinstance(i, integer_types + (np.integer,)) and
+                isinstance(j, integer_types + (np.integer,))):
+            if not (-self.n <= i < self.n and -self.n <= j < self.n):
+                raise IndexError('index out of bounds.')
+            i, j = sorted((int(i) % self.n, int(j) % self.n))
+            if i == j:
+                return self.y.dtype.type(0)
+            return self.y[self.n * i - i * (i + 1) // 2 + j - i - 1]
+        i, i_slice = self._index(i)
+        j, j_slice = self._index(j)
+        # the axes of a slice follow those of the other index, as in NumPy
+        if i_slice:
+            i = i.reshape(i.shape + (1,) * j.ndim)
+        elif j_slice:
+            i = i.reshape(i.shape + (1,))
+        return self._lookup(i, j)
+
+    def toarray(self):
+        """Return the square distance matrix, ``squareform(self.y)``."""
+        return squareform(self.y)
+
+    def argmin(self):
+        """
+        Return the nearest other observation of each observation.
+
+        Returns
+        -------
+        idx : ndarray
+            ``idx[i]`` is the index ``j != i`` of the smallest distance in
+            row ``i``; the smallest such index if there are ties.
+
+        """
+        if self.n < 2:
+            raise ValueError('argmin needs at least 2 observations.')
+        idx = np.empty(self.n, dtype=np.intp)
+        # blocks of rows of about a million distances
+        size = max(1, 2**20 // self.n)
+        for start in xrange(0, self.n, size):
+            stop = min(start + size, self.n)
+            rows = np.arange(start, stop)
+            block = self[start:stop].astype(np.double)
+            block[rows - start, rows] = np.inf
+            idx[start:stop] = block.argmin(axis=1)
+        return idx
+
+
+def cdist(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None,
+          n_jobs=1):
     """
     Computes distance between each pair of the two collections of inputs.
 
@@ -1899,12 +2262,18 @@ def cdist(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None):
 
     Parameters
     ----------
-    XA : ndarray
+    XA : ndarray or sparse matrix
         An :math:`m_A` by :math:`n` array of :math:`m_A`
         original observations in an :math:`n`-dimensional space.
-    XB : ndarray
+    XB : ndarray or sparse matrix
         An :math:`m_B` by :math:`n` array of :math:`m_B`
         original observations in an :math:`n`-dimensional space.
+        The built-in metrics compute the distances of float32 observations
+        without converting them to float64, if both `XA` and `XB` are
+        float32.  Sparse matrices are supported for the 'euclidean',
+        'sqeuclidean', 'cityblock', 'cosine', 'hamming' and 'jaccard'
+        metrics, whose cost then depends on the number of nonzeros instead
+        of :math:`n`.
     metric : string or function
         The distance metric to use. The distance function can
         be 'braycurtis', 'canberra', 'chebyshev', 'cityblock',
@@ -1921,6 +2290,10 @@ def cdist(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None):
         The variance vector (for standardized Euclidean).
     VI : ndarray
         The inverse of the covariance matrix (for Mahalanobis).
+    n_jobs : int, optional
+        Number of threads computing the distances of the built-in metrics,
+        each for a block of rows.  If -1 is given, all CPU cores are used.
+        Default: 1.
 
     Returns
     -------
@@ -1943,6 +2316,9 @@ def cdist(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None):
 #           using the distance metric Y but with a more succint,
 #           verifiable, but less efficient implementation.
 
+    if scipy.sparse.issparse(XA) or scipy.sparse.issparse(XB):
+        return _cdist_csr(XA, XB, metric, n_jobs)
+
     XA = np.asarray(XA, order='c')
     XB = np.asarray(XB, order='c')
 
@@ -1950,9 +2326,14 @@ def cdist(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None):
     #    raise TypeError('Floating point arrays must be 64-bit (got %r).' %
     #    (X.dtype.type,))
 
-    # The C code doesn't do striding.
-    [XA] = _copy_arrays_if_base_present([_convert_to_double(XA)])
-    [XB] = _copy_arrays_if_base_present([_convert_to_double(XB)])
+    # The C code doesn't do striding.  The built-in metrics between real
+    # vectors are computed from float32 observations without conversion.
+    if isinstance(metric, string_types):
+        XA, XB = _convert_pair_to_real(XA, XB)
+    else:
+        XA = _convert_to_double(XA)
+        XB = _convert_to_double(XB)
+    [XA, XB] = _copy_arrays_if_base_present([XA, XB])
 
     s = XA.shape
     sB = XB.shape
@@ -1969,6 +2350,11 @@ def cdist(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None):
     mB = sB[0]
     n = s[1]
     dm = np.zeros((mA, mB), dtype=np.double)
+    n_jobs = _get_n_jobs(n_jobs)
+
+    def call(wrap, rows):
+        # rows(start, stop) are the arguments of wrap for XA[start:stop]
+        _cdist_call(wrap, mA, n_jobs, rows)
 
     if callable(metric):
         if metric == minkowski:
@@ -1998,42 +2384,41 @@ def cdist(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None):
         #       (mstr != 'hamming' and mstr != 'jaccard'):
         #    TypeError('A double array must be passed.')
         if mstr in set(['euclidean', 'euclid', 'eu', 'e']):
-            _distance_wrap.cdist_euclidean_wrap(_convert_to_double(XA),
-                                                _convert_to_double(XB), dm)
+            call(_distance_wrap.cdist_euclidean_wrap,
+                 lambda a, b: (XA[a:b], XB, dm[a:b]))
         elif mstr in set(['sqeuclidean', 'sqe', 'sqeuclid']):
-            _distance_wrap.cdist_euclidean_wrap(_convert_to_double(XA),
-                                                _convert_to_double(XB), dm)
+            call(_distance_wrap.cdist_euclidean_wrap,
+                 lambda a, b: (XA[a:b], XB, dm[a:b]))
             dm **= 2.0
         elif mstr in set(['cityblock', 'cblock', 'cb', 'c']):
-            _distance_wrap.cdist_city_block_wrap(_convert_to_double(XA),
-                                                 _convert_to_double(XB), dm)
+            call(_distance_wrap.cdist_city_block_wrap,
+                 lambda a, b: (XA[a:b], XB, dm[a:b]))
         elif mstr in set(['hamming', 'hamm', 'ha', 'h']):
             if XA.dtype == np.bool:
-                _distance_wrap.cdist_hamming_bool_wrap(_convert_to_bool(XA),
-                                                       _convert_to_bool(XB),
-                                                       dm)
+                XA, XB = _convert_to_bool(XA), _convert_to_bool(XB)
+                call(_distance_wrap.cdist_hamming_bool_wrap,
+                     lambda a, b: (XA[a:b], XB, dm[a:b]))
             else:
-                _distance_wrap.cdist_hamming_wrap(_convert_to_double(XA),
-                                                  _convert_to_double(XB), dm)
+                call(_distance_wrap.cdist_hamming_wrap,
+                     lambda a, b: (XA[a:b], XB, dm[a:b]))
         elif mstr in set(['jaccard', 'jacc', 'ja', 'j']):
             if XA.dtype == np.bool:
-                _distance_wrap.cdist_jaccard_bool_wrap(_convert_to_bool(XA),
-                                                       _convert_to_bool(XB),
-                                                       dm)
+                XA, XB = _convert_to_bool(XA), _convert_to_bool(XB)
+                call(_distance_wrap.cdist_jaccard_bool_wrap,
+                     lambda a, b: (XA[a:b], XB, dm[a:b]))
             else:
-                _distance_wrap.cdist_jaccard_wrap(_convert_to_double(XA),
-                                                  _convert_to_double(XB), dm)
+                call(_distance_wrap.cdist_jaccard_wrap,
+                     lambda a, b: (XA[a:b], XB, dm[a:b]))
         elif mstr in set(['chebychev', 'chebyshev', 'cheby', 'cheb', 'ch']):
-            _distance_wrap.cdist_chebyshev_wrap(_convert_to_double(XA),
-                                                _convert_to_double(XB), dm)
+            call(_distance_wrap.cdist_chebyshev_wrap,
+                 lambda a, b: (XA[a:b], XB, dm[a:b]))
         elif mstr in set(['minkowski', 'mi', 'm', 'pnorm']):
-            _distance_wrap.cdist_minkowski_wrap(_convert_to_double(XA),
-                                                _convert_to_double(XB), dm, p)
+            call(_distance_wrap.cdist_minkowski_wrap,
+                 lambda a, b: (XA[a:b], XB, dm[a:b], p))
         elif mstr in set(['wminkowski', 'wmi', 'wm', 'wpnorm']):
-            _distance_wrap.cdist_weighted_minkowski_wrap(_convert_to_double(XA),
-                                                         _convert_to_double(XB),
-                                                         dm, p,
-                                                         _convert_to_double(w))
+            w = _convert_to_double(w)
+            call(_distance_wrap.cdist_weighted_minkowski_wrap,
+                 lambda a, b: (XA[a:b], XB, dm[a:b], p, w))
         elif mstr in set(['seuclidean', 'se', 's']):
             if V is not None:
                 V = np.asarray(V, order='c')
@@ -2052,33 +2437,28 @@ def cdist(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None):
                 [VV] = _copy_arrays_if_base_present([_convert_to_double(V)])
             else:
                 X = np.vstack([XA, XB])
-                VV = np.var(X, axis=0, ddof=1)
+                VV = np.var(X, axis=0, ddof=1, dtype=np.double)
                 X = None
                 del X
-            _distance_wrap.cdist_seuclidean_wrap(_convert_to_double(XA),
-                                                 _convert_to_double(XB), VV, dm)
+            call(_distance_wrap.cdist_seuclidean_wrap,
+                 lambda a, b: (XA[a:b], XB, VV, dm[a:b]))
         # Need to test whether vectorized cosine works better.
         # Find out: Is there a dot subtraction operator so I can
         # subtract matrices in a similar way to multiplying them?
         # Need to get rid of as much unnecessary C code as possible.
         elif mstr in set(['cosine', 'cos']):
-            normsA = np.sqrt(np.sum(XA * XA, axis=1))
-            normsB = np.sqrt(np.sum(XB * XB, axis=1))
-            _distance_wrap.cdist_cosine_wrap(_convert_to_double(XA),
-                                             _convert_to_double(XB), dm,
-                                             normsA,
-                                             normsB)
+            normsA = _row_norms(XA)
+            normsB = _row_norms(XB)
+            call(_distance_wrap.cdist_cosine_wrap,
+                 lambda a, b: (XA[a:b], XB, dm[a:b], normsA[a:b], normsB))
         elif mstr in set(['correlation', 'co']):
-            XA2 = XA - XA.mean(1)[:, np.newaxis]
-            XB2 = XB - XB.mean(1)[:, np.newaxis]
+            XA2 = XA - XA.mean(1, dtype=np.double)[:, np.newaxis]
+            XB2 = XB - XB.mean(1, dtype=np.double)[:, np.newaxis]
             #X2 = X - np.matlib.repmat(np.mean(X, axis=1).reshape(m, 1), 1, n)
-            normsA = np.sqrt(np.sum(XA2 * XA2, axis=1))
-            normsB = np.sqrt(np.sum(XB2 * XB2, axis=1))
-            _distance_wrap.cdist_cosine_wrap(_convert_to_double(XA2),
-                                             _convert_to_double(XB2),
-                                             _convert_to_double(dm),
-                                             _convert_to_double(normsA),
-                                             _convert_to_double(normsB))
+            normsA = _row_norms(XA2)
+            normsB = _row_norms(XB2)
+            call(_distance_wrap.cdist_cosine_wrap,
+                 lambda a, b: (XA2[a:b], XB2, dm[a:b], normsA[a:b], normsB))
         elif mstr in set(['mahalanobis', 'mahal', 'mah']):
             if VI is not None:
                 VI = _convert_to_double(np.asarray(VI, order='c'))
@@ -2094,42 +2474,18 @@ def cdist(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None):
                 del X
                 VI = _convert_to_double(np.linalg.inv(V).T.copy())
             # (u-v)V^(-1)(u-v)^T
-            _distance_wrap.cdist_mahalanobis_wrap(_convert_to_double(XA),
-                                                  _convert_to_double(XB),
-                                                  VI, dm)
+            call(_distance_wrap.cdist_mahalanobis_wrap,
+                 lambda a, b: (XA[a:b], XB, VI, dm[a:b]))
         elif mstr == 'canberra':
-            _distance_wrap.cdist_canberra_wrap(_convert_to_double(XA),
-                                               _convert_to_double(XB), dm)
+            call(_distance_wrap.cdist_canberra_wrap,
+                 lambda a, b: (XA[a:b], XB, dm[a:b]))
         elif mstr == 'braycurtis':
-            _distance_wrap.cdist_bray_curtis_wrap(_convert_to_double(XA),
-                                                  _convert_to_double(XB), dm)
-        elif mstr == 'yule':
-            _distance_wrap.cdist_yule_bool_wrap(_convert_to_bool(XA),
-                                                _convert_to_bool(XB), dm)
-        elif mstr == 'matching':
-            _distance_wrap.cdist_matching_bool_wrap(_convert_to_bool(XA),
-                                                    _convert_to_bool(XB), dm)
-        elif mstr == 'kulsinski':
-            _distance_wrap.cdist_kulsinski_bool_wrap(_convert_to_bool(XA),
-                                                     _convert_to_bool(XB), dm)
-        elif mstr == 'dice':
-            _distance_wrap.cdist_dice_bool_wrap(_convert_to_bool(XA),
-                                                _convert_to_bool(XB), dm)
-        elif mstr == 'rogerstanimoto':
-            _distance_wrap.cdist_rogerstanimoto_bool_wrap(_convert_to_bool(XA),
-                                                          _convert_to_bool(XB),
-                                                          dm)
-        elif mstr == 'russellrao':
-            _distance_wrap.cdist_russellrao_bool_wrap(_convert_to_bool(XA),
-                                                      _convert_to_bool(XB), dm)
-        elif mstr == 'sokalmichener':
-            _distance_wrap.cdist_sokalmichener_bool_wrap(_convert_to_bool(XA),
-                                                         _convert_to_bool(XB),
-                                                         dm)
-        elif mstr == 'sokalsneath':
-            _distance_wrap.cdist_sokalsneath_bool_wrap(_convert_to_bool(XA),
-                                                       _convert_to_bool(XB),
-                                                       dm)
+            call(_distance_wrap.cdist_bray_curtis_wrap,
+                 lambda a, b: (XA[a:b], XB, dm[a:b]))
+        elif mstr in _cdist_bool_wraps:
+            XA, XB = _convert_to_bool(XA), _convert_to_bool(XB)
+            call(getattr(_distance_wrap, _cdist_bool_wraps[mstr]),
+                 lambda a, b: (XA[a:b], XB, dm[a:b]))
         elif metric == 'test_euclidean':
             dm = cdist(XA, XB, euclidean)
         elif metric == 'test_seuclidean':
@@ -2194,3 +2550,251 @@ def cdist(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None):
         raise TypeError('2nd argument metric must be a string identifier '
                         'or a function.')
     return dm
+
+
+def _prepare_cdist_blocks(XA, XB, metric, V, VI):
+    """
+    Validate the inputs of a blocked cdist, and compute the metric
+    parameters that are by default estimated from all observations, so
+    that every block uses the same metric as a single call to cdist.
+    """
+    XA, XB = np.asarray(XA, order='c'), np.asarray(XB, order='c')
+    if isinstance(metric, string_types):
+        XA, XB = _convert_pair_to_real(XA, XB)
+    else:
+        XA = _convert_to_double(XA)
+        XB = _convert_to_double(XB)
+    if XA.ndim != 2:
+        raise ValueError('XA must be a 2-dimensional array.')
+    if XB.ndim != 2:
+        raise ValueError('XB must be a 2-dimensional array.')
+    if XA.shape[1] != XB.shape[1]:
+        raise ValueError('XA and XB must have the same number of columns '
+                         '(i.e. feature dimension.)')
+    # XB is passed to every block; copy it once instead of in each call
+    [XB] = _copy_arrays_if_base_present([XB])
+
+    if isinstance(metric, string_types):
+        mstr = metric.lower()
+        if mstr in set(['seuclidean', 'se', 's']) and V is None:
+            V = np.var(np.vstack([XA, XB]), axis=0, ddof=1, dtype=np.double)
+        elif mstr in set(['mahalanobis', 'mahal', 'mah']) and VI is None:
+            V = np.cov(np.vstack([XA, XB]).T)
+            VI = np.linalg.inv(V).T.copy()
+    return XA, XB, V, VI
+
+
+def _row_blocks(mA, mB, max_memory, n_jobs, itemsize=8):
+    """Split range(mA) into blocks of rows, such that n_jobs blocks of
+    an (mA, mB) matrix of itemsize bytes per entry take at most
+    max_memory bytes."""
+    if max_memory <= 0:
+        raise ValueError('max_memory must be positive.')
+    rows = max(1, int(max_memory // (itemsize * max(mB, 1) * n_jobs)))
+    return [(start, min(start + rows, mA)) for start in xrange(0, mA, rows)]
+
+
+def cdist_blocks(XA, XB, metric='euclidean', p=2, V=None, VI=None, w=None,
+                 max_memory=2**26, n_jobs=1):
+    """
+    Compute the distance matrix of cdist in blocks of rows.
+
+    Parameters
+    ----------
+    XA : ndarray
+        An :math:`m_A` by :math:`n` array of :math:`m_A`
+        original observations in an :math:`n`-dimensional space.
+    XB : ndarray
+        An :math:`m_B` by :math:`n` array of :math:`m_B`
+        original observations in an :math:`n`-dimensional space.
+    metric : string or function
+        The distance metric to use, see `cdist`.
+    p, V, VI, w
+        Parameters of the metric, see `cdist`.  The default `V` of the
+        ``'seuclidean'`` metric and `VI` of the ``'mahalanobis'`` metric
+        are computed from all observations, as in `cdist`.
+    max_memory : int, optional
+        Largest number of bytes taken by the blocks computed at a time.
+        A block holds at least one row, whatever its size.  Default: 64 MiB.
+    n_jobs : int, optional
+        Number of threads computing blocks concurrently.  If -1 is given,
+        all CPU cores are used.  Default: 1.
+
+    Yields
+    ------
+    start : int
+        Index of the first row of the block.
+    D : ndarray
+        The distances ``cdist(XA[start:start+len(D)], XB, ...)``.
+
+    See Also
+    --------
+    cdist_reduce : row-wise reductions of the distance matrix
+
+    Notes
+    -----
+    The blocks are yielded in order.  With ``n_jobs > 1`` the next
+    `n_jobs` blocks are computed concurrently before they are yielded,
+    which the block size accounts for.
+
+    Examples
+    --------
+    >>> from scipy.spatial.distance import cdist_blocks
+    >>> XA = np.random.randn(10000, 3)
+    >>> XB = np.random.randn(20000, 3)
+    >>> total = 0
+    >>> for start, D in cdist_blocks(XA, XB, max_memory=2**24):
+    ...     total += D.sum()
+
+    """
+    XA, XB, V, VI = _prepare_cdist_blocks(XA, XB, metric, V, VI)
+    n_jobs = _get_n_jobs(n_jobs)
+    blocks = _row_blocks(XA.shape[0], XB.shape[0], max_memory, n_jobs)
+    for first in xrange(0, len(blocks), n_jobs):
+        batch = blocks[first:first + n_jobs]
+        results = {}
+
+        def compute(start, stop):
+            results[start] = cdist(XA[start:stop], XB, metric, p=p, V=V,
+                                   VI=VI, w=w)
+
+        _map_blocks(compute, batch, n_jobs)
+        for start, stop in batch:
+            yield start, results.pop(start)
+
+
+def cdist_reduce(XA, XB, reduction, metric='euclidean', k=1, threshold=None,
+                 p=2, V=None, VI=None, w=None, max_memory=2**26, n_jobs=1):
+    """
+    Row-wise reduction of the distance matrix of cdist.
+
+    The distance matrix is computed in blocks of rows, which are reduced
+    as soon as they are computed, so that the full :math:`m_A` by
+    :math:`m_B` matrix is never held in memory.
+
+    Parameters
+    ----------
+    XA : ndarray
+        An :math:`m_A` by :math:`n` array of :math:`m_A`
+        original observations in an :math:`n`-dimensional space.
+    XB : ndarray
+        An :math:`m_B` by :math:`n` array of :math:`m_B`
+        original observations in an :math:`n`-dimensional space.
+    reduction : {'min', 'argmin', 'topk', 'count'}
+        The reduction of each row ``D[i]`` of the distance matrix:
+
+        - 'min': the smallest distance ``D[i].min()``.
+        - 'argmin': the index ``D[i].argmin()`` of the nearest
+          observation in `XB`.
+        - 'topk': the `k` smallest distances and the indices of their
+          observations in `XB`, in increasing order of distance.
+        - 'count': the number of distances ``D[i] <= threshold``.
+
+    metric : string or function
+        The distance metric to use, see `cdist`.
+    k : int, optional
+        Number of neighbors for the 'topk' reduction.
+    threshold : float, optional
+        Distance threshold for the 'count' reduction.
+    p, V, VI, w
+        Parameters of the metric, see `cdist`.
+    max_memory : int, optional
+        Largest number of bytes taken by the blocks of the distance matrix
+        computed at a time, and the temporaries of their reduction.
+        Default: 64 MiB.
+    n_jobs : int, optional
+        Number of threads.  If -1 is given, all CPU cores are used.
+        Default: 1.
+
+    Returns
+    -------
+    result : ndarray or tuple of ndarrays
+        For 'min', the float array of the :math:`m_A` smallest distances.
+        For 'argmin' and 'count', an integer array of length :math:`m_A`.
+        For 'topk', a tuple ``(d, i)`` of :math:`m_A` by `k` arrays of
+        distances and indices.  Ties are broken by the smaller index.
+
+    See Also
+    --------
+    cdist_blocks : iterate over blocks of the distance matrix
+
+    Examples
+    --------
+    Assign each observation to its nearest center:
+
+    >>> from scipy.spatial.distance import cdist_reduce
+    >>> X = np.random.randn(100000, 3)
+    >>> centers = np.random.randn(10, 3)
+    >>> labels = cdist_reduce(X, centers, 'argmin')
+
+    """
+    XA, XB, V, VI = _prepare_cdist_blocks(XA, XB, metric, V, VI)
+    mA, mB = XA.shape[0], XB.shape[0]
+    n_jobs = _get_n_jobs(n_jobs)
+
+    if reduction in ('min', 'argmin', 'topk'):
+        if k < 1:
+            raise ValueError('k must be at least 1.')
+        if reduction != 'topk':
+            k = 1
+        if mB < k:
+            raise ValueError('XB must have at least %d observations.' % k)
+    elif reduction == 'count':
+        if threshold is None:
+            raise ValueError("The 'count' reduction requires a threshold.")
+    else:
+        raise ValueError('Unknown reduction: %r' % (reduction,))
+
+    # bytes per entry of a block and the temporaries of its reduction
+    itemsize = 8
+    if reduction == 'min':
+        out = np.empty(mA, dtype=np.double)
+
+        def reduce_block(start, D):
+            out[start:start + len(D)] = D.min(axis=1)
+    elif reduction == 'argmin':
+        out = np.empty(mA, dtype=np.intp)
+
+        def reduce_block(start, D):
+            out[start:start + len(D)] = D.argmin(axis=1)
+    elif reduction == 'topk':
+        dd = np.empty((mA, k), dtype=np.double)
+        ii = np.empty((mA, k), dtype=np.intp)
+        out = (dd, ii)
+
+        # the indices of argpartition and the mask of the ties
+        itemsize = 8 + np.dtype(np.intp).itemsize + 1
+
+        def reduce_block(start, D):
+            rows = np.arange(len(D))[:, np.newaxis]
+            if hasattr(np, 'argpartition'):
+                # Select the k nearest in linear time and only sort those.
+                # A tie at the k-th distance may keep a larger index than
+                # the stable sort would, so such rows are sorted in full.
+                idx = np.argpartition(D, k - 1, axis=1)[:, :k].copy()
+                kth = D[rows, idx].max(axis=1)
+                tied = np.sum(D <= kth[:, np.newaxis], axis=1) > k
+                if tied.any():
+                    idx[tied] = np.argsort(D[tied], axis=1,
+                                           kind='mergesort')[:, :k]
+            else:
+                idx = np.argsort(D, axis=1, kind='mergesort')[:, :k]
+            d = D[rows, idx]
+            order = np.lexsort((idx, d))
+            dd[start:start + len(D)] = d[rows, order]
+            ii[start:start + len(D)] = idx[rows, order]
+    else:
+        out = np.empty(mA, dtype=np.intp)
+        # the mask of the distances under the threshold
+        itemsize = 9
+
+        def reduce_block(start, D):
+            out[start:start + len(D)] = np.sum(D <= threshold, axis=1)
+
+    def compute(start, stop):
+        reduce_block(start, cdist(XA[start:stop], XB, metric, p=p, V=V,
+                                  VI=VI, w=w))
+
+    _map_blocks(compute, _row_blocks(mA, mB, max_memory, n_jobs, itemsize),
+                n_jobs)
+    return out
@@ -18,6 +18,9 @@ cimport qhull
 cimport setlist
 
 from numpy.compat import asbytes
+from scipy.lib._threads import run_threads, cpu_count
+from .ckdtree import cKDTree
+from ._arrayfile import save_arrays, load_arrays
 
 __all__ = ['Delaunay', 'ConvexHull', 'Voronoi', 'tsearch']
 
@@ -1432,6 +1435,84 @@ class _QhullUser(object):
         self.min_bound = self.points.min(axis=0)
         self.max_bound = self.points.max(axis=0)
 
+    # -----------
+    # persistence
+    # -----------
+
+    def _state(self):
+        # The arrays that make up the object, as (name, array) pairs.
+        return [('points', self.points),
+                ('min_bound', self.min_bound),
+                ('max_bound', self.max_bound)]
+
+    def _set_state(self, state):
+        # Inverse of _state: set up the object from its arrays, without
+        # copying them and without calling Qhull.
+        self.points = np.require(state['points'], np.double, 'C')
+        self.npoints, self.ndim = self.points.shape
+        self.min_bound = np.require(state['min_bound'], np.double, 'C')
+        self.max_bound = np.require(state['max_bound'], np.double, 'C')
+
+    def __reduce__(self):
+        return (_qhull_user_from_state, (type(self), dict(self._state())))
+
+    def save(self, filename):
+        """
+        save(filename)
+
+        Save the result to a file.
+
+        Only the arrays of the result are written, so that `load` can
+        open it again without running Qhull.  For a `Delaunay`
+        triangulation these include `transform` and `vertex_to_simplex`,
+        which are computed first if needed.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to write.
+
+        See Also
+        --------
+        load
+
+        Notes
+        -----
+        The same arrays are used when the object is pickled.  Neither a
+        saved nor a pickled object keeps the Qhull state needed for
+        `add_points`.
+
+        """
+        save_arrays(filename, self._file_tag, self._state())
+
+    @classmethod
+    def load(cls, filename, mmap_mode='r'):
+        """
+        load(filename, mmap_mode='r')
+
+        Open a result saved with `save`.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file to read.
+        mmap_mode : {'r', 'c', None}, optional
+            By default the arrays are memory mapped read-only from the
+            file, so that processes opening the same file share its
+            memory.  ``'c'`` maps the file copy-on-write; with None the
+            arrays are read into memory.
+
+        Returns
+        -------
+        obj
+            The object, of the class `load` is called on.
+
+        """
+        if mmap_mode not in ('r', 'c', None):
+            raise ValueError("mmap_mode must be 'r', 'c' or None")
+        return _qhull_user_from_state(
+            cls, load_arrays(filename, cls._file_tag, mmap_mode=mmap_mode))
+
     def add_points(self, points, restart=False):
         """
         add_points(points, restart=False)
@@ -1485,6 +1566,29 @@ class _QhullUser(object):
         self._update(self._qhull)
 
 
+def _qhull_user_from_state(cls, state):
+    # Unpickling and _QhullUser.load: set up an object without Qhull
+    obj = cls.__new__(cls)
+    obj._set_state(state)
+    return obj
+
+
+def _ragged_to_arrays(lists):
+    # A list of lists of ints as (data, indptr) arrays
+    indptr = np.zeros((len(lists) + 1,), dtype=np.intp)
+    indptr[1:] = np.cumsum([len(x) for x in lists])
+    data = np.empty((indptr[-1],), dtype=np.intc)
+    for k, x in enumerate(lists):
+        data[indptr[k]:indptr[k+1]] = x
+    return data, indptr
+
+
+def _arrays_to_ragged(data, indptr):
+    data = np.asarray(data).tolist()
+    indptr = np.asarray(indptr).tolist()
+    return [data[indptr[k]:indptr[k+1]] for k in xrange(len(indptr) - 1)]
+
+
 class Delaunay(_QhullUser):
     """
     Delaunay(points, furthest_site=False, incremental=False, qhull_options=None)
@@ -1682,12 +1786,42 @@ class Delaunay(_QhullUser):
         self._transform = None
         self._vertex_to_simplex = None
         self._vertex_neighbor_vertices = None
+        self._grid_locator = None
 
         # Backwards compatibility (Scipy < 0.12.0)
         self.vertices = self.simplices
 
         _QhullUser._update(self, qhull)
 
+    _file_tag = 'scipy.spatial.Delaunay'
+
+    def _state(self):
+        return _QhullUser._state(self) + [
+            ('simplices', self.simplices),
+            ('neighbors', self.neighbors),
+            ('equations', self.equations),
+            ('coplanar', self.coplanar),
+            ('paraboloid', np.array([self.paraboloid_scale,
+                                     self.paraboloid_shift])),
+            ('transform', self.transform),
+            ('vertex_to_simplex', self.vertex_to_simplex)]
+
+    def _set_state(self, state):
+        _QhullUser._set_state(self, state)
+        self.simplices = np.require(state['simplices'], np.intc, 'C')
+        self.neighbors = np.require(state['neighbors'], np.intc, 'C')
+        self.equations = np.require(state['equations'], np.double, 'C')
+        self.coplanar = np.require(state['coplanar'], np.intc, 'C')
+        self.paraboloid_scale, self.paraboloid_shift = \
+                               [float(v) for v in state['paraboloid']]
+        self.nsimplex = self.simplices.shape[0]
+        self._transform = np.require(state['transform'], np.double, 'C')
+        self._vertex_to_simplex = np.require(state['vertex_to_simplex'],
+                                             np.intc, 'C')
+        self._vertex_neighbor_vertices = None
+        self._grid_locator = None
+        self.vertices = self.simplices
+
     @property
     def transform(self):
         """
@@ -1854,10 +1988,37 @@ class Delaunay(_QhullUser):
             return np.resize(out, (m, ndim))
         return out
 
-    @cython.boundscheck(False)
-    def find_simplex(self, xi, bruteforce=False, tol=None):
+    def _get_grid_locator(self):
+        """
+        Coarse uniform grid over the bounding box of the points, giving
+        for each cell the simplex whose centroid is closest to the cell
+        centre.  Used as walk start hints in `find_simplex`.
+
         """
-        find_simplex(self, xi, bruteforce=False, tol=None)
+        cdef int ndim
+        if self._grid_locator is None:
+            ndim = self.ndim
+            # about one cell per simplex, but bounded in size
+            side = max(1, int(min(self.nsimplex, 2**20) ** (1.0/ndim)))
+            shape = np.empty((ndim,), dtype=np.intp)
+            shape.fill(side)
+            width = (self.max_bound - self.min_bound) / side
+            width[width == 0] = 1
+            centers = (np.indices(shape).reshape(ndim, -1).T + 0.5) * width
+            centers += self.min_bound
+            centroids = self.points[self.simplices].mean(axis=1)
+            cells = cKDTree(centroids).query(centers)[1]
+            self._grid_locator = (
+                np.ascontiguousarray(self.min_bound, dtype=np.double),
+                1.0 / width,
+                shape,
+                np.ascontiguousarray(cells, dtype=np.intc))
+        return self._grid_locator
+
+    def find_simplex(self, xi, bruteforce=False, tol=None, n_jobs=1,
+                     hint='previous'):
+        """
+        find_simplex(self, xi, bruteforce=False, tol=None, n_jobs=1, hint='previous')
 
         Find the simplices containing the given points.
 
@@ -1872,6 +2033,22 @@ class Delaunay(_QhullUser):
         tol : float, optional
             Tolerance allowed in the inside-triangle check.
             Default is ``100*eps``.
+        n_jobs : int, optional
+            Number of threads to use for locating the points.  If -1 is
+            given, all CPU cores are used.  Default: 1.
+
+            .. versionadded:: 0.13.0
+        hint : {'previous', 'grid'}, optional
+            Where the walk for each point starts.  With ``'previous'``,
+            the walk starts from the simplex found for the preceding
+            point, which is fastest for spatially coherent point
+            sequences.  With ``'grid'``, it starts from a simplex close
+            to the point, looked up in a coarse grid over the
+            triangulation, which is better for scattered points.  The
+            grid is built on first use and then kept.
+            Default: ``'previous'``.
+
+            .. versionadded:: 0.13.0
 
         Returns
         -------
@@ -1887,51 +2064,51 @@ class Delaunay(_QhullUser):
         the point in N+1 dimensions, the algorithm falls back to
         directed search in N dimensions.
 
+        With ``n_jobs > 1``, the points are split into contiguous
+        chunks, located in separate threads.
+
         """
-        cdef DelaunayInfo_t info
-        cdef int isimplex
-        cdef double c[NPY_MAXDIMS]
         cdef double eps, eps_broad
-        cdef int start
-        cdef int k
-        cdef np.ndarray[np.double_t, ndim=2] x
-        cdef np.ndarray[np.npy_int, ndim=1] out_
+        cdef np.npy_intp n, chunk, i
 
         xi = np.asanyarray(xi)
 
         if xi.shape[-1] != self.ndim:
             raise ValueError("wrong dimensionality in xi")
+        if hint not in ('previous', 'grid'):
+            raise ValueError("hint must be 'previous' or 'grid'")
+        if n_jobs == -1:
+            n_jobs = cpu_count()
+        elif n_jobs < 1:
+            raise ValueError("n_jobs must be a positive integer or -1")
 
         xi_shape = xi.shape
         xi = xi.reshape(-1, xi.shape[-1])
         x = np.ascontiguousarray(xi.astype(np.double))
 
-        start = 0
-
         if tol is None:
             eps = 100 * np.finfo(np.double).eps
         else:
             eps = tol
         eps_broad = np.sqrt(eps)
         out = np.zeros((xi.shape[0],), dtype=np.intc)
-        out_ = out
-        _get_delaunay_info(&info, self, 1, 0, 0)
 
-        if bruteforce:
-            with nogil:
-                for k in xrange(x.shape[0]):
-                    isimplex = _find_simplex_bruteforce(
-                        &info, c,
-                        <double*>x.data + info.ndim*k,
-                        eps, eps_broad)
-                    out_[k] = isimplex
+        # compute the lazy attributes here, not in the worker threads
+        self.transform
+        locator = None
+        if hint == 'grid' and not bruteforce:
+            locator = self._get_grid_locator()
+
+        n = x.shape[0]
+        if n_jobs == 1 or n < 2:
+            _find_simplex_rows(self, x, out, locator, 0, n,
+                               eps, eps_broad, bruteforce)
         else:
-            with nogil:
-                for k in xrange(x.shape[0]):
-                    isimplex = _find_simplex(&info, c,
-                                             <double*>x.data + info.ndim*k,
-                                             &start, eps, eps_broad)
-                    out_[k] = isimplex
+            chunk = (n + n_jobs - 1) // n_jobs
+            run_threads(_find_simplex_rows,
+                         [(self, x, out, locator, i, min(i + chunk, n),
+                           eps, eps_broad, bruteforce)
+                          for i in range(0, n, chunk)])
 
         return out.reshape(xi_shape[:-1])
 
@@ -1985,6 +2162,78 @@ class Delaunay(_QhullUser):
         return z
 
 
+cdef inline np.npy_intp _grid_cell(int ndim, double *lo, double *inv_width,
+                                    np.npy_intp *shape, double *x) nogil:
+    """
+    Flat index of the locator grid cell containing `x`; points outside
+    the grid are clamped to the closest cell.
+
+    """
+    cdef np.npy_intp cell, j
+    cdef double t
+    cdef int k
+
+    cell = 0
+    for k in xrange(ndim):
+        t = (x[k] - lo[k]) * inv_width[k]
+        if not t >= 0:
+            # also catches nan
+            j = 0
+        elif t >= shape[k]:
+            j = shape[k] - 1
+        else:
+            j = <np.npy_intp>t
+        cell = cell * shape[k] + j
+    return cell
+
+
+@cython.boundscheck(False)
+def _find_simplex_rows(tri, np.ndarray x, np.ndarray out, locator,
+                       np.npy_intp k0, np.npy_intp k1,
+                       double eps, double eps_broad, bint bruteforce):
+    """
+    Locate the points ``x[k0:k1]`` in the triangulation `tri`, writing
+    the simplex indices to ``out[k0:k1]``.  If `locator` is given, it is
+    the grid of `Delaunay._get_grid_locator` used for the walk starts.
+
+    """
+    cdef DelaunayInfo_t info
+    cdef double c[NPY_MAXDIMS]
+    cdef double *xp = <double*>x.data
+    cdef int *outp = <int*>out.data
+    cdef double *lo = NULL
+    cdef double *inv_width = NULL
+    cdef np.npy_intp *shape = NULL
+    cdef int *cells = NULL
+    cdef np.ndarray lo_, inv_width_, shape_, cells_
+    cdef np.npy_intp k
+    cdef int start, ndim
+
+    _get_delaunay_info(&info, tri, 1, 0, 0)
+    ndim = info.ndim
+
+    if locator is not None:
+        lo_, inv_width_, shape_, cells_ = locator
+        lo = <double*>lo_.data
+        inv_width = <double*>inv_width_.data
+        shape = <np.npy_intp*>shape_.data
+        cells = <int*>cells_.data
+
+    start = 0
+    with nogil:
+        if bruteforce:
+            for k in xrange(k0, k1):
+                outp[k] = _find_simplex_bruteforce(&info, c, xp + ndim*k,
+                                                   eps, eps_broad)
+        else:
+            for k in xrange(k0, k1):
+                if cells != NULL:
+                    start = cells[_grid_cell(ndim, lo, inv_width, shape,
+                                             xp + ndim*k)]
+                outp[k] = _find_simplex(&info, c, xp + ndim*k, &start,
+                                        eps, eps_broad)
+
+
 def tsearch(tri, xi):
     """
     tsearch(tri, xi)
@@ -2171,6 +2420,25 @@ class ConvexHull(_QhullUser):
 
         _QhullUser._update(self, qhull)
 
+    _file_tag = 'scipy.spatial.ConvexHull'
+
+    def _state(self):
+        return _QhullUser._state(self) + [
+            ('simplices', self.simplices),
+            ('neighbors', self.neighbors),
+            ('equations', self.equations),
+            ('coplanar', self.coplanar),
+            ('vertices', self.vertices)]
+
+    def _set_state(self, state):
+        _QhullUser._set_state(self, state)
+        self.simplices = np.require(state['simplices'], np.intc, 'C')
+        self.neighbors = np.require(state['neighbors'], np.intc, 'C')
+        self.equations = np.require(state['equations'], np.double, 'C')
+        self.coplanar = np.require(state['coplanar'], np.intc, 'C')
+        self._vertices = np.require(state['vertices'], np.intc, 'C')
+        self.nsimplex = self.simplices.shape[0]
+
     @property
     def vertices(self):
         if self._vertices is None:
@@ -2313,6 +2581,32 @@ class Voronoi(_QhullUser):
 
         _QhullUser._update(self, qhull)
 
+    _file_tag = 'scipy.spatial.Voronoi'
+
+    def _state(self):
+        # the ragged lists are stored in the (data, indptr) form of CSR
+        ridge_vertices, ridge_indptr = _ragged_to_arrays(self.ridge_vertices)
+        regions, region_indptr = _ragged_to_arrays(self.regions)
+        return _QhullUser._state(self) + [
+            ('vertices', self.vertices),
+            ('ridge_points', self.ridge_points),
+            ('ridge_vertices', ridge_vertices),
+            ('ridge_indptr', ridge_indptr),
+            ('regions', regions),
+            ('region_indptr', region_indptr),
+            ('point_region', self.point_region)]
+
+    def _set_state(self, state):
+        _QhullUser._set_state(self, state)
+        self.vertices = np.require(state['vertices'], np.double, 'C')
+        self.ridge_points = np.require(state['ridge_points'], np.intc, 'C')
+        self.ridge_vertices = _arrays_to_ragged(state['ridge_vertices'],
+                                                state['ridge_indptr'])
+        self.regions = _arrays_to_ragged(state['regions'],
+                                         state['region_indptr'])
+        self.point_region = np.require(state['point_region'], np.intp, 'C')
+        self._ridge_dict = None
+
     @property
     def ridge_dict(self):
         if self._ridge_dict is None:
@@ -35,9 +35,14 @@ def configuration(parent_package='', top_path=None):
 
     config.add_extension('ckdtree', sources=['ckdtree.c'])  # FIXME: cython
 
+    config.add_extension('_balltree', sources=['_balltree.c'])
+
+    config.add_extension('_rpforest', sources=['_rpforest.c'])
+
     config.add_extension('_distance_wrap',
-        sources=[join('src', 'distance_wrap.c'), join('src', 'distance.c')],
-        include_dirs=[get_numpy_include_dirs()])
+        sources=[join('src', 'distance_wrap.c'), join('src', 'distance.c.src')],
+        depends=[join('src', 'distance.h'), join('src', 'common.h')],
+        include_dirs=[get_numpy_include_dirs(), 'src'])
 
     return config
 
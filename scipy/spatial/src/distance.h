@@ -39,63 +39,99 @@
 
 void dist_to_squareform_from_vector(double *M, const double *v, int n);
 void dist_to_vector_from_squareform(const double *M, double *v, int n);
-void pdist_euclidean(const double *X, double *dm, int m, int n);
-void pdist_seuclidean(const double *X,
-		      const double *var, double *dm, int m, int n);
-void pdist_mahalanobis(const double *X, const double *covinv,
-		       double *dm, int m, int n);
-void pdist_bray_curtis(const double *X, double *dm, int m, int n);
-void pdist_canberra(const double *X, double *dm, int m, int n);
-void pdist_hamming(const double *X, double *dm, int m, int n);
-void pdist_hamming_bool(const char *X, double *dm, int m, int n);
-void pdist_city_block(const double *X, double *dm, int m, int n);
-void pdist_cosine(const double *X, double *dm, int m, int n, const double *norms);
-void pdist_chebyshev(const double *X, double *dm, int m, int n);
-void pdist_jaccard(const double *X, double *dm, int m, int n);
-void pdist_jaccard_bool(const char *X, double *dm, int m, int n);
-void pdist_kulsinski_bool(const char *X, double *dm, int m, int n);
-void pdist_minkowski(const double *X, double *dm, int m, int n, double p);
-void pdist_weighted_minkowski(const double *X, double *dm, int m, int n, double p, const double *w);
-void pdist_yule_bool(const char *X, double *dm, int m, int n);
-void pdist_matching_bool(const char *X, double *dm, int m, int n);
-void pdist_dice_bool(const char *X, double *dm, int m, int n);
-void pdist_rogerstanimoto_bool(const char *X, double *dm, int m, int n);
-void pdist_russellrao_bool(const char *X, double *dm, int m, int n);
-void pdist_sokalmichener_bool(const char *X, double *dm, int m, int n);
-void pdist_sokalsneath_bool(const char *X, double *dm, int m, int n);
 
-void cdist_euclidean(const double *XA, const double *XB, double *dm, int mA, int mB, int n);
-void cdist_mahalanobis(const double *XA, const double *XB,
-		       const double *covinv,
-		       double *dm, int mA, int mB, int n);
-void cdist_bray_curtis(const double *XA, const double *XB,
-		       double *dm, int mA, int mB, int n);
-void cdist_canberra(const double *XA,
-		    const double *XB, double *dm, int mA, int mB, int n);
-void cdist_hamming(const double *XA,
-		   const double *XB, double *dm, int mA, int mB, int n);
+/*
+ * The pdist functions compute the distances d(i, j), j > i, of the rows
+ * start <= i < end and store them at their place in the condensed distance
+ * matrix dm.  The distances between real vectors are defined for float and
+ * double observations, e.g. pdist_euclidean_float and pdist_euclidean_double.
+ */
+
+#define DECLARE_REAL_DISTANCES(sfx, type)                                     \
+void pdist_euclidean_##sfx(const type *X, double *dm, int m, int n,          \
+                           int start, int end);                              \
+void pdist_seuclidean_##sfx(const type *X, const double *var,                \
+                            double *dm, int m, int n, int start, int end);   \
+void pdist_mahalanobis_##sfx(const type *X, const double *covinv,            \
+                             double *dm, int m, int n, int start, int end);  \
+void pdist_bray_curtis_##sfx(const type *X, double *dm, int m, int n,        \
+                             int start, int end);                            \
+void pdist_canberra_##sfx(const type *X, double *dm, int m, int n,           \
+                          int start, int end);                               \
+void pdist_hamming_##sfx(const type *X, double *dm, int m, int n,            \
+                         int start, int end);                                \
+void pdist_city_block_##sfx(const type *X, double *dm, int m, int n,         \
+                            int start, int end);                             \
+void pdist_cosine_##sfx(const type *X, double *dm, int m, int n,             \
+                        const double *norms, int start, int end);            \
+void pdist_chebyshev_##sfx(const type *X, double *dm, int m, int n,          \
+                           int start, int end);                              \
+void pdist_jaccard_##sfx(const type *X, double *dm, int m, int n,            \
+                         int start, int end);                                \
+void pdist_minkowski_##sfx(const type *X, double *dm, int m, int n,          \
+                           double p, int start, int end);                    \
+void pdist_weighted_minkowski_##sfx(const type *X, double *dm, int m, int n, \
+                                    double p, const double *w,               \
+                                    int start, int end);                     \
+                                                                             \
+void cdist_euclidean_##sfx(const type *XA, const type *XB, double *dm,       \
+                           int mA, int mB, int n);                           \
+void cdist_mahalanobis_##sfx(const type *XA, const type *XB,                 \
+                             const double *covinv,                           \
+                             double *dm, int mA, int mB, int n);             \
+void cdist_bray_curtis_##sfx(const type *XA, const type *XB,                 \
+                             double *dm, int mA, int mB, int n);             \
+void cdist_canberra_##sfx(const type *XA, const type *XB, double *dm,        \
+                          int mA, int mB, int n);                            \
+void cdist_hamming_##sfx(const type *XA, const type *XB, double *dm,         \
+                         int mA, int mB, int n);                             \
+void cdist_jaccard_##sfx(const type *XA, const type *XB, double *dm,         \
+                         int mA, int mB, int n);                             \
+void cdist_chebyshev_##sfx(const type *XA, const type *XB, double *dm,       \
+                           int mA, int mB, int n);                           \
+void cdist_cosine_##sfx(const type *XA, const type *XB, double *dm,          \
+                        int mA, int mB, int n,                               \
+                        const double *normsA, const double *normsB);         \
+void cdist_seuclidean_##sfx(const type *XA, const type *XB,                  \
+                            const double *var,                               \
+                            double *dm, int mA, int mB, int n);              \
+void cdist_city_block_##sfx(const type *XA, const type *XB, double *dm,      \
+                            int mA, int mB, int n);                          \
+void cdist_minkowski_##sfx(const type *XA, const type *XB, double *dm,       \
+                           int mA, int mB, int n, double p);                 \
+void cdist_weighted_minkowski_##sfx(const type *XA, const type *XB,          \
+                                    double *dm, int mA, int mB, int n,       \
+                                    double p, const double *w);
+
+DECLARE_REAL_DISTANCES(float, npy_float)
+DECLARE_REAL_DISTANCES(double, npy_double)
+
+void pdist_hamming_bool(const char *X, double *dm, int m, int n,
+			int start, int end);
+void pdist_jaccard_bool(const char *X, double *dm, int m, int n,
+			int start, int end);
+void pdist_kulsinski_bool(const char *X, double *dm, int m, int n,
+			  int start, int end);
+void pdist_yule_bool(const char *X, double *dm, int m, int n,
+		     int start, int end);
+void pdist_matching_bool(const char *X, double *dm, int m, int n,
+			 int start, int end);
+void pdist_dice_bool(const char *X, double *dm, int m, int n,
+		     int start, int end);
+void pdist_rogerstanimoto_bool(const char *X, double *dm, int m, int n,
+			       int start, int end);
+void pdist_russellrao_bool(const char *X, double *dm, int m, int n,
+			   int start, int end);
+void pdist_sokalmichener_bool(const char *X, double *dm, int m, int n,
+			      int start, int end);
+void pdist_sokalsneath_bool(const char *X, double *dm, int m, int n,
+			    int start, int end);
+
 void cdist_hamming_bool(const char *XA,
 			const char *XB, double *dm,
 			int mA, int mB, int n);
-void cdist_jaccard(const double *XA,
-		   const double *XB, double *dm, int mA, int mB, int n);
 void cdist_jaccard_bool(const char *XA,
 			const char *XB, double *dm, int mA, int mB, int n);
-void cdist_chebyshev(const double *XA,
-		     const double *XB, double *dm, int mA, int mB, int n);
-void cdist_cosine(const double *XA,
-		  const double *XB, double *dm, int mA, int mB, int n,
-		  const double *normsA, const double *normsB);
-void cdist_seuclidean(const double *XA,
-		      const double *XB,
-		      const double *var,
-		      double *dm, int mA, int mB, int n);
-void cdist_city_block(const double *XA, const double *XB, double *dm,
-		      int mA, int mB, int n);
-void cdist_minkowski(const double *XA, const double *XB, double *dm,
-		     int mA, int mB, int n, double p);
-void cdist_weighted_minkowski(const double *XA, const double *XB, double *dm,
-			      int mA, int mB, int n, double p, const double *w);
 void cdist_yule_bool(const char *XA, const char *XB, double *dm,
 		     int mA, int mB, int n);
 void cdist_matching_bool(const char *XA, const char *XB, double *dm,
@@ -113,4 +149,27 @@ void cdist_sokalsneath_bool(const char *XA, const char *XB, double *dm,
 void cdist_sokalmichener_bool(const char *XA, const char *XB, double *dm,
 			      int mA, int mB, int n);
 
+#define DECLARE_CSR_DISTANCE(name)                                           \
+void pdist_##name##_csr(const double *data, const int *indices,              \
+                        const int *indptr, double *dm, int m, int n,         \
+                        int start, int end);                                 \
+void cdist_##name##_csr(const double *dataA, const int *indicesA,            \
+                        const int *indptrA, const double *dataB,             \
+                        const int *indicesB, const int *indptrB,             \
+                        double *dm, int mA, int mB, int n);
+
+DECLARE_CSR_DISTANCE(euclidean)
+DECLARE_CSR_DISTANCE(city_block)
+DECLARE_CSR_DISTANCE(hamming)
+DECLARE_CSR_DISTANCE(jaccard)
+
+void pdist_cosine_csr(const double *data, const int *indices,
+                      const int *indptr, double *dm, int m, int n,
+                      const double *norms, int start, int end);
+void cdist_cosine_csr(const double *dataA, const int *indicesA,
+                      const int *indptrA, const double *dataB,
+                      const int *indicesB, const int *indptrB,
+                      double *dm, int mA, int mB, int n,
+                      const double *normsA, const double *normsB);
+
 #endif
@@ -34,1014 +34,592 @@
  * OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
  */
 
-#include <math.h>
-#include "distance.h"
 #include "Python.h"
 #include <numpy/arrayobject.h>
+#include <math.h>
 #include <stdio.h>
+#include "distance.h"
 
-extern PyObject *cdist_euclidean_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const double *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_euclidean(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *cdist_canberra_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const double *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_canberra(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *cdist_bray_curtis_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const double *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
+/*
+ * The distance functions between real vectors exist for float and double
+ * observations.  DISPATCH_REAL calls func_float or func_double with the
+ * parenthesized arguments args, depending on the type of the array X_.
+ * Both observation arrays of cdist must have the same type.
+ */
+#define DISPATCH_REAL(X_, func, args)                                        \
+  if (PyArray_TYPE(X_) == NPY_FLOAT) {                                       \
+    func##_float args;                                                       \
+  }                                                                          \
+  else {                                                                     \
+    func##_double args;                                                      \
   }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
 
-    cdist_bray_curtis(XA, XB, dm, mA, mB, n);
+static int check_same_type(PyArrayObject *XA_, PyArrayObject *XB_) {
+  if (PyArray_TYPE(XA_) != PyArray_TYPE(XB_)) {
+    PyErr_SetString(PyExc_TypeError,
+                    "XA and XB must have the same dtype.");
+    return -1;
   }
-  return Py_BuildValue("d", 0.0);
+  return 0;
 }
 
-
-extern PyObject *cdist_mahalanobis_wrap(PyObject *self, PyObject *args) {
+/*
+ * pdist computes the rows start <= i < end of the condensed distance
+ * matrix, all rows by default, so that blocks of rows can be computed
+ * concurrently.
+ */
+static int check_row_range(int *start, int *end, int m) {
+  if (*end < 0) {
+    *end = m;
+  }
+  if (*start < 0 || *start > *end || *end > m) {
+    PyErr_SetString(PyExc_ValueError, "invalid range of rows.");
+    return -1;
+  }
+  return 0;
+}
+
+/***************************** cdist ***/
+
+#define DEFINE_CDIST_REAL(name)                                              \
+static PyObject *cdist_##name##_wrap(PyObject *self, PyObject *args) {       \
+  PyArrayObject *XA_, *XB_, *dm_;                                            \
+  int mA, mB, n;                                                             \
+  void *XA, *XB;                                                             \
+  double *dm;                                                                \
+  if (!PyArg_ParseTuple(args, "O!O!O!",                                      \
+                        &PyArray_Type, &XA_, &PyArray_Type, &XB_,            \
+                        &PyArray_Type, &dm_)                                 \
+      || check_same_type(XA_, XB_) < 0) {                                    \
+    return 0;                                                                \
+  }                                                                          \
+  XA = PyArray_DATA(XA_);                                                    \
+  XB = PyArray_DATA(XB_);                                                    \
+  dm = (double*)PyArray_DATA(dm_);                                           \
+  mA = PyArray_DIM(XA_, 0);                                                  \
+  mB = PyArray_DIM(XB_, 0);                                                  \
+  n = PyArray_DIM(XA_, 1);                                                   \
+  NPY_BEGIN_ALLOW_THREADS;                                                   \
+  DISPATCH_REAL(XA_, cdist_##name, (XA, XB, dm, mA, mB, n));                 \
+  NPY_END_ALLOW_THREADS;                                                     \
+  return Py_BuildValue("");                                                  \
+}
+
+#define DEFINE_CDIST_BOOL(name)                                              \
+static PyObject *cdist_##name##_wrap(PyObject *self, PyObject *args) {       \
+  PyArrayObject *XA_, *XB_, *dm_;                                            \
+  int mA, mB, n;                                                             \
+  const char *XA, *XB;                                                       \
+  double *dm;                                                                \
+  if (!PyArg_ParseTuple(args, "O!O!O!",                                      \
+                        &PyArray_Type, &XA_, &PyArray_Type, &XB_,            \
+                        &PyArray_Type, &dm_)) {                              \
+    return 0;                                                                \
+  }                                                                          \
+  XA = (const char*)PyArray_DATA(XA_);                                       \
+  XB = (const char*)PyArray_DATA(XB_);                                       \
+  dm = (double*)PyArray_DATA(dm_);                                           \
+  mA = PyArray_DIM(XA_, 0);                                                  \
+  mB = PyArray_DIM(XB_, 0);                                                  \
+  n = PyArray_DIM(XA_, 1);                                                   \
+  NPY_BEGIN_ALLOW_THREADS;                                                   \
+  cdist_##name(XA, XB, dm, mA, mB, n);                                       \
+  NPY_END_ALLOW_THREADS;                                                     \
+  return Py_BuildValue("");                                                  \
+}
+
+DEFINE_CDIST_REAL(euclidean)
+DEFINE_CDIST_REAL(canberra)
+DEFINE_CDIST_REAL(bray_curtis)
+DEFINE_CDIST_REAL(chebyshev)
+DEFINE_CDIST_REAL(city_block)
+DEFINE_CDIST_REAL(hamming)
+DEFINE_CDIST_REAL(jaccard)
+
+DEFINE_CDIST_BOOL(hamming_bool)
+DEFINE_CDIST_BOOL(jaccard_bool)
+DEFINE_CDIST_BOOL(yule_bool)
+DEFINE_CDIST_BOOL(matching_bool)
+DEFINE_CDIST_BOOL(dice_bool)
+DEFINE_CDIST_BOOL(rogerstanimoto_bool)
+DEFINE_CDIST_BOOL(russellrao_bool)
+DEFINE_CDIST_BOOL(kulsinski_bool)
+DEFINE_CDIST_BOOL(sokalmichener_bool)
+DEFINE_CDIST_BOOL(sokalsneath_bool)
+
+static PyObject *cdist_mahalanobis_wrap(PyObject *self, PyObject *args) {
   PyArrayObject *XA_, *XB_, *covinv_, *dm_;
   int mA, mB, n;
+  void *XA, *XB;
   double *dm;
-  const double *XA, *XB;
   const double *covinv;
   if (!PyArg_ParseTuple(args, "O!O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
+			&PyArray_Type, &XA_, &PyArray_Type, &XB_,
 			&PyArray_Type, &covinv_,
-			&PyArray_Type, &dm_)) {
+			&PyArray_Type, &dm_)
+      || check_same_type(XA_, XB_) < 0) {
     return 0;
   }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    covinv = (const double*)covinv_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_mahalanobis(XA, XB, covinv, dm, mA, mB, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
+  XA = PyArray_DATA(XA_);
+  XB = PyArray_DATA(XB_);
+  covinv = (const double*)PyArray_DATA(covinv_);
+  dm = (double*)PyArray_DATA(dm_);
+  mA = PyArray_DIM(XA_, 0);
+  mB = PyArray_DIM(XB_, 0);
+  n = PyArray_DIM(XA_, 1);
 
-extern PyObject *cdist_chebyshev_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const double *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_chebyshev(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("d", 0.0);
+  NPY_BEGIN_ALLOW_THREADS;
+  DISPATCH_REAL(XA_, cdist_mahalanobis, (XA, XB, covinv, dm, mA, mB, n));
+  NPY_END_ALLOW_THREADS;
+  return Py_BuildValue("");
 }
 
-
-extern PyObject *cdist_cosine_wrap(PyObject *self, PyObject *args) {
+static PyObject *cdist_cosine_wrap(PyObject *self, PyObject *args) {
   PyArrayObject *XA_, *XB_, *dm_, *normsA_, *normsB_;
   int mA, mB, n;
+  void *XA, *XB;
   double *dm;
-  const double *XA, *XB, *normsA, *normsB;
+  const double *normsA, *normsB;
   if (!PyArg_ParseTuple(args, "O!O!O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
+			&PyArray_Type, &XA_, &PyArray_Type, &XB_,
 			&PyArray_Type, &dm_,
-			&PyArray_Type, &normsA_,
-			&PyArray_Type, &normsB_)) {
-    return 0;
-  }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    dm = (double*)dm_->data;
-    normsA = (const double*)normsA_->data;
-    normsB = (const double*)normsB_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_cosine(XA, XB, dm, mA, mB, n, normsA, normsB);
-  }
-  return Py_BuildValue("d", 0.0);
+			&PyArray_Type, &normsA_, &PyArray_Type, &normsB_)
+      || check_same_type(XA_, XB_) < 0) {
+    return 0;
+  }
+  XA = PyArray_DATA(XA_);
+  XB = PyArray_DATA(XB_);
+  dm = (double*)PyArray_DATA(dm_);
+  normsA = (const double*)PyArray_DATA(normsA_);
+  normsB = (const double*)PyArray_DATA(normsB_);
+  mA = PyArray_DIM(XA_, 0);
+  mB = PyArray_DIM(XB_, 0);
+  n = PyArray_DIM(XA_, 1);
+
+  NPY_BEGIN_ALLOW_THREADS;
+  DISPATCH_REAL(XA_, cdist_cosine, (XA, XB, dm, mA, mB, n, normsA, normsB));
+  NPY_END_ALLOW_THREADS;
+  return Py_BuildValue("");
 }
 
-extern PyObject *cdist_seuclidean_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_, *var_;
+static PyObject *cdist_seuclidean_wrap(PyObject *self, PyObject *args) {
+  PyArrayObject *XA_, *XB_, *var_, *dm_;
   int mA, mB, n;
+  void *XA, *XB;
   double *dm;
-  const double *XA, *XB, *var;
+  const double *var;
   if (!PyArg_ParseTuple(args, "O!O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
+			&PyArray_Type, &XA_, &PyArray_Type, &XB_,
 			&PyArray_Type, &var_,
-			&PyArray_Type, &dm_)) {
+			&PyArray_Type, &dm_)
+      || check_same_type(XA_, XB_) < 0) {
     return 0;
   }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    dm = (double*)dm_->data;
-    var = (double*)var_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_seuclidean(XA, XB, var, dm, mA, mB, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
+  XA = PyArray_DATA(XA_);
+  XB = PyArray_DATA(XB_);
+  var = (const double*)PyArray_DATA(var_);
+  dm = (double*)PyArray_DATA(dm_);
+  mA = PyArray_DIM(XA_, 0);
+  mB = PyArray_DIM(XB_, 0);
+  n = PyArray_DIM(XA_, 1);
 
-extern PyObject *cdist_city_block_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const double *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_city_block(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *cdist_hamming_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const double *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_hamming(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *cdist_hamming_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const char *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const char*)XA_->data;
-    XB = (const char*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_hamming_bool(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *cdist_jaccard_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const double *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_jaccard(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *cdist_jaccard_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const char *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const char*)XA_->data;
-    XB = (const char*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_jaccard_bool(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("d", 0.0);
+  NPY_BEGIN_ALLOW_THREADS;
+  DISPATCH_REAL(XA_, cdist_seuclidean, (XA, XB, var, dm, mA, mB, n));
+  NPY_END_ALLOW_THREADS;
+  return Py_BuildValue("");
 }
 
-extern PyObject *cdist_minkowski_wrap(PyObject *self, PyObject *args) {
+static PyObject *cdist_minkowski_wrap(PyObject *self, PyObject *args) {
   PyArrayObject *XA_, *XB_, *dm_;
   int mA, mB, n;
+  void *XA, *XB;
   double *dm;
-  const double *XA, *XB;
   double p;
   if (!PyArg_ParseTuple(args, "O!O!O!d",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
+			&PyArray_Type, &XA_, &PyArray_Type, &XB_,
 			&PyArray_Type, &dm_,
-			&p)) {
+			&p)
+      || check_same_type(XA_, XB_) < 0) {
     return 0;
   }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-    cdist_minkowski(XA, XB, dm, mA, mB, n, p);
-  }
-  return Py_BuildValue("d", 0.0);
+  XA = PyArray_DATA(XA_);
+  XB = PyArray_DATA(XB_);
+  dm = (double*)PyArray_DATA(dm_);
+  mA = PyArray_DIM(XA_, 0);
+  mB = PyArray_DIM(XB_, 0);
+  n = PyArray_DIM(XA_, 1);
+
+  NPY_BEGIN_ALLOW_THREADS;
+  DISPATCH_REAL(XA_, cdist_minkowski, (XA, XB, dm, mA, mB, n, p));
+  NPY_END_ALLOW_THREADS;
+  return Py_BuildValue("");
 }
 
-extern PyObject *cdist_weighted_minkowski_wrap(PyObject *self, PyObject *args) {
+static PyObject *cdist_weighted_minkowski_wrap(PyObject *self, PyObject *args) {
   PyArrayObject *XA_, *XB_, *dm_, *w_;
   int mA, mB, n;
+  void *XA, *XB;
   double *dm;
-  const double *XA, *XB, *w;
+  const double *w;
   double p;
   if (!PyArg_ParseTuple(args, "O!O!O!dO!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
+			&PyArray_Type, &XA_, &PyArray_Type, &XB_,
 			&PyArray_Type, &dm_,
 			&p,
-			&PyArray_Type, &w_)) {
-    return 0;
-  }
-  else {
-    XA = (const double*)XA_->data;
-    XB = (const double*)XB_->data;
-    w = (const double*)w_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-    cdist_weighted_minkowski(XA, XB, dm, mA, mB, n, p, w);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *cdist_yule_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const char *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const char*)XA_->data;
-    XB = (const char*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_yule_bool(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("");
-}
-
-extern PyObject *cdist_matching_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const char *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const char*)XA_->data;
-    XB = (const char*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_matching_bool(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("");
-}
-
-extern PyObject *cdist_dice_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const char *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const char*)XA_->data;
-    XB = (const char*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_dice_bool(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("");
-}
-
-extern PyObject *cdist_rogerstanimoto_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const char *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
+			&PyArray_Type, &w_)
+      || check_same_type(XA_, XB_) < 0) {
     return 0;
   }
-  else {
-    XA = (const char*)XA_->data;
-    XB = (const char*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
+  XA = PyArray_DATA(XA_);
+  XB = PyArray_DATA(XB_);
+  w = (const double*)PyArray_DATA(w_);
+  dm = (double*)PyArray_DATA(dm_);
+  mA = PyArray_DIM(XA_, 0);
+  mB = PyArray_DIM(XB_, 0);
+  n = PyArray_DIM(XA_, 1);
 
-    cdist_rogerstanimoto_bool(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("");
-}
-
-extern PyObject *cdist_russellrao_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const char *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const char*)XA_->data;
-    XB = (const char*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_russellrao_bool(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("");
-}
-
-extern PyObject *cdist_kulsinski_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const char *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const char*)XA_->data;
-    XB = (const char*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_kulsinski_bool(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("");
-}
-
-extern PyObject *cdist_sokalmichener_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const char *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const char*)XA_->data;
-    XB = (const char*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_sokalmichener_bool(XA, XB, dm, mA, mB, n);
-  }
-  return Py_BuildValue("");
-}
-
-extern PyObject *cdist_sokalsneath_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *XA_, *XB_, *dm_;
-  int mA, mB, n;
-  double *dm;
-  const char *XA, *XB;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &XA_, &PyArray_Type, &XB_, 
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    XA = (const char*)XA_->data;
-    XB = (const char*)XB_->data;
-    dm = (double*)dm_->data;
-    mA = XA_->dimensions[0];
-    mB = XB_->dimensions[0];
-    n = XA_->dimensions[1];
-
-    cdist_sokalsneath_bool(XA, XB, dm, mA, mB, n);
-  }
+  NPY_BEGIN_ALLOW_THREADS;
+  DISPATCH_REAL(XA_, cdist_weighted_minkowski, (XA, XB, dm, mA, mB, n, p, w));
+  NPY_END_ALLOW_THREADS;
   return Py_BuildValue("");
 }
 
 /***************************** pdist ***/
 
-extern PyObject *pdist_euclidean_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const double *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    X = (const double*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_euclidean(X, dm, m, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *pdist_canberra_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const double *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    X = (const double*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_canberra(X, dm, m, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *pdist_bray_curtis_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const double *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    X = (const double*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_bray_curtis(X, dm, m, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-
-extern PyObject *pdist_mahalanobis_wrap(PyObject *self, PyObject *args) {
+#define DEFINE_PDIST_REAL(name)                                              \
+static PyObject *pdist_##name##_wrap(PyObject *self, PyObject *args) {       \
+  PyArrayObject *X_, *dm_;                                                   \
+  int m, n, start = 0, end = -1;                                             \
+  void *X;                                                                   \
+  double *dm;                                                                \
+  if (!PyArg_ParseTuple(args, "O!O!|ii",                                     \
+                        &PyArray_Type, &X_,                                  \
+                        &PyArray_Type, &dm_,                                 \
+                        &start, &end)) {                                     \
+    return 0;                                                                \
+  }                                                                          \
+  X = PyArray_DATA(X_);                                                      \
+  dm = (double*)PyArray_DATA(dm_);                                           \
+  m = PyArray_DIM(X_, 0);                                                    \
+  n = PyArray_DIM(X_, 1);                                                    \
+  if (check_row_range(&start, &end, m) < 0) {                                \
+    return 0;                                                                \
+  }                                                                          \
+  NPY_BEGIN_ALLOW_THREADS;                                                   \
+  DISPATCH_REAL(X_, pdist_##name, (X, dm, m, n, start, end));                \
+  NPY_END_ALLOW_THREADS;                                                     \
+  return Py_BuildValue("");                                                  \
+}
+
+#define DEFINE_PDIST_BOOL(name)                                              \
+static PyObject *pdist_##name##_wrap(PyObject *self, PyObject *args) {       \
+  PyArrayObject *X_, *dm_;                                                   \
+  int m, n, start = 0, end = -1;                                             \
+  const char *X;                                                             \
+  double *dm;                                                                \
+  if (!PyArg_ParseTuple(args, "O!O!|ii",                                     \
+                        &PyArray_Type, &X_,                                  \
+                        &PyArray_Type, &dm_,                                 \
+                        &start, &end)) {                                     \
+    return 0;                                                                \
+  }                                                                          \
+  X = (const char*)PyArray_DATA(X_);                                         \
+  dm = (double*)PyArray_DATA(dm_);                                           \
+  m = PyArray_DIM(X_, 0);                                                    \
+  n = PyArray_DIM(X_, 1);                                                    \
+  if (check_row_range(&start, &end, m) < 0) {                                \
+    return 0;                                                                \
+  }                                                                          \
+  NPY_BEGIN_ALLOW_THREADS;                                                   \
+  pdist_##name(X, dm, m, n, start, end);                                     \
+  NPY_END_ALLOW_THREADS;                                                     \
+  return Py_BuildValue("");                                                  \
+}
+
+DEFINE_PDIST_REAL(euclidean)
+DEFINE_PDIST_REAL(canberra)
+DEFINE_PDIST_REAL(bray_curtis)
+DEFINE_PDIST_REAL(chebyshev)
+DEFINE_PDIST_REAL(city_block)
+DEFINE_PDIST_REAL(hamming)
+DEFINE_PDIST_REAL(jaccard)
+
+DEFINE_PDIST_BOOL(hamming_bool)
+DEFINE_PDIST_BOOL(jaccard_bool)
+DEFINE_PDIST_BOOL(yule_bool)
+DEFINE_PDIST_BOOL(matching_bool)
+DEFINE_PDIST_BOOL(dice_bool)
+DEFINE_PDIST_BOOL(rogerstanimoto_bool)
+DEFINE_PDIST_BOOL(russellrao_bool)
+DEFINE_PDIST_BOOL(kulsinski_bool)
+DEFINE_PDIST_BOOL(sokalmichener_bool)
+DEFINE_PDIST_BOOL(sokalsneath_bool)
+
+static PyObject *pdist_mahalanobis_wrap(PyObject *self, PyObject *args) {
   PyArrayObject *X_, *covinv_, *dm_;
-  int m, n;
+  int m, n, start = 0, end = -1;
+  void *X;
   double *dm;
-  const double *X;
   const double *covinv;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
+  if (!PyArg_ParseTuple(args, "O!O!O!|ii",
 			&PyArray_Type, &X_,
 			&PyArray_Type, &covinv_,
-			&PyArray_Type, &dm_)) {
+			&PyArray_Type, &dm_,
+			&start, &end)) {
     return 0;
   }
-  else {
-    X = (const double*)X_->data;
-    covinv = (const double*)covinv_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_mahalanobis(X, covinv, dm, m, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-
-extern PyObject *pdist_chebyshev_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const double *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
+  X = PyArray_DATA(X_);
+  covinv = (const double*)PyArray_DATA(covinv_);
+  dm = (double*)PyArray_DATA(dm_);
+  m = PyArray_DIM(X_, 0);
+  n = PyArray_DIM(X_, 1);
+  if (check_row_range(&start, &end, m) < 0) {
     return 0;
   }
-  else {
-    X = (const double*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
 
-    pdist_chebyshev(X, dm, m, n);
-  }
-  return Py_BuildValue("d", 0.0);
+  NPY_BEGIN_ALLOW_THREADS;
+  DISPATCH_REAL(X_, pdist_mahalanobis, (X, covinv, dm, m, n, start, end));
+  NPY_END_ALLOW_THREADS;
+  return Py_BuildValue("");
 }
 
-
-extern PyObject *pdist_cosine_wrap(PyObject *self, PyObject *args) {
+static PyObject *pdist_cosine_wrap(PyObject *self, PyObject *args) {
   PyArrayObject *X_, *dm_, *norms_;
-  int m, n;
+  int m, n, start = 0, end = -1;
+  void *X;
   double *dm;
-  const double *X, *norms;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
+  const double *norms;
+  if (!PyArg_ParseTuple(args, "O!O!O!|ii",
 			&PyArray_Type, &X_,
 			&PyArray_Type, &dm_,
-			&PyArray_Type, &norms_)) {
+			&PyArray_Type, &norms_,
+			&start, &end)) {
     return 0;
   }
-  else {
-    X = (const double*)X_->data;
-    dm = (double*)dm_->data;
-    norms = (const double*)norms_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_cosine(X, dm, m, n, norms);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *pdist_seuclidean_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_, *var_;
-  int m, n;
-  double *dm;
-  const double *X, *var;
-  if (!PyArg_ParseTuple(args, "O!O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &var_,
-			&PyArray_Type, &dm_)) {
+  X = PyArray_DATA(X_);
+  dm = (double*)PyArray_DATA(dm_);
+  norms = (const double*)PyArray_DATA(norms_);
+  m = PyArray_DIM(X_, 0);
+  n = PyArray_DIM(X_, 1);
+  if (check_row_range(&start, &end, m) < 0) {
     return 0;
   }
-  else {
-    X = (double*)X_->data;
-    dm = (double*)dm_->data;
-    var = (double*)var_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_seuclidean(X, var, dm, m, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
 
-extern PyObject *pdist_city_block_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const double *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    X = (const double*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_city_block(X, dm, m, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *pdist_hamming_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const double *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    X = (const double*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_hamming(X, dm, m, n);
-  }
-  return Py_BuildValue("d", 0.0);
+  NPY_BEGIN_ALLOW_THREADS;
+  DISPATCH_REAL(X_, pdist_cosine, (X, dm, m, n, norms, start, end));
+  NPY_END_ALLOW_THREADS;
+  return Py_BuildValue("");
 }
 
-extern PyObject *pdist_hamming_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
+static PyObject *pdist_seuclidean_wrap(PyObject *self, PyObject *args) {
+  PyArrayObject *X_, *dm_, *var_;
+  int m, n, start = 0, end = -1;
+  void *X;
   double *dm;
-  const char *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
+  const double *var;
+  if (!PyArg_ParseTuple(args, "O!O!O!|ii",
 			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
+			&PyArray_Type, &var_,
+			&PyArray_Type, &dm_,
+			&start, &end)) {
     return 0;
   }
-  else {
-    X = (const char*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_hamming_bool(X, dm, m, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *pdist_jaccard_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const double *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
+  X = PyArray_DATA(X_);
+  dm = (double*)PyArray_DATA(dm_);
+  var = (const double*)PyArray_DATA(var_);
+  m = PyArray_DIM(X_, 0);
+  n = PyArray_DIM(X_, 1);
+  if (check_row_range(&start, &end, m) < 0) {
     return 0;
   }
-  else {
-    X = (const double*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
 
-    pdist_jaccard(X, dm, m, n);
-  }
-  return Py_BuildValue("d", 0.0);
+  NPY_BEGIN_ALLOW_THREADS;
+  DISPATCH_REAL(X_, pdist_seuclidean, (X, var, dm, m, n, start, end));
+  NPY_END_ALLOW_THREADS;
+  return Py_BuildValue("");
 }
 
-extern PyObject *pdist_jaccard_bool_wrap(PyObject *self, PyObject *args) {
+static PyObject *pdist_minkowski_wrap(PyObject *self, PyObject *args) {
   PyArrayObject *X_, *dm_;
-  int m, n;
+  int m, n, start = 0, end = -1;
+  void *X;
   double *dm;
-  const char *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    X = (const char*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_jaccard_bool(X, dm, m, n);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *pdist_minkowski_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm, *X;
   double p;
-  if (!PyArg_ParseTuple(args, "O!O!d",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_,
-			&p)) {
-    return 0;
-  }
-  else {
-    X = (double*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_minkowski(X, dm, m, n, p);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-extern PyObject *pdist_weighted_minkowski_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_, *w_;
-  int m, n;
-  double *dm, *X, *w;
-  double p;
-  if (!PyArg_ParseTuple(args, "O!O!dO!",
+  if (!PyArg_ParseTuple(args, "O!O!d|ii",
 			&PyArray_Type, &X_,
 			&PyArray_Type, &dm_,
 			&p,
-			&PyArray_Type, &w_)) {
+			&start, &end)) {
     return 0;
   }
-  else {
-    X = (double*)X_->data;
-    dm = (double*)dm_->data;
-    w = (const double*)w_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_weighted_minkowski(X, dm, m, n, p, w);
-  }
-  return Py_BuildValue("d", 0.0);
-}
-
-
-extern PyObject *pdist_yule_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const char *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    X = (const char*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_yule_bool(X, dm, m, n);
-  }
-  return Py_BuildValue("");
-}
-
-extern PyObject *pdist_matching_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const char *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
+  X = PyArray_DATA(X_);
+  dm = (double*)PyArray_DATA(dm_);
+  m = PyArray_DIM(X_, 0);
+  n = PyArray_DIM(X_, 1);
+  if (check_row_range(&start, &end, m) < 0) {
     return 0;
   }
-  else {
-    X = (const char*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
 
-    pdist_matching_bool(X, dm, m, n);
-  }
+  NPY_BEGIN_ALLOW_THREADS;
+  DISPATCH_REAL(X_, pdist_minkowski, (X, dm, m, n, p, start, end));
+  NPY_END_ALLOW_THREADS;
   return Py_BuildValue("");
 }
 
-extern PyObject *pdist_dice_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
+static PyObject *pdist_weighted_minkowski_wrap(PyObject *self, PyObject *args) {
+  PyArrayObject *X_, *dm_, *w_;
+  int m, n, start = 0, end = -1;
+  void *X;
   double *dm;
-  const char *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
+  const double *w;
+  double p;
+  if (!PyArg_ParseTuple(args, "O!O!dO!|ii",
 			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
+			&PyArray_Type, &dm_,
+			&p,
+			&PyArray_Type, &w_,
+			&start, &end)) {
     return 0;
   }
-  else {
-    X = (const char*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_dice_bool(X, dm, m, n);
-  }
-  return Py_BuildValue("");
-}
-
-extern PyObject *pdist_rogerstanimoto_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const char *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
+  X = PyArray_DATA(X_);
+  dm = (double*)PyArray_DATA(dm_);
+  w = (const double*)PyArray_DATA(w_);
+  m = PyArray_DIM(X_, 0);
+  n = PyArray_DIM(X_, 1);
+  if (check_row_range(&start, &end, m) < 0) {
     return 0;
   }
-  else {
-    X = (const char*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
 
-    pdist_rogerstanimoto_bool(X, dm, m, n);
-  }
+  NPY_BEGIN_ALLOW_THREADS;
+  DISPATCH_REAL(X_, pdist_weighted_minkowski, (X, dm, m, n, p, w, start, end));
+  NPY_END_ALLOW_THREADS;
   return Py_BuildValue("");
 }
 
-extern PyObject *pdist_russellrao_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const char *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    X = (const char*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_russellrao_bool(X, dm, m, n);
-  }
-  return Py_BuildValue("");
-}
+/***************************** sparse ***/
 
-extern PyObject *pdist_kulsinski_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const char *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
-    return 0;
-  }
-  else {
-    X = (const char*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
+/*
+ * The observations in CSR format are passed as their data (double),
+ * indices and indptr (int) arrays, and the number n of columns.  The rows
+ * of cdist are those of the indptrA array, which may be a slice.
+ */
 
-    pdist_kulsinski_bool(X, dm, m, n);
-  }
+#define DEFINE_CDIST_CSR(name)                                               \
+static PyObject *cdist_##name##_csr_wrap(PyObject *self, PyObject *args) {   \
+  PyArrayObject *dataA_, *indicesA_, *indptrA_;                              \
+  PyArrayObject *dataB_, *indicesB_, *indptrB_, *dm_;                        \
+  int mA, mB, n;                                                             \
+  if (!PyArg_ParseTuple(args, "O!O!O!O!O!O!O!i",                             \
+                        &PyArray_Type, &dataA_, &PyArray_Type, &indicesA_,   \
+                        &PyArray_Type, &indptrA_,                            \
+                        &PyArray_Type, &dataB_, &PyArray_Type, &indicesB_,   \
+                        &PyArray_Type, &indptrB_,                            \
+                        &PyArray_Type, &dm_, &n)) {                          \
+    return 0;                                                                \
+  }                                                                          \
+  mA = PyArray_DIM(indptrA_, 0) - 1;                                         \
+  mB = PyArray_DIM(indptrB_, 0) - 1;                                         \
+  NPY_BEGIN_ALLOW_THREADS;                                                   \
+  cdist_##name##_csr((const double*)PyArray_DATA(dataA_),                    \
+                     (const int*)PyArray_DATA(indicesA_),                    \
+                     (const int*)PyArray_DATA(indptrA_),                     \
+                     (const double*)PyArray_DATA(dataB_),                    \
+                     (const int*)PyArray_DATA(indicesB_),                    \
+                     (const int*)PyArray_DATA(indptrB_),                     \
+                     (double*)PyArray_DATA(dm_), mA, mB, n);                 \
+  NPY_END_ALLOW_THREADS;                                                     \
+  return Py_BuildValue("");                                                  \
+}
+
+#define DEFINE_PDIST_CSR(name)                                               \
+static PyObject *pdist_##name##_csr_wrap(PyObject *self, PyObject *args) {   \
+  PyArrayObject *data_, *indices_, *indptr_, *dm_;                           \
+  int m, n, start = 0, end = -1;                                             \
+  if (!PyArg_ParseTuple(args, "O!O!O!O!i|ii",                                \
+                        &PyArray_Type, &data_, &PyArray_Type, &indices_,     \
+                        &PyArray_Type, &indptr_, &PyArray_Type, &dm_,        \
+                        &n, &start, &end)) {                                 \
+    return 0;                                                                \
+  }                                                                          \
+  m = PyArray_DIM(indptr_, 0) - 1;                                           \
+  if (check_row_range(&start, &end, m) < 0) {                                \
+    return 0;                                                                \
+  }                                                                          \
+  NPY_BEGIN_ALLOW_THREADS;                                                   \
+  pdist_##name##_csr((const double*)PyArray_DATA(data_),                     \
+                     (const int*)PyArray_DATA(indices_),                     \
+                     (const int*)PyArray_DATA(indptr_),                      \
+                     (double*)PyArray_DATA(dm_), m, n, start, end);          \
+  NPY_END_ALLOW_THREADS;                                                     \
+  return Py_BuildValue("");                                                  \
+}
+
+DEFINE_CDIST_CSR(euclidean)
+DEFINE_CDIST_CSR(city_block)
+DEFINE_CDIST_CSR(hamming)
+DEFINE_CDIST_CSR(jaccard)
+
+DEFINE_PDIST_CSR(euclidean)
+DEFINE_PDIST_CSR(city_block)
+DEFINE_PDIST_CSR(hamming)
+DEFINE_PDIST_CSR(jaccard)
+
+static PyObject *cdist_cosine_csr_wrap(PyObject *self, PyObject *args) {
+  PyArrayObject *dataA_, *indicesA_, *indptrA_;
+  PyArrayObject *dataB_, *indicesB_, *indptrB_, *dm_, *normsA_, *normsB_;
+  int mA, mB, n;
+  if (!PyArg_ParseTuple(args, "O!O!O!O!O!O!O!iO!O!",
+			&PyArray_Type, &dataA_, &PyArray_Type, &indicesA_,
+			&PyArray_Type, &indptrA_,
+			&PyArray_Type, &dataB_, &PyArray_Type, &indicesB_,
+			&PyArray_Type, &indptrB_,
+			&PyArray_Type, &dm_, &n,
+			&PyArray_Type, &normsA_, &PyArray_Type, &normsB_)) {
+    return 0;
+  }
+  mA = PyArray_DIM(indptrA_, 0) - 1;
+  mB = PyArray_DIM(indptrB_, 0) - 1;
+
+  NPY_BEGIN_ALLOW_THREADS;
+  cdist_cosine_csr((const double*)PyArray_DATA(dataA_),
+		   (const int*)PyArray_DATA(indicesA_),
+		   (const int*)PyArray_DATA(indptrA_),
+		   (const double*)PyArray_DATA(dataB_),
+		   (const int*)PyArray_DATA(indicesB_),
+		   (const int*)PyArray_DATA(indptrB_),
+		   (double*)PyArray_DATA(dm_), mA, mB, n,
+		   (const double*)PyArray_DATA(normsA_),
+		   (const double*)PyArray_DATA(normsB_));
+  NPY_END_ALLOW_THREADS;
   return Py_BuildValue("");
 }
 
-extern PyObject *pdist_sokalmichener_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const char *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
+static PyObject *pdist_cosine_csr_wrap(PyObject *self, PyObject *args) {
+  PyArrayObject *data_, *indices_, *indptr_, *dm_, *norms_;
+  int m, n, start = 0, end = -1;
+  if (!PyArg_ParseTuple(args, "O!O!O!O!iO!|ii",
+			&PyArray_Type, &data_, &PyArray_Type, &indices_,
+			&PyArray_Type, &indptr_, &PyArray_Type, &dm_, &n,
+			&PyArray_Type, &norms_,
+			&start, &end)) {
     return 0;
   }
-  else {
-    X = (const char*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
-
-    pdist_sokalmichener_bool(X, dm, m, n);
-  }
-  return Py_BuildValue("");
-}
-
-extern PyObject *pdist_sokalsneath_bool_wrap(PyObject *self, PyObject *args) {
-  PyArrayObject *X_, *dm_;
-  int m, n;
-  double *dm;
-  const char *X;
-  if (!PyArg_ParseTuple(args, "O!O!",
-			&PyArray_Type, &X_,
-			&PyArray_Type, &dm_)) {
+  m = PyArray_DIM(indptr_, 0) - 1;
+  if (check_row_range(&start, &end, m) < 0) {
     return 0;
   }
-  else {
-    X = (const char*)X_->data;
-    dm = (double*)dm_->data;
-    m = X_->dimensions[0];
-    n = X_->dimensions[1];
 
-    pdist_sokalsneath_bool(X, dm, m, n);
-  }
+  NPY_BEGIN_ALLOW_THREADS;
+  pdist_cosine_csr((const double*)PyArray_DATA(data_),
+		   (const int*)PyArray_DATA(indices_),
+		   (const int*)PyArray_DATA(indptr_),
+		   (double*)PyArray_DATA(dm_), m, n,
+		   (const double*)PyArray_DATA(norms_), start, end);
+  NPY_END_ALLOW_THREADS;
   return Py_BuildValue("");
 }
 
-extern PyObject *to_squareform_from_vector_wrap(PyObject *self, PyObject *args) {
+static PyObject *to_squareform_from_vector_wrap(PyObject *self, PyObject *args) {
   PyArrayObject *M_, *v_;
   int n;
   const double *v;
@@ -1060,7 +638,7 @@ extern PyObject *to_squareform_from_vector_wrap(PyObject *self, PyObject *args)
   return Py_BuildValue("d", 0.0);
 }
 
-extern PyObject *to_vector_from_squareform_wrap(PyObject *self, PyObject *args) {
+static PyObject *to_vector_from_squareform_wrap(PyObject *self, PyObject *args) {
   PyArrayObject *M_, *v_;
   int n;
   double *v;
@@ -1085,12 +663,17 @@ static PyMethodDef _distanceWrapMethods[] = {
   {"cdist_canberra_wrap", cdist_canberra_wrap, METH_VARARGS},
   {"cdist_chebyshev_wrap", cdist_chebyshev_wrap, METH_VARARGS},
   {"cdist_city_block_wrap", cdist_city_block_wrap, METH_VARARGS},
+  {"cdist_city_block_csr_wrap", cdist_city_block_csr_wrap, METH_VARARGS},
   {"cdist_cosine_wrap", cdist_cosine_wrap, METH_VARARGS},
+  {"cdist_cosine_csr_wrap", cdist_cosine_csr_wrap, METH_VARARGS},
   {"cdist_dice_bool_wrap", cdist_dice_bool_wrap, METH_VARARGS},
   {"cdist_euclidean_wrap", cdist_euclidean_wrap, METH_VARARGS},
+  {"cdist_euclidean_csr_wrap", cdist_euclidean_csr_wrap, METH_VARARGS},
   {"cdist_hamming_wrap", cdist_hamming_wrap, METH_VARARGS},
+  {"cdist_hamming_csr_wrap", cdist_hamming_csr_wrap, METH_VARARGS},
   {"cdist_hamming_bool_wrap", cdist_hamming_bool_wrap, METH_VARARGS},
   {"cdist_jaccard_wrap", cdist_jaccard_wrap, METH_VARARGS},
+  {"cdist_jaccard_csr_wrap", cdist_jaccard_csr_wrap, METH_VARARGS},
   {"cdist_jaccard_bool_wrap", cdist_jaccard_bool_wrap, METH_VARARGS},
   {"cdist_kulsinski_bool_wrap", cdist_kulsinski_bool_wrap, METH_VARARGS},
   {"cdist_mahalanobis_wrap", cdist_mahalanobis_wrap, METH_VARARGS},
@@ -1107,12 +690,17 @@ static PyMethodDef _distanceWrapMethods[] = {
   {"pdist_canberra_wrap", pdist_canberra_wrap, METH_VARARGS},
   {"pdist_chebyshev_wrap", pdist_chebyshev_wrap, METH_VARARGS},
   {"pdist_city_block_wrap", pdist_city_block_wrap, METH_VARARGS},
+  {"pdist_city_block_csr_wrap", pdist_city_block_csr_wrap, METH_VARARGS},
   {"pdist_cosine_wrap", pdist_cosine_wrap, METH_VARARGS},
+  {"pdist_cosine_csr_wrap", pdist_cosine_csr_wrap, METH_VARARGS},
   {"pdist_dice_bool_wrap", pdist_dice_bool_wrap, METH_VARARGS},
   {"pdist_euclidean_wrap", pdist_euclidean_wrap, METH_VARARGS},
+  {"pdist_euclidean_csr_wrap", pdist_euclidean_csr_wrap, METH_VARARGS},
   {"pdist_hamming_wrap", pdist_hamming_wrap, METH_VARARGS},
+  {"pdist_hamming_csr_wrap", pdist_hamming_csr_wrap, METH_VARARGS},
   {"pdist_hamming_bool_wrap", pdist_hamming_bool_wrap, METH_VARARGS},
   {"pdist_jaccard_wrap", pdist_jaccard_wrap, METH_VARARGS},
+  {"pdist_jaccard_csr_wrap", pdist_jaccard_csr_wrap, METH_VARARGS},
   {"pdist_jaccard_bool_wrap", pdist_jaccard_bool_wrap, METH_VARARGS},
   {"pdist_kulsinski_bool_wrap", pdist_kulsinski_bool_wrap, METH_VARARGS},
   {"pdist_mahalanobis_wrap", pdist_mahalanobis_wrap, METH_VARARGS},
@@ -0,0 +1,132 @@
+from __future__ import division, print_function, absolute_import
+
+import pickle
+
+import numpy as np
+from numpy.testing import (assert_equal, assert_array_equal,
+    assert_array_almost_equal, assert_raises, assert_, run_module_suite)
+
+from scipy.spatial import BallTree
+from scipy.spatial.distance import cdist
+
+
+METRICS = [('euclidean', {}, {}),
+           ('cityblock', {}, {}),
+           ('chebyshev', {}, {}),
+           ('minkowski', {'p': 3.}, {'p': 3.}),
+           ('cosine', {}, {}),
+           ('correlation', {}, {})]
+
+
+def check_metric(metric, kwargs, cdist_kwargs):
+    np.random.seed(1234)
+    data = np.random.randn(300, 12)
+    x = np.random.randn(20, 12)
+    T = BallTree(data, leafsize=4, metric=metric, **kwargs)
+    D = cdist(x, data, metric, **cdist_kwargs)
+
+    d, i = T.query(x, k=4)
+    assert_array_almost_equal(d, np.sort(D, axis=1)[:, :4])
+    assert_array_equal(i, np.argsort(D, axis=1)[:, :4])
+
+    d, i = T.query(x[0])
+    assert_almost_equal_float(d, D[0].min())
+    assert_equal(i, np.argmin(D[0]))
+
+    r = np.percentile(D, 5)
+    for c, neighbors in enumerate(T.query_ball_point(x, r)):
+        assert_equal(sorted(neighbors), np.nonzero(D[c] <= r)[0].tolist())
+    assert_array_equal(T.query_ball_point(x, r, output='count'),
+                       np.sum(D <= r, axis=1))
+
+    # only neighbors within the upper bound
+    d, i = T.query(x, k=4, distance_upper_bound=r)
+    expected = np.sort(D, axis=1)[:, :4]
+    expected[expected >= r] = np.inf
+    assert_array_almost_equal(d, expected)
+    assert_array_equal(i[np.isinf(d)], T.n)
+
+
+def assert_almost_equal_float(a, b):
+    assert_(isinstance(a, float))
+    assert_array_almost_equal(a, b)
+
+
+def test_metrics():
+    for metric, kwargs, cdist_kwargs in METRICS:
+        yield check_metric, metric, kwargs, cdist_kwargs
+
+
+def test_mahalanobis():
+    np.random.seed(1234)
+    A = np.random.randn(12, 12)
+    VI = np.dot(A, A.T) + np.eye(12)
+    check_metric('mahalanobis', {'VI': VI}, {'VI': VI})
+    # the default VI is the inverse covariance of the data
+    data = np.random.randn(100, 5)
+    x = np.random.randn(10, 5)
+    d, i = BallTree(data, metric='mahalanobis').query(x, k=3)
+    D = cdist(x, data, 'mahalanobis', VI=np.linalg.inv(np.cov(data.T)).T)
+    assert_array_almost_equal(d, np.sort(D, axis=1)[:, :3])
+
+
+def test_approximate():
+    np.random.seed(1234)
+    data = np.random.randn(500, 8)
+    x = np.random.randn(20, 8)
+    T = BallTree(data, leafsize=4)
+    d_exact = T.query(x, k=3)[0]
+    d = T.query(x, k=3, eps=0.5)[0]
+    assert_(np.all(d <= 1.5 * d_exact + 1e-12))
+    assert_(np.all(d >= d_exact - 1e-12))
+
+
+def test_n_jobs():
+    np.random.seed(1234)
+    T = BallTree(np.random.randn(300, 10), leafsize=4)
+    x = np.random.randn(51, 10)
+    d, i = T.query(x, k=3)
+    for n_jobs in (2, -1):
+        dj, ij = T.query(x, k=3, n_jobs=n_jobs)
+        assert_array_equal(d, dj)
+        assert_array_equal(i, ij)
+
+
+def test_ball_point_output():
+    np.random.seed(1234)
+    T = BallTree(np.random.randn(200, 6), leafsize=4, metric='cosine')
+    x = np.random.randn(3, 2, 6)
+    lists = T.query_ball_point(x, 0.5)
+    assert_equal(lists.shape, (3, 2))
+    indices, offsets = T.query_ball_point(x, 0.5, output='csr')
+    for c, neighbors in enumerate(lists.ravel()):
+        assert_equal(indices[offsets[c]:offsets[c+1]].tolist(), neighbors)
+    assert_equal(T.query_ball_point(x[0, 0], 0.5), lists[0, 0])
+
+
+def test_pickle():
+    np.random.seed(1234)
+    T1 = BallTree(np.random.randn(100, 4), leafsize=4, metric='minkowski',
+                  p=3)
+    T2 = pickle.loads(pickle.dumps(T1))
+    assert_equal(T2.metric, 'minkowski')
+    assert_equal(T2.p, 3)
+    x = np.random.randn(10, 4)
+    assert_array_equal(T1.query(x, k=2)[1], T2.query(x, k=2)[1])
+
+
+def test_errors():
+    data = np.random.randn(10, 3)
+    assert_raises(ValueError, BallTree, data, metric='hamming')
+    assert_raises(ValueError, BallTree, data, metric='minkowski', p=0.5)
+    assert_raises(ValueError, BallTree, data, leafsize=0)
+    assert_raises(ValueError, BallTree, data, metric='mahalanobis',
+                  VI=-np.eye(3))
+    assert_raises(ValueError, BallTree, np.zeros((2, 3)), metric='cosine')
+    T = BallTree(data)
+    assert_raises(ValueError, T.query, np.zeros(4))
+    assert_raises(ValueError, T.query, np.zeros(3), k=0)
+
+
+if __name__ == "__main__":
+    run_module_suite()
@@ -0,0 +1,75 @@
+from __future__ import division, print_function, absolute_import
+
+import numpy as np
+from numpy.testing import (assert_equal, assert_array_equal,
+    assert_array_almost_equal, assert_raises, assert_, run_module_suite)
+
+from scipy.spatial import DynamicKDTree, cKDTree
+
+
+def check_against_rebuild(T, x, k, r):
+    # queries on the dynamic tree must agree with a freshly built tree
+    ids = T.ids
+    F = cKDTree(T.data)
+
+    d1, i1 = T.query(x, k=k)
+    d2, i2 = F.query(x, k=k)
+    assert_array_almost_equal(d1, d2)
+    assert_array_equal(i1, ids[i2])
+
+    b1 = T.query_ball_point(x, r)
+    b2 = F.query_ball_point(x, r)
+    for l1, l2 in zip(b1, b2):
+        assert_equal(l1, sorted(ids[l2].tolist()))
+
+
+def test_insert_remove():
+    np.random.seed(1234)
+    T = DynamicKDTree(np.random.rand(50, 3), leafsize=3)
+    assert_equal(T.n, 50)
+    assert_array_equal(T.ids, np.arange(50))
+    for it in range(20):
+        new = T.insert(np.random.rand(np.random.randint(0, 20), 3))
+        if len(new) > 0:
+            assert_array_equal(T.ids[-len(new):], new)
+        old = np.random.permutation(T.ids)[:np.random.randint(0, 15)]
+        T.remove(old)
+        x = np.random.rand(5, 3)
+        check_against_rebuild(T, x, 4, 0.3)
+    assert_equal(T.n, len(T.ids))
+    assert_equal(len(T), T.data.shape[0])
+
+
+def test_remove_all():
+    T = DynamicKDTree(m=2)
+    ids = T.insert([[0, 0], [1, 0], [0, 1]])
+    T.remove(ids)
+    assert_equal(T.n, 0)
+    d, i = T.query([[0, 0]], k=2)
+    assert_equal(d, [[np.inf, np.inf]])
+    assert_equal(i, [[-1, -1]])
+    assert_equal(T.query_ball_point([0, 0], 2.), [])
+
+
+def test_single_point_query():
+    T = DynamicKDTree(m=2)
+    T.insert([[0, 0], [1, 0], [0, 1]])
+    d, i = T.query([0.25, 0])
+    assert_equal((d, i), (0.25, 0))
+    assert_(isinstance(i, int))
+    T.remove([0])
+    assert_equal(T.query([0.25, 0]), (0.75, 1))
+    assert_equal(T.query_ball_point([0, 0], 1.), [1, 2])
+
+
+def test_invalid_remove():
+    T = DynamicKDTree(m=2)
+    T.insert([[0, 0], [1, 0]])
+    T.remove([1])
+    assert_raises(ValueError, T.remove, [1])
+    assert_raises(ValueError, T.remove, [2])
+    assert_raises(ValueError, T.insert, [[0, 0, 0]])
+
+
+if __name__ == "__main__":
+    run_module_suite()
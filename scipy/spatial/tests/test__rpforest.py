@@ -0,0 +1,149 @@
+from __future__ import division, print_function, absolute_import
+
+import pickle
+
+import numpy as np
+from numpy.testing import (assert_equal, assert_array_equal,
+    assert_array_almost_equal, assert_raises, assert_, run_module_suite)
+
+from scipy.spatial import RPForest, cKDTree
+
+
+def recall(i, i_exact):
+    return np.mean([len(set(a) & set(b)) / len(b)
+                    for a, b in zip(i, i_exact)])
+
+
+def test_exhaustive_search():
+    # examining every point of every tree gives the exact neighbors
+    np.random.seed(1234)
+    data = np.random.randn(500, 10)
+    x = np.random.randn(30, 10)
+    F = RPForest(data, n_trees=3, leafsize=5, random_state=0)
+    d_exact, i_exact = cKDTree(data).query(x, k=5)
+    d, i = F.query(x, k=5, search_k=3*500)
+    assert_array_almost_equal(d, d_exact)
+    assert_array_equal(i, i_exact)
+
+
+def test_recall_increases():
+    np.random.seed(1234)
+    data = np.random.randn(2000, 20)
+    x = np.random.randn(50, 20)
+    F = RPForest(data, n_trees=8, leafsize=10, random_state=0)
+    d_exact, i_exact = cKDTree(data).query(x, k=10)
+    recalls = []
+    for search_k in [80, 400, 2000]:
+        d, i = F.query(x, k=10, search_k=search_k)
+        # the distances reported are exact distances
+        assert_array_almost_equal(d, np.sqrt(((data[i] - x[:, None])**2)
+                                             .sum(-1)))
+        assert_(np.all(d >= d_exact - 1e-12))
+        recalls.append(recall(i, i_exact))
+    assert_(recalls[0] <= recalls[1] <= recalls[2])
+    assert_(recalls[2] > 0.8)
+
+
+def test_query_format():
+    np.random.seed(1234)
+    data = np.random.randn(100, 4)
+    F = RPForest(data, n_trees=2, leafsize=4, random_state=0)
+    T = cKDTree(data)
+    x = np.random.randn(3, 2, 4)
+    for k in (1, 3):
+        d, i = F.query(x, k=k, search_k=200)
+        de, ie = T.query(x, k=k)
+        assert_equal(d.shape, de.shape)
+        assert_array_almost_equal(d, de)
+        assert_array_equal(i, ie)
+    d, i = F.query(x[0, 0], search_k=200)
+    assert_(isinstance(d, float))
+    assert_equal(i, T.query(x[0, 0])[1])
+    # missing neighbors
+    d, i = RPForest(data[:5]).query(x[0, 0], k=8)
+    assert_(np.all(np.isinf(d[5:])))
+    assert_array_equal(i[5:], 5)
+    d, i = F.query(x, k=2, distance_upper_bound=0.)
+    assert_(np.all(np.isinf(d)))
+    assert_array_equal(i, F.n)
+
+
+def test_duplicate_points():
+    data = np.zeros((50, 3))
+    d, i = RPForest(data, leafsize=4).query(np.zeros(3), k=3)
+    assert_array_equal(d, 0)
+    assert_equal(len(set(i)), 3)
+
+
+def test_n_jobs():
+    np.random.seed(1234)
+    data = np.random.randn(300, 10)
+    x = np.random.randn(51, 10)
+    F1 = RPForest(data, n_trees=4, random_state=0)
+    F2 = RPForest(data, n_trees=4, random_state=0, n_jobs=3)
+    d, i = F1.query(x, k=3)
+    for F in (F1, F2):
+        for n_jobs in (1, 2, -1):
+            dj, ij = F.query(x, k=3, n_jobs=n_jobs)
+            assert_array_equal(d, dj)
+            assert_array_equal(i, ij)
+
+
+def test_pickle():
+    np.random.seed(1234)
+    F1 = RPForest(np.random.randn(100, 4), n_trees=3, leafsize=4)
+    F2 = pickle.loads(pickle.dumps(F1))
+    assert_equal(F2.n_trees, 3)
+    x = np.random.randn(10, 4)
+    assert_array_equal(F1.query(x, k=2)[1], F2.query(x, k=2)[1])
+
+
+def test_corrupt_state():
+    # pickled forests whose node offsets or indices point outside their
+    # arrays
+    np.random.seed(1234)
+    F = RPForest(np.random.randn(100, 3), n_trees=3, leafsize=4)
+    from_state, (state,) = F.__reduce__()
+    from_state(state)
+    nodes = state['nodes']
+    inner = np.nonzero(nodes['less'] >= 0)[0]
+    leaf = np.nonzero(nodes['less'] < 0)[0]
+
+    def corrupt(name, index, field, value):
+        bad = dict(state)
+        bad[name] = state[name].copy()
+        if field is None:
+            bad[name][index] = value
+        else:
+            bad[name][field][index] = value
+        return bad
+
+    for bad in [corrupt('nodes', inner[-1], 'less', len(nodes)),
+                corrupt('nodes', inner[-1], 'greater', inner[-1]),
+                corrupt('nodes', inner[0], 'less', state['roots'][1]),
+                corrupt('nodes', leaf[0], 'end_idx', 101),
+                corrupt('nodes', leaf[0], 'start_idx', -5),
+                corrupt('indices', (1, 7), None, 100),
+                corrupt('indices', (0, 7), None, -1),
+                corrupt('roots', 1, None, 0),
+                dict(state, nodes=nodes[:-1]),
+                dict(state, directions=state['directions'][:, :2]),
+                dict(state, indices=state['indices'][:2]),
+                dict(state, n_trees=4),
+                dict(state, leafsize=0)]:
+        assert_raises(ValueError, from_state, bad)
+
+
+def test_errors():
+    data = np.random.randn(10, 3)
+    assert_raises(ValueError, RPForest, data, n_trees=0)
+    assert_raises(ValueError, RPForest, data, leafsize=0)
+    assert_raises(ValueError, RPForest, data[0])
+    F = RPForest(data)
+    assert_raises(ValueError, F.query, np.zeros(4))
+    assert_raises(ValueError, F.query, np.zeros(3), k=0)
+    assert_raises(ValueError, F.query, np.zeros(3), search_k=0)
+
+
+if __name__ == "__main__":
+    run_module_suite()
@@ -45,12 +45,15 @@ from numpy.testing import (verbose, TestCase, run_module_suite,
         assert_allclose)
 
 from scipy.lib.six import u
+from scipy.sparse import csr_matrix, coo_matrix
 
 from scipy.spatial.distance import (squareform, pdist, cdist, matching,
         jaccard, dice, sokalsneath, rogerstanimoto, russellrao, yule,
         num_obs_y, num_obs_dm, is_valid_dm, is_valid_y, minkowski, wminkowski,
         euclidean, sqeuclidean, cosine, correlation, mahalanobis,
-        canberra, braycurtis, sokalmichener, _validate_vector)
+        canberra, braycurtis, sokalmichener, _validate_vector,
+        cdist_blocks, cdist_reduce, CondensedDistanceMatrix,
+        _condensed_offsets)
 
 
 _filenames = ["iris.txt",
@@ -1908,5 +1911,273 @@ def test__validate_vector():
     assert_raises(ValueError, _validate_vector, x)
 
 
+class TestCdistBlocks(TestCase):
+
+    def setUp(self):
+        np.random.seed(1234)
+        self.XA = np.random.randn(57, 4)
+        self.XB = np.random.randn(31, 4)
+
+    def test_blocks(self):
+        for metric in ['euclidean', 'cityblock', 'seuclidean', 'mahalanobis',
+                       'cosine']:
+            D = cdist(self.XA, self.XB, metric)
+            for n_jobs in (1, 3):
+                # blocks of two rows per thread
+                blocks = list(cdist_blocks(self.XA, self.XB, metric,
+                                           max_memory=16*31*n_jobs,
+                                           n_jobs=n_jobs))
+                assert_equal([start for start, _ in blocks],
+                             list(range(0, 57, 2)))
+                assert_allclose(np.vstack([b for _, b in blocks]), D)
+
+    def test_tiny_memory(self):
+        blocks = list(cdist_blocks(self.XA, self.XB, max_memory=1))
+        assert_equal(len(blocks), 57)
+
+    def test_reductions(self):
+        D = cdist(self.XA, self.XB, 'minkowski', p=3)
+        kw = dict(metric='minkowski', p=3, max_memory=1000)
+        for n_jobs in (1, 2):
+            kw['n_jobs'] = n_jobs
+            assert_allclose(cdist_reduce(self.XA, self.XB, 'min', **kw),
+                            D.min(axis=1))
+            assert_array_equal(cdist_reduce(self.XA, self.XB, 'argmin', **kw),
+                               D.argmin(axis=1))
+            d, i = cdist_reduce(self.XA, self.XB, 'topk', k=5, **kw)
+            assert_array_equal(i, np.argsort(D, axis=1)[:, :5])
+            assert_allclose(d, np.sort(D, axis=1)[:, :5])
+            r = np.median(D)
+            assert_array_equal(cdist_reduce(self.XA, self.XB, 'count',
+                                            threshold=r, **kw),
+                               np.sum(D <= r, axis=1))
+
+    def test_topk_ties(self):
+        # many equal distances: ties go to the smaller index
+        XA = np.round(self.XA)
+        XB = np.round(self.XB)
+        D = cdist(XA, XB, 'cityblock')
+        order = np.argsort(D, axis=1, kind='mergesort')
+        for k in (1, 4, 31):
+            d, i = cdist_reduce(XA, XB, 'topk', metric='cityblock', k=k,
+                                max_memory=1000)
+            assert_array_equal(i, order[:, :k])
+            assert_array_equal(d, np.sort(D, axis=1)[:, :k])
+
+    def test_errors(self):
+        assert_raises(ValueError, cdist_reduce, self.XA, self.XB, 'max')
+        assert_raises(ValueError, cdist_reduce, self.XA, self.XB, 'count')
+        assert_raises(ValueError, cdist_reduce, self.XA, self.XB, 'topk',
+                      k=32)
+        assert_raises(ValueError, cdist_reduce, self.XA, self.XB[:, :3],
+                      'min')
+        assert_raises(ValueError, list,
+                      cdist_blocks(self.XA, self.XB, max_memory=0))
+
+
+# metrics of the C code between real vectors, with their parameters
+_REAL_METRICS = [('euclidean', {}), ('sqeuclidean', {}), ('cityblock', {}),
+                 ('chebyshev', {}), ('minkowski', {'p': 3.}),
+                 ('wminkowski', {'p': 3., 'w': np.arange(1., 6.)}),
+                 ('seuclidean', {}), ('mahalanobis', {}), ('cosine', {}),
+                 ('correlation', {}), ('canberra', {}), ('braycurtis', {}),
+                 ('hamming', {}), ('jaccard', {})]
+
+
+class TestFloat32AndThreads(TestCase):
+
+    def setUp(self):
+        np.random.seed(1234)
+        # values exactly representable in float32
+        self.XA = np.float32(np.random.randn(23, 5)).astype(np.double)
+        self.XB = np.float32(np.random.randn(17, 5)).astype(np.double)
+        self.XA[::4, 1] = self.XB[::3, 1] = 0
+
+    def test_pdist_float32(self):
+        for metric, kw in _REAL_METRICS:
+            Y = pdist(self.XA, metric, **kw)
+            Y32 = pdist(np.float32(self.XA), metric, **kw)
+            assert_equal(Y32.dtype, np.double)
+            assert_allclose(Y32, Y, rtol=1e-12, err_msg=metric)
+
+    def test_cdist_float32(self):
+        for metric, kw in _REAL_METRICS:
+            Y = cdist(self.XA, self.XB, metric, **kw)
+            Y32 = cdist(np.float32(self.XA), np.float32(self.XB), metric,
+                        **kw)
+            assert_equal(Y32.dtype, np.double)
+            assert_allclose(Y32, Y, rtol=1e-12, err_msg=metric)
+            # a float32 and a float64 input are both computed as doubles
+            assert_allclose(cdist(np.float32(self.XA), self.XB, metric, **kw),
+                            Y, rtol=1e-12, err_msg=metric)
+
+    def test_float32_noncontiguous(self):
+        X = np.float32(np.random.randn(10, 8))[:, ::2]
+        assert_allclose(pdist(X), pdist(np.double(X)), rtol=1e-12)
+        assert_allclose(cdist(X, X[::2]),
+                        cdist(np.double(X), np.double(X[::2])), rtol=1e-12)
+
+    def test_n_jobs(self):
+        XA_bool = self.XA > 0
+        XB_bool = self.XB > 0
+        for X, XB in [(self.XA, self.XB), (np.float32(self.XA), self.XB)]:
+            for metric, kw in _REAL_METRICS:
+                Y = pdist(X, metric, **kw)
+                D = cdist(X, XB, metric, **kw)
+                for n_jobs in (2, 3, -1):
+                    assert_array_equal(pdist(X, metric, n_jobs=n_jobs, **kw),
+                                       Y)
+                    assert_array_equal(cdist(X, XB, metric, n_jobs=n_jobs,
+                                             **kw), D)
+        for metric in ['yule', 'dice', 'sokalsneath', 'matching']:
+            Y = pdist(XA_bool, metric)
+            D = cdist(XA_bool, XB_bool, metric)
+            assert_array_equal(pdist(XA_bool, metric, n_jobs=4), Y)
+            assert_array_equal(cdist(XA_bool, XB_bool, metric, n_jobs=4), D)
+
+    def test_n_jobs_small(self):
+        for m in range(4):
+            X = np.random.randn(m, 3)
+            assert_array_equal(pdist(X, n_jobs=3), pdist(X))
+            assert_array_equal(cdist(X, X, n_jobs=3), cdist(X, X))
+
+    def test_bad_n_jobs(self):
+        assert_raises(ValueError, pdist, self.XA, n_jobs=0)
+        assert_raises(ValueError, cdist, self.XA, self.XB, n_jobs=-2)
+
+
+class TestSparse(TestCase):
+
+    metrics = ['euclidean', 'sqeuclidean', 'cityblock', 'cosine', 'hamming',
+               'jaccard']
+
+    def setUp(self):
+        np.random.seed(1234)
+        self.XA = np.random.randint(-2, 3, size=(23, 40)).astype(np.double)
+        self.XA[np.random.rand(23, 40) < 0.8] = 0
+        self.XB = np.random.randint(-2, 3, size=(17, 40)).astype(np.double)
+        self.XB[np.random.rand(17, 40) < 0.8] = 0
+
+    def test_pdist(self):
+        for metric in self.metrics:
+            Y = pdist(self.XA, metric)
+            for n_jobs in (1, 3):
+                assert_allclose(pdist(csr_matrix(self.XA), metric,
+                                      n_jobs=n_jobs), Y, err_msg=metric)
+
+    def test_cdist(self):
+        for metric in self.metrics:
+            D = cdist(self.XA, self.XB, metric)
+            for n_jobs in (1, 3):
+                assert_allclose(cdist(csr_matrix(self.XA), csr_matrix(self.XB),
+                                      metric, n_jobs=n_jobs), D,
+                                err_msg=metric)
+            # a sparse and a dense collection
+            assert_allclose(cdist(self.XA, csr_matrix(self.XB), metric), D,
+                            err_msg=metric)
+            assert_allclose(cdist(csr_matrix(self.XA), self.XB, metric), D,
+                            err_msg=metric)
+
+    def test_noncanonical(self):
+        # unsorted indices, an explicit zero and a duplicate entry
+        indices = np.array([3, 0, 2, 0, 1, 1])
+        X = csr_matrix((np.array([2., 1., 0., 3., -1., 1.5]), indices,
+                        np.array([0, 2, 4, 6])), shape=(3, 4))
+        dense = np.array([[1., 0., 0., 2.],
+                          [3., 0., 0., 0.],
+                          [0., 0.5, 0., 0.]])
+        for metric in self.metrics:
+            Y = pdist(dense, metric)
+            assert_allclose(pdist(X, metric), Y, err_msg=metric)
+            assert_allclose(pdist(coo_matrix(dense), metric), Y,
+                            err_msg=metric)
+        # the input is not modified
+        assert_array_equal(X.indices, indices)
+
+    def test_unsupported(self):
+        X = csr_matrix(self.XA)
+        assert_raises(ValueError, pdist, X, 'chebyshev')
+        assert_raises(ValueError, pdist, X, euclidean)
+        assert_raises(ValueError, cdist, X, self.XB, 'mahalanobis')
+        assert_raises(ValueError, cdist, X, self.XB[:, :3])
+
+    def test_too_large(self):
+        # 64-bit column indices that do not fit in the C int of the kernels
+        n = 2**31 + 5
+        X = csr_matrix((np.array([1., 2.]), np.array([0, n - 1]),
+                        np.array([0, 1, 2])), shape=(2, n))
+        assert_raises(ValueError, pdist, X)
+        assert_raises(ValueError, cdist, X, X)
+
+
+class TestCondensedDistanceMatrix(TestCase):
+
+    def setUp(self):
+        np.random.seed(1234)
+        self.y = pdist(np.random.randn(13, 3))
+        self.S = squareform(self.y)
+        self.D = CondensedDistanceMatrix(self.y)
+
+    def test_attributes(self):
+        assert_equal(self.D.n, 13)
+        assert_equal(len(self.D), 13)
+        assert_equal(self.D.shape, (13, 13))
+        # the condensed matrix is not copied
+        self.assertTrue(self.D.y is self.y)
+        assert_array_equal(self.D.toarray(), self.S)
+
+    def test_pairs(self):
+        for i in range(-13, 13):
+            for j in range(-13, 13):
+                assert_equal(self.D[i, j], self.S[i, j])
+        assert_equal(self.D[np.int32(3), np.int64(5)], self.S[3, 5])
+        assert_equal(self.D[np.array(3), np.array(5)], self.S[3, 5])
+
+    def test_indexing(self):
+        D, S = self.D, self.S
+        rows, cols = [1, 5, 12, 5], [0, 5, 2]
+        keys = [4, -1, rows, slice(2, 9), (2, slice(3, None)),
+                (slice(None, None, -2), 7), (rows, rows), (rows, slice(2, 5)),
+                (slice(2, 5), cols), (slice(1, 4), slice(None)),
+                np.ix_(rows, cols), (np.array([[1, 2], [3, 3]]), 0)]
+        for key in keys:
+            assert_array_equal(D[key], S[key])
+
+    def test_argmin(self):
+        T = self.S + np.diag(np.inf * np.ones(13))
+        assert_array_equal(self.D.argmin(), T.argmin(axis=1))
+        # ties go to the smallest index
+        D = CondensedDistanceMatrix(np.ones(6))
+        assert_array_equal(D.argmin(), [1, 0, 0, 0])
+
+    def test_int32_indices_large_n(self):
+        # the offsets into y of 1e5 observations do not fit in 32 bits
+        if np.dtype(np.intp).itemsize < 8:
+            return
+        n = 100000
+        a = np.array([0, 1, 46000, 90000, 99998], dtype=np.int32)
+        b = np.array([1, 99999, 46001, 99999, 99999], dtype=np.int32)
+        k = _condensed_offsets(n, a, b)
+        expected = [n * p - p * (p + 1) // 2 + q - p - 1
+                    for p, q in zip(a.tolist(), b.tolist())]
+        assert_array_equal(k, expected)
+        assert_equal(k[-1], n * (n - 1) // 2 - 1)
+
+    def test_int32_indices(self):
+        D, S = self.D, self.S
+        rows = np.array([1, 5, 12, -1], dtype=np.intc)
+        cols = np.array([0, 5, 2], dtype=np.intc)
+        assert_array_equal(D[np.ix_(rows, cols)], S[np.ix_(rows, cols)])
+        assert_array_equal(D[rows, rows[::-1]], S[rows, rows[::-1]])
+
+    def test_errors(self):
+        assert_raises(ValueError, CondensedDistanceMatrix, np.ones(4))
+        assert_raises(ValueError, CondensedDistanceMatrix, self.S)
+        assert_raises(IndexError, self.D.__getitem__, (13, 0))
+        assert_raises(IndexError, self.D.__getitem__, ([0, -14], 0))
+        assert_raises(IndexError, self.D.__getitem__, (1.5, 0))
+        assert_raises(IndexError, self.D.__getitem__, (0, 1, 2))
+
+
 if __name__ == "__main__":
     run_module_suite()
@@ -3,10 +3,18 @@
 
 from __future__ import division, print_function, absolute_import
 
+import os
+import shutil
+import pickle
+from tempfile import mkdtemp
+
 from numpy.testing import (assert_equal, assert_array_equal,
-    assert_almost_equal, assert_array_almost_equal, assert_, run_module_suite)
+    assert_almost_equal, assert_array_almost_equal, assert_, assert_raises,
+    run_module_suite)
 
 import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
 from scipy.spatial import KDTree, Rectangle, distance_matrix, cKDTree
 from scipy.spatial import minkowski_distance as distance
 
@@ -380,6 +388,43 @@ def test_random_ball_vectorized_compiled():
     assert_(isinstance(r[0,0],list))
 
 
+def test_random_ball_output_formats_compiled():
+    n = 50
+    m = 3
+    np.random.seed(1234)
+    T = cKDTree(np.random.randn(n,m), leafsize=3)
+    x = np.random.randn(2,4,m)
+
+    r = T.query_ball_point(x, 1.)
+    indices, offsets = T.query_ball_point(x, 1., output='csr')
+    counts = T.query_ball_point(x, 1., output='count')
+    assert_equal(counts.shape, (2,4))
+    assert_equal(offsets.shape, (9,))
+    for c, l in enumerate(r.ravel()):
+        assert_equal(indices[offsets[c]:offsets[c+1]].tolist(), l)
+        assert_equal(counts.ravel()[c], len(l))
+
+    l = T.query_ball_point(x[0,0], 1.)
+    assert_equal(T.query_ball_point(x[0,0], 1., output='count'), len(l))
+    indices, offsets = T.query_ball_point(x[0,0], 1., output='csr')
+    assert_equal(indices.tolist(), l)
+    assert_equal(offsets.tolist(), [0, len(l)])
+
+
+def test_ball_tree_output_formats_compiled():
+    np.random.seed(1234)
+    T1 = cKDTree(np.random.randn(50,3), leafsize=3)
+    T2 = cKDTree(np.random.randn(40,3), leafsize=2)
+
+    r = T1.query_ball_tree(T2, 1.)
+    indices, offsets = T1.query_ball_tree(T2, 1., output='csr')
+    counts = T1.query_ball_tree(T2, 1., output='count')
+    assert_equal(offsets.shape, (T1.n+1,))
+    for i, l in enumerate(r):
+        assert_equal(indices[offsets[i]:offsets[i+1]].tolist(), l)
+        assert_equal(counts[i], len(l))
+
+
 class two_trees_consistency:
 
     def test_all_in_ball(self):
@@ -557,6 +602,57 @@ class test_count_neighbors_compiled:
         for r,result in zip(rs, results):
             assert_equal(self.T1.count_neighbors(self.T2, r), result)
 
+    def test_unsorted_radius(self):
+        rs = [0.5, 0.1, 2., 0.1]
+        results = self.T1.count_neighbors(self.T2, rs)
+        for r,result in zip(rs, results):
+            assert_equal(self.T1.count_neighbors(self.T2, r), result)
+
+    def test_binned(self):
+        rs = [0.1, 0.5, 0.5, 2.]
+        binned = self.T1.count_neighbors(self.T2, rs, cumulative=False)
+        assert_array_equal(np.cumsum(binned),
+                           self.T1.count_neighbors(self.T2, rs))
+        assert_raises(ValueError, self.T1.count_neighbors, self.T2,
+                      [0.5, 0.1], cumulative=False)
+
+    def test_weights(self):
+        np.random.seed(1234)
+        w1 = np.random.rand(self.T1.n)
+        w2 = np.random.rand(self.T2.n)
+        rs = [0.1, 0.5, 2.]
+        d = distance_matrix(self.T1.data, self.T2.data)
+        for weights, W in [((w1, w2), w1[:, None] * w2),
+                           ((w1, None), w1[:, None] * np.ones(self.T2.n)),
+                           ((None, w2), np.ones(self.T1.n)[:, None] * w2)]:
+            expected = [np.sum(W[d <= r]) for r in rs]
+            assert_array_almost_equal(
+                self.T1.count_neighbors(self.T2, rs, weights=weights),
+                expected)
+            assert_array_almost_equal(
+                self.T1.count_neighbors(self.T2, rs, weights=weights,
+                                        cumulative=False),
+                np.diff(np.r_[0, expected]))
+            assert_almost_equal(
+                self.T1.count_neighbors(self.T2, 0.5, weights=weights),
+                expected[1])
+
+        # unit weights give the counts
+        assert_array_almost_equal(
+            self.T1.count_neighbors(self.T2, rs,
+                                    weights=(np.ones(self.T1.n), None)),
+            self.T1.count_neighbors(self.T2, rs))
+
+        # a single array of weights for an autocorrelation
+        d = distance_matrix(self.T1.data, self.T1.data)
+        assert_array_almost_equal(
+            self.T1.count_neighbors(self.T1, rs, weights=w1),
+            [np.sum((w1[:, None] * w1)[d <= r]) for r in rs])
+        assert_raises(ValueError, self.T1.count_neighbors, self.T2, rs,
+                      weights=w1)
+        assert_raises(ValueError, self.T1.count_neighbors, self.T2, rs,
+                      weights=(w2[:10], None))
+
 
 class test_sparse_distance_matrix:
     def setUp(self):
@@ -717,5 +813,269 @@ def test_ball_point_ints():
 # cKDTree is specialized to type double points, so no need to make
 # a unit test corresponding to test_ball_point_ints()
 
+
+def test_query_n_jobs_compiled():
+    np.random.seed(1234)
+    points = np.random.randn(500, 3)
+    queries = np.random.randn(101, 3)
+    T = cKDTree(points, leafsize=4)
+    for k in (1, 5):
+        d, i = T.query(queries, k=k)
+        for n_jobs in (2, 3, -1):
+            dj, ij = T.query(queries, k=k, n_jobs=n_jobs)
+            assert_array_equal(d, dj)
+            assert_array_equal(i, ij)
+    # more threads than query points
+    d, i = T.query(queries[:2], k=2, n_jobs=4)
+    assert_array_equal(i, T.query(queries[:2], k=2)[1])
+
+
+def test_build_options_compiled():
+    np.random.seed(1234)
+    # clustered data with many duplicate coordinates
+    points = np.vstack((np.random.randn(400, 3),
+                        np.round(np.random.randn(400, 3) * 3) + 10))
+    queries = np.random.randn(50, 3) * 5
+    d_expected, i_expected = cKDTree(points).query(queries, k=4)
+    counts = cKDTree(points).query_ball_point(queries, 1., output='count')
+    for balanced_tree in (False, True):
+        for n_jobs in (1, 2, 3, -1):
+            T = cKDTree(points, leafsize=4, balanced_tree=balanced_tree,
+                        n_jobs=n_jobs)
+            assert_array_equal(np.sort(T.indices), np.arange(len(points)))
+            d, i = T.query(queries, k=4)
+            assert_array_almost_equal(d, d_expected)
+            assert_array_equal(
+                T.query_ball_point(queries, 1., output='count'), counts)
+        # the tree does not depend on the number of threads
+        assert_array_equal(
+            cKDTree(points, leafsize=4, balanced_tree=balanced_tree).indices,
+            cKDTree(points, leafsize=4, balanced_tree=balanced_tree,
+                    n_jobs=3).indices)
+
+
+def test_balanced_tree_compiled():
+    # every split of a balanced tree halves its points
+    np.random.seed(1234)
+    for points in (np.arange(1000.)[:, None],
+                   np.random.randn(1000, 2) ** 3):
+        T = cKDTree(points, leafsize=1, balanced_tree=True)
+        nodes = dict(T._state())['tree_nodes']
+        inner = nodes[nodes['split_dim'] >= 0]
+        less = nodes[np.nonzero(nodes['split_dim'] >= 0)[0] + inner['less']]
+        assert_array_equal(less['children'], inner['children'] // 2)
+
+
+def check_same_tree(T1, T2):
+    np.random.seed(1234)
+    x = np.random.randn(20, T1.m)
+    assert_equal(T2.n, T1.n)
+    assert_equal(T2.leafsize, T1.leafsize)
+    assert_array_equal(T2.data, T1.data)
+    assert_array_equal(T2.query(x, k=3)[1], T1.query(x, k=3)[1])
+    assert_equal(T2.query_pairs(0.5), T1.query_pairs(0.5))
+    r = np.array([0.2, 0.5])
+    assert_equal(T2.count_neighbors(T1, r), T1.count_neighbors(T1, r))
+
+
+def test_ckdtree_pickle():
+    np.random.seed(1234)
+    T1 = cKDTree(np.random.randn(100, 3), leafsize=4)
+    T2 = pickle.loads(pickle.dumps(T1))
+    check_same_tree(T1, T2)
+
+
+def test_ckdtree_save_load():
+    np.random.seed(1234)
+    T1 = cKDTree(np.random.randn(100, 3), leafsize=4)
+    tmpdir = mkdtemp()
+    try:
+        fname = os.path.join(tmpdir, 'tree.ckd')
+        T1.save(fname)
+        for mmap_mode in ('r', 'c', None):
+            T2 = cKDTree.load(fname, mmap_mode=mmap_mode)
+            check_same_tree(T1, T2)
+            del T2
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_ckdtree_corrupt_state():
+    # saved trees whose node offsets or indices point outside their arrays
+    np.random.seed(1234)
+    T = cKDTree(np.random.randn(100, 3), leafsize=4)
+    # the function unpickling uses to set up a tree from its arrays
+    from_state, (state,) = T.__reduce__()
+    from_state(state)
+    inner = np.nonzero(state['tree_nodes']['split_dim'] >= 0)[0]
+    leaf = np.nonzero(state['tree_nodes']['split_dim'] < 0)[0]
+
+    def corrupt(name, index, field, value):
+        bad = dict(state)
+        bad[name] = state[name].copy()
+        if field is None:
+            bad[name][index] = value
+        else:
+            bad[name][field][index] = value
+        return bad
+
+    n_nodes = len(state['tree_nodes'])
+    for bad in [corrupt('tree_nodes', inner[-1], 'less', n_nodes),
+                corrupt('tree_nodes', inner[-1], 'greater', -1),
+                corrupt('tree_nodes', inner[0], 'less', 0),
+                corrupt('tree_nodes', leaf[0], 'end_idx', 101),
+                corrupt('tree_nodes', leaf[0], 'start_idx', -5),
+                corrupt('tree_nodes', leaf[0], 'children', 50),
+                corrupt('tree_nodes', inner[1], 'split_dim', 3),
+                corrupt('indices', 7, None, 100),
+                corrupt('indices', 7, None, -1),
+                corrupt('leafsize', 0, None, 0),
+                dict(state, tree_nodes=state['tree_nodes'][:-1]),
+                dict(state, indices=state['indices'][:-1]),
+                dict(state, mins=state['mins'][:2])]:
+        assert_raises(ValueError, from_state, bad)
+
+    # truncated files
+    tmpdir = mkdtemp()
+    try:
+        fname = os.path.join(tmpdir, 'tree.ckd')
+        T.save(fname)
+        with open(fname, 'rb') as f:
+            contents = f.read()
+        for size in (200, len(contents) // 2, len(contents) - 8):
+            with open(fname, 'wb') as f:
+                f.write(contents[:size])
+            for mmap_mode in ('r', None):
+                assert_raises(ValueError, cKDTree.load, fname,
+                              mmap_mode=mmap_mode)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def tiled_tree(data, boxsize):
+    # The periodic images of data in the neighboring boxes, and the index
+    # of the original point of every image.
+    n, m = data.shape
+    shifts = np.array(list(np.ndindex(*((3,) * m)))) - 1
+    tiled = (data[np.newaxis, :, :] +
+             (shifts * boxsize)[:, np.newaxis, :]).reshape(-1, m)
+    return cKDTree(tiled), np.tile(np.arange(n), len(shifts))
+
+
+def test_periodic_compiled():
+    np.random.seed(1234)
+    boxsize = np.array([1., 2.])
+    data = np.random.rand(100, 2) * boxsize
+    x = np.random.rand(30, 2) * boxsize
+    T = cKDTree(data, leafsize=4, boxsize=boxsize)
+    T_tiled, orig = tiled_tree(data, boxsize)
+    other = cKDTree(x, leafsize=4, boxsize=boxsize)
+    other_tiled = tiled_tree(x, boxsize)[0]
+    r = 0.3
+    for p in (1, 2, np.inf):
+        d, i = T.query(x, k=4, p=p)
+        d_tiled, i_tiled = T_tiled.query(x, k=4, p=p)
+        assert_array_almost_equal(d, d_tiled)
+        # query points are wrapped into the box
+        assert_array_almost_equal(T.query(x + boxsize * [2, -1], k=4, p=p)[0],
+                                  d)
+
+        for c, neighbors in enumerate(T.query_ball_point(x, r, p=p)):
+            expected = orig[T_tiled.query_ball_point(x[c], r, p=p)]
+            assert_equal(sorted(neighbors), sorted(expected))
+
+        for c, neighbors in enumerate(other.query_ball_tree(T, r, p=p)):
+            expected = orig[T_tiled.query_ball_point(x[c], r, p=p)]
+            assert_equal(sorted(neighbors), sorted(expected))
+
+        pairs = set()
+        for i, neighbors in enumerate(T.query_ball_point(data, r, p=p)):
+            pairs.update((i, j) for j in neighbors if i < j)
+        assert_equal(T.query_pairs(r, p=p), pairs)
+
+        radii = np.array([0.05, 0.1, 0.2, 0.4])
+        assert_array_equal(other.count_neighbors(T, radii, p=p),
+                           other_tiled.count_neighbors(cKDTree(data), radii,
+                                                       p=p))
+
+        M = other.sparse_distance_matrix(T, r, p=p).toarray()
+        M_tiled = cKDTree(x).sparse_distance_matrix(T_tiled, r, p=p)
+        M_tiled = M_tiled.toarray()
+        M_expected = np.zeros_like(M)
+        for i, j in zip(*np.nonzero(M_tiled)):
+            M_expected[i, orig[j]] = M_tiled[i, j]
+        assert_array_almost_equal(M, M_expected)
+
+
+def test_periodic_nonperiodic_axis_compiled():
+    np.random.seed(1234)
+    data = np.random.rand(50, 2) * [1., 5.]
+    T = cKDTree(data, boxsize=[1., np.inf])
+    d, i = T.query([0.99, 2.5], k=5)
+    dx = np.abs(data[:, 0] - 0.99)
+    dx = np.minimum(dx, 1 - dx)
+    dist = np.sqrt(dx**2 + (data[:, 1] - 2.5)**2)
+    assert_array_almost_equal(d, np.sort(dist)[:5])
+    assert_array_equal(i, np.argsort(dist)[:5])
+
+
+def test_periodic_errors_compiled():
+    data = np.random.rand(10, 2)
+    assert_raises(ValueError, cKDTree, data + 1, boxsize=1.)
+    assert_raises(ValueError, cKDTree, data, boxsize=0.)
+    assert_raises(ValueError, cKDTree, data, boxsize=[1., 1., 1.])
+    T = cKDTree(data, boxsize=1.)
+    assert_raises(ValueError, T.count_neighbors, cKDTree(data), 0.1)
+    assert_raises(ValueError, T.query_ball_tree, cKDTree(data, boxsize=2.),
+                  0.1)
+
+
+def test_periodic_pickle():
+    np.random.seed(1234)
+    T1 = cKDTree(np.random.rand(100, 3), leafsize=4, boxsize=1.)
+    T2 = pickle.loads(pickle.dumps(T1))
+    assert_array_equal(T2.boxsize, T1.boxsize)
+    check_same_tree(T1, T2)
+    assert_(pickle.loads(pickle.dumps(cKDTree(np.ones((2, 2))))).boxsize
+            is None)
+
+
+def test_minimum_spanning_tree_compiled():
+    np.random.seed(1234)
+    data = np.random.rand(200, 3)
+    for p in (1, 2, 3, np.inf):
+        T = cKDTree(data, leafsize=4)
+        i, j, d = T.minimum_spanning_tree(p=p)
+        assert_equal(len(d), 199)
+        assert_array_almost_equal(d, distance(data[i], data[j], p))
+        M = scipy.sparse.csgraph.minimum_spanning_tree(
+            distance_matrix(data, data, p))
+        assert_almost_equal(d.sum(), M.sum())
+        G = scipy.sparse.coo_matrix((np.ones(199), (i, j)), shape=(200, 200))
+        assert_equal(scipy.sparse.csgraph.connected_components(G)[0], 1)
+
+
+def test_minimum_spanning_tree_ties_compiled():
+    # points on a grid have many edges of equal length
+    data = np.array(list(np.ndindex(6, 5)), dtype=float)
+    i, j, d = cKDTree(data, leafsize=2).minimum_spanning_tree()
+    assert_array_equal(d, np.ones(29))
+    G = scipy.sparse.coo_matrix((np.ones(29), (i, j)), shape=(30, 30))
+    assert_equal(scipy.sparse.csgraph.connected_components(G)[0], 1)
+    assert_equal(len(cKDTree(data[:1]).minimum_spanning_tree()[0]), 0)
+
+
+def test_minimum_spanning_tree_periodic_compiled():
+    np.random.seed(1234)
+    boxsize = np.array([1., 2.])
+    data = np.random.rand(100, 2) * boxsize
+    d = cKDTree(data, leafsize=4, boxsize=boxsize).minimum_spanning_tree()[2]
+    # the distance between two points is that of their nearest images
+    T_tiled = tiled_tree(data, boxsize)[0]
+    D = distance_matrix(data, T_tiled.data).reshape(100, -1, 100).min(axis=1)
+    M = scipy.sparse.csgraph.minimum_spanning_tree(D)
+    assert_almost_equal(d.sum(), M.sum())
+
+
 if __name__ == "__main__":
     run_module_suite()
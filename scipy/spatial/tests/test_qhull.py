@@ -9,6 +9,9 @@ from numpy.testing import assert_equal, assert_almost_equal, run_module_suite,\
 from scipy.lib.six.moves import xrange
 
 import copy
+import pickle
+import shutil
+from tempfile import mkdtemp
 import scipy.spatial.qhull as qhull
 from scipy.spatial import cKDTree as KDTree
 
@@ -146,6 +149,44 @@ class TestUtilities(object):
             j = qhull.tsearch(tri, p[:2])
             assert_equal(i, j)
 
+    def test_find_simplex_hints_and_threads(self):
+        # All walk start strategies and thread counts locate the points
+        # in the same simplices as the brute force search
+        np.random.seed(1234)
+        for ndim in (2, 3, 4):
+            tri = qhull.Delaunay(np.random.rand(300, ndim))
+            # includes points outside the triangulation
+            xi = 1.2*np.random.rand(4, 250, ndim) - 0.1
+            xi[0,0] = np.nan
+            expected = tri.find_simplex(xi, bruteforce=True)
+            assert_equal(expected.shape, (4, 250))
+            assert_((expected == -1).any())
+            for hint in ('previous', 'grid'):
+                for n_jobs in (1, 3, -1):
+                    i = tri.find_simplex(xi, hint=hint, n_jobs=n_jobs)
+                    assert_array_equal(i, expected,
+                                       err_msg="%r %r" % (hint, n_jobs))
+            assert_array_equal(tri.find_simplex(xi, bruteforce=True,
+                                                n_jobs=2), expected)
+
+    def test_find_simplex_grid_incremental(self):
+        # The walk start grid is rebuilt when points are added
+        np.random.seed(1234)
+        tri = qhull.Delaunay(np.random.rand(20, 2), incremental=True)
+        xi = np.random.rand(100, 2)
+        tri.find_simplex(xi, hint='grid')
+        tri.add_points(np.random.rand(200, 2) + 1)
+        xi = 2*np.random.rand(100, 2)
+        assert_array_equal(tri.find_simplex(xi, hint='grid'),
+                           tri.find_simplex(xi, bruteforce=True))
+        tri.close()
+
+    def test_find_simplex_bad_args(self):
+        tri = qhull.Delaunay(np.random.rand(10, 2))
+        xi = np.random.rand(5, 2)
+        assert_raises(ValueError, tri.find_simplex, xi, hint='tree')
+        assert_raises(ValueError, tri.find_simplex, xi, n_jobs=0)
+
     def test_plane_distance(self):
         # Compare plane distance from hyperplane equations obtained from Qhull
         # to manually computed plane equations
@@ -798,5 +839,78 @@ class TestVoronoi:
             for chunksize in 1, 4:
                 yield check, name, chunksize
 
+
+class TestPersistence(object):
+    # Pickling, saving and loading rebuild the objects from their arrays
+
+    def _roundtrips(self, obj):
+        yield pickle.loads(pickle.dumps(obj))
+        tmpdir = mkdtemp()
+        try:
+            fname = os.path.join(tmpdir, 'qhull.npy')
+            obj.save(fname)
+            for mmap_mode in ('r', 'c', None):
+                yield type(obj).load(fname, mmap_mode=mmap_mode)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_delaunay(self):
+        np.random.seed(1234)
+        tri = qhull.Delaunay(np.random.rand(50, 3), incremental=True)
+        xi = np.random.rand(100, 3)
+        for tri2 in self._roundtrips(tri):
+            for name in ('points', 'simplices', 'neighbors', 'equations',
+                         'coplanar', 'transform', 'vertex_to_simplex',
+                         'convex_hull', 'min_bound', 'max_bound'):
+                assert_array_equal(getattr(tri2, name), getattr(tri, name),
+                                   err_msg=name)
+            assert_equal(tri2.paraboloid_scale, tri.paraboloid_scale)
+            assert_equal(tri2.paraboloid_shift, tri.paraboloid_shift)
+            assert_array_equal(tri2.find_simplex(xi), tri.find_simplex(xi))
+            assert_array_equal(tri2.find_simplex(xi, hint='grid'),
+                               tri.find_simplex(xi))
+            assert_allclose(tri2.plane_distance(xi), tri.plane_distance(xi))
+            for a, b in zip(tri2.vertex_neighbor_vertices,
+                            tri.vertex_neighbor_vertices):
+                assert_array_equal(a, b)
+            del tri2
+        tri.close()
+
+    def test_convex_hull(self):
+        np.random.seed(1234)
+        for ndim in (2, 3):
+            hull = qhull.ConvexHull(np.random.rand(50, ndim))
+            for hull2 in self._roundtrips(hull):
+                for name in ('points', 'simplices', 'neighbors', 'equations',
+                             'coplanar', 'vertices'):
+                    assert_array_equal(getattr(hull2, name),
+                                       getattr(hull, name), err_msg=name)
+                del hull2
+
+    def test_voronoi(self):
+        np.random.seed(1234)
+        vor = qhull.Voronoi(np.random.rand(50, 2))
+        for vor2 in self._roundtrips(vor):
+            for name in ('points', 'vertices', 'ridge_points',
+                         'point_region'):
+                assert_array_equal(getattr(vor2, name), getattr(vor, name),
+                                   err_msg=name)
+            assert_equal(vor2.regions, vor.regions)
+            assert_equal(vor2.ridge_vertices, vor.ridge_vertices)
+            assert_equal(vor2.ridge_dict, vor.ridge_dict)
+            del vor2
+
+    def test_load_errors(self):
+        tri = qhull.Delaunay(np.random.rand(10, 2))
+        tmpdir = mkdtemp()
+        try:
+            fname = os.path.join(tmpdir, 'qhull.npy')
+            tri.save(fname)
+            assert_raises(ValueError, qhull.Voronoi.load, fname)
+            assert_raises(ValueError, qhull.Delaunay.load, fname,
+                          mmap_mode='w+')
+        finally:
+            shutil.rmtree(tmpdir)
+
 if __name__ == "__main__":
     run_module_suite()